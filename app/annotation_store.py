@@ -0,0 +1,498 @@
+"""
+Storage of the annotators' checkbox selections and navigation state.
+
+JsonFileStore keeps the original layout in every annotator directory: checkbox_selections_<user>[_<mode>].json with
+all annotations of a user, rewritten on every save. The current image indices of all users and modes are kept in one
+navigation_state.json next to the annotator directories (written in batches by app.navigation_state), falling back
+to the older per-user current_image_index_[<mode>_]<user>.txt files. SqliteAnnotationStore
+keeps one row per annotated image in a SQLite database in WAL mode, so a save writes only the images it changed and
+counts per class are answered from an index. Both return the same dicts, in the same order, as the JSON files;
+export_user()/import_user() convert between the two without loss, and the sync backends keep uploading the JSON
+files (exported before every upload).
+
+Both can be shared by several worker processes: JsonFileStore replaces its files atomically and serializes the
+read-modify-write of a user's selections (and of navigation_state.json) with file locks, SQLite locks the database.
+
+Modes are the suffixes of the annotation files ('S' and 'M' for the sanity check modes, None for the default
+annotations) and of the index files ('sanity_1', 'sanity_2', None).
+
+Usage:
+    python -m app.annotation_store import --db annotations.sqlite3 --annotators-dir app/demo_data/annotator_dirs
+    python -m app.annotation_store export --db annotations.sqlite3 --annotators-dir exported/ [--users demo]
+"""
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import threading
+
+from .file_lock import FileLock, write_file_atomically
+
+ANNOTATION_MODES = (None, 'S', 'M')
+NAVIGATION_FILENAME = 'navigation_state.json'
+DEFAULT_NAVIGATION_MODE = 'grid'  # Key of the mode None in navigation_state.json
+
+
+def get_selections_filename(username, mode=None):
+    return f'checkbox_selections_{username}_{mode}.json' if mode else f'checkbox_selections_{username}.json'
+
+
+def get_index_filename(username, mode=None):
+    return f'current_image_index_{mode}_{username}.txt' if mode else f'current_image_index_{username}.txt'
+
+
+def read_selections_file(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def read_index_file(path):
+    try:
+        with open(path, 'r') as f:
+            return int(f.read().strip())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def read_navigation_file(path):
+    """{username: {mode: index}} of a navigation_state.json, {} if there is none."""
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def get_label_type(image_data):
+    return image_data.get('label_type') if isinstance(image_data, dict) else None
+
+
+class AnnotationStore:
+    """Interface of the annotation backends."""
+
+    def load_selections(self, username, mode=None):
+        """All checkbox selections of a user as {image_name: image_data}, {} if there are none."""
+        raise NotImplementedError
+
+    def save_selections(self, username, selections, mode=None, image_names=None):
+        """
+        Store the checkbox selections of a user. With image_names, only these images changed: those in
+        `selections` are written, the others deleted. Without, `selections` replaces everything stored.
+        """
+        raise NotImplementedError
+
+    def save_image(self, username, image_name, image_data, mode=None):
+        """Store the annotation of one image."""
+        raise NotImplementedError
+
+    def count_annotations(self, username, class_index=None, mode=None, selections=None):
+        """
+        Number of annotated images of a user, of one ground truth class with class_index. `selections`, the user's
+        selections if the caller already loaded them, may be counted instead of the stored ones.
+        """
+        raise NotImplementedError
+
+    def get_current_index(self, username, mode=None):
+        """Last image index stored for a user, None if there is none."""
+        raise NotImplementedError
+
+    def set_current_index(self, username, index, mode=None):
+        self.set_current_indices({(username, mode): index})
+
+    def set_current_indices(self, indices):
+        """Store several indices at once, given as {(username, mode): index}."""
+        raise NotImplementedError
+
+    def get_revision(self, username, mode=None):
+        """Value that changes whenever the user's selections change, also when changed by another process."""
+        raise NotImplementedError
+
+    def has_user(self, username):
+        """Whether anything is stored for the user."""
+        raise NotImplementedError
+
+    def export_user(self, username, user_dir):
+        """Write the user's selections and indices to user_dir in the JSON file layout."""
+        raise NotImplementedError
+
+    def import_user(self, username, user_dir):
+        """Replace the user's selections and indices with those of the JSON files in user_dir."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class JsonFileStore(AnnotationStore):
+    def __init__(self, annotators_dir, class_of=None):
+        """
+        Args:
+            annotators_dir: Directory of the annotator directories
+            class_of: Function returning the ground truth class index of an image name, for count_annotations
+        """
+        self.annotators_dir = annotators_dir
+        self.class_of = class_of
+
+    def _path(self, username, filename):
+        return os.path.join(self.annotators_dir, username, filename)
+
+    def load_selections(self, username, mode=None):
+        return read_selections_file(self._path(username, get_selections_filename(username, mode)))
+
+    def _lock(self, username):
+        """Held while a user's selections are read, changed and written back."""
+        return FileLock(self._path(username, '.annotations.lock'))
+
+    def _write_selections(self, username, selections, mode):
+        write_file_atomically(self._path(username, get_selections_filename(username, mode)), json.dumps(selections))
+
+    def save_selections(self, username, selections, mode=None, image_names=None):
+        """
+        With image_names, the changes are applied to the selections as stored, so images saved meanwhile by
+        another process are kept.
+        """
+        with self._lock(username):
+            if image_names is not None:
+                stored = self.load_selections(username, mode)
+                for image_name in image_names:
+                    if image_name in selections:
+                        stored[image_name] = selections[image_name]
+                    else:
+                        stored.pop(image_name, None)
+                selections = stored
+            self._write_selections(username, selections, mode)
+
+    def save_image(self, username, image_name, image_data, mode=None):
+        with self._lock(username):
+            selections = self.load_selections(username, mode)
+            selections[image_name] = image_data
+            self._write_selections(username, selections, mode)
+
+    def count_annotations(self, username, class_index=None, mode=None, selections=None):
+        if selections is None:
+            selections = self.load_selections(username, mode)
+        if class_index is None:
+            return len(selections)
+        return sum(1 for image_name in selections if self.class_of(image_name) == class_index)
+
+    @property
+    def navigation_path(self):
+        return os.path.join(self.annotators_dir, NAVIGATION_FILENAME)
+
+    def get_current_index(self, username, mode=None):
+        user_state = read_navigation_file(self.navigation_path).get(username, {})
+        index = user_state.get(mode or DEFAULT_NAVIGATION_MODE)
+        if index is not None:
+            return index
+        return read_index_file(self._path(username, get_index_filename(username, mode)))
+
+    def set_current_indices(self, indices):
+        """Rewrites navigation_state.json atomically: a crash leaves either the old or the new file."""
+        with FileLock(self.navigation_path + '.lock'):
+            state = read_navigation_file(self.navigation_path)
+            for (username, mode), index in indices.items():
+                state.setdefault(username, {})[mode or DEFAULT_NAVIGATION_MODE] = int(index)
+            write_file_atomically(self.navigation_path, json.dumps(state, indent=1, sort_keys=True), fsync=True)
+
+    def get_revision(self, username, mode=None):
+        """Modification time, size and inode of the selections file, or None if it does not exist."""
+        try:
+            stat = os.stat(self._path(username, get_selections_filename(username, mode)))
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def has_user(self, username):
+        return os.path.isdir(os.path.join(self.annotators_dir, username))
+
+    def export_user(self, username, user_dir):
+        pass  # The files are already there
+
+    def import_user(self, username, user_dir):
+        pass
+
+
+class SqliteAnnotationStore(AnnotationStore):
+    """
+    Annotations in a SQLite database in WAL mode: readers never wait for writers, and a save commits only the rows
+    of the images it changed. Every thread uses its own connection. Rows are returned in insertion order (their
+    rowid, which an upsert of an existing image keeps), matching the key order of the JSON files.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS annotations (
+            username TEXT NOT NULL,
+            mode TEXT NOT NULL,
+            image_name TEXT NOT NULL,
+            class_index INTEGER,
+            label_type TEXT,
+            payload TEXT NOT NULL,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (username, mode, image_name)
+        );
+        CREATE INDEX IF NOT EXISTS annotations_class ON annotations (username, mode, class_index);
+        CREATE INDEX IF NOT EXISTS annotations_label_type ON annotations (username, mode, label_type);
+        CREATE INDEX IF NOT EXISTS annotations_updated_at ON annotations (username, updated_at);
+        CREATE TABLE IF NOT EXISTS navigation (
+            username TEXT NOT NULL,
+            mode TEXT NOT NULL,
+            image_index INTEGER NOT NULL,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (username, mode)
+        );
+        CREATE TABLE IF NOT EXISTS revisions (
+            username TEXT NOT NULL,
+            mode TEXT NOT NULL,
+            revision INTEGER NOT NULL,
+            PRIMARY KEY (username, mode)
+        );
+    """
+
+    def __init__(self, path, class_of=None, busy_timeout=30.0):
+        """
+        Args:
+            path: Database file (created with its directory if needed)
+            class_of: Function returning the ground truth class index of an image name, stored with every row
+                for count_annotations by class
+            busy_timeout: Seconds a write waits for another process's write to finish
+        """
+        self.path = path
+        self.class_of = class_of
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._connection().executescript(self.SCHEMA)
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            # Autocommit mode: transactions are begun explicitly in _transaction()
+            connection = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None,
+                                         check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+            with self._connections_lock:
+                self._connections.append(connection)
+        return connection
+
+    def _transaction(self):
+        return _Transaction(self._connection())
+
+    @staticmethod
+    def _mode(mode):
+        return mode or ''
+
+    def _class_index(self, image_name):
+        return self.class_of(image_name) if self.class_of is not None else None
+
+    def _upsert(self, connection, username, mode, image_name, image_data, now):
+        connection.execute(
+            "INSERT INTO annotations (username, mode, image_name, class_index, label_type, payload, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (username, mode, image_name) DO UPDATE SET "
+            "label_type = excluded.label_type, payload = excluded.payload, updated_at = excluded.updated_at",
+            (username, mode, image_name, self._class_index(image_name), get_label_type(image_data),
+             json.dumps(image_data), now))
+
+    def _bump_revision(self, connection, username, mode):
+        connection.execute(
+            "INSERT INTO revisions (username, mode, revision) VALUES (?, ?, 1) "
+            "ON CONFLICT (username, mode) DO UPDATE SET revision = revision + 1", (username, mode))
+
+    def load_selections(self, username, mode=None):
+        rows = self._connection().execute(
+            "SELECT image_name, payload FROM annotations WHERE username = ? AND mode = ? ORDER BY rowid",
+            (username, self._mode(mode)))
+        return {image_name: json.loads(payload) for image_name, payload in rows}
+
+    def save_selections(self, username, selections, mode=None, image_names=None):
+        mode = self._mode(mode)
+        now = time.time()
+        with self._transaction() as connection:
+            if image_names is None:
+                connection.execute("DELETE FROM annotations WHERE username = ? AND mode = ?", (username, mode))
+                image_names = selections.keys()
+            for image_name in image_names:
+                if image_name in selections:
+                    self._upsert(connection, username, mode, image_name, selections[image_name], now)
+                else:
+                    connection.execute("DELETE FROM annotations WHERE username = ? AND mode = ? AND image_name = ?",
+                                       (username, mode, image_name))
+            self._bump_revision(connection, username, mode)
+
+    def save_image(self, username, image_name, image_data, mode=None):
+        mode = self._mode(mode)
+        with self._transaction() as connection:
+            self._upsert(connection, username, mode, image_name, image_data, time.time())
+            self._bump_revision(connection, username, mode)
+
+    def count_annotations(self, username, class_index=None, mode=None, selections=None):
+        if class_index is None:
+            row = self._connection().execute(
+                "SELECT COUNT(*) FROM annotations WHERE username = ? AND mode = ?",
+                (username, self._mode(mode))).fetchone()
+        else:
+            row = self._connection().execute(
+                "SELECT COUNT(*) FROM annotations WHERE username = ? AND mode = ? AND class_index = ?",
+                (username, self._mode(mode), class_index)).fetchone()
+        return row[0]
+
+    def count_by_label_type(self, username, mode=None):
+        rows = self._connection().execute(
+            "SELECT label_type, COUNT(*) FROM annotations WHERE username = ? AND mode = ? GROUP BY label_type",
+            (username, self._mode(mode)))
+        return dict(rows.fetchall())
+
+    def get_updated_since(self, username, since, mode=None):
+        """Names of the images whose annotation changed after the timestamp `since`."""
+        rows = self._connection().execute(
+            "SELECT image_name FROM annotations WHERE username = ? AND updated_at > ? AND mode = ? "
+            "ORDER BY updated_at", (username, since, self._mode(mode)))
+        return [image_name for image_name, in rows]
+
+    def get_current_index(self, username, mode=None):
+        row = self._connection().execute(
+            "SELECT image_index FROM navigation WHERE username = ? AND mode = ?",
+            (username, self._mode(mode))).fetchone()
+        return row[0] if row is not None else None
+
+    def set_current_indices(self, indices):
+        now = time.time()
+        with self._transaction() as connection:
+            connection.executemany(
+                "INSERT INTO navigation (username, mode, image_index, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (username, mode) DO UPDATE SET "
+                "image_index = excluded.image_index, updated_at = excluded.updated_at",
+                [(username, self._mode(mode), int(index), now) for (username, mode), index in indices.items()])
+
+    def get_revision(self, username, mode=None):
+        row = self._connection().execute(
+            "SELECT revision FROM revisions WHERE username = ? AND mode = ?",
+            (username, self._mode(mode))).fetchone()
+        return row[0] if row is not None else 0
+
+    def get_usernames(self):
+        rows = self._connection().execute(
+            "SELECT username FROM annotations UNION SELECT username FROM navigation ORDER BY username")
+        return [username for username, in rows]
+
+    def has_user(self, username):
+        row = self._connection().execute(
+            "SELECT 1 FROM annotations WHERE username = ? UNION ALL SELECT 1 FROM navigation WHERE username = ? "
+            "LIMIT 1", (username, username)).fetchone()
+        return row is not None
+
+    def get_index_modes(self, username):
+        rows = self._connection().execute("SELECT mode FROM navigation WHERE username = ?", (username,))
+        return [mode or None for mode, in rows]
+
+    def export_user(self, username, user_dir):
+        os.makedirs(user_dir, exist_ok=True)
+        for mode in ANNOTATION_MODES:
+            selections = self.load_selections(username, mode)
+            path = os.path.join(user_dir, get_selections_filename(username, mode))
+            if selections or mode is None or os.path.exists(path):
+                write_file_atomically(path, json.dumps(selections))
+        for mode in self.get_index_modes(username):
+            write_file_atomically(os.path.join(user_dir, get_index_filename(username, mode)),
+                                  str(self.get_current_index(username, mode)))
+
+    def import_user(self, username, user_dir):
+        for mode in ANNOTATION_MODES:
+            self.save_selections(username, read_selections_file(
+                os.path.join(user_dir, get_selections_filename(username, mode))), mode)
+
+        indices = {}
+        prefix, suffix = 'current_image_index_', f'_{username}.txt'
+        for filename in os.listdir(user_dir):
+            if filename == get_index_filename(username):
+                mode = None
+            elif filename.startswith(prefix) and filename.endswith(suffix):
+                mode = filename[len(prefix):-len(suffix)]
+            else:
+                continue
+            index = read_index_file(os.path.join(user_dir, filename))
+            if index is not None:
+                indices[(username, mode)] = index
+        # The shared navigation_state.json of the JSON backend takes precedence over the older files
+        navigation_file = os.path.join(os.path.dirname(os.path.abspath(user_dir)), NAVIGATION_FILENAME)
+        for mode, index in read_navigation_file(navigation_file).get(username, {}).items():
+            indices[(username, None if mode == DEFAULT_NAVIGATION_MODE else mode)] = index
+        if indices:
+            self.set_current_indices(indices)
+
+    def close(self):
+        with self._connections_lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections = []
+        self._local = threading.local()
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT, rolled back on errors; takes the write lock up front to avoid deadlocks."""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        self.connection.execute('BEGIN IMMEDIATE')
+        return self.connection
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.connection.execute('COMMIT' if exc_type is None else 'ROLLBACK')
+        return False
+
+
+def create_annotation_store(config, class_of=None):
+    """The annotation store selected by ANNOTATION_BACKEND ('json' or 'sqlite')."""
+    backend = config.get('ANNOTATION_BACKEND', 'json')
+    if backend == 'json':
+        return JsonFileStore(config['ANNOTATORS_ROOT_DIRECTORY'], class_of=class_of)
+    if backend == 'sqlite':
+        return SqliteAnnotationStore(config.get('ANNOTATION_SQLITE_PATH', 'annotations.sqlite3'), class_of=class_of)
+    raise ValueError(f"Unknown ANNOTATION_BACKEND: {backend}. Use 'json' or 'sqlite'.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=('import', 'export'),
+                        help='import: JSON files into the database, export: database into JSON files')
+    parser.add_argument('--db', required=True, help='SQLite database file')
+    parser.add_argument('--annotators-dir', required=True, help='Directory of the annotator directories')
+    parser.add_argument('--users', nargs='*', default=None, help='Only these users (default: all)')
+    args = parser.parse_args()
+
+    from class_mapping.class_loader import ClassDictionary
+    store = SqliteAnnotationStore(args.db, class_of=ClassDictionary().get_val_img_class)
+    try:
+        if args.command == 'import':
+            usernames = args.users or sorted(name for name in os.listdir(args.annotators_dir)
+                                             if os.path.isdir(os.path.join(args.annotators_dir, name)))
+        else:
+            usernames = args.users or store.get_usernames()
+        for username in usernames:
+            user_dir = os.path.join(args.annotators_dir, username)
+            if args.command == 'import':
+                store.import_user(username, user_dir)
+            else:
+                store.export_user(username, user_dir)
+            print(f"{args.command}ed {username}: {store.count_annotations(username)} annotated images")
+    finally:
+        store.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,8 +1,15 @@
 import os
 import json
 import logging
+import threading
 from flask import request
-from app.helper_funcs import read_json_file
+from app.helper_funcs import read_json_file, load_json
+from app.metrics import stage
+from app.logging_pipeline import setup_logging_pipeline
+from app.annotation_store import JsonFileStore
+from app.navigation_state import NavigationState, NavigationIndexDict
+from app.gt_arrays import load_gt_arrays
+from app.lazy_proposals import load_lazy_records, LAZY_GT_FILENAMES
 import shutil
 from tqdm import tqdm
 
@@ -53,7 +60,7 @@ def copy_js_files_to_static(app):
     os.makedirs(destination_dir, exist_ok=True)
 
     # List of JavaScript files to copy
-    js_files = ['bbox-editor.js', 'bbox-editor-patch.js', 'bbox-editor-ui.js', 'bbox-init.js', 'auto-select-class.js', 'inline-bbox-editor.js', 'grid-view.js', 'class-jump.js', 'whole-image-bbox.js', 'refresh-btn.js', 'keyboard-shortcuts.js']
+    js_files = ['bbox-editor.js', 'bbox-editor-patch.js', 'bbox-editor-ui.js', 'bbox-init.js', 'auto-select-class.js', 'inline-bbox-editor.js', 'grid-view.js', 'class-jump.js', 'whole-image-bbox.js', 'refresh-btn.js', 'keyboard-shortcuts.js', 'detail-navigation.js', 'grid-navigation.js', 'class-names.js']
 
     # Copy each JavaScript file
     for js_file in js_files:
@@ -100,13 +107,11 @@ def copy_sample_files_to_static(source, destination, images_per_dir=50):
 
 
 def setup_logging(app):
-    log_format = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    handler = logging.FileHandler('app.log')
-    handler.setLevel(logging.INFO)
-    handler.setFormatter(log_format)
-
-    app.logger.addHandler(handler)
-    app.logger.setLevel(logging.INFO)
+    """
+    Writes the logs to a size-rotated log file (and the console) from a background thread, see
+    app.logging_pipeline. Request threads only put records on a queue.
+    """
+    setup_logging_pipeline(app)
 
 
 def load_users_data(app):
@@ -126,18 +131,18 @@ def load_users_data(app):
     If the `ANNOTATORS_ROOT_DIRECTORY` contains directories for users "user1" and "user2", this function will
     read or initialize their image indices and load any additional data required for each user.
     """
+    store = get_annotation_store(app)
     for username in os.listdir(app.config['ANNOTATORS_ROOT_DIRECTORY']):
         # Perform initial setup for each user
         user_dir = os.path.join(app.config['ANNOTATORS_ROOT_DIRECTORY'], username)
         if os.path.isdir(user_dir):
-            # read current image index.
-            index_file_path = os.path.join(app.config['ANNOTATORS_ROOT_DIRECTORY'], username,
-                                           'current_image_index_{}.txt'.format(username))
-            if os.path.exists(index_file_path):
-                with open(index_file_path, 'r') as f:
-                    app.current_image_index_dct[username] = int(f.read())
-            else:
-                app.current_image_index_dct[username] = 0  # Initialize image index
+            # Users new to a database backend start from their JSON files
+            if not store.has_user(username):
+                store.import_user(username, user_dir)
+            # read current image index (the app's index dict reads it from the navigation state itself)
+            if not isinstance(app.current_image_index_dct, NavigationIndexDict):
+                current_image_index = get_navigation_state(app).get(username)
+                app.current_image_index_dct[username] = current_image_index if current_image_index is not None else 0
             # Load additional user-specific data
             load_user_specific_data(username, app)
 
@@ -166,8 +171,8 @@ def load_user_specific_data(username, app):
     proposals_infofile = os.path.join(app.config['GT_DATA_ROOT_DIRECTORY'], f"predictions.json")
     all_sample_images_file = os.path.join(app.config['GT_DATA_ROOT_DIRECTORY'], "sample_images_info.json")
 
-    proposals_info = read_json_file(proposals_infofile, app)
-    all_sample_images = read_json_file(all_sample_images_file, app)
+    proposals_info = read_gt_data_file(proposals_infofile, app)
+    all_sample_images = read_gt_data_file(all_sample_images_file, app)
 
     # Cache data in some form of data structure
     app.user_cache[username] = {
@@ -177,6 +182,65 @@ def load_user_specific_data(username, app):
     }
 
 
+# Ground truth files are read once per process and shared by all users: (path, backend) -> (file revision, data).
+# Read before the worker processes are forked (preload_gt_data), the data is shared with them too. With the 'arrays'
+# backend (see gt_arrays.py) the data is memory-mapped, and bboxes.json is shared by all users as well; 'lazy' (see
+# lazy_proposals.py) reads predictions.json from disk on access instead.
+GT_DATA_FILENAMES = ('predictions.json', 'sample_images_info.json')
+GT_ARRAYS_FILENAMES = GT_DATA_FILENAMES + ('bboxes.json',)
+_gt_data_cache = {}
+_gt_data_lock = threading.Lock()
+
+
+def read_gt_data_file(file_path, app=None, backend=None, arrays_directory=None, cache_rows=None):
+    """
+    Contents of a ground truth JSON file, only read again when the file changed. None if it does not exist.
+
+    backend, arrays_directory and cache_rows default to the app's GT_DATA_BACKEND, GT_ARRAYS_DIRECTORY and
+    LAZY_PROPOSALS_CACHE_ROWS. Files the 'arrays' or 'lazy' backend cannot convert are read as JSON.
+    """
+    logger = app.logger if app is not None else logging.getLogger(__name__)
+    if backend is None:
+        backend = app.config.get('GT_DATA_BACKEND', 'json') if app is not None else 'json'
+    if arrays_directory is None and app is not None:
+        arrays_directory = app.config.get('GT_ARRAYS_DIRECTORY')
+    if cache_rows is None:
+        cache_rows = app.config.get('LAZY_PROPOSALS_CACHE_ROWS', 4096) if app is not None else 4096
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        logger.error(f"File not found: {file_path}")
+        return None
+    revision = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+    key = (file_path, backend)
+    with _gt_data_lock:
+        cached = _gt_data_cache.get(key)
+    if cached is not None and cached[0] == revision:
+        return cached[1]
+
+    data = None
+    if backend in ('arrays', 'lazy'):
+        try:
+            if backend == 'lazy' and os.path.basename(file_path) in LAZY_GT_FILENAMES:
+                data = load_lazy_records(file_path, arrays_directory, cache_rows=cache_rows)
+            else:
+                data = load_gt_arrays(file_path, arrays_directory)
+        except ValueError as e:
+            logger.warning(f"Reading {file_path} as JSON, it cannot be converted for the {backend} backend: {e}")
+    if data is None:
+        data = load_json(file_path)
+    with _gt_data_lock:
+        _gt_data_cache[key] = (revision, data)
+    return data
+
+
+def preload_gt_data(gt_data_root_directory, backend='json', arrays_directory=None):
+    """Read the ground truth files into the cache, e.g. in a server's master process before it forks workers."""
+    for filename in (GT_ARRAYS_FILENAMES if backend in ('arrays', 'lazy') else GT_DATA_FILENAMES):
+        read_gt_data_file(os.path.join(gt_data_root_directory, filename), backend=backend,
+                          arrays_directory=arrays_directory)
+
+
 def get_form_data():
     image_name = request.form.get('image_name')
     checkbox_values = request.form.getlist('checkboxes')
@@ -184,6 +248,22 @@ def get_form_data():
     return image_name, checkbox_values, direction
 
 
+def get_annotation_store(app):
+    """The app's annotation store (see app.annotation_store), the JSON files for apps without one."""
+    store = getattr(app, 'annotation_store', None)
+    if store is None:
+        store = JsonFileStore(app.config['ANNOTATORS_ROOT_DIRECTORY'])
+    return store
+
+
+def get_navigation_state(app):
+    """The app's navigation state, or one writing every change to the annotation store for apps without one."""
+    navigation_state = getattr(app, 'navigation_state', None)
+    if navigation_state is None:
+        navigation_state = NavigationState(get_annotation_store(app), max_delay_seconds=None)
+    return navigation_state
+
+
 def load_user_data(app, username, mode=None):
     """
     Load user annotation data.
@@ -197,17 +277,15 @@ def load_user_data(app, username, mode=None):
     Returns:
         Dictionary with checkbox selections
     """
-    results_dir = app.config['ANNOTATORS_ROOT_DIRECTORY']
-    
-    if mode:
-        # Load mode-specific file
-        filename = f'checkbox_selections_{username}_{mode}.json'
-    else:
-        # Load default file
-        filename = f'checkbox_selections_{username}.json'
-    
-    checkbox_selections = load_json_data(os.path.join(results_dir, username, filename))
-    return checkbox_selections
+    return get_annotation_store(app).load_selections(username, mode)
+
+
+def count_user_annotations(app, username, class_index=None, checkbox_selections=None):
+    """
+    Number of images the user annotated, of the ground truth class with class_index. File-based stores count
+    checkbox_selections, the user's selections if they are already loaded, instead of reading them again.
+    """
+    return get_annotation_store(app).count_annotations(username, class_index, selections=checkbox_selections)
 
 
 def load_json_data(file_path):
@@ -228,27 +306,33 @@ def get_total_num_predictions(app, username):
 
 def update_current_image_index(app, username, direction, total_num_predictions, current_image_index_dct, step=1):
     # global current_image_index_dct
-    results_dir = app.config['ANNOTATORS_ROOT_DIRECTORY']
     if direction == 'next':
         current_image_index_dct[username] = min(current_image_index_dct.get(username, 0) + step, total_num_predictions - step)
     elif direction == 'prev':
         current_image_index_dct[username] = max(current_image_index_dct.get(username, 0) - step, 0)
 
-    index_file_path = os.path.join(results_dir, username, 'current_image_index_{}.txt'.format(username))
-    with open(index_file_path, 'w') as f:
-        f.write(str(current_image_index_dct[username]))
+    # The app's index dict persists assignments itself
+    if not isinstance(current_image_index_dct, NavigationIndexDict):
+        get_navigation_state(app).set(username, current_image_index_dct[username])
 
 
 def update_current_image_index_simple(app, username, current_image_index_dct, current_index):
-    results_dir = app.config['ANNOTATORS_ROOT_DIRECTORY']
     current_image_index_dct[username] = current_index
+    if not isinstance(current_image_index_dct, NavigationIndexDict):
+        get_navigation_state(app).set(username, current_image_index_dct[username])
+
+
+def load_current_image_index(app, username, mode=None):
+    """Image index of the user in a mode ('sanity_1', 'sanity_2'; None for the grid), None if unset."""
+    return get_navigation_state(app).get(username, mode)
+
 
-    index_file_path = os.path.join(results_dir, username, 'current_image_index_{}.txt'.format(username))
-    with open(index_file_path, 'w') as f:
-        f.write(str(current_image_index_dct[username]))
+def save_current_image_index(app, username, current_index, mode=None):
+    """Persisted in the background by app.navigation_state, within NAVIGATION_MAX_DELAY_SECONDS."""
+    get_navigation_state(app).set(username, current_index, mode)
 
 
-def save_user_data(app, username, checkbox_selections=None, mode=None):
+def save_user_data(app, username, checkbox_selections=None, mode=None, image_names=None):
     """
     Save user annotation data.
     
@@ -258,17 +342,36 @@ def save_user_data(app, username, checkbox_selections=None, mode=None):
         checkbox_selections: Dictionary with checkbox selections to save
         mode: Optional mode suffix ('S' for Mode 1, 'M' for Mode 2)
               If None, saves to default checkbox_selections file
+        image_names: Names of the images whose selections changed (added, updated or deleted). Database backends
+              only write these; None saves all of checkbox_selections.
     """
-    results_dir = app.config['ANNOTATORS_ROOT_DIRECTORY']
     if checkbox_selections is not None:
-        if mode:
-            # Save to mode-specific file
-            filename = f'checkbox_selections_{username}_{mode}.json'
-        else:
-            # Save to default file
-            filename = f'checkbox_selections_{username}.json'
-        
-        save_json_data(os.path.join(results_dir, username, filename), checkbox_selections)
+        with stage('save_annotations'):
+            get_annotation_store(app).save_selections(username, checkbox_selections, mode, image_names)
+
+        # Rendered grid and labeling pages show the default file's annotations
+        if not mode and hasattr(app, 'page_cache'):
+            app.page_cache.invalidate(username)
+
+
+def save_user_image(app, username, image_name, image_data, mode=None):
+    """Save the annotation of a single image, see save_user_data."""
+    with stage('save_annotations'):
+        get_annotation_store(app).save_image(username, image_name, image_data, mode)
+
+    if not mode and hasattr(app, 'page_cache'):
+        app.page_cache.invalidate(username)
+
+
+def export_user_files(app, username):
+    """Bring the user's JSON files up to date with the annotation store, e.g. before they are synced."""
+    get_navigation_state(app).flush()
+    get_annotation_store(app).export_user(username, os.path.join(app.config['ANNOTATORS_ROOT_DIRECTORY'], username))
+
+
+def import_user_files(app, username):
+    """Load the user's JSON files into the annotation store, e.g. after they were downloaded."""
+    get_annotation_store(app).import_user(username, os.path.join(app.config['ANNOTATORS_ROOT_DIRECTORY'], username))
 
 
 def save_json_data(file_path, data):
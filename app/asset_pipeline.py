@@ -0,0 +1,371 @@
+"""
+Build-at-startup pipeline for the JavaScript and CSS files in the static folder.
+
+Every asset is minified, written next to its source under a content-hashed name (js/grid-view.<hash>.js)
+and precompressed to .gz (and .br when the brotli package is installed). url_for('static', ...) resolves
+to the fingerprinted names, which are served with immutable cache headers and the best encoding the
+browser accepts. A manifest in the static folder records the hash of every source, so only changed
+sources are rebuilt at the next start.
+
+rjsmin/rcssmin are used for minifying when installed; otherwise a conservative built-in minifier strips
+comments and indentation but keeps every line break, so automatic semicolon insertion is unaffected.
+"""
+
+import os
+import re
+import gzip
+import json
+import hashlib
+import logging
+import mimetypes
+import threading
+
+from flask import request, send_from_directory
+
+from .file_lock import write_file_atomically
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MANIFEST_FILENAME = 'asset-manifest.json'
+FINGERPRINT_LENGTH = 12
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+FINGERPRINTED_NAME = re.compile(r'.+\.[0-9a-f]{%d}\.(js|css)$' % FINGERPRINT_LENGTH)
+
+# Encodings in order of preference, with the suffix of their precompressed files
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+
+class AssetPipeline:
+    def __init__(self, static_dir, minify=True, precompress=True, logger=None):
+        """
+        Args:
+            static_dir: Absolute path of the static folder, assets are read from and written to it
+            minify: Minify the fingerprinted files (the sources are left unchanged)
+            precompress: Also write .gz (and .br) files of every fingerprinted file
+        """
+        self.static_dir = static_dir
+        self.minify = minify
+        self.precompress = precompress
+        self.logger = logger or logging.getLogger(__name__)
+
+        self.manifest_path = os.path.join(static_dir, MANIFEST_FILENAME)
+        self.assets = {}  # logical name (js/grid-view.js) -> manifest entry
+        self.fingerprinted = {}  # fingerprinted name -> list of available encodings
+        self._lock = threading.Lock()
+
+        self.stats = {
+            'built': 0,
+            'unchanged': 0,
+            'source_bytes': 0,
+            'output_bytes': 0,
+            'compressed_bytes': {encoding: 0 for encoding, _ in ENCODINGS},
+            'encoded_responses': {encoding: 0 for encoding, _ in ENCODINGS}
+        }
+
+    def build(self, names):
+        """
+        Build the given assets (paths relative to the static folder) and write the manifest.
+        Sources whose hash and settings match the manifest, and whose outputs still exist, are skipped.
+        """
+        previous = self._load_manifest()
+        assets = {}
+
+        for name in names:
+            source_path = os.path.join(self.static_dir, name)
+            if not os.path.isfile(source_path):
+                self.logger.warning(f"Asset {name} not found in the static folder, it is served as is")
+                continue
+
+            with open(source_path, 'rb') as f:
+                source = f.read()
+            source_hash = hashlib.sha256(source).hexdigest()
+
+            entry = previous.get(name)
+            if entry and self._is_up_to_date(entry, source_hash):
+                self.stats['unchanged'] += 1
+            else:
+                if entry:
+                    self._remove_outputs(entry)
+                entry = self._build_asset(name, source, source_hash)
+                self.stats['built'] += 1
+
+            self.stats['source_bytes'] += len(source)
+            self.stats['output_bytes'] += entry['size']
+            for encoding, size in entry['compressed_sizes'].items():
+                self.stats['compressed_bytes'][encoding] += size
+            assets[name] = entry
+
+        # Outputs of assets that are no longer part of the build
+        for name, entry in previous.items():
+            if name not in assets:
+                self._remove_outputs(entry)
+
+        self.assets = assets
+        self.fingerprinted = {entry['path']: list(entry['compressed_sizes']) for entry in assets.values()}
+        self._write_manifest(assets)
+        self.logger.info(f"Asset pipeline: {self.stats['built']} assets built, {self.stats['unchanged']} unchanged")
+        return assets
+
+    def resolve(self, name):
+        """Fingerprinted name of an asset, or the name itself when it is not part of the build."""
+        entry = self.assets.get(name)
+        return entry['path'] if entry else name
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['compressed_bytes'] = dict(self.stats['compressed_bytes'])
+            stats['encoded_responses'] = dict(self.stats['encoded_responses'])
+        stats['assets'] = len(self.assets)
+        stats['minifier_js'] = 'rjsmin' if rjsmin is not None else 'builtin'
+        stats['minifier_css'] = 'rcssmin' if rcssmin is not None else 'builtin'
+        stats['brotli'] = brotli is not None
+        return stats
+
+    def serve(self, filename, fallback):
+        """
+        Serve a fingerprinted asset precompressed and with immutable cache headers; other static files
+        are passed on to fallback (the default static view).
+        """
+        encodings = self.fingerprinted.get(filename)
+        if encodings is None:
+            return fallback(filename=filename)
+
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        for encoding, suffix in ENCODINGS:
+            if encoding in encodings and request.accept_encodings[encoding]:
+                response = send_from_directory(self.static_dir, filename + suffix, mimetype=mimetype)
+                response.headers['Content-Encoding'] = encoding
+                with self._lock:
+                    self.stats['encoded_responses'][encoding] += 1
+                break
+        else:
+            response = send_from_directory(self.static_dir, filename, mimetype=mimetype)
+
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        response.vary.add('Accept-Encoding')
+        return response
+
+    def _build_asset(self, name, source, source_hash):
+        output = minify_asset(name, source) if self.minify else source
+        base, ext = os.path.splitext(name)
+        path = f"{base}.{hashlib.sha256(output).hexdigest()[:FINGERPRINT_LENGTH]}{ext}"
+
+        output_path = os.path.join(self.static_dir, path)
+        write_file_atomically(output_path, output)
+
+        compressed_sizes = {}
+        if self.precompress:
+            for encoding, suffix in ENCODINGS:
+                compressed = compress(output, encoding)
+                # Tiny files can grow when compressed, those are sent as they are
+                if compressed is None or len(compressed) >= len(output):
+                    continue
+                write_file_atomically(output_path + suffix, compressed)
+                compressed_sizes[encoding] = len(compressed)
+
+        self.logger.debug(f"Built asset {path} ({len(source)} -> {len(output)} bytes)")
+        return {
+            'path': path,
+            'source_hash': source_hash,
+            'minified': self.minify,
+            'precompressed': self.precompress,
+            'brotli': brotli is not None,
+            'size': len(output),
+            'compressed_sizes': compressed_sizes
+        }
+
+    def _is_up_to_date(self, entry, source_hash):
+        if entry.get('source_hash') != source_hash or entry.get('minified') != self.minify:
+            return False
+        if entry.get('precompressed') != self.precompress or entry.get('brotli') != (brotli is not None):
+            return False
+        paths = [entry['path']] + [entry['path'] + suffix for encoding, suffix in ENCODINGS
+                                   if encoding in entry.get('compressed_sizes', {})]
+        return all(os.path.isfile(os.path.join(self.static_dir, path)) for path in paths)
+
+    def _remove_outputs(self, entry):
+        for suffix in [''] + [suffix for _, suffix in ENCODINGS]:
+            path = os.path.join(self.static_dir, entry['path'] + suffix)
+            if os.path.isfile(path):
+                os.remove(path)
+
+    def _load_manifest(self):
+        if not os.path.isfile(self.manifest_path):
+            return {}
+        try:
+            with open(self.manifest_path, 'r') as f:
+                return json.load(f).get('assets', {})
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Could not read the asset manifest, rebuilding all assets: {e}")
+            return {}
+
+    def _write_manifest(self, assets):
+        data = json.dumps({'assets': assets}, indent=2, sort_keys=True).encode('utf-8')
+        write_file_atomically(self.manifest_path, data)
+
+
+def setup_asset_pipeline(app):
+    """
+    Build the static assets and make url_for('static', ...) and the static view use the fingerprinted files.
+    """
+    if not app.config.get('ASSET_PIPELINE_ENABLED', True):
+        app.asset_pipeline = None
+        return None
+
+    pipeline = AssetPipeline(
+        os.path.join(app.root_path, app.config['STATIC_FOLDER']),
+        minify=app.config.get('ASSET_MINIFY', True),
+        precompress=app.config.get('ASSET_PRECOMPRESS', True),
+        logger=app.logger
+    )
+    pipeline.build(get_static_asset_names(pipeline.static_dir))
+    app.asset_pipeline = pipeline
+
+    @app.url_defaults
+    def fingerprint_static_url(endpoint, values):
+        if endpoint == 'static' and 'filename' in values:
+            values['filename'] = pipeline.resolve(values['filename'])
+
+    default_static_view = app.view_functions['static']
+
+    def static_with_assets(filename):
+        return pipeline.serve(filename, default_static_view)
+
+    app.view_functions['static'] = static_with_assets
+    return pipeline
+
+
+def get_static_asset_names(static_dir):
+    """The copied JS and CSS sources in the static folder (fingerprinted outputs excluded)."""
+    names = []
+    for folder, ext in (('js', '.js'), ('css', '.css')):
+        directory = os.path.join(static_dir, folder)
+        if not os.path.isdir(directory):
+            continue
+        for filename in sorted(os.listdir(directory)):
+            if filename.endswith(ext) and not FINGERPRINTED_NAME.match(filename):
+                names.append(f"{folder}/{filename}")
+    return names
+
+
+def compress(data, encoding):
+    if encoding == 'gzip':
+        # mtime=0 keeps the output identical across builds
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    if encoding == 'br' and brotli is not None:
+        return brotli.compress(data, quality=11)
+    return None
+
+
+def minify_asset(name, source):
+    text = source.decode('utf-8')
+    if name.endswith('.js'):
+        text = rjsmin.jsmin(text) if rjsmin is not None else minify_js(text)
+    elif name.endswith('.css'):
+        text = rcssmin.cssmin(text) if rcssmin is not None else minify_css(text)
+    return text.encode('utf-8')
+
+
+def minify_js(text):
+    """
+    Remove comments, indentation and blank lines from JavaScript, keeping all other line breaks.
+    Lines inside template literals are left untouched. Returns the source unchanged if its strings,
+    template literals or block comments do not balance (e.g. because of an unusual regex literal).
+    """
+    lines = []
+    state = None  # None, '`' (template literal) or '*' (block comment) at the start of the line
+
+    for line in text.split('\n'):
+        start_state = state
+        kept, state = _strip_js_line(line, state)
+        if start_state == '`':
+            # Whitespace inside a template literal is part of the string
+            lines.append(line)
+        elif kept.strip():
+            lines.append(kept.strip() if state != '`' else kept.lstrip())
+
+    if state is not None:
+        return text
+    return '\n'.join(lines) + '\n'
+
+
+def _strip_js_line(line, state):
+    """Return the line without comments, and the state (template literal or block comment) at its end."""
+    kept = []
+    quote = None
+    i = 0
+    while i < len(line):
+        char = line[i]
+        pair = line[i:i + 2]
+        if state == '*':
+            if pair == '*/':
+                state = None
+                i += 2
+                continue
+            i += 1
+            continue
+        if state == '`' or quote is not None:
+            kept.append(char)
+            if char == '\\':
+                kept.append(line[i + 1:i + 2])
+                i += 2
+                continue
+            if state == '`' and char == '`':
+                state = None
+            elif quote is not None and char == quote:
+                quote = None
+            i += 1
+            continue
+        if char == '\\':
+            # Escapes outside strings only occur in regex literals, e.g. /https?:\/\//
+            kept.append(line[i:i + 2])
+            i += 2
+            continue
+        if pair == '//':
+            break
+        if pair == '/*':
+            state = '*'
+            i += 2
+            continue
+        if char in ('"', "'"):
+            quote = char
+        elif char == '`':
+            state = '`'
+        kept.append(char)
+        i += 1
+    return ''.join(kept), state
+
+
+CSS_COMMENT = re.compile(r'/\*.*?\*/', re.DOTALL)
+CSS_WHITESPACE = re.compile(r'\s+')
+CSS_PUNCTUATION_SPACE = re.compile(r'\s*([{};,])\s*')
+
+
+def minify_css(text):
+    """Remove comments and collapse whitespace (CSS without strings containing these characters)."""
+    text = CSS_COMMENT.sub('', text)
+    if '"' in text or "'" in text:
+        # Keep quoted strings as they are
+        parts = re.split(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')', text)
+        return ''.join(part if i % 2 else _minify_css_part(part) for i, part in enumerate(parts)).strip()
+    return _minify_css_part(text).strip()
+
+
+def _minify_css_part(text):
+    text = CSS_WHITESPACE.sub(' ', text)
+    text = CSS_PUNCTUATION_SPACE.sub(r'\1', text)
+    return text.replace(';}', '}')
@@ -0,0 +1,225 @@
+"""
+WSGI middleware compressing text responses (HTML pages, JSON APIs, CSS/JS) with gzip or brotli.
+
+The encoding is negotiated per request from Accept-Encoding (brotli is preferred when the brotli package
+is installed). Responses below a size threshold, responses that already have a Content-Encoding (such as
+the precompressed static assets) and non-text responses like images are passed through. Bodies of known
+size are compressed in one go; large or streamed bodies are compressed chunk by chunk while they are sent.
+Bytes before and after compression are recorded per route.
+"""
+
+import zlib
+import threading
+
+from werkzeug.http import parse_accept_header
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = (
+    'text/',
+    'application/json',
+    'application/javascript',
+    'application/xml',
+    'image/svg+xml'
+)
+
+# Responses without a body or with partial content are never compressed
+SKIPPED_STATUS_CODES = (204, 206, 304)
+
+
+class CompressionMiddleware:
+    def __init__(self, wsgi_app, min_bytes=1024, gzip_level=6, brotli_quality=4, stream_min_bytes=1024 * 1024):
+        """
+        Args:
+            wsgi_app: The wrapped WSGI application (app.wsgi_app)
+            min_bytes: Responses with a smaller Content-Length are sent uncompressed
+            gzip_level: zlib compression level (1-9)
+            brotli_quality: Brotli quality (0-11), only used when the brotli package is installed
+            stream_min_bytes: Bodies of at least this size (or of unknown size) are compressed while streaming
+        """
+        self.wsgi_app = wsgi_app
+        self.min_bytes = min_bytes
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.stream_min_bytes = stream_min_bytes
+
+        self._lock = threading.Lock()
+        self.routes = {}  # route rule -> counters, see _get_route_counters()
+        self.stats = {
+            'responses': 0,
+            'compressed': 0,
+            'streamed': 0,
+            'bytes_in': 0,
+            'bytes_out': 0,
+            'encodings': {'br': 0, 'gzip': 0}
+        }
+
+    def __call__(self, environ, start_response):
+        encoding = self.negotiate_encoding(environ.get('HTTP_ACCEPT_ENCODING', ''))
+        state = {}
+
+        def capture_start_response(status, headers, exc_info=None):
+            state['status'] = status
+            state['headers'] = headers
+            state['exc_info'] = exc_info
+            state['route'] = _get_route(environ)
+            state['mode'] = self._choose_mode(environ, encoding, status, headers)
+            if state['mode'] == 'passthrough':
+                return start_response(status, headers, exc_info)
+            if state['mode'] == 'stream':
+                return start_response(status, _compressed_headers(headers, encoding), exc_info)
+            # Buffered: headers are sent once the compressed size is known
+            return state.setdefault('buffer', []).append
+
+        app_iter = self.wsgi_app(environ, capture_start_response)
+        mode = state.get('mode', 'passthrough')
+        route = state.get('route')
+
+        if mode == 'passthrough':
+            return app_iter
+        if mode == 'stream':
+            return self._stream(app_iter, encoding, route)
+
+        try:
+            body = b''.join(state['buffer'] + list(app_iter))
+        finally:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
+        compressed = self.compress(body, encoding)
+        headers = _compressed_headers(state['headers'], encoding)
+        headers.append(('Content-Length', str(len(compressed))))
+        start_response(state['status'], headers, state['exc_info'])
+        self._record(route, encoding, len(body), len(compressed))
+        return [compressed]
+
+    def negotiate_encoding(self, accept_encoding):
+        """Return 'br', 'gzip' or None for an Accept-Encoding header value."""
+        accepted = parse_accept_header(accept_encoding)
+        if brotli is not None and accepted['br'] > 0:
+            return 'br'
+        if accepted['gzip'] > 0:
+            return 'gzip'
+        return None
+
+    def compress(self, body, encoding):
+        if encoding == 'br':
+            return brotli.compress(body, quality=self.brotli_quality)
+        compressor = zlib.compressobj(self.gzip_level, zlib.DEFLATED, 31)  # 31: gzip container
+        return compressor.compress(body) + compressor.flush()
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['encodings'] = dict(self.stats['encodings'])
+            stats['routes'] = {route: dict(counters) for route, counters in self.routes.items()}
+        stats['ratio'] = stats['bytes_out'] / stats['bytes_in'] if stats['bytes_in'] else 1.0
+        stats['brotli'] = brotli is not None
+        return stats
+
+    def _choose_mode(self, environ, encoding, status, headers):
+        """'passthrough', 'buffer' or 'stream' for a response."""
+        header_dict = {name.lower(): value for name, value in headers}
+        content_type = header_dict.get('content-type', '').split(';')[0].strip().lower()
+        compressible = content_type.startswith(COMPRESSIBLE_TYPES)
+
+        if compressible and 'content-encoding' not in header_dict:
+            # Caches must keep the compressed and uncompressed variants apart
+            _add_vary(headers)
+
+        if (encoding is None or not compressible
+                or 'content-encoding' in header_dict
+                or environ.get('REQUEST_METHOD') == 'HEAD'
+                or int(status.split(' ', 1)[0]) in SKIPPED_STATUS_CODES
+                or 'no-transform' in header_dict.get('cache-control', '')):
+            self._record_passthrough(_get_route(environ), header_dict.get('content-length'))
+            return 'passthrough'
+
+        content_length = header_dict.get('content-length')
+        if content_length is None:
+            return 'stream'
+        if int(content_length) < self.min_bytes:
+            self._record_passthrough(_get_route(environ), content_length)
+            return 'passthrough'
+        return 'buffer' if int(content_length) < self.stream_min_bytes else 'stream'
+
+    def _stream(self, app_iter, encoding, route):
+        if encoding == 'br':
+            compressor = brotli.Compressor(quality=self.brotli_quality)
+            compress_chunk, flush = compressor.process, compressor.finish
+        else:
+            compressor = zlib.compressobj(self.gzip_level, zlib.DEFLATED, 31)
+            compress_chunk, flush = compressor.compress, compressor.flush
+
+        bytes_in = bytes_out = 0
+        try:
+            for chunk in app_iter:
+                bytes_in += len(chunk)
+                compressed = compress_chunk(chunk)
+                if compressed:
+                    bytes_out += len(compressed)
+                    yield compressed
+            compressed = flush()
+            bytes_out += len(compressed)
+            yield compressed
+        finally:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
+            self._record(route, encoding, bytes_in, bytes_out, streamed=True)
+
+    def _record_passthrough(self, route, content_length):
+        size = int(content_length) if content_length and content_length.isdigit() else 0
+        with self._lock:
+            self.stats['responses'] += 1
+            self.stats['bytes_in'] += size
+            self.stats['bytes_out'] += size
+            counters = self._get_route_counters(route)
+            counters['uncompressed'] += 1
+            counters['bytes_in'] += size
+            counters['bytes_out'] += size
+
+    def _get_route_counters(self, route):
+        """Counters of a route. Caller holds the lock."""
+        return self.routes.setdefault(route, {'compressed': 0, 'uncompressed': 0, 'bytes_in': 0, 'bytes_out': 0})
+
+    def _record(self, route, encoding, bytes_in, bytes_out, streamed=False):
+        with self._lock:
+            self.stats['responses'] += 1
+            self.stats['compressed'] += 1
+            self.stats['streamed'] += int(streamed)
+            self.stats['bytes_in'] += bytes_in
+            self.stats['bytes_out'] += bytes_out
+            self.stats['encodings'][encoding] += 1
+
+            counters = self._get_route_counters(route)
+            counters['compressed'] += 1
+            counters['bytes_in'] += bytes_in
+            counters['bytes_out'] += bytes_out
+
+
+def _get_route(environ):
+    """URL rule of the request (e.g. /<username>/label_image), so all users share one entry."""
+    request = environ.get('werkzeug.request')
+    url_rule = getattr(request, 'url_rule', None)
+    return url_rule.rule if url_rule is not None else environ.get('PATH_INFO', '')
+
+
+def _compressed_headers(headers, encoding):
+    headers = [(name, value) for name, value in headers if name.lower() != 'content-length']
+    headers.append(('Content-Encoding', encoding))
+    for i, (name, value) in enumerate(headers):
+        # The compressed body differs byte for byte, so a strong ETag becomes weak
+        if name.lower() == 'etag' and not value.startswith('W/'):
+            headers[i] = (name, 'W/' + value)
+    return headers
+
+
+def _add_vary(headers):
+    for i, (name, value) in enumerate(headers):
+        if name.lower() == 'vary':
+            if 'accept-encoding' not in value.lower():
+                headers[i] = (name, value + ', Accept-Encoding')
+            return
+    headers.append(('Vary', 'Accept-Encoding'))
@@ -78,9 +78,172 @@ GOOGLE_DRIVE_FOLDER_ID = "134YdKmKQdWyNPYdz-Q-cu5dHFrTpj_rc"  # Set this to your
 GOOGLE_DRIVE_TIME_TRACKING_FOLDER_ID = "1qgcl6kt1wq7NYMdIZCkb07DPdMazy_we"  # TODO: CHANGE THIS TO YOUR TIME TRACKING FOLDER ID
 # If None, time tracking sheets will be saved to the auto-created Time_Tracking folder
 
+# Checkbox selections files of at least this many bytes are gzip-compressed before upload.
+# Set to None to always upload the plain JSON files.
+GOOGLE_DRIVE_COMPRESS_THRESHOLD_BYTES = 1024 * 1024
+
+# Number of Drive file transfers that may run concurrently, and the resumable upload/download chunk size
+# (rounded up to a multiple of 256 KiB).
+GOOGLE_DRIVE_MAX_CONCURRENT_TRANSFERS = 4
+GOOGLE_DRIVE_CHUNK_SIZE_BYTES = 5 * 1024 * 1024
+
+# Background uploads after navigation: an upload starts once the annotator has been idle for
+# UPLOAD_DEBOUNCE_SECONDS, but is never postponed more than UPLOAD_MAX_DELAY_SECONDS by further navigation.
+# Failed uploads are retried after UPLOAD_RETRY_BASE_SECONDS, doubling up to UPLOAD_RETRY_MAX_SECONDS,
+# and given up after UPLOAD_RETRY_MAX_ATTEMPTS consecutive failures. Permanent failures (missing
+# credentials, nothing to upload) are not retried; the user's next navigation tries again.
+UPLOAD_DEBOUNCE_SECONDS = 2.0
+UPLOAD_MAX_DELAY_SECONDS = 30.0
+UPLOAD_RETRY_BASE_SECONDS = 5.0
+UPLOAD_RETRY_MAX_SECONDS = 300.0
+UPLOAD_RETRY_MAX_ATTEMPTS = 10
+
+# Use in-process fakes of Google Drive/Sheets and S3 instead of the real services (local development and
+# benchmarking only).
+GOOGLE_DRIVE_USE_FAKE = False
+
+# Where annotator data is synced to: 'google_drive' (uses the settings above), 'local' (a local or
+# NFS-mounted directory) or 's3' (any S3-compatible object storage, requires boto3). None disables syncing.
+SYNC_BACKEND = 'google_drive'
+SYNC_LOCAL_DIRECTORY = os.path.join(APP_ROOT_FOLDER, 'sync_data')
+SYNC_S3_BUCKET = 'multilabelfy'
+SYNC_S3_PREFIX = 'multilabelfy'
+SYNC_S3_ENDPOINT_URL = None  # e.g. 'http://localhost:9000' for MinIO; None for AWS
+SYNC_S3_REGION = None
+
 # Number of examples per class
 NUM_EXAMPLES_PER_CLASS = 5
 
+# Number of images per page of the grid view (should divide the 50 images of a class), and the limits of the grid
+# page-data API (/api/<username>/grid): images per request and following pages returned with `lookahead`.
+GRID_IMAGES_PER_PAGE = 5
+GRID_API_MAX_IMAGES = 50
+GRID_API_MAX_LOOKAHEAD_PAGES = 3
+
+# After a labeling page is shown, the next PAGE_WARMER_LOOKAHEAD images are prepared on PAGE_WARMER_WORKERS background
+# threads: their top-k classes and example picks are computed (keeping at most PAGE_WARMER_MAX_ENTRIES) and their
+# image files are read once, so they are in the OS page cache when the annotator moves on.
+PAGE_WARMER_ENABLED = True
+PAGE_WARMER_LOOKAHEAD = 3
+PAGE_WARMER_MAX_ENTRIES = 64
+PAGE_WARMER_WORKERS = 2
+
+# Rendered grid and labeling pages are cached (up to RENDERED_PAGE_CACHE_MAX_BYTES) until the annotations or ground
+# truth files change, and sent with ETags so browsers revalidate them with 304 responses. A labeling page opened again
+# shows the same randomly picked example images (the Refresh button picks new ones); disable the cache to get new
+# picks on every visit.
+RENDERED_PAGE_CACHE_ENABLED = True
+RENDERED_PAGE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# The JS and CSS files copied to the static folder are minified (ASSET_MINIFY), saved under content-hashed names and
+# precompressed to .gz, plus .br when the brotli package is installed (ASSET_PRECOMPRESS). url_for('static', ...) links
+# the hashed names, which browsers cache for a year. Only changed files are rebuilt at startup.
+ASSET_PIPELINE_ENABLED = True
+ASSET_MINIFY = True
+ASSET_PRECOMPRESS = True
+
+# HTML, JSON and other text responses of at least RESPONSE_COMPRESSION_MIN_BYTES are compressed with brotli (when the
+# brotli package is installed and the browser accepts it) or gzip. Bodies of RESPONSE_COMPRESSION_STREAM_MIN_BYTES or
+# more are compressed while they are streamed instead of in memory. Images are never compressed again.
+RESPONSE_COMPRESSION_ENABLED = True
+RESPONSE_COMPRESSION_MIN_BYTES = 1024
+RESPONSE_COMPRESSION_GZIP_LEVEL = 6
+RESPONSE_COMPRESSION_BROTLI_QUALITY = 4
+RESPONSE_COMPRESSION_STREAM_MIN_BYTES = 1024 * 1024
+
+# Latency of every request and of its stages (loading annotations, rendering, Drive transfers, ...) is aggregated per
+# route and exposed on /metrics in the Prometheus text format. METRICS_SERVER_TIMING also sends the stage durations of
+# each response in a Server-Timing header, shown in the network panel of the browser's developer tools.
+METRICS_ENABLED = True
+METRICS_SERVER_TIMING = True
+
+# Logs are written to LOG_FILE (rotated at LOG_MAX_BYTES, keeping LOG_BACKUP_COUNT old files; with more than one
+# worker process it is not rotated by the app, rotate it externally, e.g. with logrotate) and the console by a
+# background thread; request threads only queue the records (at most LOG_QUEUE_SIZE, further records are dropped).
+# LOG_LEVELS sets the level of individual loggers, e.g. {'app.sync_backends': 'DEBUG', 'werkzeug': 'WARNING'}.
+# Debug records are limited to LOG_DEBUG_RATE_LIMIT per message every LOG_DEBUG_RATE_INTERVAL_SECONDS and sampled
+# with LOG_DEBUG_SAMPLE_RATE. LOG_DEBUG_EVENTS enables the per-request debug events (bboxes found per image, ...).
+LOG_FILE = 'app.log'
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+LOG_QUEUE_SIZE = 10000
+LOG_TO_CONSOLE = True
+LOG_LEVEL = 'INFO'
+LOG_LEVELS = {}
+LOG_DEBUG_RATE_LIMIT = 20
+LOG_DEBUG_RATE_INTERVAL_SECONDS = 10.0
+LOG_DEBUG_SAMPLE_RATE = 1.0
+LOG_DEBUG_EVENTS = False
+
+# Request profiling (development/debugging only). With PROFILING_ENABLED, requests with an `X-Profile` header or a
+# `profile` query parameter are profiled: `cprofile` writes a pstats file, `sample` writes collapsed stacks (sampled
+# every PROFILING_SAMPLE_INTERVAL_SECONDS). With PROFILING_SLOW_REQUEST_SECONDS set, all requests are sampled and the
+# stacks of slower ones are written automatically. Only the newest PROFILING_MAX_FILES files in PROFILING_DIR are kept.
+PROFILING_ENABLED = False
+PROFILING_DIR = 'profiles'
+PROFILING_MAX_FILES = 50
+PROFILING_SLOW_REQUEST_SECONDS = None
+PROFILING_SAMPLE_INTERVAL_SECONDS = 0.005
+
+# Request traces for replay benchmarks. With TRACE_ENABLED, every request except those of TRACE_EXCLUDE_ENDPOINTS is
+# written as one JSON line to TRACE_DIR/trace-YYYY-MM-DD.jsonl by a background thread (at most TRACE_QUEUE_SIZE
+# lines wait, further ones are dropped). Usernames are replaced by salted hashes (TRACE_SALT, by default a salt kept
+# in TRACE_DIR) and form/JSON values are not recorded, only their sizes. Replay with `python -m benchmarks.replay`.
+TRACE_ENABLED = False
+TRACE_DIR = 'traces'
+TRACE_QUEUE_SIZE = 10000
+TRACE_EXCLUDE_ENDPOINTS = ('static',)
+TRACE_SALT = None
+
+# Memory accounting. With MEMORY_DEBUG_ENDPOINT_ENABLED, /debug/memory reports the deep size of every cache and user
+# (development/debugging only: slow on large datasets, it blocks the worker serving it). With MEMORY_BUDGET_MB set,
+# startup logs a warning when the process is larger than the budget afterwards, or fails with
+# MEMORY_BUDGET_ACTION = 'fail'. MEMORY_TRACE_STARTUP records the top MEMORY_TRACE_TOP_ALLOCATORS allocating source
+# lines of every startup stage with tracemalloc, which makes startup slower and inflates the reported RSS.
+MEMORY_DEBUG_ENDPOINT_ENABLED = False
+MEMORY_BUDGET_MB = None
+MEMORY_BUDGET_ACTION = 'warn'
+MEMORY_TRACE_STARTUP = False
+MEMORY_TRACE_TOP_ALLOCATORS = 10
+
+# Where annotations and the annotators' current image indices are stored: 'json' keeps one
+# checkbox_selections_<user>.json (rewritten on every save) and current_image_index_<user>.txt per annotator directory,
+# 'sqlite' keeps one row per annotated image in ANNOTATION_SQLITE_PATH (WAL mode), so saves only write the changed
+# images. Annotators without rows in the database are imported from their JSON files at startup, and the JSON files
+# are exported again before every sync upload. Convert by hand with `python -m app.annotation_store import|export`.
+ANNOTATION_BACKEND = 'json'
+ANNOTATION_SQLITE_PATH = os.path.join(APP_ROOT_FOLDER, 'annotations.sqlite3')
+
+# The annotators' current image indices (grid and sanity check modes) are kept in memory and written in one batch
+# (navigation_state.json with the JSON backend, one transaction with SQLite) once navigation paused for
+# NAVIGATION_DEBOUNCE_SECONDS, and at the latest NAVIGATION_MAX_DELAY_SECONDS after the first unwritten change, so a
+# crash loses at most that much navigation. Pending indices are written on shutdown. None writes every change at once.
+NAVIGATION_DEBOUNCE_SECONDS = 1.0
+NAVIGATION_MAX_DELAY_SECONDS = 5.0
+
+# Production serving (gunicorn -c gunicorn.conf.py wsgi:app) with WORKER_PROCESSES processes of WORKER_THREADS threads
+# each. With more than one process, the navigation state is read from and written to the annotation store on every
+# request instead of being kept in memory, and saves, navigation_state.json, visit counts and sync transfers are
+# serialized across processes with file locks (on systems with fcntl; use one process on Windows). The ground truth
+# files are read once before the workers are forked and shared with them, and the time tracking session is kept in a
+# state file all workers update under a file lock. Metrics and caches are per process.
+WORKER_PROCESSES = 1
+WORKER_THREADS = 4
+SERVER_HOST = '127.0.0.1'
+
+# How the ground truth files (predictions.json, sample_images_info.json, bboxes.json) are held in memory: 'json' parses
+# them into Python objects, 'arrays' converts them once (again after they change) into .npy files in
+# GT_ARRAYS_DIRECTORY and memory-maps those, so all worker processes share one copy of the data in the OS page cache
+# instead of each gradually copying the parsed objects. 'lazy' is 'arrays' for datasets whose predictions do not fit
+# in memory: predictions.json is converted without parsing it at once into fixed-stride binary rows, read from disk
+# on access, of which the LAZY_PROPOSALS_CACHE_ROWS most recently used are kept in memory. With 'arrays' and 'lazy',
+# softmax values are float32 and bboxes.json is shared by all users instead of loaded per user. All backends also read
+# predictions.json with only the top classes of every image (`python -m app.proposals_encoding encode`, see there),
+# which is an order of magnitude smaller and faster to load.
+GT_DATA_BACKEND = 'json'
+GT_ARRAYS_DIRECTORY = os.path.join(APP_ROOT_FOLDER, 'gt_arrays')
+LAZY_PROPOSALS_CACHE_ROWS = 4096
+
 # Dataset classes
 NUM_CLASSES = 1000
 
@@ -1,9 +1,18 @@
+import os
+import atexit
 from flask import Flask
 import app.config as config
 from app.routes import register_routes
 from app.app_utils import setup_logging, load_users_data
 from app.app_utils import check_that_needed_files_exist, check_dataset_dirs_have_same_names
 from app.time_tracker_utils import initialize_time_tracker
+from app.asset_pipeline import setup_asset_pipeline
+from app.compression import CompressionMiddleware
+from app.memory import StartupMemoryProfile, check_memory_budget
+from app.annotation_store import create_annotation_store
+from app.navigation_state import NavigationState, NavigationIndexDict
+from app.file_lock import FileLock
+from class_mapping.class_loader import ClassDictionary
 
 def create_app():
     app = Flask(__name__)
@@ -17,27 +26,71 @@ def create_app():
     # reconfigure static folder
     app.static_folder = app.config['STATIC_FOLDER']
 
+    # Memory used by each startup stage, reported on /debug/memory
+    app.startup_memory = StartupMemoryProfile(trace_allocations=app.config.get('MEMORY_TRACE_STARTUP', False),
+                                              top_allocators=app.config.get('MEMORY_TRACE_TOP_ALLOCATORS', 10))
+    app.startup_memory.start()
+
+    # Worker processes started together must not copy and build the static files at the same time
+    startup_lock_path = os.path.join(app.root_path, '.startup.lock')
+    shared_state = app.config.get('WORKER_PROCESSES', 1) > 1
+
     # verify that the needed config variables are set
-    if not check_that_needed_files_exist(app):
-        raise Exception("Some needed files do not exist. Please check the config for more details.")
-    if not check_dataset_dirs_have_same_names(app):
-        raise Exception("The annotation dataset and examples dataset do not have the same label names. "
-                        "Please check the config for more details.")
+    with app.startup_memory.stage('check_files'), FileLock(startup_lock_path):
+        if not check_that_needed_files_exist(app):
+            raise Exception("Some needed files do not exist. Please check the config for more details.")
+        if not check_dataset_dirs_have_same_names(app):
+            raise Exception("The annotation dataset and examples dataset do not have the same label names. "
+                            "Please check the config for more details.")
 
     setup_logging(app)
 
+    # Annotations and navigation state: JSON files or a SQLite database (ANNOTATION_BACKEND)
+    app.annotation_store = create_annotation_store(app.config, class_of=ClassDictionary().get_val_img_class)
+
+    # Current image indices are kept in memory and written in batches by a background thread, or read from and
+    # written to the store directly when several worker processes serve the same users
+    app.navigation_state = NavigationState(app.annotation_store,
+                                           debounce_seconds=app.config.get('NAVIGATION_DEBOUNCE_SECONDS', 1.0),
+                                           max_delay_seconds=app.config.get('NAVIGATION_MAX_DELAY_SECONDS', 5.0),
+                                           shared=shared_state)
+    app.navigation_state.start()
+    atexit.register(app.navigation_state.stop)
+
     # Initialize global variables
-    # ToDo: create a simple sqlite db to store these variables
-    app.current_image_index_dct = dict()
+    app.current_image_index_dct = NavigationIndexDict(app.navigation_state)
     app.num_predictions_per_user = dict()
     app.user_cache = dict()
 
     # Load user data
-    load_users_data(app)
+    with app.startup_memory.stage('load_users_data'):
+        load_users_data(app)
 
     # Initialize time tracker
-    initialize_time_tracker(config.UPLOAD_USERNAME)
+    with app.startup_memory.stage('time_tracker'):
+        # Worker processes record one session together, since a user's requests go to any of them
+        initialize_time_tracker(config.UPLOAD_USERNAME, shared=shared_state)
+
+    with app.startup_memory.stage('register_routes'):
+        register_routes(app)
+
+    # Minify, fingerprint and precompress the JS and CSS copied to the static folder
+    with app.startup_memory.stage('asset_pipeline'), FileLock(startup_lock_path):
+        setup_asset_pipeline(app)
+
+    # Compress HTML and JSON responses for annotators on slow links
+    app.compression = None
+    if app.config.get('RESPONSE_COMPRESSION_ENABLED', True):
+        app.compression = CompressionMiddleware(
+            app.wsgi_app,
+            min_bytes=app.config.get('RESPONSE_COMPRESSION_MIN_BYTES', 1024),
+            gzip_level=app.config.get('RESPONSE_COMPRESSION_GZIP_LEVEL', 6),
+            brotli_quality=app.config.get('RESPONSE_COMPRESSION_BROTLI_QUALITY', 4),
+            stream_min_bytes=app.config.get('RESPONSE_COMPRESSION_STREAM_MIN_BYTES', 1024 * 1024)
+        )
+        app.wsgi_app = app.compression
 
-    register_routes(app)
+    app.startup_memory.stop()
+    check_memory_budget(app)
 
     return app
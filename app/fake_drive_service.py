@@ -0,0 +1,365 @@
+"""
+In-process stand-ins for the Google Drive v3 ``files()`` and Sheets v4 ``spreadsheets()`` APIs.
+
+Used to exercise the sync code (uploads, downloads, manifests, sheet exports) locally without
+credentials or network access. Only the subset of the API surface used by
+GoogleDriveService is implemented.
+"""
+
+import re
+import time
+import threading
+import uuid
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+
+_QUERY_TERM = re.compile(r"(\w+)\s*=\s*'([^']*)'")
+_RANGE_HEADER = re.compile(r"bytes=(\d+)-(\d*)")
+
+
+class _Request:
+    """Mimics googleapiclient's HttpRequest: the call happens on execute()."""
+
+    def __init__(self, func, latency_seconds=0.0):
+        self._func = func
+        self._latency_seconds = latency_seconds
+
+    def execute(self, num_retries=0):
+        if self._latency_seconds:
+            time.sleep(self._latency_seconds)
+        return self._func()
+
+
+class _MediaHttp:
+    """Minimal httplib2.Http replacement serving ranged GETs for MediaIoBaseDownload."""
+
+    def __init__(self, drive, file_id):
+        self._drive = drive
+        self._file_id = file_id
+
+    def request(self, uri, method='GET', headers=None, **kwargs):
+        if self._drive.latency_seconds:
+            time.sleep(self._drive.latency_seconds)
+        content = self._drive.get_content(self._file_id)
+        total = len(content)
+        match = _RANGE_HEADER.match((headers or {}).get('range', ''))
+        if total == 0:
+            return httplib2.Response({'status': 416, 'content-range': 'bytes */0'}), b''
+        if not match:
+            return httplib2.Response({'status': 200, 'content-length': str(total)}), content
+        start = int(match.group(1))
+        end = min(int(match.group(2)) if match.group(2) else total - 1, total - 1)
+        resp = httplib2.Response({'status': 206, 'content-range': f'bytes {start}-{end}/{total}'})
+        return resp, content[start:end + 1]
+
+
+class _MediaRequest:
+    """Object handed to MediaIoBaseDownload by get_media()."""
+
+    def __init__(self, drive, file_id):
+        self.uri = f'fake://drive/files/{file_id}?alt=media'
+        self.headers = {}
+        self.http = _MediaHttp(drive, file_id)
+
+
+class _Files:
+    def __init__(self, drive):
+        self._drive = drive
+
+    def list(self, q='', fields=None, pageSize=None, **kwargs):
+        return _Request(lambda: {'files': self._drive.query(q)}, self._drive.latency_seconds)
+
+    def get(self, fileId, fields=None, **kwargs):
+        return _Request(lambda: self._drive.metadata(fileId), self._drive.latency_seconds)
+
+    def create(self, body=None, media_body=None, fields=None, **kwargs):
+        return _Request(lambda: self._drive.create(body or {}, media_body), self._drive.latency_seconds)
+
+    def update(self, fileId, body=None, media_body=None, addParents=None, removeParents=None,
+               fields=None, **kwargs):
+        return _Request(lambda: self._drive.update(fileId, body or {}, media_body, addParents, removeParents),
+                        self._drive.latency_seconds)
+
+    def delete(self, fileId, **kwargs):
+        return _Request(lambda: self._drive.delete(fileId), self._drive.latency_seconds)
+
+    def get_media(self, fileId, **kwargs):
+        self._drive.metadata(fileId)  # raises 404 for unknown ids, like the real API
+        return _MediaRequest(self._drive, fileId)
+
+
+class FakeDriveService:
+    """
+    Thread-safe in-memory Drive. Pass an instance as ``service`` to GoogleDriveService.
+
+    Besides the API surface, ``calls`` counts requests per method and ``bytes_uploaded`` /
+    ``bytes_downloaded`` count payload bytes, so sync behaviour can be inspected. ``latency_seconds``
+    adds a fixed delay to every request (and every download chunk) to emulate network round trips.
+    """
+
+    def __init__(self, latency_seconds=0.0):
+        self.latency_seconds = latency_seconds
+        self._lock = threading.Lock()
+        self._files = {}
+        self._contents = {}
+        self.calls = {}
+        self.bytes_uploaded = 0
+        self.bytes_downloaded = 0
+
+    def files(self):
+        return _Files(self)
+
+    def _count(self, method):
+        self.calls[method] = self.calls.get(method, 0) + 1
+
+    @staticmethod
+    def _not_found(file_id):
+        resp = httplib2.Response({'status': 404})
+        return HttpError(resp, f'File not found: {file_id}'.encode(), uri=f'fake://drive/files/{file_id}')
+
+    @staticmethod
+    def _read_media(media_body):
+        if media_body is None:
+            return None
+        return media_body.getbytes(0, media_body.size())
+
+    def query(self, q):
+        terms = {}
+        for key, value in _QUERY_TERM.findall(q or ''):
+            terms.setdefault(key, set()).add(value)
+        terms = {key: values if key == 'name' else values.pop() for key, values in terms.items()}
+        with self._lock:
+            self._count('list')
+            matches = []
+            for meta in self._files.values():
+                # Several name terms are OR-ed, e.g. "(name='a' or name='b') and parents='X'"
+                if 'name' in terms and meta['name'] not in terms['name']:
+                    continue
+                if 'mimeType' in terms and meta['mimeType'] != terms['mimeType']:
+                    continue
+                if 'parents' in terms and terms['parents'] not in meta['parents']:
+                    continue
+                matches.append(dict(meta))
+            return matches
+
+    def metadata(self, file_id):
+        with self._lock:
+            self._count('get')
+            if file_id not in self._files:
+                raise self._not_found(file_id)
+            return dict(self._files[file_id])
+
+    def get_content(self, file_id):
+        with self._lock:
+            content = self._contents.get(file_id, b'')
+            self.bytes_downloaded += len(content)
+            return content
+
+    def create(self, body, media_body):
+        content = self._read_media(media_body)
+        with self._lock:
+            self._count('create')
+            file_id = uuid.uuid4().hex
+            meta = {
+                'id': file_id,
+                'name': body.get('name', 'Untitled'),
+                'mimeType': body.get('mimeType', getattr(media_body, 'mimetype', lambda: None)()
+                                     or 'application/octet-stream'),
+                'parents': list(body.get('parents', [])),
+                'appProperties': dict(body.get('appProperties', {})),
+                'headRevisionId': None,
+            }
+            self._files[file_id] = meta
+            if content is not None:
+                self._store(file_id, content)
+            return dict(meta)
+
+    def update(self, file_id, body, media_body, add_parents=None, remove_parents=None):
+        content = self._read_media(media_body)
+        with self._lock:
+            self._count('update')
+            if file_id not in self._files:
+                raise self._not_found(file_id)
+            meta = self._files[file_id]
+            if 'name' in body:
+                meta['name'] = body['name']
+            if 'appProperties' in body:
+                for key, value in body['appProperties'].items():
+                    if value is None:
+                        meta['appProperties'].pop(key, None)
+                    else:
+                        meta['appProperties'][key] = value
+            if add_parents:
+                meta['parents'].extend(p for p in add_parents.split(',') if p not in meta['parents'])
+            if remove_parents:
+                meta['parents'] = [p for p in meta['parents'] if p not in remove_parents.split(',')]
+            if content is not None:
+                self._store(file_id, content)
+            return dict(meta)
+
+    def delete(self, file_id):
+        with self._lock:
+            self._count('delete')
+            if file_id not in self._files:
+                raise self._not_found(file_id)
+            del self._files[file_id]
+            self._contents.pop(file_id, None)
+            return ''
+
+    def _store(self, file_id, content):
+        self._contents[file_id] = content
+        self._files[file_id]['headRevisionId'] = uuid.uuid4().hex
+        self._files[file_id]['size'] = str(len(content))
+        self.bytes_uploaded += len(content)
+
+
+SPREADSHEET_MIME_TYPE = 'application/vnd.google-apps.spreadsheet'
+
+_A1_RANGE = re.compile(r"^(?:'?(?P<tab>[^'!]+)'?!)?[A-Z]+(?P<row>\d+)?")
+
+
+class _Values:
+    def __init__(self, sheets):
+        self._sheets = sheets
+
+    def update(self, spreadsheetId, range, valueInputOption=None, body=None, **kwargs):
+        return _Request(lambda: self._sheets.write_values(spreadsheetId, range, body['values'], append=False),
+                        self._sheets.latency_seconds)
+
+    def append(self, spreadsheetId, range, valueInputOption=None, body=None, **kwargs):
+        return _Request(lambda: self._sheets.write_values(spreadsheetId, range, body['values'], append=True),
+                        self._sheets.latency_seconds)
+
+
+class _Spreadsheets:
+    def __init__(self, sheets):
+        self._sheets = sheets
+
+    def create(self, body=None, fields=None, **kwargs):
+        return _Request(lambda: self._sheets.create(body or {}), self._sheets.latency_seconds)
+
+    def get(self, spreadsheetId, **kwargs):
+        return _Request(lambda: self._sheets.get(spreadsheetId), self._sheets.latency_seconds)
+
+    def batchUpdate(self, spreadsheetId, body=None, **kwargs):
+        return _Request(lambda: self._sheets.batch_update(spreadsheetId, (body or {}).get('requests', [])),
+                        self._sheets.latency_seconds)
+
+    def values(self):
+        return _Values(self._sheets)
+
+
+class FakeSheetsService:
+    """
+    In-memory stand-in for the Sheets v4 ``spreadsheets()`` API.
+
+    Cell values are kept as plain rows per tab. When a FakeDriveService is given, created
+    spreadsheets are registered there as files so they can be found, moved and deleted.
+    """
+
+    def __init__(self, drive=None, latency_seconds=0.0):
+        self.drive = drive
+        self.latency_seconds = latency_seconds
+        self._lock = threading.Lock()
+        self.spreadsheets_data = {}
+        self.calls = {}
+        self.format_requests = 0
+
+    def spreadsheets(self):
+        return _Spreadsheets(self)
+
+    def _count(self, method):
+        self.calls[method] = self.calls.get(method, 0) + 1
+
+    def create(self, body):
+        with self._lock:
+            self._count('create')
+            spreadsheet_id = uuid.uuid4().hex
+            tabs = {}
+            for index, sheet in enumerate(body.get('sheets', [{'properties': {'title': 'Sheet1'}}])):
+                properties = sheet.get('properties', {})
+                tabs[properties.get('sheetId', index)] = {'title': properties.get('title', f'Sheet{index + 1}'),
+                                                          'rows': []}
+            title = body.get('properties', {}).get('title', 'Untitled spreadsheet')
+            self.spreadsheets_data[spreadsheet_id] = {'title': title, 'tabs': tabs}
+        if self.drive is not None:
+            with self.drive._lock:
+                self.drive._files[spreadsheet_id] = {
+                    'id': spreadsheet_id, 'name': title, 'mimeType': SPREADSHEET_MIME_TYPE,
+                    'parents': [], 'appProperties': {}, 'headRevisionId': None
+                }
+        return {'spreadsheetId': spreadsheet_id}
+
+    def _spreadsheet(self, spreadsheet_id):
+        if spreadsheet_id not in self.spreadsheets_data or (
+                self.drive is not None and spreadsheet_id not in self.drive._files):
+            raise FakeDriveService._not_found(spreadsheet_id)
+        return self.spreadsheets_data[spreadsheet_id]
+
+    def get(self, spreadsheet_id):
+        with self._lock:
+            self._count('get')
+            spreadsheet = self._spreadsheet(spreadsheet_id)
+            return {
+                'spreadsheetId': spreadsheet_id,
+                'properties': {'title': spreadsheet['title']},
+                'sheets': [{'properties': {'sheetId': sheet_id, 'title': tab['title']}}
+                           for sheet_id, tab in spreadsheet['tabs'].items()]
+            }
+
+    def tab_rows(self, spreadsheet_id, title):
+        """Return the rows of a tab by title (inspection helper, not part of the API)."""
+        for tab in self.spreadsheets_data[spreadsheet_id]['tabs'].values():
+            if tab['title'] == title:
+                return tab['rows']
+        raise KeyError(title)
+
+    def write_values(self, spreadsheet_id, a1_range, values, append):
+        with self._lock:
+            self._count('values.append' if append else 'values.update')
+            spreadsheet = self._spreadsheet(spreadsheet_id)
+            match = _A1_RANGE.match(a1_range)
+            tab_title = match.group('tab') if match and match.group('tab') else None
+            tab = next((t for t in spreadsheet['tabs'].values() if tab_title in (None, t['title'])), None)
+            if tab is None:
+                raise FakeDriveService._not_found(f"{spreadsheet_id}/{tab_title}")
+            if append:
+                tab['rows'].extend(list(row) for row in values)
+            else:
+                start = int(match.group('row') or 1) - 1
+                while len(tab['rows']) < start + len(values):
+                    tab['rows'].append([])
+                for offset, row in enumerate(values):
+                    tab['rows'][start + offset] = list(row)
+            return {'updatedRows': len(values)}
+
+    def batch_update(self, spreadsheet_id, requests):
+        with self._lock:
+            self._count('batchUpdate')
+            spreadsheet = self._spreadsheet(spreadsheet_id)
+            replies = []
+            for request in requests:
+                if 'appendCells' in request:
+                    append = request['appendCells']
+                    tab = spreadsheet['tabs'][append['sheetId']]
+                    for row in append.get('rows', []):
+                        tab['rows'].append([self._cell_value(cell) for cell in row.get('values', [])])
+                elif 'addSheet' in request:
+                    properties = request['addSheet'].get('properties', {})
+                    sheet_id = properties.get('sheetId', len(spreadsheet['tabs']))
+                    spreadsheet['tabs'][sheet_id] = {'title': properties.get('title'), 'rows': []}
+                elif 'repeatCell' in request:
+                    self.format_requests += 1
+                replies.append({})
+            return {'spreadsheetId': spreadsheet_id, 'replies': replies}
+
+    @staticmethod
+    def _cell_value(cell):
+        value = cell.get('userEnteredValue', {})
+        for key in ('numberValue', 'stringValue', 'formulaValue', 'boolValue'):
+            if key in value:
+                return value[key]
+        return ''
@@ -0,0 +1,104 @@
+"""
+In-memory stand-in for the subset of the boto3 S3 client used by S3Backend.
+
+Lets the S3 sync backend run locally (development, benchmarks) without an object store.
+"""
+
+import io
+import time
+import uuid
+import hashlib
+import threading
+
+
+class _NoSuchKey(Exception):
+    """Raised like botocore's NoSuchKey ClientError."""
+
+    def __init__(self, key):
+        super().__init__(f"An error occurred (NoSuchKey): The specified key does not exist: {key}")
+        self.response = {'Error': {'Code': 'NoSuchKey'}, 'ResponseMetadata': {'HTTPStatusCode': 404}}
+
+
+class FakeS3Client:
+    """
+    Thread-safe in-memory, versioned bucket store. Pass an instance as ``client`` to S3Backend.
+
+    ``calls`` counts requests per method, ``bytes_uploaded`` / ``bytes_downloaded`` count payload
+    bytes and ``latency_seconds`` adds a fixed delay to every request, mirroring FakeDriveService.
+    """
+
+    def __init__(self, latency_seconds=0.0, page_size=1000):
+        self.latency_seconds = latency_seconds
+        self.page_size = page_size
+        self.calls = {}
+        self.bytes_uploaded = 0
+        self.bytes_downloaded = 0
+        self._objects = {}  # (bucket, key) -> {'body', 'etag', 'version_id', 'last_modified'}
+        self._lock = threading.Lock()
+
+    def _request(self, method):
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        with self._lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self._request('put_object')
+        data = Body.read() if hasattr(Body, 'read') else bytes(Body)
+        etag = f'"{hashlib.md5(data).hexdigest()}"'
+        version_id = uuid.uuid4().hex
+        with self._lock:
+            self._objects[(Bucket, Key)] = {
+                'body': data,
+                'etag': etag,
+                'version_id': version_id,
+                'last_modified': time.time()
+            }
+            self.bytes_uploaded += len(data)
+        return {'ETag': etag, 'VersionId': version_id}
+
+    def get_object(self, Bucket, Key, **kwargs):
+        self._request('get_object')
+        with self._lock:
+            obj = self._objects.get((Bucket, Key))
+            if obj is None:
+                raise _NoSuchKey(Key)
+            self.bytes_downloaded += len(obj['body'])
+            return {
+                'Body': io.BytesIO(obj['body']),
+                'ContentLength': len(obj['body']),
+                'ETag': obj['etag'],
+                'VersionId': obj['version_id']
+            }
+
+    def head_object(self, Bucket, Key, **kwargs):
+        self._request('head_object')
+        with self._lock:
+            obj = self._objects.get((Bucket, Key))
+            if obj is None:
+                raise _NoSuchKey(Key)
+            return {'ContentLength': len(obj['body']), 'ETag': obj['etag'], 'VersionId': obj['version_id']}
+
+    def delete_object(self, Bucket, Key, **kwargs):
+        self._request('delete_object')
+        with self._lock:
+            self._objects.pop((Bucket, Key), None)
+        return {}
+
+    def list_objects_v2(self, Bucket, Prefix='', ContinuationToken=None, **kwargs):
+        self._request('list_objects_v2')
+        with self._lock:
+            keys = sorted(key for bucket, key in self._objects if bucket == Bucket and key.startswith(Prefix))
+            start = int(ContinuationToken or 0)
+            page = keys[start:start + self.page_size]
+            response = {
+                'KeyCount': len(page),
+                'Contents': [{'Key': key, 'Size': len(self._objects[(Bucket, key)]['body']),
+                              'ETag': self._objects[(Bucket, key)]['etag']} for key in page],
+                'IsTruncated': start + self.page_size < len(keys)
+            }
+        if response['IsTruncated']:
+            response['NextContinuationToken'] = str(start + self.page_size)
+        if not page:
+            del response['Contents']
+        return response
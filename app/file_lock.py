@@ -0,0 +1,73 @@
+"""
+Locks and atomic writes for files shared by several worker processes (see WORKER_PROCESSES and wsgi.py).
+
+FileLock serializes the threads of a process with a thread lock and the processes with flock() on a lock file.
+Where fcntl is not available (Windows) only the threads of one process are serialized, so run a single worker
+process there.
+"""
+
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+
+
+def get_thread_lock(path):
+    with _thread_locks_guard:
+        return _thread_locks.setdefault(os.path.abspath(path), threading.Lock())
+
+
+class FileLock:
+    """
+    Exclusive lock on the lock file at path (created if needed). Not reentrant: a thread holding the lock must
+    not acquire it again.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._thread_lock = get_thread_lock(path)
+        self._file = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        try:
+            if fcntl is not None:
+                self._file = open(self.path, 'a')
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        except BaseException:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self._thread_lock.release()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if self._file is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+                self._file.close()
+                self._file = None
+        finally:
+            self._thread_lock.release()
+        return False
+
+
+def write_file_atomically(path, data, fsync=False):
+    """
+    Write data (str or bytes) to a temporary file next to path and rename it over path, so readers, also in
+    other processes, see either the old or the new content.
+    """
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, 'wb' if isinstance(data, bytes) else 'w') as f:
+        f.write(data)
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(temp_path, path)
@@ -4,15 +4,18 @@ Handles uploading and downloading checkbox selection data to/from Google Drive.
 
 import os
 import json
-import logging
-import io
 import csv
+import threading
 from google.oauth2.credentials import Credentials
 from google.auth.transport.requests import Request
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
-from googleapiclient.http import MediaIoBaseDownload, MediaFileUpload
+from googleapiclient.http import MediaIoBaseDownload, MediaFileUpload, HttpRequest
+import google_auth_httplib2
+import httplib2
+
+from app.sync_backends import SyncBackend, gzip_to_temp_file, finalize_download, make_download_temp_file
 
 # If modifying these scopes, delete the file token.json.
 SCOPES = [
@@ -20,20 +23,123 @@ SCOPES = [
     'https://www.googleapis.com/auth/spreadsheets'
 ]
 
-class GoogleDriveService:
-    def __init__(self, credentials_file=None, token_file=None):
+# Layout of the time tracking spreadsheet
+CLASS_SESSIONS_TAB = 'Class Sessions'
+IMAGE_SESSIONS_TAB = 'Image Sessions'
+TIME_TRACKING_TABS = {CLASS_SESSIONS_TAB: 0, IMAGE_SESSIONS_TAB: 1}
+CLASS_SESSIONS_HEADERS = [
+    'Class ID', 'Class Name', 'Visit Number', 'Persistent Visit Number', 'Start Time', 'End Time',
+    'Duration (seconds)', 'Grid Annotations', 'Grid Deannotations', 'Detail Views'
+]
+IMAGE_SESSIONS_HEADERS = [
+    'Class ID', 'Class Name', 'Image Name', 'Image Index',
+    'Persistent Visit Number', 'Start Time', 'End Time', 'Duration (seconds)'
+]
+# Zero-based columns totalled in the summary row of each tab
+SUMMED_COLUMNS = {CLASS_SESSIONS_TAB: [6, 7, 8, 9], IMAGE_SESSIONS_TAB: [7]}
+
+
+def build_time_tracking_rows(session_data):
+    """Return the class session rows and image session rows (without headers) for the spreadsheet."""
+    class_rows = []
+    image_rows = []
+    for class_session in session_data.get('class_sessions', []):
+        class_id = class_session.get('class_id', '')
+        class_name = class_session.get('class_name', '')
+        class_rows.append([
+            class_id,
+            class_name,
+            class_session.get('visit_number', 0),
+            class_session.get('persistent_visit_number', 0),
+            class_session.get('start_time', ''),
+            class_session.get('end_time', ''),
+            int(class_session.get('duration_seconds', 0)),  # Convert to int
+            class_session.get('grid_annotations', 0),
+            class_session.get('grid_deannotations', 0),
+            class_session.get('detail_views', 0)
+        ])
+        for image_session in class_session.get('image_sessions', []):
+            image_rows.append([
+                class_id,
+                class_name,
+                image_session.get('image_name', ''),
+                image_session.get('image_index', ''),
+                image_session.get('persistent_visit_number', ''),
+                image_session.get('start_time', ''),
+                image_session.get('end_time', ''),
+                int(image_session.get('duration_seconds', 0))  # Convert to int
+            ])
+    return class_rows, image_rows
+
+
+def _append_cells_request(sheet_id, rows):
+    """Build an appendCells request, typing numbers, formulas and text as the Sheets API expects."""
+    def cell(value):
+        if isinstance(value, bool):
+            return {'userEnteredValue': {'boolValue': value}}
+        if isinstance(value, (int, float)):
+            return {'userEnteredValue': {'numberValue': value}}
+        if isinstance(value, str) and value.startswith('='):
+            return {'userEnteredValue': {'formulaValue': value}}
+        return {'userEnteredValue': {'stringValue': '' if value is None else str(value)}}
+
+    return {
+        'appendCells': {
+            'sheetId': sheet_id,
+            'rows': [{'values': [cell(value) for value in row]} for row in rows],
+            'fields': 'userEnteredValue'
+        }
+    }
+
+
+def get_sheets_export_state_path(local_data_dir, username):
+    return os.path.join(local_data_dir, f"sheets_export_{username}.json")
+
+
+def load_sheets_export_state(state_path):
+    """Load {session_id: {'spreadsheet_id', 'rows_written': {tab: count}}}; empty if missing."""
+    if not state_path:
+        return {}
+    try:
+        with open(state_path, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_sheets_export_state(state_path, export_state):
+    if not state_path:
+        return
+    tmp_path = f"{state_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(export_state, f, indent=2)
+    os.replace(tmp_path, state_path)
+
+class GoogleDriveService(SyncBackend):
+    backend_name = 'Google Drive'
+
+    def __init__(self, credentials_file=None, token_file=None, service=None, compress_threshold=None,
+                 transfer_engine=None, chunk_size=None, sheets_service=None):
         """
         Initialize Google Drive service.
         
         Args:
             credentials_file: Path to the credentials.json file from Google Cloud Console
             token_file: Path to store the token.json file for authenticated sessions
+            service: Pre-built Drive service object (e.g. FakeDriveService); skips authentication
+            compress_threshold: Files of at least this many bytes are gzipped before upload (None disables)
+            transfer_engine: Shared TransferEngine used to run file transfers concurrently
+            chunk_size: Resumable upload/download chunk size in bytes (rounded up to a multiple of 256 KiB)
+            sheets_service: Pre-built Sheets service object (e.g. FakeSheetsService)
         """
+        super().__init__(transfer_engine=transfer_engine, compress_threshold=compress_threshold,
+                         chunk_size=chunk_size)
         self.credentials_file = credentials_file or 'credentials.json'
         self.token_file = token_file or 'token.json'
-        self.service = None
-        self.sheets_service = None
-        self.logger = logging.getLogger(__name__)
+        self.service = service
+        self.sheets_service = sheets_service
+        self._connect_lock = threading.Lock()
+        self._thread_local = threading.local()
         
     def authenticate(self):
         """Authenticate and build the Google Drive and Sheets services."""
@@ -65,10 +171,64 @@ class GoogleDriveService:
             with open(self.token_file, 'w') as token:
                 token.write(creds.to_json())
                 
-        self.service = build('drive', 'v3', credentials=creds)
-        self.sheets_service = build('sheets', 'v4', credentials=creds)
+        # httplib2 is not thread-safe: every thread gets its own Http, which then keeps its connection
+        # alive across requests, so concurrent transfers neither share nor reopen connections
+        def build_request(http, *args, **kwargs):
+            thread_http = getattr(self._thread_local, 'http', None)
+            if thread_http is None:
+                thread_http = google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http())
+                self._thread_local.http = thread_http
+            return HttpRequest(thread_http, *args, **kwargs)
+
+        authorized_http = google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http())
+        self.service = build('drive', 'v3', http=authorized_http, requestBuilder=build_request)
+        self.sheets_service = build('sheets', 'v4', http=authorized_http, requestBuilder=build_request)
         return True
         
+    def connect(self):
+        """Authenticate once; concurrent transfers wait for the first one instead of racing it."""
+        with self._connect_lock:
+            if not self.service:
+                self.authenticate()
+
+    def resolve_location(self, username, target_folder_id=None, create=True):
+        """Return the ID of the user's Drive folder: target_folder_id or Multilabelfy_Data/<username>/."""
+        if target_folder_id:
+            # Save directly to the specified folder
+            self.logger.info(f"Using specified folder ID: {target_folder_id}")
+            return target_folder_id
+        # Use default structure: Multilabelfy_Data/username/
+        app_folder_id = self.get_or_create_folder('Multilabelfy_Data')
+        self.logger.info(f"Using default folder structure for user: {username}")
+        if create:
+            return self.get_or_create_folder(username, app_folder_id)
+        return self.find_file(username, app_folder_id)
+
+    def resolve_time_tracking_location(self, folder_id=None):
+        """Return folder_id or the ID of Multilabelfy_Data/Time_Tracking/ (same as Google Sheets)."""
+        if folder_id:
+            return folder_id
+        app_folder_id = self.get_or_create_folder('Multilabelfy_Data')
+        return self.get_or_create_folder('Time_Tracking', app_folder_id)
+
+    def put_file(self, local_file_path, remote_name, location, remote_id=None, compress=False):
+        file = self.upload_file_with_revision(local_file_path, remote_name, location, file_id=remote_id,
+                                              compress=compress)
+        return {'id': file.get('id'), 'revision': file.get('headRevisionId')}
+
+    def find_files(self, remote_names, location):
+        """Look up several files of a folder with a single list request."""
+        name_terms = ' or '.join(f"name='{name}'" for name in remote_names)
+        query = f"({name_terms}) and parents='{location}' and trashed=false"
+        results = self.service.files().list(q=query, fields='files(id, name)').execute()
+        found = {}
+        for item in results.get('files', []):
+            found.setdefault(item['name'], item['id'])
+        return found
+
+    def get_file(self, remote_id, local_file_path):
+        return self.download_file(remote_id, local_file_path)
+
     def get_or_create_folder(self, folder_name, parent_folder_id=None):
         """
         Get folder ID by name, or create it if it doesn't exist.
@@ -119,45 +279,93 @@ class GoogleDriveService:
         Returns:
             File ID of the uploaded file
         """
-        try:
-            file_metadata = {'name': drive_file_name}
-            if folder_id:
-                file_metadata['parents'] = [folder_id]
-                
-            media = MediaFileUpload(local_file_path, resumable=True)
+        return self.upload_file_with_revision(local_file_path, drive_file_name, folder_id).get('id')
+
+    def upload_file_with_revision(self, local_file_path, drive_file_name, folder_id=None, file_id=None,
+                                  compress=False):
+        """
+        Upload a file to Google Drive and return its id and head revision id.
+        
+        Args:
+            local_file_path: Path to the local file
+            drive_file_name: Name for the file in Google Drive
+            folder_id: ID of the folder to upload to (None for root)
+            file_id: Known ID of the remote file; skips the lookup by name when given
+            compress: Gzip the content before uploading (flagged via appProperties)
             
+        Returns:
+            Dictionary with 'id' and 'headRevisionId' of the uploaded file
+        """
+        compressed_path = None
+        media = None
+        try:
+            upload_path = local_file_path
+            mimetype = None
+            if compress:
+                compressed_path = gzip_to_temp_file(local_file_path)
+                upload_path = compressed_path
+                mimetype = 'application/gzip'
+            app_properties = {'contentEncoding': 'gzip' if compress else None}
+
+            media = MediaFileUpload(upload_path, mimetype=mimetype, chunksize=self.chunk_size, resumable=True)
+
+            if file_id:
+                try:
+                    return self.service.files().update(
+                        fileId=file_id,
+                        body={'appProperties': app_properties},
+                        media_body=media,
+                        fields='id, headRevisionId'
+                    ).execute()
+                except HttpError as error:
+                    if getattr(error.resp, 'status', None) != 404:
+                        raise
+                    # Remote file was removed, fall back to a lookup by name
+                    self.logger.info(f"Known file id for {drive_file_name} is stale, looking it up by name")
+                    media.stream().close()
+                    media = MediaFileUpload(upload_path, mimetype=mimetype, chunksize=self.chunk_size, resumable=True)
+
             # Check if file already exists
-            query = f"name='{drive_file_name}'"
-            if folder_id:
-                query += f" and parents='{folder_id}'"
-                
-            results = self.service.files().list(q=query).execute()
-            items = results.get('files', [])
-            
-            if items:
+            existing_file_id = self.find_file(drive_file_name, folder_id)
+
+            if existing_file_id:
                 # Update existing file
-                file_id = items[0]['id']
                 file = self.service.files().update(
-                    fileId=file_id,
-                    media_body=media
+                    fileId=existing_file_id,
+                    body={'appProperties': app_properties},
+                    media_body=media,
+                    fields='id, headRevisionId'
                 ).execute()
             else:
                 # Create new file
+                file_metadata = {'name': drive_file_name}
+                if folder_id:
+                    file_metadata['parents'] = [folder_id]
+                if compress:
+                    file_metadata['appProperties'] = {'contentEncoding': 'gzip'}
                 file = self.service.files().create(
                     body=file_metadata,
                     media_body=media,
-                    fields='id'
+                    fields='id, headRevisionId'
                 ).execute()
                 
-            return file.get('id')
+            return file
             
         except HttpError as error:
             self.logger.error(f"Error uploading file: {error}")
             raise
-            
+        finally:
+            if media is not None:
+                media.stream().close()
+            if compressed_path:
+                os.remove(compressed_path)
+
     def download_file(self, file_id, local_file_path):
         """
         Download a file from Google Drive.
+
+        The content is streamed chunk by chunk into a temporary file next to the destination, which
+        is then atomically renamed into place, so readers never see a partially written file.
         
         Args:
             file_id: ID of the file in Google Drive
@@ -166,24 +374,27 @@ class GoogleDriveService:
         Returns:
             True if successful, False otherwise
         """
+        tmp_path = None
         try:
             request = self.service.files().get_media(fileId=file_id)
-            fh = io.BytesIO()
-            downloader = MediaIoBaseDownload(fh, request)
-            
-            done = False
-            while done is False:
-                status, done = downloader.next_chunk()
-                
-            # Write to local file
-            with open(local_file_path, 'wb') as f:
-                f.write(fh.getvalue())
-                
+            fd, tmp_path = make_download_temp_file(local_file_path)
+            with os.fdopen(fd, 'wb') as fh:
+                downloader = MediaIoBaseDownload(fh, request, chunksize=self.chunk_size)
+                done = False
+                while done is False:
+                    status, done = downloader.next_chunk()
+
+            # Files uploaded with compression are stored gzipped on Drive
+            finalize_download(tmp_path, local_file_path)
+            tmp_path = None
             return True
             
         except HttpError as error:
             self.logger.error(f"Error downloading file: {error}")
             return False
+        finally:
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
             
     def find_file(self, file_name, folder_id=None):
         """
@@ -210,151 +421,6 @@ class GoogleDriveService:
             self.logger.error(f"Error finding file: {error}")
             return None
             
-    def upload_user_data(self, username, local_data_dir, target_folder_id=None):
-        """
-        Upload checkbox selections file to Google Drive.
-        
-        Args:
-            username: Username of the annotator
-            local_data_dir: Local directory containing user data
-            target_folder_id: Google Drive folder ID to save to (if None, uses default structure)
-            
-        Returns:
-            Dictionary with upload results
-        """
-        results = {
-            'success': True,
-            'uploaded_files': [],
-            'errors': []
-        }
-        
-        try:
-            if not self.service:
-                self.authenticate()
-                
-            # Determine the target folder
-            if target_folder_id:
-                # Save directly to the specified folder
-                user_folder_id = target_folder_id
-                self.logger.info(f"Using specified folder ID: {target_folder_id}")
-            else:
-                # Use default structure: Multilabelfy_Data/username/
-                app_folder_id = self.get_or_create_folder('Multilabelfy_Data')
-                user_folder_id = self.get_or_create_folder(username, app_folder_id)
-                self.logger.info(f"Using default folder structure for user: {username}")
-            
-            # Upload all checkbox_selections files (default + mode-specific)
-            # Files to upload: checkbox_selections_<username>.json, checkbox_selections_<username>_S.json, checkbox_selections_<username>_M.json
-            checkbox_files = [
-                f"checkbox_selections_{username}.json",       # Default mode
-                f"checkbox_selections_{username}_S.json",     # Sanity Check Mode 1
-                f"checkbox_selections_{username}_M.json"      # Sanity Check Mode 2
-            ]
-            
-            files_uploaded = False
-            for checkbox_filename in checkbox_files:
-                local_file_path = os.path.join(local_data_dir, checkbox_filename)
-                
-                if os.path.exists(local_file_path):
-                    try:
-                        file_id = self.upload_file(local_file_path, checkbox_filename, user_folder_id)
-                        results['uploaded_files'].append({
-                            'filename': checkbox_filename,
-                            'file_id': file_id
-                        })
-                        self.logger.info(f"Successfully uploaded {checkbox_filename} for user {username}")
-                        files_uploaded = True
-                    except Exception as e:
-                        results['errors'].append(f"Error uploading {checkbox_filename}: {str(e)}")
-                        self.logger.warning(f"Failed to upload {checkbox_filename}: {str(e)}")
-            
-            # Only set success to False if NO files were uploaded at all
-            if not files_uploaded:
-                results['errors'].append(f"No checkbox selections files found for user {username}")
-                results['success'] = False
-                
-        except Exception as e:
-            results['success'] = False
-            results['errors'].append(f"General error: {str(e)}")
-            
-        return results
-        
-    def download_user_data(self, username, local_data_dir, target_folder_id=None):
-        """
-        Download checkbox selections file from Google Drive.
-        
-        Args:
-            username: Username of the annotator
-            local_data_dir: Local directory to save downloaded data
-            target_folder_id: Google Drive folder ID to download from (if None, uses default structure)
-            
-        Returns:
-            Dictionary with download results
-        """
-        results = {
-            'success': True,
-            'downloaded_files': [],
-            'errors': []
-        }
-        
-        try:
-            if not self.service:
-                self.authenticate()
-                
-            # Determine the source folder
-            if target_folder_id:
-                # Download from the specified folder
-                user_folder_id = target_folder_id
-                self.logger.info(f"Using specified folder ID: {target_folder_id}")
-            else:
-                # Use default structure: Multilabelfy_Data/username/
-                app_folder_id = self.get_or_create_folder('Multilabelfy_Data')
-                user_folder_id = self.find_file(username, app_folder_id)
-                if not user_folder_id:
-                    results['errors'].append(f"No data found for user {username} on Google Drive")
-                    results['success'] = False
-                    return results
-                self.logger.info(f"Using default folder structure for user: {username}")
-                
-            # Create local directory if it doesn't exist
-            os.makedirs(local_data_dir, exist_ok=True)
-            
-            # Look for all checkbox_selections files (default + mode-specific)
-            checkbox_files = [
-                f"checkbox_selections_{username}.json",       # Default mode
-                f"checkbox_selections_{username}_S.json",     # Sanity Check Mode 1
-                f"checkbox_selections_{username}_M.json"      # Sanity Check Mode 2
-            ]
-            
-            files_downloaded = False
-            for checkbox_filename in checkbox_files:
-                file_id = self.find_file(checkbox_filename, user_folder_id)
-                
-                if file_id:
-                    local_file_path = os.path.join(local_data_dir, checkbox_filename)
-                    try:
-                        if self.download_file(file_id, local_file_path):
-                            results['downloaded_files'].append(checkbox_filename)
-                            self.logger.info(f"Successfully downloaded {checkbox_filename} for user {username}")
-                            files_downloaded = True
-                        else:
-                            results['errors'].append(f"Failed to download {checkbox_filename}")
-                            self.logger.warning(f"Failed to download {checkbox_filename}")
-                    except Exception as e:
-                        results['errors'].append(f"Error downloading {checkbox_filename}: {str(e)}")
-                        self.logger.warning(f"Error downloading {checkbox_filename}: {str(e)}")
-            
-            # Only set success to False if NO files were downloaded at all
-            if not files_downloaded:
-                results['errors'].append(f"No checkbox selections files found for user {username} on Google Drive")
-                results['success'] = False
-                        
-        except Exception as e:
-            results['success'] = False
-            results['errors'].append(f"General error: {str(e)}")
-            
-        return results
-    
     def upload_to_sheets(self, data, spreadsheet_id, range_name):
         """
         Upload data to Google Sheets.
@@ -387,14 +453,20 @@ class GoogleDriveService:
             self.logger.error(f"Error uploading to Google Sheets: {error}")
             raise
 
-    def create_time_tracking_sheet(self, username, session_data, folder_id=None):
+    def create_time_tracking_sheet(self, username, session_data, folder_id=None, local_data_dir=None):
         """
-        Create a Google Sheet with time tracking data.
+        Export time tracking data to a Google Sheet, incrementally.
+
+        The spreadsheet of a session is created (and formatted) once. Afterwards only class and
+        image session rows that were not exported yet are appended, through a single batchUpdate
+        call covering both tabs. The spreadsheet id and the number of rows already written per tab
+        are kept in an export state file in local_data_dir.
         
         Args:
             username: Username of the annotator
             session_data: Time tracking session data
             folder_id: Google Drive folder ID to save the sheet
+            local_data_dir: Directory for the export state file (state is not persisted if None)
             
         Returns:
             Dictionary with success status and sheet information
@@ -403,205 +475,54 @@ class GoogleDriveService:
             'success': False,
             'sheet_id': None,
             'sheet_url': None,
+            'rows_appended': {},
             'errors': []
         }
         
         try:
-            # Authenticate
-            if not self.authenticate():
-                results['errors'].append("Authentication failed")
-                return results
-            
-            # Check for existing spreadsheet and delete it
-            sheet_title = f"Time_Tracking_{username}_{session_data['session_id']}"
-            existing_sheet_id = self.find_spreadsheet_by_name(sheet_title, folder_id)
-            if existing_sheet_id:
-                self.logger.info(f"Found existing spreadsheet {sheet_title}, deleting it")
-                self.delete_file(existing_sheet_id)
-                
-            # Create spreadsheet with multiple sheets
-            spreadsheet = {
-                'properties': {
-                    'title': sheet_title
-                },
-                'sheets': [
-                    {
-                        'properties': {
-                            'title': 'Class Sessions',
-                            'sheetId': 0
-                        }
-                    },
-                    {
-                        'properties': {
-                            'title': 'Image Sessions',
-                            'sheetId': 1
-                        }
+            self.connect()
+
+            state_path = get_sheets_export_state_path(local_data_dir, username) if local_data_dir else None
+            export_state = load_sheets_export_state(state_path)
+            session_id = session_data['session_id']
+            session_state = export_state.get(session_id)
+
+            class_rows, image_rows = build_time_tracking_rows(session_data)
+
+            for attempt in range(2):
+                if session_state is None:
+                    sheet_id = self._create_time_tracking_spreadsheet(
+                        f"Time_Tracking_{username}_{session_id}", folder_id)
+                    session_state = {
+                        'spreadsheet_id': sheet_id,
+                        'rows_written': {CLASS_SESSIONS_TAB: 0, IMAGE_SESSIONS_TAB: 0}
                     }
-                ]
-            }
-            
-            spreadsheet = self.sheets_service.spreadsheets().create(
-                body=spreadsheet,
-                fields='spreadsheetId'
-            ).execute()
-            
-            sheet_id = spreadsheet.get('spreadsheetId')
+
+                new_rows = {
+                    CLASS_SESSIONS_TAB: class_rows[session_state['rows_written'][CLASS_SESSIONS_TAB]:],
+                    IMAGE_SESSIONS_TAB: image_rows[session_state['rows_written'][IMAGE_SESSIONS_TAB]:]
+                }
+                try:
+                    self._append_time_tracking_rows(session_state['spreadsheet_id'], new_rows)
+                    break
+                except HttpError as error:
+                    # The spreadsheet was deleted on Drive: start over with a fresh one
+                    if getattr(error.resp, 'status', None) != 404 or attempt == 1:
+                        raise
+                    self.logger.info(f"Time tracking spreadsheet of session {session_id} is gone, recreating it")
+                    session_state = None
+
+            for tab, rows in new_rows.items():
+                session_state['rows_written'][tab] += len(rows)
+                results['rows_appended'][tab] = len(rows)
+            export_state[session_id] = session_state
+            save_sheets_export_state(state_path, export_state)
+
+            sheet_id = session_state['spreadsheet_id']
             results['sheet_id'] = sheet_id
             results['sheet_url'] = f"https://docs.google.com/spreadsheets/d/{sheet_id}"
-            
-            # Prepare data for the sheet
-            headers = [
-                'Class ID', 'Class Name', 'Visit Number', 'Persistent Visit Number', 'Start Time', 'End Time',
-                'Duration (seconds)', 'Grid Annotations', 'Grid Deannotations', 'Detail Views'
-            ]
-            
-            # Prepare rows
-            rows = [headers]
-            
-            for class_session in session_data.get('class_sessions', []):
-                row = [
-                    class_session.get('class_id', ''),
-                    class_session.get('class_name', ''),
-                    class_session.get('visit_number', 0),
-                    class_session.get('persistent_visit_number', 0),
-                    class_session.get('start_time', ''),
-                    class_session.get('end_time', ''),
-                    int(class_session.get('duration_seconds', 0)),  # Convert to int
-                    class_session.get('grid_annotations', 0),
-                    class_session.get('grid_deannotations', 0),
-                    class_session.get('detail_views', 0)
-                ]
-                rows.append(row)
-            
-            # Add summary row
-            if len(rows) > 1:
-                summary_row = [
-                    'SUMMARY', '', '', '', '', '',  # One more empty column for persistent visit number
-                    sum(int(row[6]) for row in rows[1:]),    # Total duration 
-                    sum(int(row[7]) for row in rows[1:]),    # Total grid annotations 
-                    sum(int(row[8]) for row in rows[1:]),    # Total grid deannotations 
-                    sum(int(row[9]) for row in rows[1:])     # Total detail views 
-                ]
-                rows.append(summary_row)
-            
-            # Update the sheet with class session data
-            body = {
-                'values': rows
-            }
-            
-            self.sheets_service.spreadsheets().values().update(
-                spreadsheetId=sheet_id,
-                range='Class Sessions!A1',
-                valueInputOption='RAW',
-                body=body
-            ).execute()
-            
-            # Prepare image session data
-            image_headers = [
-                'Class ID', 'Class Name', 'Image Name', 'Image Index',
-                'Persistent Visit Number', 'Start Time', 'End Time', 'Duration (seconds)'
-            ]
-            
-            image_rows = [image_headers]
-            
-            for class_session in session_data.get('class_sessions', []):
-                class_id = class_session.get('class_id', '')
-                class_name = class_session.get('class_name', '')
-                
-                for image_session in class_session.get('image_sessions', []):
-                    image_row = [
-                        class_id,
-                        class_name,
-                        image_session.get('image_name', ''),
-                        image_session.get('image_index', ''),
-                        image_session.get('persistent_visit_number', ''),
-                        image_session.get('start_time', ''),
-                        image_session.get('end_time', ''),
-                        int(image_session.get('duration_seconds', 0))  # Convert to int
-                    ]
-                    image_rows.append(image_row)
-            
-            # Add image summary row
-            if len(image_rows) > 1:
-                image_summary_row = [
-                    'SUMMARY', '', '', '', '',
-                    '', '',  # Start/End time empty for summary
-                    sum(int(row[7]) for row in image_rows[1:])  # Total duration
-                ]
-                image_rows.append(image_summary_row)
-            
-            # Update the image sessions sheet
-            if len(image_rows) > 1:  # Only if there are image sessions
-                image_body = {
-                    'values': image_rows
-                }
-                
-                self.sheets_service.spreadsheets().values().update(
-                    spreadsheetId=sheet_id,
-                    range='Image Sessions!A1',
-                    valueInputOption='RAW',
-                    body=image_body
-                ).execute()
-            
-            # Format the header rows for both sheets
-            format_requests = [
-                # Format Class Sessions sheet header
-                {
-                    'repeatCell': {
-                        'range': {
-                            'sheetId': 0,
-                            'startRowIndex': 0,
-                            'endRowIndex': 1
-                        },
-                        'cell': {
-                            'userEnteredFormat': {
-                                'backgroundColor': {'red': 0.9, 'green': 0.9, 'blue': 0.9},
-                                'textFormat': {'bold': True}
-                            }
-                        },
-                        'fields': 'userEnteredFormat(backgroundColor,textFormat)'
-                    }
-                }
-            ]
-            
-            # Add Image Sessions sheet header formatting if there are image sessions
-            if len(image_rows) > 1:
-                format_requests.append({
-                    'repeatCell': {
-                        'range': {
-                            'sheetId': 1,
-                            'startRowIndex': 0,
-                            'endRowIndex': 1
-                        },
-                        'cell': {
-                            'userEnteredFormat': {
-                                'backgroundColor': {'red': 0.9, 'green': 0.9, 'blue': 0.9},
-                                'textFormat': {'bold': True}
-                            }
-                        },
-                        'fields': 'userEnteredFormat(backgroundColor,textFormat)'
-                    }
-                })
-            
-            format_request = {
-                'requests': format_requests
-            }
-            
-            self.sheets_service.spreadsheets().batchUpdate(
-                spreadsheetId=sheet_id,
-                body=format_request
-            ).execute()
-            
-            # Move to specified folder if provided
-            if folder_id:
-                self.service.files().update(
-                    fileId=sheet_id,
-                    addParents=folder_id,
-                    fields='id, parents'
-                ).execute()
-                
             results['success'] = True
-            self.logger.info(f"Successfully created time tracking sheet for {username}")
+            self.logger.info(f"Successfully exported time tracking sheet for {username}: {results['rows_appended']}")
             
         except HttpError as error:
             results['errors'].append(f"HTTP error creating sheet: {error}")
@@ -611,68 +532,101 @@ class GoogleDriveService:
             self.logger.error(f"Error creating sheet: {error}")
             
         return results
-    
-    def upload_time_tracking_json(self, username, session_data, local_data_dir, folder_id=None):
+
+    def _create_time_tracking_spreadsheet(self, sheet_title, folder_id=None):
         """
-        Upload time tracking JSON file to Google Drive.
-        
-        Args:
-            username: Username of the annotator
-            session_data: Time tracking session data
-            local_data_dir: Local directory containing time tracking files
-            folder_id: Google Drive folder ID to save to
-            
+        Create the two-tab time tracking spreadsheet with its header and summary rows and formatting.
+
+        A spreadsheet with the same title left over from an earlier export without state is replaced.
+
         Returns:
-            Dictionary with upload results
+            Spreadsheet ID
         """
-        results = {
-            'success': True,
-            'uploaded_file': None,
-            'errors': []
-        }
-        
-        try:
-            if not self.service:
-                self.authenticate()
-                
-            # Determine target folder (same as Google Sheets)
-            if folder_id:
-                target_folder_id = folder_id
-            else:
-                # Use default time tracking folder structure
-                app_folder_id = self.get_or_create_folder('Multilabelfy_Data')
-                target_folder_id = self.get_or_create_folder('Time_Tracking', app_folder_id)
-            
-            # Find the time tracking JSON file for this session
-            session_id = session_data.get('session_id')
-            json_filename = f"time_tracking_{session_id}.json"
-            local_file_path = os.path.join(local_data_dir, json_filename)
-            
-            if os.path.exists(local_file_path):
-                try:
-                    # Use session-specific filename to ensure uniqueness
-                    drive_filename = f"Time_Tracking_{username}_{session_id}.json"
-                    
-                    file_id = self.upload_file(local_file_path, drive_filename, target_folder_id)
-                    results['uploaded_file'] = {
-                        'filename': drive_filename,
-                        'file_id': file_id,
-                        'local_path': local_file_path
+        existing_sheet_id = self.find_spreadsheet_by_name(sheet_title, folder_id)
+        if existing_sheet_id:
+            self.logger.info(f"Found existing spreadsheet {sheet_title} without export state, deleting it")
+            self.delete_file(existing_sheet_id)
+
+        spreadsheet = {
+            'properties': {
+                'title': sheet_title
+            },
+            'sheets': [
+                {
+                    'properties': {
+                        'title': CLASS_SESSIONS_TAB,
+                        'sheetId': TIME_TRACKING_TABS[CLASS_SESSIONS_TAB]
                     }
-                    self.logger.info(f"Successfully uploaded {drive_filename} for user {username}")
-                except Exception as e:
-                    results['errors'].append(f"Error uploading {json_filename}: {str(e)}")
-                    results['success'] = False
-            else:
-                results['errors'].append(f"Time tracking JSON file not found: {local_file_path}")
-                results['success'] = False
-                
-        except Exception as e:
-            results['success'] = False
-            results['errors'].append(f"General error uploading time tracking JSON: {str(e)}")
-            
-        return results
+                },
+                {
+                    'properties': {
+                        'title': IMAGE_SESSIONS_TAB,
+                        'sheetId': TIME_TRACKING_TABS[IMAGE_SESSIONS_TAB]
+                    }
+                }
+            ]
+        }
 
+        spreadsheet = self.sheets_service.spreadsheets().create(
+            body=spreadsheet,
+            fields='spreadsheetId'
+        ).execute()
+        sheet_id = spreadsheet.get('spreadsheetId')
+
+        # Header and summary rows plus their formatting, written once in a single call.
+        # The summary row sits right below the header and sums the whole column, so it stays
+        # correct while data rows are appended below it.
+        requests = []
+        for tab, header in ((CLASS_SESSIONS_TAB, CLASS_SESSIONS_HEADERS), (IMAGE_SESSIONS_TAB, IMAGE_SESSIONS_HEADERS)):
+            summary = ['SUMMARY'] + [''] * (len(header) - 1)
+            for column in SUMMED_COLUMNS[tab]:
+                letter = chr(ord('A') + column)
+                summary[column] = f"=SUM({letter}3:{letter})"
+            requests.append(_append_cells_request(TIME_TRACKING_TABS[tab], [header, summary]))
+            requests.append({
+                'repeatCell': {
+                    'range': {
+                        'sheetId': TIME_TRACKING_TABS[tab],
+                        'startRowIndex': 0,
+                        'endRowIndex': 2
+                    },
+                    'cell': {
+                        'userEnteredFormat': {
+                            'backgroundColor': {'red': 0.9, 'green': 0.9, 'blue': 0.9},
+                            'textFormat': {'bold': True}
+                        }
+                    },
+                    'fields': 'userEnteredFormat(backgroundColor,textFormat)'
+                }
+            })
+
+        self.sheets_service.spreadsheets().batchUpdate(
+            spreadsheetId=sheet_id,
+            body={'requests': requests}
+        ).execute()
+
+        # Move to specified folder if provided
+        if folder_id:
+            self.service.files().update(
+                fileId=sheet_id,
+                addParents=folder_id,
+                fields='id, parents'
+            ).execute()
+
+        return sheet_id
+
+    def _append_time_tracking_rows(self, sheet_id, new_rows):
+        """Append new rows to both tabs with one batchUpdate call (no call if nothing is new)."""
+        requests = [_append_cells_request(TIME_TRACKING_TABS[tab], rows) for tab, rows in new_rows.items() if rows]
+        if not requests:
+            # Still confirm the spreadsheet exists so a deleted sheet gets recreated
+            self.sheets_service.spreadsheets().get(spreadsheetId=sheet_id, fields='spreadsheetId').execute()
+            return
+        self.sheets_service.spreadsheets().batchUpdate(
+            spreadsheetId=sheet_id,
+            body={'requests': requests}
+        ).execute()
+    
     def find_spreadsheet_by_name(self, name, folder_id=None):
         """
         Find a Google Sheets spreadsheet by name.
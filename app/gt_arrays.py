@@ -0,0 +1,310 @@
+"""
+Ground truth files as memory-mapped NumPy arrays, shared by all worker processes.
+
+Parsed JSON is held as millions of Python objects per process. Even when the files are read before the workers are
+forked, every access updates the objects' reference counts, so the pages holding them are copied into each worker
+over time and N workers end up with N copies. With GT_DATA_BACKEND = 'arrays', predictions.json,
+sample_images_info.json and bboxes.json are instead converted once (again after they change) into .npy files in
+GT_ARRAYS_DIRECTORY, which every process maps read-only: the OS keeps one copy of them in its page cache, however
+many workers there are.
+
+RecordArray (a list of records, like predictions.json) and BboxArrays (a dict of per-image dicts of lists, like
+bboxes.json) build the records on access, so they are used like the parsed JSON: proposals_info[i]['image_name'],
+['ground_truth'] and ['softmax_val'] (a read-only float32 row), bboxes[image_name]['boxes'], ... Records are new
+objects on every access, changing them does not change the data. Top-k encoded proposals (see proposals_encoding.py)
+are stored as int16 indices and float16 values.
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import logging
+import operator
+from collections.abc import Mapping, Sequence
+
+import numpy as np
+
+from .file_lock import FileLock
+from .helper_funcs import load_json
+from .proposals_encoding import get_compact_dtype
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+META_FILENAME = 'meta.json'
+
+
+def encode_column(values, float_dtype=None):
+    """
+    One field of all records as a NumPy array: strings as UTF-8 bytes, numbers as they are and lists of numbers
+    as rows of a 2-D array (of float_dtype, if given, for floats). Raises ValueError for other values.
+    """
+    if values and all(isinstance(value, str) for value in values):
+        return np.array([value.encode('utf-8') for value in values], dtype=bytes)
+    try:
+        array = np.asarray(values)
+    except ValueError as e:  # Lists of different lengths
+        raise ValueError(f"Values cannot be stored as an array: {e}") from None
+    if array.dtype.kind not in 'biuf' or array.ndim > 2:
+        raise ValueError(f"Values of type {array.dtype} and {array.ndim} dimensions cannot be stored as an array")
+    if float_dtype is not None and array.ndim == 2 and array.dtype.kind == 'f':
+        array = array.astype(float_dtype)
+    return array
+
+
+def decode_value(array, index):
+    """Element index of a column as the JSON value: str, Python number, or a row view of a 2-D array."""
+    value = array[index]
+    if array.ndim == 2:
+        return value
+    if array.dtype.kind == 'S':
+        return value.decode('utf-8')
+    return value.item()
+
+
+def decode_values(array, start, stop):
+    """Elements start to stop of a column as a list of JSON values."""
+    if array.dtype.kind == 'S':
+        return [value.decode('utf-8') for value in array[start:stop]]
+    return array[start:stop].tolist()
+
+
+class RecordArray(Sequence):
+    """Read-only list of dicts with the same keys, one array per key."""
+
+    def __init__(self, columns, sorted_names=None, name_order=None):
+        """
+        Args:
+            columns: Field name -> array with one element (or row) per record, in the records' key order
+            sorted_names, name_order: The encoded image names in sorted order and their record indices, for
+                index_of()
+        """
+        self.columns = columns
+        self.sorted_names = sorted_names
+        self.name_order = name_order
+        self._length = len(next(iter(columns.values()))) if columns else 0
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._record(i) for i in range(*index.indices(self._length))]
+        index = operator.index(index)
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError('record index out of range')
+        return self._record(index)
+
+    def _record(self, index):
+        return {field: decode_value(array, index) for field, array in self.columns.items()}
+
+    def index_of(self, image_name):
+        """Index of the first record of the image. Raises ValueError if there is none."""
+        if self.sorted_names is None:
+            raise ValueError(f"{image_name} not found: records have no image names")
+        key = image_name.encode('utf-8')
+        position = int(np.searchsorted(self.sorted_names, key))
+        if position < len(self.sorted_names) and self.sorted_names[position] == key:
+            return int(self.name_order[position])
+        raise ValueError(f"{image_name} not found")
+
+    def records_where(self, field, value):
+        """The records whose field equals value, in order."""
+        if isinstance(value, str):
+            value = value.encode('utf-8')
+        return [self._record(index) for index in np.flatnonzero(self.columns[field] == value)]
+
+
+class BboxArrays(Mapping):
+    """
+    Read-only dict of image name -> dict of lists (boxes, scores, gt, ...). Per field, the lists of all images are
+    concatenated into one array, with an offset table and a mask of the images that have the field.
+    """
+
+    def __init__(self, names, fields):
+        """
+        Args:
+            names: Sorted encoded image names
+            fields: Field name -> (values, offsets, present), in the entries' key order
+        """
+        self.names = names
+        self.fields = fields
+
+    def _position(self, image_name):
+        if not isinstance(image_name, str):
+            return None
+        key = image_name.encode('utf-8')
+        position = int(np.searchsorted(self.names, key))
+        if position < len(self.names) and self.names[position] == key:
+            return position
+        return None
+
+    def __getitem__(self, image_name):
+        position = self._position(image_name)
+        if position is None:
+            raise KeyError(image_name)
+        entry = {}
+        for field, (values, offsets, present) in self.fields.items():
+            if present[position]:
+                entry[field] = decode_values(values, offsets[position], offsets[position + 1])
+        return entry
+
+    def __contains__(self, image_name):
+        return self._position(image_name) is not None
+
+    def __iter__(self):
+        return (name.decode('utf-8') for name in self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+
+def records_to_arrays(records, float_dtype=np.float32):
+    """Arrays (name -> array) and field names of a list of records, which must all have the same keys."""
+    fields = list(records[0]) if records else []
+    for record in records:
+        if not isinstance(record, dict) or list(record) != fields:
+            raise ValueError("Records do not all have the same fields")
+    num_classes = max((record.get('num_classes', 0) for record in records), default=0)
+    arrays = {}
+    for i, field in enumerate(fields):
+        arrays[f'field{i}'] = encode_column([record[field] for record in records], float_dtype)
+        compact_dtype = get_compact_dtype(field, num_classes)
+        if compact_dtype is not None:
+            arrays[f'field{i}'] = arrays[f'field{i}'].astype(compact_dtype)
+    if 'image_name' in fields:
+        names = arrays[f'field{fields.index("image_name")}']
+        if names.dtype.kind == 'S':
+            arrays['name_order'] = np.argsort(names, kind='stable')
+            arrays['sorted_names'] = names[arrays['name_order']]
+    return arrays, fields
+
+
+def bboxes_to_arrays(bboxes):
+    """Arrays (name -> array) and field names of a dict of image name -> dict of lists."""
+    names = sorted(bboxes)
+    entries = [bboxes[name] for name in names]
+    fields = []
+    for entry in entries:
+        if not isinstance(entry, dict):
+            raise ValueError("Entries are not dicts")
+        fields.extend(field for field in entry if field not in fields)
+
+    arrays = {'names': np.array([name.encode('utf-8') for name in names], dtype=bytes)}
+    for i, field in enumerate(fields):
+        present = np.zeros(len(entries), dtype=bool)
+        offsets = np.zeros(len(entries) + 1, dtype=np.int64)
+        flat = []
+        for j, entry in enumerate(entries):
+            if field in entry:
+                if not isinstance(entry[field], list):
+                    raise ValueError(f"Field {field} is not a list")
+                present[j] = True
+                flat.extend(entry[field])
+            offsets[j + 1] = len(flat)
+        arrays[f'field{i}.values'] = encode_column(flat)  # Coordinates and scores keep their exact values
+        arrays[f'field{i}.offsets'] = offsets
+        arrays[f'field{i}.present'] = present
+    return arrays, fields
+
+
+def convert_gt_file(file_path, target_directory, float_dtype=np.float32):
+    """
+    Convert a ground truth JSON file into .npy files in target_directory, which must not exist. The directory
+    appears complete or not at all. Raises ValueError if the file's layout is not supported.
+    """
+    data = load_json(file_path)
+    if isinstance(data, list):
+        kind = 'records'
+        arrays, fields = records_to_arrays(data, float_dtype)
+    elif isinstance(data, dict):
+        kind = 'bboxes'
+        arrays, fields = bboxes_to_arrays(data)
+    else:
+        raise ValueError(f"{file_path} is neither a list of records nor a dict of images")
+    count = len(data)
+    del data
+
+    temp_directory = f"{target_directory}.{os.getpid()}.tmp"
+    shutil.rmtree(temp_directory, ignore_errors=True)
+    os.makedirs(temp_directory)
+    try:
+        for name, array in arrays.items():
+            np.save(os.path.join(temp_directory, f'{name}.npy'), array, allow_pickle=False)
+        meta = {'version': FORMAT_VERSION, 'kind': kind, 'fields': fields, 'count': count,
+                'source': os.path.abspath(file_path)}
+        with open(os.path.join(temp_directory, META_FILENAME), 'w') as f:
+            json.dump(meta, f, indent=2)
+        os.rename(temp_directory, target_directory)
+    except BaseException:
+        shutil.rmtree(temp_directory, ignore_errors=True)
+        raise
+
+
+def load_array(path):
+    try:
+        # Plain ndarray on the mapping: indexing np.memmap costs several microseconds more per access
+        return np.load(path, mmap_mode='r', allow_pickle=False).view(np.ndarray)
+    except ValueError:  # Empty arrays cannot be memory-mapped
+        return np.load(path, allow_pickle=False)
+
+
+def open_gt_arrays(directory):
+    """RecordArray or BboxArrays of a converted ground truth file."""
+    with open(os.path.join(directory, META_FILENAME), 'r') as f:
+        meta = json.load(f)
+    if meta.get('version') != FORMAT_VERSION:
+        raise ValueError(f"{directory} has format version {meta.get('version')}, expected {FORMAT_VERSION}")
+
+    def array(name):
+        return load_array(os.path.join(directory, f'{name}.npy'))
+
+    if meta['kind'] == 'records':
+        columns = {field: array(f'field{i}') for i, field in enumerate(meta['fields'])}
+        if os.path.isfile(os.path.join(directory, 'sorted_names.npy')):
+            return RecordArray(columns, array('sorted_names'), array('name_order'))
+        return RecordArray(columns)
+    fields = {field: (array(f'field{i}.values'), array(f'field{i}.offsets'), array(f'field{i}.present'))
+              for i, field in enumerate(meta['fields'])}
+    return BboxArrays(array('names'), fields)
+
+
+def get_conversion_prefix(file_path, tag=None):
+    """Name prefix of the conversions of a file: its name, the tag of the format, and a hash of its directory."""
+    file_path = os.path.abspath(file_path)
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    directory_hash = hashlib.sha1(os.path.dirname(file_path).encode('utf-8')).hexdigest()[:8]
+    return f"{stem}-{tag}-{directory_hash}-" if tag else f"{stem}-{directory_hash}-"
+
+
+def get_conversion_directory(file_path, arrays_directory, convert, tag=None):
+    """
+    Directory in arrays_directory holding the conversion of the current version of file_path, made with
+    convert(file_path, target_directory) if there is none. Processes converting at the same time wait for each
+    other, and conversions of older versions are removed (processes still using their files keep their data).
+    """
+    stat = os.stat(file_path)
+    prefix = get_conversion_prefix(file_path, tag)
+    name = f"{prefix}{stat.st_mtime_ns}-{stat.st_size}"
+    target_directory = os.path.join(arrays_directory, name)
+    if not os.path.isfile(os.path.join(target_directory, META_FILENAME)):
+        os.makedirs(arrays_directory, exist_ok=True)
+        with FileLock(os.path.join(arrays_directory, '.convert.lock')):
+            if not os.path.isfile(os.path.join(target_directory, META_FILENAME)):
+                logger.info(f"Converting {file_path} to {target_directory}")
+                convert(file_path, target_directory)
+                for entry in os.listdir(arrays_directory):
+                    if entry.startswith(prefix) and entry != name and not entry.endswith('.tmp'):
+                        shutil.rmtree(os.path.join(arrays_directory, entry), ignore_errors=True)
+    return target_directory
+
+
+def load_gt_arrays(file_path, arrays_directory):
+    """
+    The ground truth JSON file at file_path as RecordArray or BboxArrays, converting it first if arrays_directory
+    has no conversion of its current version.
+    """
+    return open_gt_arrays(get_conversion_directory(file_path, arrays_directory, convert_gt_file))
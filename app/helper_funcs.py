@@ -1,9 +1,10 @@
 import os
 import shutil
 import random
-import numpy as np
 import json
 
+from .proposals_encoding import get_top_classes, get_sorted_confidences
+
 
 def orjson_load(fname):
     with open(fname, 'rb') as f:
@@ -33,9 +34,7 @@ def get_image_softmax_dict(proposals_info):
     image_softmax_dict = {}
     for info in proposals_info:
         image_name = info['image_name']
-        softmax_vector = info['softmax_val']
-        softmax_indices = np.argsort(softmax_vector)[::-1]
-        image_softmax_dict[image_name] = softmax_indices
+        image_softmax_dict[image_name] = get_top_classes(info)
     return image_softmax_dict
 
 
@@ -43,11 +42,23 @@ def get_image_conf_dict(proposals_info):
     image_conf_dict = {}
     for info in proposals_info:
         image_name = info['image_name']
-        softmax_vector = np.sort(info['softmax_val'])[::-1]
-        image_conf_dict[image_name] = softmax_vector
+        image_conf_dict[image_name] = get_sorted_confidences(info)
     return image_conf_dict
 
 
+def find_image_index(proposals_info, image_name):
+    """Index of the first proposal of the image, -1 if there is none."""
+    if hasattr(proposals_info, 'index_of'):  # gt_arrays.RecordArray: binary search of the sorted names
+        try:
+            return proposals_info.index_of(image_name)
+        except ValueError:
+            return -1
+    for i, info in enumerate(proposals_info):
+        if info['image_name'] == image_name:
+            return i
+    return -1
+
+
 def get_sample_images_for_categories(top_categories, all_sample_images, indices_to_class_names, num_selection=10):
     """
     Returns a dictionary of sample images for each of the top categories.
@@ -111,7 +122,10 @@ def get_sample_image_for_category(category, all_sample_images, indices_to_class_
     """
 
     # slice the dataframe to get the sample images for the category
-    sample_images = [elem for elem in all_sample_images if elem['ground_truth'] == category]
+    if hasattr(all_sample_images, 'records_where'):  # gt_arrays.RecordArray: compares the whole column at once
+        sample_images = all_sample_images.records_where('ground_truth', category)
+    else:
+        sample_images = [elem for elem in all_sample_images if elem['ground_truth'] == category]
 
     # Shuffle and sample num_selection images
     random.shuffle(sample_images)
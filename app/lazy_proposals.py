@@ -0,0 +1,337 @@
+"""
+Lazy on-disk backend of predictions.json, for datasets whose proposals do not fit in memory.
+
+With GT_DATA_BACKEND = 'lazy', predictions.json is converted once (again after it changes) into GT_ARRAYS_DIRECTORY.
+The converter streams through the file, so it is never parsed as a whole:
+
+    rows.bin         one fixed-stride binary row per record with its numeric fields (softmax_val as float32, top-k
+                     fields as int16 and float16, see proposals_encoding.py)
+    strings.bin      the string fields of all records (image_name), UTF-8, back to back
+    offsets.bin      offset table: where each record's strings start in strings.bin
+    name_hashes.bin  64-bit hashes of the image names, sorted, and their record indices in name_order.bin, to find
+                     an image by name
+    meta.json        fields, row layout and number of records
+
+LazyRecordArray reads a record's row and strings with positioned reads and keeps the cache_rows most recently used
+records in an LRU, so the memory of the proposals stays roughly constant however many there are. The other ground
+truth files are memory-mapped as with 'arrays' (see gt_arrays.py).
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import operator
+import threading
+from array import array
+from collections import OrderedDict
+from collections.abc import Sequence
+
+import numpy as np
+
+from .gt_arrays import META_FILENAME, get_conversion_directory
+from .proposals_encoding import get_compact_dtype
+
+FORMAT_VERSION = 1
+LAZY_GT_FILENAMES = ('predictions.json',)
+CONVERT_BATCH_RECORDS = 256  # Parsed records held at once while converting
+
+
+def iter_json_array(file_path, chunk_size=1 << 20):
+    """The elements of the JSON array in file_path, parsed one at a time while reading the file in chunks."""
+    decoder = json.JSONDecoder()
+    with open(file_path, 'r', encoding='utf-8') as f:
+        buffer = f.read(chunk_size)
+        eof = not buffer
+        position = len(buffer) - len(buffer.lstrip())
+        if buffer[position:position + 1] != '[':
+            raise ValueError(f"{file_path} does not contain a JSON array")
+        position += 1
+        expect_element = True
+        while True:
+            # Skip whitespace and the comma between elements, reading on when the buffer runs out
+            while True:
+                while position < len(buffer) and buffer[position] in ' \t\r\n':
+                    position += 1
+                if position < len(buffer) or eof:
+                    break
+                buffer, position = f.read(chunk_size), 0
+                eof = not buffer
+            if position >= len(buffer):
+                raise ValueError(f"{file_path} ends inside the JSON array")
+            if buffer[position] == ']':
+                return
+            if not expect_element:
+                if buffer[position] != ',':
+                    raise ValueError(f"Expected ',' at character {position} of a chunk of {file_path}")
+                position += 1
+                expect_element = True
+                continue
+
+            while True:
+                try:
+                    element, end = decoder.raw_decode(buffer, position)
+                    if end < len(buffer) or eof:  # A number at the end of the buffer may continue in the next chunk
+                        break
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer, position = buffer[position:] + chunk, 0
+            yield element
+            position = end
+            expect_element = False
+
+
+def hash_name(name_bytes):
+    return int.from_bytes(hashlib.blake2b(name_bytes, digest_size=8).digest(), 'little')
+
+
+def get_row_layout(record):
+    """Fields of the first record and the (name, dtype, shape) of its numeric fields, the row layout."""
+    if not isinstance(record, dict):
+        raise ValueError("Records are not dicts")
+    row_fields = []
+    for field, value in record.items():
+        if isinstance(value, str):
+            continue
+        if isinstance(value, bool):
+            row_fields.append((field, '?', []))
+        elif isinstance(value, int):
+            row_fields.append((field, '<i8', []))
+        elif isinstance(value, float):
+            row_fields.append((field, '<f8', []))
+        elif isinstance(value, list) and all(isinstance(item, (int, float)) for item in value):
+            # Probability vectors in float32 (half the size), integer lists as they are, top-k fields compacted
+            compact_dtype = get_compact_dtype(field, record.get('num_classes', 0))
+            if compact_dtype is not None:
+                list_dtype = np.dtype(compact_dtype).newbyteorder('<').str
+            else:
+                list_dtype = '<i8' if all(isinstance(item, int) for item in value) else '<f4'
+            row_fields.append((field, list_dtype, [len(value)]))
+        else:
+            raise ValueError(f"Field {field} of type {type(value).__name__} cannot be stored in a row")
+    return list(record), row_fields
+
+
+def make_row_dtype(row_fields):
+    return np.dtype([(field, dtype, tuple(shape)) for field, dtype, shape in row_fields])
+
+
+def convert_to_lazy_records(file_path, target_directory):
+    """
+    Convert a JSON array of records with the same fields into the files of a LazyRecordArray in
+    target_directory, which must not exist. Raises ValueError if the records cannot be stored in rows.
+    """
+    temp_directory = f"{target_directory}.{os.getpid()}.tmp"
+    shutil.rmtree(temp_directory, ignore_errors=True)
+    os.makedirs(temp_directory)
+    try:
+        fields, row_fields, count = write_lazy_records(iter_json_array(file_path), temp_directory)
+        meta = {'version': FORMAT_VERSION, 'kind': 'lazy_records', 'fields': fields, 'row_fields': row_fields,
+                'count': count, 'source': os.path.abspath(file_path)}
+        with open(os.path.join(temp_directory, META_FILENAME), 'w') as f:
+            json.dump(meta, f, indent=2)
+        os.rename(temp_directory, target_directory)
+    except BaseException:
+        shutil.rmtree(temp_directory, ignore_errors=True)
+        raise
+
+
+def write_lazy_records(records, directory):
+    """Write the rows, strings and name index of the records into directory, one batch at a time."""
+    fields, row_fields, row_dtype, string_fields = None, None, None, None
+    name_hashes = array('Q')
+    count = 0
+    string_offset = 0
+    with open(os.path.join(directory, 'rows.bin'), 'wb') as rows_file, \
+            open(os.path.join(directory, 'strings.bin'), 'wb') as strings_file, \
+            open(os.path.join(directory, 'offsets.bin'), 'wb') as offsets_file:
+        offsets_file.write(np.zeros(1, dtype='<i8').tobytes())
+        batch = []
+        for record in records:
+            if fields is None:
+                fields, row_fields = get_row_layout(record)
+                row_dtype = make_row_dtype(row_fields)
+                string_fields = [field for field in fields if field not in row_dtype.names]
+            elif not isinstance(record, dict) or list(record) != fields:
+                raise ValueError(f"Record {count + len(batch)} does not have the fields {fields}")
+            batch.append(record)
+            if len(batch) == CONVERT_BATCH_RECORDS:
+                string_offset = write_batch(batch, row_dtype, string_fields, rows_file, strings_file, offsets_file,
+                                            string_offset, name_hashes)
+                count += len(batch)
+                batch = []
+        if batch:
+            write_batch(batch, row_dtype, string_fields, rows_file, strings_file, offsets_file, string_offset,
+                        name_hashes)
+            count += len(batch)
+
+    # Name index: 16 bytes per record, the only part of the conversion that grows with the dataset
+    name_hashes = np.frombuffer(name_hashes, dtype=np.uint64).astype('<u8')
+    name_order = np.argsort(name_hashes, kind='stable').astype('<i8')
+    name_hashes[name_order].tofile(os.path.join(directory, 'name_hashes.bin'))
+    name_order.tofile(os.path.join(directory, 'name_order.bin'))
+    return fields or [], row_fields or [], count
+
+
+def write_batch(batch, row_dtype, string_fields, rows_file, strings_file, offsets_file, string_offset, name_hashes):
+    rows = np.zeros(len(batch), dtype=row_dtype)
+    for field in row_dtype.names:
+        try:
+            rows[field] = [record[field] for record in batch]
+        except (ValueError, TypeError, OverflowError) as e:  # Lists of another length, strings in a number field, ...
+            raise ValueError(f"Field {field} cannot be stored in a row: {e}") from None
+    rows_file.write(rows.tobytes())
+
+    offsets = np.empty(len(batch) * len(string_fields), dtype='<i8')
+    position = 0
+    for record in batch:
+        for field in string_fields:
+            if not isinstance(record[field], str):
+                raise ValueError(f"Field {field} is not a string in every record")
+            encoded = record[field].encode('utf-8')
+            strings_file.write(encoded)
+            string_offset += len(encoded)
+            offsets[position] = string_offset
+            position += 1
+            if field == 'image_name':
+                name_hashes.append(hash_name(encoded))
+    offsets_file.write(offsets.tobytes())
+    return string_offset
+
+
+def read_at(file, offset, size, lock):
+    """size bytes of file at offset, without moving a position other threads use."""
+    if hasattr(os, 'pread'):
+        return os.pread(file.fileno(), size, offset)
+    with lock:  # Windows
+        file.seek(offset)
+        return file.read(size)
+
+
+def map_table(path, dtype):
+    if os.path.getsize(path) == 0:  # Empty files cannot be memory-mapped
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r').view(np.ndarray)
+
+
+class LazyRecordArray(Sequence):
+    """Read-only list of the records of a converted JSON array, read from disk on access."""
+
+    def __init__(self, directory, cache_rows=4096):
+        """
+        Args:
+            directory: Directory written by convert_to_lazy_records()
+            cache_rows: Number of most recently used records kept in memory
+        """
+        with open(os.path.join(directory, META_FILENAME), 'r') as f:
+            meta = json.load(f)
+        if meta.get('version') != FORMAT_VERSION or meta.get('kind') != 'lazy_records':
+            raise ValueError(f"{directory} is not a lazy records conversion of version {FORMAT_VERSION}")
+        self.directory = directory
+        self.cache_rows = cache_rows
+        self.fields = meta['fields']
+        self.row_dtype = make_row_dtype(meta['row_fields'])
+        self.string_fields = [field for field in self.fields if field not in self.row_dtype.names]
+        self._length = meta['count']
+
+        self._rows_file = open(os.path.join(directory, 'rows.bin'), 'rb')
+        self._strings_file = open(os.path.join(directory, 'strings.bin'), 'rb')
+        self.offsets = map_table(os.path.join(directory, 'offsets.bin'), '<i8')
+        self.name_hashes = map_table(os.path.join(directory, 'name_hashes.bin'), '<u8')
+        self.name_order = map_table(os.path.join(directory, 'name_order.bin'), '<i8')
+
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._length)
+            if step == 1:
+                return self._records(start, stop)
+            return [self._record(i) for i in range(start, stop, step)]
+        index = operator.index(index)
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError('record index out of range')
+        return self._record(index)
+
+    def _record(self, index):
+        with self._lock:
+            record = self._cache.get(index)
+            if record is not None:
+                self._cache.move_to_end(index)
+                self.stats['hits'] += 1
+                return record
+        return self._records(index, index + 1)[0]
+
+    def _records(self, start, stop):
+        """Records start to stop, read with one read of their rows and one of their strings."""
+        if start >= stop:
+            return []
+        itemsize = self.row_dtype.itemsize
+        rows = np.frombuffer(read_at(self._rows_file, start * itemsize, (stop - start) * itemsize, self._lock),
+                             dtype=self.row_dtype)
+        num_strings = len(self.string_fields)
+        string_offsets = np.asarray(self.offsets[start * num_strings:stop * num_strings + 1])
+        strings = read_at(self._strings_file, int(string_offsets[0]), int(string_offsets[-1] - string_offsets[0]),
+                          self._lock)
+        string_offsets = (string_offsets - string_offsets[0]).tolist()
+
+        records = []
+        for i, row in enumerate(rows):
+            record = {}
+            string_position = i * num_strings
+            for field in self.fields:
+                if field in self.row_dtype.names:
+                    value = row[field]
+                    record[field] = value if value.ndim else value.item()
+                else:
+                    record[field] = strings[string_offsets[string_position]:
+                                            string_offsets[string_position + 1]].decode('utf-8')
+                    string_position += 1
+            records.append(record)
+
+        with self._lock:
+            self.stats['misses'] += len(records)
+            for index, record in zip(range(start, stop), records):
+                self._cache[index] = record
+                self._cache.move_to_end(index)
+            while len(self._cache) > self.cache_rows:
+                self._cache.popitem(last=False)
+        return records
+
+    def index_of(self, image_name):
+        """Index of the first record of the image. Raises ValueError if there is none."""
+        key = hash_name(image_name.encode('utf-8'))
+        position = int(np.searchsorted(self.name_hashes, key))
+        while position < len(self.name_hashes) and int(self.name_hashes[position]) == key:
+            index = int(self.name_order[position])
+            if self[index]['image_name'] == image_name:
+                return index
+            position += 1
+        raise ValueError(f"{image_name} not found")
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats, cached_rows=len(self._cache), cache_rows=self.cache_rows, records=self._length)
+
+    def close(self):
+        self._rows_file.close()
+        self._strings_file.close()
+
+
+def load_lazy_records(file_path, arrays_directory, cache_rows=4096):
+    """
+    The JSON array of records at file_path as LazyRecordArray, converting it first if arrays_directory has no
+    conversion of its current version.
+    """
+    directory = get_conversion_directory(file_path, arrays_directory, convert_to_lazy_records, tag='lazy')
+    return LazyRecordArray(directory, cache_rows=cache_rows)
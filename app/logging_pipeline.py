@@ -0,0 +1,215 @@
+"""
+Non-blocking logging for the app.
+
+Records are put on a bounded in-memory queue by a QueueHandler and written by a QueueListener thread to a
+size-rotated log file (and the console), so request threads never wait for disk or terminal I/O. When the
+queue is full, records are dropped and counted instead of blocking the request.
+
+Debug records are rate limited per logger and message template (per event for debug events), and can be
+sampled, so enabling debug logging on a busy server cannot flood the log. Per-request data dumps are structured
+debug events (debug_event()) on the 'app.events' logger, which is silent unless LOG_DEBUG_EVENTS is set. Their
+fields are serialized to JSON by the listener thread, not by the request thread that logs them.
+"""
+
+import sys
+import json
+import time
+import queue
+import random
+import atexit
+import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, WatchedFileHandler
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+EVENTS_LOGGER_NAME = 'app.events'
+
+events_logger = logging.getLogger(EVENTS_LOGGER_NAME)
+
+_active_pipeline = None
+_active_pipeline_lock = threading.Lock()
+
+
+class DebugRateLimitFilter(logging.Filter):
+    """
+    Lets through at most `max_per_interval` debug records per logger and message template (per event name for
+    debug events, which all share one template) every `interval` seconds, each with probability `sample_rate`.
+    Records above DEBUG always pass.
+    """
+
+    def __init__(self, max_per_interval=20, interval=10.0, sample_rate=1.0):
+        super().__init__()
+        self.max_per_interval = max_per_interval
+        self.interval = interval
+        self.sample_rate = sample_rate
+        self._lock = threading.Lock()
+        self._windows = {}  # (logger name, message template or event) -> [window start, records let through]
+        self.suppressed = 0
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG:
+            return True
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            with self._lock:
+                self.suppressed += 1
+            return False
+
+        event = getattr(record, 'event', None)
+        if event is not None:
+            key = (record.name, event)
+        else:
+            key = (record.name, record.msg if isinstance(record.msg, str) else type(record.msg).__name__)
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                if len(self._windows) > 10000:
+                    self._windows.clear()
+                window = self._windows[key] = [now, 0]
+            if window[1] >= self.max_per_interval:
+                self.suppressed += 1
+                return False
+            window[1] += 1
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler that drops records (and counts them) instead of blocking when the queue is full."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.enqueued = 0
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+            self.enqueued += 1
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record):
+        # QueueHandler formats every record on the calling thread. Debug events are queued as they are, so
+        # their JSON fields are serialized by the listener thread when the file and console handlers format them
+        if getattr(record, 'event', None) is not None:
+            return record
+        return super().prepare(record)
+
+
+class LoggingPipeline:
+    def __init__(self, handlers, queue_size=10000, rate_limit_filter=None):
+        """
+        Args:
+            handlers: Handlers the listener thread writes to (file, console)
+            queue_size: Maximum number of records waiting to be written
+            rate_limit_filter: Optional DebugRateLimitFilter applied before records are queued
+        """
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.handler = NonBlockingQueueHandler(self.queue)
+        self.rate_limit_filter = rate_limit_filter
+        if rate_limit_filter is not None:
+            self.handler.addFilter(rate_limit_filter)
+        self.handlers = handlers
+        self.listener = QueueListener(self.queue, *handlers, respect_handler_level=True)
+
+    def start(self):
+        self.listener.start()
+
+    def stop(self):
+        """Write the remaining queued records and stop the listener thread."""
+        if self.listener._thread is not None:
+            self.listener.stop()
+        for handler in self.handlers:
+            handler.close()
+
+    def get_stats(self):
+        return {
+            'queued': self.queue.qsize(),
+            'queue_size': self.queue.maxsize,
+            'enqueued': self.handler.enqueued,
+            'dropped': self.handler.dropped,
+            'debug_suppressed': self.rate_limit_filter.suppressed if self.rate_limit_filter is not None else 0
+        }
+
+
+def setup_logging_pipeline(app):
+    """
+    Route the logs of the app (app.logger and every module logger under 'app') through a LoggingPipeline,
+    replacing the pipeline of a previously created app.
+    """
+    global _active_pipeline
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = []
+
+    if app.config.get('WORKER_PROCESSES', 1) > 1:
+        # Processes rotating the same file would truncate and lose each other's records: all of them append, and
+        # the file is rotated externally (logrotate), after which each process reopens it
+        file_handler = WatchedFileHandler(app.config.get('LOG_FILE', 'app.log'), delay=True)
+    else:
+        file_handler = RotatingFileHandler(app.config.get('LOG_FILE', 'app.log'),
+                                           maxBytes=app.config.get('LOG_MAX_BYTES', 10 * 1024 * 1024),
+                                           backupCount=app.config.get('LOG_BACKUP_COUNT', 5),
+                                           delay=True)
+    file_handler.setFormatter(formatter)
+    handlers.append(file_handler)
+
+    if app.config.get('LOG_TO_CONSOLE', True):
+        console_handler = logging.StreamHandler(sys.stderr)
+        console_handler.setFormatter(formatter)
+        handlers.append(console_handler)
+
+    rate_limit_filter = DebugRateLimitFilter(max_per_interval=app.config.get('LOG_DEBUG_RATE_LIMIT', 20),
+                                             interval=app.config.get('LOG_DEBUG_RATE_INTERVAL_SECONDS', 10.0),
+                                             sample_rate=app.config.get('LOG_DEBUG_SAMPLE_RATE', 1.0))
+    pipeline = LoggingPipeline(handlers, queue_size=app.config.get('LOG_QUEUE_SIZE', 10000),
+                               rate_limit_filter=rate_limit_filter)
+
+    # app.logger is named after the app's import name, so it and the module loggers all propagate to 'app'
+    package_logger = logging.getLogger('app')
+    with _active_pipeline_lock:
+        if _active_pipeline is not None:
+            package_logger.removeHandler(_active_pipeline.handler)
+            _active_pipeline.stop()
+        package_logger.addHandler(pipeline.handler)
+        package_logger.setLevel(app.config.get('LOG_LEVEL', 'INFO'))
+        _active_pipeline = pipeline
+
+    # Flask's synchronous stderr handler would write every record a second time
+    from flask.logging import default_handler
+    app.logger.removeHandler(default_handler)
+    app.logger.setLevel(logging.NOTSET)
+
+    events_logger.setLevel(logging.DEBUG if app.config.get('LOG_DEBUG_EVENTS', False) else logging.WARNING)
+    for logger_name, level in app.config.get('LOG_LEVELS', {}).items():
+        logging.getLogger(logger_name).setLevel(level)
+
+    pipeline.start()
+    atexit.register(pipeline.stop)
+    app.logging_pipeline = pipeline
+    return pipeline
+
+
+def debug_event(event, **fields):
+    """
+    Log a structured debug event (JSON fields) on the 'app.events' logger. Costs a single level check
+    unless debug events are enabled. The fields are serialized later, on the listener thread, so they must
+    not be changed after the call.
+    """
+    if not events_logger.isEnabledFor(logging.DEBUG):
+        return
+    events_logger.debug('%s %s', event, _JsonFields(fields), extra={'event': event, 'fields': fields})
+
+
+class _JsonFields:
+    """Fields of a debug event, serialized only when the record is formatted (once for all handlers)."""
+    __slots__ = ('fields', '_json')
+
+    def __init__(self, fields):
+        self.fields = fields
+        self._json = None
+
+    def __str__(self):
+        if self._json is None:
+            self._json = json.dumps(self.fields, default=str, sort_keys=True)
+        return self._json
@@ -0,0 +1,298 @@
+"""
+Memory accounting of the app's caches and the startup memory budget.
+
+get_memory_report() measures the deep size of every in-process cache (user_cache, bbox_openclip_data, the time
+tracker, the label maps, ...) and of every user's share of them. Objects reachable from several caches or users
+are counted once in the unique totals, so the difference to the summed sizes shows what is duplicated per user.
+
+StartupMemoryProfile records the resident set size after each stage of create_app() and, optionally, the top
+allocating source lines of each stage with tracemalloc. check_memory_budget() warns or fails the startup when
+the process uses more than MEMORY_BUDGET_MB.
+"""
+
+import os
+import sys
+import time
+import types
+import logging
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Objects not followed when measuring deep sizes: code, classes and modules are shared by the whole process
+_NOT_FOLLOWED = (type, types.ModuleType, types.FunctionType, types.MethodType, types.BuiltinFunctionType,
+                 types.CodeType, types.FrameType)
+
+# Allocations of tracemalloc itself and of the import machinery are left out of the startup stages
+_TRACEMALLOC_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>')
+)
+
+
+class MemoryBudgetExceeded(Exception):
+    pass
+
+
+def deep_sizeof(obj, seen=None):
+    """
+    Bytes of obj and everything reachable from it through containers, instance attributes and slots. Objects in
+    `seen` (a set of ids, updated in place) are not counted, so one set can be shared by several calls to count
+    shared objects once.
+    """
+    from flask import Flask
+
+    if seen is None:
+        seen = set()
+    size = 0
+    stack = [obj]
+    while stack:
+        current = stack.pop()
+        if id(current) in seen or isinstance(current, (_NOT_FOLLOWED, Flask)):
+            continue
+        seen.add(id(current))
+        size += sys.getsizeof(current)
+
+        if isinstance(current, (str, bytes, bytearray, int, float, bool)) or current is None:
+            continue
+        if isinstance(current, np.ndarray):
+            # getsizeof includes the data of arrays that own it; views keep their base alive
+            if current.base is not None:
+                stack.append(current.base)
+            continue
+        if isinstance(current, dict):
+            for key, value in list(current.items()):
+                stack.append(key)
+                stack.append(value)
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            stack.extend(list(current))
+        if hasattr(current, '__dict__'):
+            stack.append(vars(current))
+        for slot in getattr(type(current), '__slots__', ()):
+            if isinstance(slot, str) and hasattr(current, slot):
+                stack.append(getattr(current, slot))
+    return size
+
+
+def get_rss_bytes():
+    """Resident set size of the process, or None where it cannot be determined."""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    if resource is not None:
+        # Peak rather than current RSS; kilobytes on Linux, bytes on macOS
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return max_rss if sys.platform == 'darwin' else max_rss * 1024
+    return None
+
+
+def get_app_caches(app):
+    """The caches held by the app, by name."""
+    from .app_utils import get_label_indices_to_label_names_dicts
+    from . import time_tracker_utils
+
+    return {
+        'user_cache': app.user_cache,
+        'bbox_openclip_data': getattr(app, 'bbox_openclip_data', {}),
+        'current_image_index_dct': app.current_image_index_dct,
+        'time_tracker': time_tracker_utils._time_tracker,
+        # Read from disk on every call; measured to show what each lookup allocates
+        'label_maps': get_label_indices_to_label_names_dicts(app),
+        'class_hierarchy': (getattr(app, 'parent_to_children', None), getattr(app, 'index_to_parent', None),
+                            getattr(app, 'ordered_class_list', None)),
+        'class_names_payload': getattr(app, 'class_names_payload', None),
+        'page_cache': getattr(app, 'page_cache', None),
+        'page_warmer': getattr(app, 'page_warmer', None),
+        'metrics': getattr(app, 'metrics', None)
+    }
+
+
+def get_memory_report(app, per_user=True):
+    """
+    Deep sizes of the app's caches.
+
+    Returns:
+        dict with 'rss_bytes', 'caches' (per cache its 'bytes' on its own and 'unique_bytes' not already
+        counted for a cache listed before it), 'caches_unique_bytes' and, with per_user, 'users': per user the
+        bytes of each of their user_cache entries and of their bbox_openclip_data, their 'total_bytes', and
+        'duplicated_bytes', the part of the summed user sizes held in per-user copies of equal data
+    """
+    start = time.perf_counter()
+    caches = get_app_caches(app)
+    shared_seen = set()
+    cache_sizes = {}
+    for name, cache in caches.items():
+        cache_sizes[name] = {
+            'bytes': deep_sizeof(cache),
+            'unique_bytes': deep_sizeof(cache, shared_seen)
+        }
+
+    report = {
+        'rss_bytes': get_rss_bytes(),
+        'caches': cache_sizes,
+        'caches_unique_bytes': sum(size['unique_bytes'] for size in cache_sizes.values())
+    }
+
+    if per_user:
+        users = {}
+        user_values = []  # (data name, value, bytes) of every user, to find per-user copies
+        for username in sorted(set(app.user_cache) | set(caches['bbox_openclip_data'])):
+            user_data = dict(app.user_cache.get(username) or {})
+            if username in caches['bbox_openclip_data']:
+                user_data['bbox_openclip_data'] = caches['bbox_openclip_data'][username]
+            sizes = {}
+            for key, value in user_data.items():
+                name = key if key == 'bbox_openclip_data' else f"user_cache.{key}"
+                sizes[name] = deep_sizeof(value)
+                user_values.append((name, value, sizes[name]))
+            sizes['total_bytes'] = sum(sizes.values())
+            users[username] = sizes
+        report['users'] = users
+        report['users_summed_bytes'] = sum(sizes['total_bytes'] for sizes in users.values())
+        report['duplicated_bytes'] = get_duplicated_bytes(user_values)
+
+    report['measure_seconds'] = time.perf_counter() - start
+    return report
+
+
+def get_duplicated_bytes(user_values):
+    """
+    Bytes of the (name, value, bytes) entries that are equal to, but not the same object as, an earlier entry
+    of the same name.
+    """
+    distinct = {}  # name -> distinct values seen so far
+    duplicated = 0
+    for name, value, size in user_values:
+        values = distinct.setdefault(name, [])
+        if any(value is other for other in values):
+            continue
+        if any(values_equal(value, other) for other in values):
+            duplicated += size
+            continue
+        values.append(value)
+    return duplicated
+
+
+def values_equal(a, b):
+    try:
+        return bool(a == b)
+    except (ValueError, TypeError):  # Containers holding NumPy arrays
+        return False
+
+
+class StartupMemoryProfile:
+    def __init__(self, trace_allocations=False, top_allocators=10, frames=1):
+        """
+        Args:
+            trace_allocations: Record the top allocators of every stage with tracemalloc (slows startup down)
+            top_allocators: Number of source lines reported per stage
+            frames: Stack frames stored per allocation by tracemalloc
+        """
+        self.trace_allocations = trace_allocations
+        self.top_allocators = top_allocators
+        self.frames = frames
+        self._started_tracing = False
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self.stages = []
+
+    def start(self):
+        if self.trace_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._started_tracing = True
+        if self.trace_allocations:
+            self._snapshot = tracemalloc.take_snapshot().filter_traces(_TRACEMALLOC_FILTERS)
+
+    def stop(self):
+        """Stop tracing (if this profile started it) once startup is done."""
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        self._snapshot = None
+
+    @contextmanager
+    def stage(self, name):
+        rss_before = get_rss_bytes()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            entry = {
+                'stage': name,
+                'seconds': time.perf_counter() - start,
+                'rss_bytes': get_rss_bytes()
+            }
+            if rss_before is not None and entry['rss_bytes'] is not None:
+                entry['rss_delta_bytes'] = entry['rss_bytes'] - rss_before
+            if self._snapshot is not None:
+                snapshot = tracemalloc.take_snapshot().filter_traces(_TRACEMALLOC_FILTERS)
+                differences = snapshot.compare_to(self._snapshot, 'lineno')
+                entry['top_allocators'] = [{
+                    'location': f"{difference.traceback[0].filename}:{difference.traceback[0].lineno}",
+                    'size_delta_bytes': difference.size_diff,
+                    'count_delta': difference.count_diff
+                } for difference in differences[:self.top_allocators]]
+                self._snapshot = snapshot
+            with self._lock:
+                self.stages.append(entry)
+            logger.info(f"Startup stage {name}: {entry['seconds']:.2f} s, RSS "
+                        f"{format_bytes(entry['rss_bytes'])} ({format_bytes(entry.get('rss_delta_bytes'))} added)")
+
+    def get_stats(self):
+        with self._lock:
+            return {'trace_allocations': self.trace_allocations, 'stages': list(self.stages)}
+
+
+def check_memory_budget(app):
+    """
+    Compare the resident set size after startup with MEMORY_BUDGET_MB. Logs a warning when it is exceeded, or
+    raises MemoryBudgetExceeded when MEMORY_BUDGET_ACTION is 'fail'.
+    """
+    budget_mb = app.config.get('MEMORY_BUDGET_MB')
+    if budget_mb is None:
+        return
+    rss = get_rss_bytes()
+    if rss is None:
+        app.logger.warning("Memory budget not checked: the resident set size is not available on this platform")
+        return
+    if rss <= budget_mb * 1024 * 1024:
+        app.logger.info(f"Memory after startup: {format_bytes(rss)} of the {budget_mb} MB budget")
+        return
+
+    message = (f"Memory after startup ({format_bytes(rss)}) exceeds the budget of {budget_mb} MB with "
+               f"{len(app.user_cache)} users loaded. See /debug/memory (with MEMORY_DEBUG_ENDPOINT_ENABLED) for "
+               f"the size of each cache.")
+    if app.config.get('MEMORY_BUDGET_ACTION', 'warn') == 'fail':
+        raise MemoryBudgetExceeded(message)
+    app.logger.warning(message)
+
+
+def format_bytes(num_bytes):
+    if num_bytes is None:
+        return 'n/a'
+    sign = '-' if num_bytes < 0 else ''
+    num_bytes = abs(num_bytes)
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if num_bytes < 1024 or unit == 'GB':
+            return f"{sign}{num_bytes:.1f} {unit}" if unit != 'B' else f"{sign}{num_bytes} B"
+        num_bytes /= 1024
@@ -0,0 +1,204 @@
+"""
+In-memory navigation state (the image index of every user in every mode) persisted by a background writer.
+
+Navigation only updates memory. Changed indices are written to the annotation store in one batch once no index
+changed for the debounce window, or at the latest max_delay_seconds after the first unsaved change, which bounds
+how much navigation a crash can lose. With the JSON backend the batch is one atomic rewrite of
+navigation_state.json, holding all users and modes; with SQLite it is one transaction. Pending changes are
+flushed on shutdown.
+
+With several worker processes (shared=True), a user's requests may reach any of them, so indices are not kept in
+memory: every read goes to the store and every change is written at once.
+"""
+
+import time
+import logging
+import threading
+from collections.abc import MutableMapping
+
+
+class NavigationState:
+    def __init__(self, store, debounce_seconds=1.0, max_delay_seconds=5.0, shared=False, logger=None):
+        """
+        Args:
+            store: AnnotationStore the indices are loaded from and written to
+            debounce_seconds: Quiet period after the last change before writing
+            max_delay_seconds: Upper bound on how long a change stays unwritten. None or 0 writes every change
+                immediately (no background thread)
+            shared: Other processes change the indices too: read them from the store every time, write at once
+        """
+        self.store = store
+        self.debounce_seconds = debounce_seconds
+        self.max_delay_seconds = max_delay_seconds
+        self.shared = shared
+        self.write_through = shared or not max_delay_seconds
+        self.logger = logger or logging.getLogger(__name__)
+
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()  # Batches are written one at a time, in order
+        self._indices = {}  # (username, mode) -> index, None if the store has none
+        self._dirty = {}  # (username, mode) -> index not written yet
+        self._first_change = None
+        self._last_change = None
+        self._stopped = False
+        self._thread = None
+
+        self.stats = {
+            'changes': 0,
+            'unchanged': 0,
+            'flushes': 0,
+            'entries_written': 0,
+            'flush_errors': 0,
+            'last_flush_seconds': None,
+            'last_error': None
+        }
+
+    def start(self):
+        if self.write_through:
+            return
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, name='navigation-state', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=5.0):
+        """Stop the writer and flush the pending changes."""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+        self.flush()
+
+    def get(self, username, mode=None):
+        """Current index of the user in the mode, None if none was ever stored."""
+        key = (username, mode)
+        if self.shared:
+            return self.store.get_current_index(username, mode)
+        with self._cond:
+            if key in self._indices:
+                return self._indices[key]
+        index = self.store.get_current_index(username, mode)
+        with self._cond:
+            return self._indices.setdefault(key, index)
+
+    def set(self, username, index, mode=None):
+        key = (username, mode)
+        index = int(index)
+        with self._cond:
+            if key in self._indices and self._indices[key] == index and not self.shared:
+                self.stats['unchanged'] += 1
+                return
+            if not self.shared:
+                self._indices[key] = index
+            self.stats['changes'] += 1
+            self._dirty[key] = index
+            if not self.write_through:
+                now = time.monotonic()
+                if self._first_change is None:
+                    self._first_change = now
+                self._last_change = now
+                self._cond.notify_all()
+                return
+        self.flush()
+
+    def forget(self, username):
+        """Drop the user's indices from memory (after their files were replaced), writing pending ones first."""
+        self.flush()
+        with self._cond:
+            for key in [key for key in self._indices if key[0] == username]:
+                del self._indices[key]
+
+    def flush(self):
+        """Write all pending changes now."""
+        with self._flush_lock:
+            self._flush()
+
+    def _flush(self):
+        with self._cond:
+            batch, self._dirty = self._dirty, {}
+            self._first_change = self._last_change = None
+        if not batch:
+            return
+        start = time.perf_counter()
+        try:
+            self.store.set_current_indices(batch)
+        except Exception as e:
+            self.logger.error(f"Writing the navigation state failed, retrying: {e}")
+            with self._cond:
+                # Keep newer changes made while writing
+                for key, index in batch.items():
+                    self._dirty.setdefault(key, index)
+                now = time.monotonic()
+                self._first_change = self._last_change = now
+                self.stats['flush_errors'] += 1
+                self.stats['last_error'] = str(e)
+            return
+        with self._cond:
+            self.stats['flushes'] += 1
+            self.stats['entries_written'] += len(batch)
+            self.stats['last_flush_seconds'] = time.perf_counter() - start
+
+    def get_stats(self):
+        with self._cond:
+            stats = dict(self.stats)
+            stats['pending'] = len(self._dirty)
+            stats['write_through'] = self.write_through
+            stats['shared'] = self.shared
+            stats['debounce_seconds'] = self.debounce_seconds
+            stats['max_delay_seconds'] = self.max_delay_seconds
+            return stats
+
+    def _due_time(self):
+        return min(self._last_change + self.debounce_seconds, self._first_change + self.max_delay_seconds)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopped:
+                    if self._dirty:
+                        wait = self._due_time() - time.monotonic()
+                        if wait <= 0:
+                            break
+                    else:
+                        wait = None
+                    self._cond.wait(timeout=wait)
+                if self._stopped:
+                    return
+            self.flush()
+
+
+class NavigationIndexDict(MutableMapping):
+    """
+    app.current_image_index_dct: the grid index of every user, read from and assigned to the navigation state.
+    Iterates over the users whose index was read or assigned in this process.
+    """
+
+    def __init__(self, navigation_state):
+        self.navigation_state = navigation_state
+        self._usernames = set()
+
+    def __getitem__(self, username):
+        index = self.navigation_state.get(username)
+        if index is None:
+            raise KeyError(username)
+        self._usernames.add(username)
+        return index
+
+    def __setitem__(self, username, index):
+        self.navigation_state.set(username, index)
+        self._usernames.add(username)
+
+    def __delitem__(self, username):
+        raise TypeError("Navigation indices cannot be deleted")
+
+    def __iter__(self):
+        return iter(sorted(self._usernames))
+
+    def __len__(self):
+        return len(self._usernames)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
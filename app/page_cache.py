@@ -0,0 +1,107 @@
+"""
+Cache of rendered HTML pages with strong ETags.
+
+Entries are keyed by the page identity together with the revisions of the data it was rendered from,
+so a changed annotation file or ground truth file never serves an outdated page. Saving a user's
+annotations drops that user's entries right away; the least recently used pages are evicted once the
+cached bodies exceed the byte budget.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class RenderedPageCache:
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        """
+        Args:
+            max_bytes: Upper bound on the total size of the cached page bodies
+        """
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (body bytes, etag)
+        self._size = 0
+        self._revisions = {}  # username -> int, bumped on every invalidate()
+
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'stores': 0,
+            'evictions': 0,
+            'invalidations': 0,
+            'not_modified': 0
+        }
+
+    def get_revision(self, username):
+        """In-process annotation revision of a user, part of the cache keys of the user's pages."""
+        with self._lock:
+            return self._revisions.get(username, 0)
+
+    def get(self, key):
+        """Return (body, etag) of a cached page, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return entry
+
+    def put(self, key, body, revision):
+        """
+        Cache a rendered page and return its (body, etag). Pages larger than the budget are not stored.
+
+        Args:
+            key: Tuple starting with the username, followed by the view, the page index and the data revisions
+            body: The rendered page as str or bytes
+            revision: get_revision(username) from before the page was rendered
+        """
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        etag = make_etag(body)
+        if len(body) > self.max_bytes:
+            return body, etag
+
+        with self._lock:
+            # A save may have happened while this page was rendered from the old data
+            if revision != self._revisions.get(key[0], 0):
+                return body, etag
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old[0])
+            self._entries[key] = (body, etag)
+            self._size += len(body)
+            self.stats['stores'] += 1
+            while self._size > self.max_bytes:
+                _, (evicted_body, _) = self._entries.popitem(last=False)
+                self._size -= len(evicted_body)
+                self.stats['evictions'] += 1
+        return body, etag
+
+    def invalidate(self, username):
+        """Drop all pages of a user, called whenever the user's annotations change."""
+        with self._lock:
+            self._revisions[username] = self._revisions.get(username, 0) + 1
+            for key in [key for key in self._entries if key[0] == username]:
+                body, _ = self._entries.pop(key)
+                self._size -= len(body)
+                self.stats['invalidations'] += 1
+
+    def record_not_modified(self):
+        with self._lock:
+            self.stats['not_modified'] += 1
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['entries'] = len(self._entries)
+            stats['bytes'] = self._size
+            stats['max_bytes'] = self.max_bytes
+        return stats
+
+
+def make_etag(body):
+    """Strong ETag value (without quotes) derived from the page content."""
+    return hashlib.sha256(body).hexdigest()[:32]
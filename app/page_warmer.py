@@ -0,0 +1,165 @@
+"""
+Predictive warming of the images an annotator is likely to open next.
+
+After a labeling page is rendered, the page context of the following images (top-k classes, example
+picks, image paths) is computed on a small background pool and kept in a bounded LRU cache until the
+image is opened, and their image files are read once so the next request finds them in the OS page cache instead of going to a
+slow or network-mounted dataset drive.
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+READ_CHUNK_SIZE = 1024 * 1024
+
+
+class PageWarmer:
+    def __init__(self, compute_func, files_func=None, lookahead=3, max_entries=64, max_workers=2, logger=None):
+        """
+        Args:
+            compute_func: Callable (username, image_index) -> page context. Must not depend on the
+                          user's annotations, warmed contexts are used until invalidated.
+                          Raising IndexError marks an index past the end of the user's images.
+            files_func: Callable (context) -> list of file paths to read into the OS page cache
+            lookahead: Number of following images warmed after each render
+            max_entries: Maximum number of cached contexts (least recently used are evicted)
+            max_workers: Number of background warming threads
+        """
+        self.compute_func = compute_func
+        self.files_func = files_func
+        self.lookahead = lookahead
+        self.max_entries = max_entries
+        self.logger = logger or logging.getLogger(__name__)
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='page-warmer')
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()  # (username, image_index) -> Future of the context
+        self._windows = {}  # username -> (first, last) image index of the latest schedule(), older warming is dropped
+
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'warmed': 0,
+            'warm_failures': 0,
+            'stale_skipped': 0,
+            'evictions': 0,
+            'files_read': 0,
+            'bytes_read': 0
+        }
+
+    def get(self, username, image_index):
+        """
+        Return the context of an image, from the cache when it was warmed (waiting for a warming that
+        is still running) and computed in the calling thread otherwise.
+
+        A warmed context is used for one visit and then dropped, and contexts computed here are not kept:
+        the example images are picked at random, so every visit of an image gets its own picks.
+        """
+        key = (username, image_index)
+        with self._lock:
+            future = self._cache.pop(key, None)
+
+        if future is not None:
+            try:
+                context = future.result()
+            except Exception:
+                context = None
+            if context is not None:
+                with self._lock:
+                    self.stats['hits'] += 1
+                return context
+            # Failed or skipped warmings, compute it below
+
+        context = self.compute_func(username, image_index)
+        with self._lock:
+            self.stats['misses'] += 1
+        return context
+
+    def schedule(self, username, image_index):
+        """Warm the `lookahead` images following image_index in the background."""
+        first, last = image_index + 1, image_index + self.lookahead
+        with self._lock:
+            self._windows[username] = (first, last)
+
+            for next_index in range(first, last + 1):
+                key = (username, next_index)
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    continue
+                self._store(key, self._executor.submit(self._warm, username, next_index))
+
+    def invalidate(self, username=None):
+        """Drop the cached contexts of one user, or of all users."""
+        with self._lock:
+            for key in list(self._cache):
+                if username is None or key[0] == username:
+                    del self._cache[key]
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['entries'] = len(self._cache)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+    def shutdown(self, wait=False):
+        self._executor.shutdown(wait=wait)
+
+    def _store(self, key, future):
+        """Insert a cache entry and evict the least recently used ones. Caller holds the lock."""
+        self._cache[key] = future
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def _warm(self, username, image_index):
+        key = (username, image_index)
+        # The annotator has jumped elsewhere since this was queued; compute it on demand if ever needed
+        with self._lock:
+            first, last = self._windows.get(username, (image_index, image_index))
+            if not first <= image_index <= last:
+                self.stats['stale_skipped'] += 1
+                self._cache.pop(key, None)
+                return None
+
+        try:
+            context = self.compute_func(username, image_index)
+        except IndexError:
+            # Past the last image of the user, nothing to warm
+            with self._lock:
+                self._cache.pop(key, None)
+            return None
+        except Exception as e:
+            self.logger.warning(f"Warming image {image_index} for {username} failed: {e}")
+            with self._lock:
+                self.stats['warm_failures'] += 1
+            raise
+
+        if self.files_func is not None:
+            for path in self.files_func(context):
+                self._read_file(path)
+
+        with self._lock:
+            self.stats['warmed'] += 1
+        return context
+
+    def _read_file(self, path):
+        """Read a file once and discard the data, leaving it in the OS page cache."""
+        bytes_read = 0
+        try:
+            with open(path, 'rb') as f:
+                while True:
+                    chunk = f.read(READ_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    bytes_read += len(chunk)
+        except OSError as e:
+            self.logger.debug(f"Could not prime page cache with {path}: {e}")
+            return
+        with self._lock:
+            self.stats['files_read'] += 1
+            self.stats['bytes_read'] += bytes_read
@@ -0,0 +1,214 @@
+"""
+On-demand profiling of single requests.
+
+With PROFILING_ENABLED set, a request carrying the X-Profile header or the `profile` query parameter is
+profiled: `cprofile` (the default) runs it under cProfile and writes a pstats file, `sample` runs a
+sampling profiler and writes collapsed stacks (for flamegraph.pl or speedscope). With
+PROFILING_SLOW_REQUEST_SECONDS set, every request is sampled and the stacks of those slower than the
+threshold are written automatically.
+
+Files are written to PROFILING_DIR, named after the time, route, user and duration of the request; only
+the newest PROFILING_MAX_FILES are kept.
+"""
+
+import os
+import re
+import sys
+import time
+import cProfile
+import itertools
+import logging
+import threading
+from collections import Counter
+
+from flask import g, request
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_QUERY_PARAMETER = 'profile'
+_UNSAFE_FILENAME_CHARS = re.compile(r'[^A-Za-z0-9_.-]+')
+
+
+class StackSampler:
+    """
+    Samples the stacks of registered threads every `interval` seconds from a background thread.
+    Threads only pay for registering; the sampler sleeps while no thread is registered.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._samples = {}  # thread id -> Counter of collapsed stacks
+        self._active = threading.Event()
+        self._thread = None
+
+    def start_sampling(self, thread_id):
+        with self._lock:
+            self._samples[thread_id] = Counter()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+                self._thread.start()
+            self._active.set()
+
+    def stop_sampling(self, thread_id):
+        """Stop sampling a thread and return its Counter of collapsed stacks."""
+        with self._lock:
+            samples = self._samples.pop(thread_id, Counter())
+            if not self._samples:
+                self._active.clear()
+        return samples
+
+    def _run(self):
+        own_thread_id = threading.get_ident()
+        while True:
+            self._active.wait()
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, samples in self._samples.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None and thread_id != own_thread_id:
+                        samples[collapse_stack(frame)] += 1
+
+
+class RequestProfiler:
+    def __init__(self, profiles_dir, max_files=50, slow_request_seconds=None, sample_interval=0.005,
+                 logger=None):
+        """
+        Args:
+            profiles_dir: Directory the profiles are written to (created on first use)
+            max_files: Number of newest profile files kept, older ones are deleted
+            slow_request_seconds: Sample every request and keep the profiles of slower ones; None disables it
+            sample_interval: Seconds between two stack samples of the sampling profiler
+        """
+        self.profiles_dir = profiles_dir
+        self.max_files = max_files
+        self.slow_request_seconds = slow_request_seconds
+        self.sampler = StackSampler(interval=sample_interval)
+        self.logger = logger or logging.getLogger(__name__)
+
+        self._lock = threading.Lock()
+        self._sequence = itertools.count(1)  # keeps the names of profiles written in the same second apart
+        self.stats = {
+            'requested': 0,
+            'slow_captured': 0,
+            'written': 0,
+            'deleted': 0
+        }
+
+    def init_app(self, app):
+        app.profiler = self
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats['profiles'] = self.list_profiles()
+        return stats
+
+    def list_profiles(self):
+        """Profile files, newest first."""
+        if not os.path.isdir(self.profiles_dir):
+            return []
+        paths = [os.path.join(self.profiles_dir, name) for name in os.listdir(self.profiles_dir)]
+        return [os.path.basename(path) for path in sorted(paths, key=os.path.getmtime, reverse=True)]
+
+    def _start_request(self):
+        mode = request.headers.get(PROFILE_HEADER) or request.args.get(PROFILE_QUERY_PARAMETER)
+        if mode:
+            mode = 'sample' if mode.lower() == 'sample' else 'cprofile'
+        elif self.slow_request_seconds is not None:
+            mode = 'slow'
+        else:
+            return
+
+        g.profiling_mode = mode
+        g.profiling_start = time.perf_counter()
+        if mode == 'cprofile':
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError as e:
+                # Another profiler is already active in this thread
+                self.logger.warning(f"Could not profile {request.path}: {e}")
+                g.pop('profiling_mode')
+                return
+            g.profiling_profile = profile
+        else:
+            self.sampler.start_sampling(threading.get_ident())
+
+    def _finish_request(self, response):
+        mode = g.pop('profiling_mode', None)
+        if mode is None:
+            return response
+        duration = time.perf_counter() - g.pop('profiling_start')
+
+        if mode == 'cprofile':
+            profile = g.pop('profiling_profile')
+            profile.disable()
+            path = self._write(duration, 'prof', profile.dump_stats)
+            with self._lock:
+                self.stats['requested'] += 1
+        else:
+            samples = self.sampler.stop_sampling(threading.get_ident())
+            if mode == 'slow' and duration < self.slow_request_seconds:
+                return response
+            path = self._write(duration, 'collapsed', lambda file_path: write_collapsed_stacks(file_path, samples))
+            with self._lock:
+                self.stats['requested' if mode == 'sample' else 'slow_captured'] += 1
+
+        if path is not None:
+            response.headers['X-Profile-File'] = os.path.basename(path)
+        return response
+
+    def _write(self, duration, extension, write_func):
+        """Write a profile with write_func(path) and apply the retention limit. Returns the path or None."""
+        route = request.url_rule.rule if request.url_rule is not None else request.path
+        username = (request.view_args or {}).get('username', '-')
+        filename = '_'.join([
+            time.strftime('%Y%m%d-%H%M%S'),
+            _UNSAFE_FILENAME_CHARS.sub('-', route).strip('-') or 'root',
+            _UNSAFE_FILENAME_CHARS.sub('-', username),
+            f"{duration * 1000:.0f}ms"
+        ]) + f"_{next(self._sequence):04d}.{extension}"
+        path = os.path.join(self.profiles_dir, filename)
+
+        try:
+            os.makedirs(self.profiles_dir, exist_ok=True)
+            write_func(path)
+        except OSError as e:
+            self.logger.warning(f"Could not write profile {path}: {e}")
+            return None
+
+        self.logger.info(f"Wrote profile of {request.method} {request.path} ({duration:.3f} s) to {path}")
+        with self._lock:
+            self.stats['written'] += 1
+            self._apply_retention()
+        return path
+
+    def _apply_retention(self):
+        """Delete the oldest profiles beyond max_files. Caller holds the lock."""
+        paths = [os.path.join(self.profiles_dir, name) for name in os.listdir(self.profiles_dir)]
+        paths.sort(key=os.path.getmtime)
+        for path in paths[:max(len(paths) - self.max_files, 0)]:
+            try:
+                os.remove(path)
+                self.stats['deleted'] += 1
+            except OSError:
+                pass
+
+
+def collapse_stack(frame):
+    """One line of the collapsed-stack format: the frames from the outermost call inwards, separated by ';'."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+def write_collapsed_stacks(path, samples):
+    with open(path, 'w') as f:
+        for stack, count in samples.most_common():
+            f.write(f"{stack} {count}\n")
@@ -0,0 +1,148 @@
+"""
+Compact top-k encoding of the proposals' softmax vectors.
+
+The pages only use the top classes of an image (label_image and refresh_examples show the 20 most probable) and its
+highest confidence (grid_image), yet every record of predictions.json stores all of its softmax values. A top-k
+record stores, instead of softmax_val:
+
+    topk_indices   the k most probable classes, most probable first (int16 in the 'arrays' and 'lazy' backends,
+                   int32 with more than 32768 classes)
+    topk_values    their probabilities (float16 in the 'arrays' and 'lazy' backends)
+    residual_mass  the probability of all other classes together, 1 - sum of the full topk_values
+    num_classes    the length of the softmax vector
+
+get_top_classes(), get_max_confidence() and get_softmax_vector() read either encoding, so the routes work on both.
+Convert predictions.json (streaming, the file is never parsed as a whole) with:
+
+    python -m app.proposals_encoding encode predictions.json predictions_topk.json [--k 20]
+    python -m app.proposals_encoding decode predictions_topk.json predictions.json
+
+Decoding cannot restore the other classes' values: the residual mass is spread evenly over them.
+"""
+
+import sys
+import json
+import argparse
+
+import numpy as np
+
+DEFAULT_TOPK = 20
+TOPK_FIELDS = ('topk_indices', 'topk_values', 'residual_mass', 'num_classes')
+
+
+def is_topk_record(record):
+    return 'topk_indices' in record
+
+
+def get_compact_dtype(field, num_classes):
+    """dtype the binary backends store a top-k field in, None for other fields."""
+    if field == 'topk_indices':
+        return np.int16 if num_classes <= np.iinfo(np.int16).max + 1 else np.int32
+    if field == 'topk_values':
+        return np.float16
+    return None
+
+
+def get_top_classes(record, k=None):
+    """
+    Indices of the k most probable classes of a proposal (all of them with k=None), most probable first. Top-k
+    records have at most their k classes.
+    """
+    if is_topk_record(record):
+        return np.asarray(record['topk_indices'][:k], dtype=np.int64)
+    return np.argsort(record['softmax_val'])[::-1][:k]
+
+
+def get_sorted_confidences(record):
+    """The proposal's probabilities in descending order (of its top-k classes for top-k records)."""
+    if is_topk_record(record):
+        return np.asarray(record['topk_values'], dtype=np.float32)
+    return np.sort(record['softmax_val'])[::-1]
+
+
+def get_max_confidence(record):
+    if is_topk_record(record):
+        return float(record['topk_values'][0]) if len(record['topk_values']) else 0.0
+    return float(np.max(record['softmax_val']))
+
+
+def get_softmax_vector(record):
+    """The full softmax vector; for top-k records with the residual mass spread evenly over the other classes."""
+    if not is_topk_record(record):
+        return np.asarray(record['softmax_val'])
+    num_classes = int(record['num_classes'])
+    num_other = num_classes - len(record['topk_indices'])
+    vector = np.full(num_classes, record['residual_mass'] / num_other if num_other else 0.0, dtype=np.float32)
+    vector[np.asarray(record['topk_indices'], dtype=np.int64)] = np.asarray(record['topk_values'], dtype=np.float32)
+    return vector
+
+
+def shortest_float16(value):
+    """value rounded to float16, written with the fewest digits that read back as the same float16."""
+    return float(np.format_float_positional(np.float16(value), unique=True, trim='0'))
+
+
+def encode_record(record, k=DEFAULT_TOPK):
+    """A top-k record of a dense one: softmax_val replaced by the top-k fields, other fields kept in order."""
+    if is_topk_record(record):
+        return record
+    softmax = np.asarray(record['softmax_val'], dtype=np.float64)
+    top = np.argsort(softmax)[::-1][:k]  # Same order and ties as the dense lookups
+    encoded = {}
+    for field, value in record.items():
+        if field != 'softmax_val':
+            encoded[field] = value
+            continue
+        encoded['topk_indices'] = top.tolist()
+        encoded['topk_values'] = [shortest_float16(value) for value in softmax[top]]
+        encoded['residual_mass'] = round(max(float(1.0 - softmax[top].sum()), 0.0), 6)
+        encoded['num_classes'] = len(softmax)
+    return encoded
+
+
+def decode_record(record):
+    """A dense record of a top-k one (see get_softmax_vector())."""
+    if not is_topk_record(record):
+        return record
+    decoded = {}
+    for field, value in record.items():
+        if field == 'topk_indices':
+            decoded['softmax_val'] = [round(float(value), 6) for value in get_softmax_vector(record)]
+        elif field not in TOPK_FIELDS:
+            decoded[field] = value
+    return decoded
+
+
+def convert_file(input_path, output_path, convert_record):
+    """Write convert_record() of every record of the JSON array in input_path to output_path; returns the count."""
+    from .lazy_proposals import iter_json_array
+
+    count = 0
+    with open(output_path, 'w', encoding='utf-8') as f:
+        f.write('[')
+        for record in iter_json_array(input_path):
+            f.write(',\n' if count else '\n')
+            f.write(json.dumps(convert_record(record), separators=(', ', ': ')))
+            count += 1
+        f.write('\n]\n')
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=('encode', 'decode'))
+    parser.add_argument('input', help='predictions.json to convert')
+    parser.add_argument('output', help='File to write')
+    parser.add_argument('--k', type=int, default=DEFAULT_TOPK, help='Classes kept per image when encoding')
+    args = parser.parse_args()
+
+    if args.command == 'encode':
+        count = convert_file(args.input, args.output, lambda record: encode_record(record, args.k))
+    else:
+        count = convert_file(args.input, args.output, decode_record)
+    print(f"{args.command}d {count} records into {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,19 +2,35 @@ import os
 import numpy as np
 import json
 import time
-import timeit
-import threading
-from flask import render_template, request, redirect, url_for, jsonify
+import logging
+import atexit
+import hashlib
+from flask import render_template, request, redirect, url_for, jsonify, make_response
 
 from .helper_funcs import get_sample_images_for_categories, copy_to_static_dir, get_image_softmax_dict, \
-    get_image_conf_dict, load_json
+    get_image_conf_dict, load_json, find_image_index
+from .proposals_encoding import get_top_classes
 from .app_utils import get_form_data, load_user_data, update_current_image_index, save_user_data, \
-    get_label_indices_to_label_names_dicts, save_json_data, update_current_image_index_simple, read_json_file
+    get_label_indices_to_label_names_dicts, update_current_image_index_simple, save_user_image, \
+    count_user_annotations, load_current_image_index, save_current_image_index, export_user_files, \
+    import_user_files, get_annotation_store, read_gt_data_file
 from class_mapping.class_loader import ClassDictionary
-from .google_drive_service import GoogleDriveService
+from .sync_backends import create_sync_backend
+from .upload_scheduler import UploadScheduler
+from .transfer_engine import TransferEngine
+from .page_warmer import PageWarmer
+from .page_cache import RenderedPageCache
+from .metrics import Metrics, stage
+from .logging_pipeline import debug_event
+from .profiling import RequestProfiler
+from .trace_recorder import TraceRecorder
+from .memory import get_memory_report
 from .time_tracker_utils import get_time_tracker, initialize_time_tracker
+from .file_lock import FileLock
 import traceback
 
+logger = logging.getLogger(__name__)
+
 
 def convert_bboxes_to_serializable(bboxes_unprocessed, threshold):
     """Convert bbox data to a serializable format for JSON."""
@@ -60,16 +76,15 @@ def convert_bboxes_to_serializable(bboxes_unprocessed, threshold):
 def get_bboxes_from_file(file_path, image_name=None):
     """Load bboxes directly from file without caching"""
     try:
-        t=time.time()
-        bbox_data = load_json(file_path)
-        print("bbox load", time.time()-t)
+        with stage('load_bboxes'):
+            bbox_data = load_json(file_path)
         # If we're looking for a specific image, extract just that image's data
         if image_name and bbox_data and isinstance(bbox_data, dict):
             result = bbox_data.get(image_name, {'boxes': [], 'scores': [], 'labels': [], 'gt': []})
             return result
         return bbox_data
     except (IOError, json.JSONDecodeError) as e:
-        print(f"Error loading file {file_path}: {e}")
+        logger.error(f"Error loading file {file_path}: {e}")
         return {}
 
 
@@ -92,8 +107,8 @@ def ensure_at_least_one_bbox(bboxes, threshold):
                 highest_score_idx = i
 
         # Boost the score of the highest scoring box
-        print(
-            f"No boxes above threshold {threshold}. Boosting box {highest_score_idx} with score {highest_score} to display")
+        logger.debug("No boxes above threshold %s. Boosting box %s with score %s to display",
+                     threshold, highest_score_idx, highest_score)
         bboxes['scores'][highest_score_idx] = threshold + 1
 
     return bboxes
@@ -103,93 +118,85 @@ def register_routes(app):
     # Initialize the global bbox data
     app.bbox_openclip_data = {}
 
-    # Background upload management
-    app.upload_threads = {}  # Dictionary to track upload threads by username
-    app.upload_cancel_events = {}  # Dictionary to track cancel events by username
-
-    def background_upload_to_drive(username):
+    # Stage timings of the requests, reported in Server-Timing headers and on /metrics
+    Metrics(enabled=app.config.get('METRICS_ENABLED', True),
+            server_timing=app.config.get('METRICS_SERVER_TIMING', True)).init_app(app)
+
+    # Opt-in profiling of single requests (X-Profile header or ?profile=) and of slow requests
+    app.profiler = None
+    if app.config.get('PROFILING_ENABLED', False):
+        RequestProfiler(app.config.get('PROFILING_DIR', 'profiles'),
+                        max_files=app.config.get('PROFILING_MAX_FILES', 50),
+                        slow_request_seconds=app.config.get('PROFILING_SLOW_REQUEST_SECONDS'),
+                        sample_interval=app.config.get('PROFILING_SAMPLE_INTERVAL_SECONDS', 0.005),
+                        logger=app.logger).init_app(app)
+
+    # Opt-in anonymized request traces for replay benchmarks (benchmarks/replay.py)
+    app.trace_recorder = None
+    if app.config.get('TRACE_ENABLED', False):
+        TraceRecorder(app.config.get('TRACE_DIR', 'traces'),
+                      queue_size=app.config.get('TRACE_QUEUE_SIZE', 10000),
+                      exclude_endpoints=app.config.get('TRACE_EXCLUDE_ENDPOINTS', ('static',)),
+                      salt=app.config.get('TRACE_SALT')).init_app(app)
+
+    # Bounded pool shared by all sync transfers
+    app.transfer_engine = TransferEngine(max_workers=app.config.get('GOOGLE_DRIVE_MAX_CONCURRENT_TRANSFERS', 4))
+
+    # One sync backend (and connection pool) shared by all requests; None when syncing is disabled.
+    # With GOOGLE_DRIVE_USE_FAKE it runs on in-process fakes of Drive/Sheets/S3
+    app.sync_backend = create_sync_backend(app.config, app.transfer_engine)
+
+    def get_sync_folder_id(config_key):
+        """Configured Drive folder ID; other backends use their default layout under their root."""
+        if app.config.get('SYNC_BACKEND', 'google_drive') != 'google_drive':
+            return None
+        return app.config.get(config_key)
+
+    def get_sync_lock(username):
+        """Held while a user's files are synced, so transfers of several worker processes do not overlap."""
+        return FileLock(os.path.join(app.config['ANNOTATORS_ROOT_DIRECTORY'], username, '.sync.lock'))
+
+    def background_upload_to_drive(username, cancel_event):
         """
-        Background function to upload user data to Google Drive.
-        Runs silently without user notification and can be cancelled.
+        Upload user data to the sync backend from the upload scheduler's worker thread.
+        Stops between files once cancel_event is set.
         """
-        try:
-            # Check if Google Drive is enabled
-            if not app.config.get('GOOGLE_DRIVE_ENABLED', False):
-                app.logger.debug(f"Background upload skipped for {username}: Google Drive disabled")
-                return
-
-            # Create cancel event for this upload
-            cancel_event = threading.Event()
-            app.upload_cancel_events[username] = cancel_event
-
-            # Initialize Google Drive service
-            drive_service = GoogleDriveService(
-                app.config.get('GOOGLE_DRIVE_CREDENTIALS_FILE'),
-                app.config.get('GOOGLE_DRIVE_TOKEN_FILE')
-            )
-
-            # Get user data directory
-            user_data_dir = os.path.join(app.config['ANNOTATORS_ROOT_DIRECTORY'], username)
-
-            # Get folder ID from config if specified
-            folder_id = app.config.get('GOOGLE_DRIVE_FOLDER_ID')
-
-            # Check if upload was cancelled before starting
-            if cancel_event.is_set():
-                app.logger.debug(f"Background upload cancelled for {username} before starting")
-                return
-
-            app.logger.debug(f"Starting background upload for {username}")
-
-            # Upload data to Google Drive
-            upload_results = drive_service.upload_user_data(username, user_data_dir, folder_id)
-
-            # Check if upload was cancelled after completion
-            if cancel_event.is_set():
-                app.logger.debug(f"Background upload for {username} was cancelled but completed anyway")
-                return
-
-            if upload_results['success']:
-                app.logger.debug(f"Background upload successful for {username}")
-            else:
-                app.logger.debug(f"Background upload failed for {username}: {upload_results['errors']}")
-
-        except Exception as e:
-            app.logger.debug(f"Background upload error for {username}: {str(e)}")
-        finally:
-            # Clean up
-            if username in app.upload_threads:
-                del app.upload_threads[username]
-            if username in app.upload_cancel_events:
-                del app.upload_cancel_events[username]
+        # Get user data directory
+        user_data_dir = os.path.join(app.config['ANNOTATORS_ROOT_DIRECTORY'], username)
+
+        # Get folder ID from config if specified
+        folder_id = get_sync_folder_id('GOOGLE_DRIVE_FOLDER_ID')
+
+        app.logger.debug(f"Starting background upload for {username}")
+        # Other worker processes have their own upload scheduler
+        with get_sync_lock(username):
+            export_user_files(app, username)
+            with app.metrics.stage('drive_upload', route='background_upload'):
+                return app.sync_backend.upload_user_data(username, user_data_dir, folder_id, cancel_event=cancel_event)
+
+    # Background upload management: one worker thread, uploads coalesced per user
+    app.upload_scheduler = UploadScheduler(
+        background_upload_to_drive,
+        debounce_seconds=app.config.get('UPLOAD_DEBOUNCE_SECONDS', 2.0),
+        max_delay_seconds=app.config.get('UPLOAD_MAX_DELAY_SECONDS', 30.0),
+        retry_base_seconds=app.config.get('UPLOAD_RETRY_BASE_SECONDS', 5.0),
+        retry_max_seconds=app.config.get('UPLOAD_RETRY_MAX_SECONDS', 300.0),
+        max_attempts=app.config.get('UPLOAD_RETRY_MAX_ATTEMPTS', 10),
+        logger=app.logger
+    )
+    if app.sync_backend is not None:
+        app.upload_scheduler.start()
+        atexit.register(app.upload_scheduler.stop)
 
     def trigger_background_upload(username):
         """
-        Trigger a background upload for the given username.
-        Cancels any existing upload for the same user.
+        Queue a background upload for the given username. Returns immediately;
+        repeated triggers while an upload is pending are coalesced into one upload.
         """
-        try:
-            # Cancel any existing upload for this user
-            if username in app.upload_cancel_events:
-                app.upload_cancel_events[username].set()
-                app.logger.debug(f"Cancelled previous upload for {username}")
-
-            # Wait for previous thread to finish if it exists
-            if username in app.upload_threads and app.upload_threads[username].is_alive():
-                app.upload_threads[username].join(timeout=1.0)  # Wait max 1 second
-
-            # Start new background upload
-            upload_thread = threading.Thread(
-                target=background_upload_to_drive,
-                args=(username,),
-                daemon=True  # Thread will die when main process dies
-            )
-            upload_thread.start()
-            app.upload_threads[username] = upload_thread
-            app.logger.debug(f"Started background upload thread for {username}")
-
-        except Exception as e:
-            app.logger.error(f"Error triggering background upload for {username}: {str(e)}")
+        if app.sync_backend is None:
+            app.logger.debug(f"Background upload skipped for {username}: syncing disabled")
+            return
+        app.upload_scheduler.schedule(username)
 
     # Load hierarchy files for class navigation
     def load_hierarchy_files():
@@ -270,9 +277,13 @@ def register_routes(app):
     def load_bbox_openclip_data(username):
         """Helper function to load bbox data for a specific image"""
         if username not in app.bbox_openclip_data:
-            # Load entire file for this user
             bbox_file_path = os.path.join(app.config['GT_DATA_ROOT_DIRECTORY'], 'bboxes.json')
-            app.bbox_openclip_data[username] = get_bboxes_from_file(bbox_file_path)
+            if app.config.get('GT_DATA_BACKEND', 'json') in ('arrays', 'lazy'):
+                # Memory-mapped and shared by all users; entries are built on access
+                app.bbox_openclip_data[username] = read_gt_data_file(bbox_file_path, app) or {}
+            else:
+                # Load entire file for this user
+                app.bbox_openclip_data[username] = get_bboxes_from_file(bbox_file_path)
 
         # Return data for specific image if exists
         if app.bbox_openclip_data:
@@ -361,20 +372,10 @@ def register_routes(app):
         if not image_list:
             return "No images found in evaluation report"
         
-        # Load last viewed image index from separate file for this mode
-        sanity_check_index_file = os.path.join(
-            app.config['ANNOTATORS_ROOT_DIRECTORY'],
-            username,
-            f'current_image_index_sanity_{mode}_{username}.txt'
-        )
-        
-        try:
-            with open(sanity_check_index_file, 'r') as f:
-                current_image_index = int(f.read().strip())
-                # Validate index
-                if current_image_index >= len(image_list) or current_image_index < 0:
-                    current_image_index = 0
-        except (FileNotFoundError, ValueError):
+        # Load last viewed image index, stored separately for this mode
+        current_image_index = load_current_image_index(app, username, mode=f'sanity_{mode}')
+        # Validate index
+        if current_image_index is None or current_image_index >= len(image_list) or current_image_index < 0:
             current_image_index = 0
         
         # Redirect to sanity check detailed view with the last viewed index
@@ -429,21 +430,11 @@ def register_routes(app):
         if not image_list:
             return "No images found in evaluation report"
         
-        # Load current image index from separate file for sanity check mode
-        sanity_check_index_file = os.path.join(
-            app.config['ANNOTATORS_ROOT_DIRECTORY'],
-            username,
-            f'current_image_index_sanity_{mode}_{username}.txt'
-        )
-        
-        # Try to get index from URL parameter first, otherwise load from file
+        # Try to get index from URL parameter first, otherwise load the one stored for sanity check mode
         current_image_index = request.args.get('image_index', None, type=int)
         if current_image_index is None:
-            # Load from file
-            try:
-                with open(sanity_check_index_file, 'r') as f:
-                    current_image_index = int(f.read().strip())
-            except (FileNotFoundError, ValueError):
+            current_image_index = load_current_image_index(app, username, mode=f'sanity_{mode}')
+            if current_image_index is None:
                 current_image_index = 0
         
         # Validate and wrap index
@@ -452,10 +443,9 @@ def register_routes(app):
         elif current_image_index < 0:
             current_image_index = len(image_list) - 1
         
-        # Save the current index to file for next time
+        # Save the current index for next time
         try:
-            with open(sanity_check_index_file, 'w') as f:
-                f.write(str(current_image_index))
+            save_current_image_index(app, username, current_image_index, mode=f'sanity_{mode}')
         except Exception as e:
             app.logger.error(f"Error saving sanity check index: {e}")
             
@@ -643,9 +633,7 @@ def register_routes(app):
         image_paths = {}
         for user in annotators:
             # Read bbox/checkbox selection
-            checkbox_data = read_json_file(
-                os.path.join(app.config['ANNOTATORS_ROOT_DIRECTORY'], user, f'checkbox_selections_{user}.json'), app
-            )
+            checkbox_data = load_user_data(app, user)
 
             # Initialize bbox_data to store bounding boxes for each image
             bbox_data.append({})
@@ -716,7 +704,6 @@ def register_routes(app):
 
         # Get cluster name for current class
         cluster_name = app.get_cluster_name(class_index)
-        print(f"Cluster name for class {class_index}: {cluster_name}")
 
         return render_template('compare_grid.html',
                                image_paths=image_paths,
@@ -727,68 +714,121 @@ def register_routes(app):
                                cluster_name=cluster_name,
                                class_index=class_index)
 
-    @app.route('/<username>')
-    def grid_image(username):
+    # Rendered grid and labeling pages, revalidated by browsers through their ETags
+    app.page_cache = RenderedPageCache(max_bytes=app.config.get('RENDERED_PAGE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+
+    def get_file_revision(path):
+        """Modification time, size and inode of a file, or None if it does not exist."""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def get_page_cache_key(username, view, index):
         """
-        Renders the image labeling page for a given user.
+        Key of a rendered page: the page itself plus the revisions of the user's annotation file and of the
+        ground truth files it was rendered from, so files changed outside of the app are picked up too.
+        """
+        data_revision = tuple(get_file_revision(os.path.join(app.config['GT_DATA_ROOT_DIRECTORY'], filename))
+                              for filename in ('predictions.json', 'sample_images_info.json', 'bboxes.json'))
+        return username, view, index, get_annotation_store(app).get_revision(username), data_revision
 
-        Validates the user from the cached data and processes image data for labeling.
-        Returns an error message if the user does not exist or data is unavailable.
+    def cached_page_response(username, view, index, render_func):
+        """
+        Serves a page from app.page_cache, rendering it with render_func() on a miss.
+
+        The response carries a strong ETag and must be revalidated, so browsers coming back to an unchanged
+        page get a 304 without a body. Random choices made by render_func() (the example images of the
+        labeling page) are therefore kept as long as the page is cached.
 
         Args:
             username (str): The username of the user.
+            view (str): Name of the view the page belongs to.
+            index (int): Image index of the page.
+            render_func: Callable returning the rendered page.
 
         Returns:
-            Rendered 'img_grid.html' template with relevant image data
-            if user exists and data is available, otherwise a string error message.
+            The (possibly 304) response.
         """
-        t=time.time()
-        if username not in app.user_cache:
-            return "No such user exists. Please check it again."
+        if not app.config.get('RENDERED_PAGE_CACHE_ENABLED', True):
+            return render_func()
+
+        revision = app.page_cache.get_revision(username)
+        key = get_page_cache_key(username, view, index)
+        entry = app.page_cache.get(key)
+        if entry is None:
+            entry = app.page_cache.put(key, render_func(), revision)
+        body, etag = entry
+
+        response = make_response(body)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response = response.make_conditional(request)
+        if response.status_code == 304:
+            app.page_cache.record_not_modified()
+        return response
+
+    def get_adjacent_grid_index(current_image_index, direction, page_size=None):
+        """
+        Computes the image index the grid view moves to from current_image_index.
 
-        user_data = app.user_cache[username]
-        if any(value is None for value in user_data.values()):
-            return "Error loading data."
+        Moves by one page within the class; at a class boundary moves to the first (next) or last (prev)
+        image of the neighbouring class in the hierarchy.
 
-        # Cached data is being used here
-        proposals_info = user_data['proposals_info']
-        # dataset_classes = user_data['imagenet_classes']
-        app.num_predictions_per_user[username] = user_data['num_predictions']
+        Args:
+            current_image_index (int): The current image index of the user.
+            direction (str): 'next' or 'prev'.
+            page_size (int): Images per grid page, defaults to GRID_IMAGES_PER_PAGE.
 
-        # get class names and mappings
-        label_indices_to_label_names, label_indices_to_human_readable = get_label_indices_to_label_names_dicts(app)
-        # assert both are not None
-        assert label_indices_to_label_names is not None and label_indices_to_human_readable is not None
+        Returns:
+            int: The new image index, not aligned to a page boundary.
+        """
+        page_size = page_size or app.config['GRID_IMAGES_PER_PAGE']
+        current_class = current_image_index // 50
 
-        # Set current image index
-        current_image_index = app.current_image_index_dct.get(username, 0)
-        current_image_index = current_image_index - (current_image_index % 5)
+        if direction == "next" and current_image_index + page_size < (current_class + 1) * 50:
+            return current_image_index + page_size
+        if direction == "prev" and current_image_index - page_size >= current_class * 50:
+            return current_image_index - page_size
 
-        NUM_IMG_TO_FETCH = 5
-        selected_indices = []
+        next_class = app.get_next_class_in_hierarchy(current_class, direction)
+        return next_class * 50 if direction == "next" else (next_class + 1) * 50 - 1
+
+    def build_grid_page_data(username, start, count, man_annotated_bboxes_dict):
+        """
+        Computes the per-image data of one grid page and copies its images to the static folder.
+
+        Shared by grid_image, which renders it, and grid_page_data, which returns it as JSON.
+
+        Args:
+            username (str): The username of the user.
+            start (int): Index of the first image of the page.
+            count (int): Number of images on the page, clipped at the end of the dataset.
+            man_annotated_bboxes_dict (dict): The user's checkbox selections.
+
+        Returns:
+            dict: 'image_paths', 'label_indices', 'bbox_data' and 'borders' keyed by image index, and
+            'checked_labels', the set of annotated image names on the page.
+        """
+        proposals_info = app.user_cache[username]['proposals_info']
+        label_indices_to_label_names, _ = get_label_indices_to_label_names_dicts(app)
+
+        selected_indices = list(range(start, min(start + count, len(proposals_info))))
         selected_images = []
         label_indices = {}
-        for i in range(NUM_IMG_TO_FETCH):
-            selected_indices.append(current_image_index + i)
-            image_data = proposals_info[selected_indices[i]]
+        for selected_index in selected_indices:
+            image_data = proposals_info[selected_index]
             image_name = image_data['image_name']
             gt_class = image_data['ground_truth']
             class_name = label_indices_to_label_names[str(gt_class)]
             image_path = os.path.join(class_name, image_name)
             selected_images.append(image_path)
-            label_indices[selected_indices[i]] = gt_class
+            label_indices[selected_index] = gt_class
 
         copy_to_static_dir(selected_images, app.config['ANNOTATIONS_ROOT_FOLDER'],
                            os.path.join(app.config['APP_ROOT_FOLDER'], app.config['STATIC_FOLDER'], 'images'))
 
-        # Load checkbox selections with bounding box data
-        man_annotated_bboxes_dict = read_json_file(
-            os.path.join(app.config['ANNOTATORS_ROOT_DIRECTORY'], username, f'checkbox_selections_{username}.json'),
-            app) or {}
-
-        # Used to track the progress of the user
-        num_corrected_images = len(man_annotated_bboxes_dict)
-
         # Initialize bbox_data to store bounding boxes for each image
         bbox_data = {}
         checked_labels = set()
@@ -797,10 +837,8 @@ def register_routes(app):
         threshold = app.config.get('THRESHOLD', 0.5)
 
         MULTILABEL_CONFIDENCE_THRESHOLD = 0.7  # We can move it to the config, anyway further discussion is needed
-        print ("time before ing conf", time.time() -t )
-        t=time.time()
+
         # Used for possible multilabel detection based on the confidence
-        # image_conf_dict = get_image_conf_dict(proposals_info)
         image_conf_dict = get_image_conf_dict([proposals_info[idx] for idx in selected_indices])
         for selected_index, image_path in zip(selected_indices, selected_images):
             image_basename = os.path.basename(image_path)
@@ -865,9 +903,7 @@ def register_routes(app):
                             else:
                                 bboxes['group'].append(None)
             else:
-                # print ("we go for open clip data")
                 data = app.load_bbox_openclip_data(username)[image_basename]
-                # print("open clip load", time.time() -tt)
                 for box, label, score in zip(data['boxes'], data['gt'], data['scores']):
                     bboxes['boxes'].append(box)
                     bboxes['labels'].append(label)
@@ -880,144 +916,316 @@ def register_routes(app):
                 # Ensure at least one bbox is displayed
                 bboxes = ensure_at_least_one_bbox(bboxes, threshold)
 
-
-            print(bboxes)
             bbox_data[selected_index] = convert_bboxes_to_serializable(bboxes, threshold)
 
             # Set image path
             image_paths[selected_index] = os.path.join(app.config['STATIC_FOLDER'], 'images', image_path)
 
-        assert len(image_paths) == len(label_indices) == NUM_IMG_TO_FETCH
-        print ("time bbox", time.time() -t )
+        assert len(image_paths) == len(label_indices) == len(selected_indices)
+
+        return {'image_paths': image_paths,
+                'label_indices': label_indices,
+                'checked_labels': checked_labels,
+                'bbox_data': bbox_data,
+                'borders': borders}
+
+    def count_class_corrected_images(username, class_index, man_annotated_bboxes_dict=None):
+        """Counts the annotated images of a class (at most 50) for the grid progress bar."""
+        return min(count_user_annotations(app, username, class_index, man_annotated_bboxes_dict), 50)
+
+    @app.route('/<username>')
+    def grid_image(username):
+        """
+        Renders the image labeling page for a given user.
+
+        Validates the user from the cached data and processes image data for labeling.
+        Returns an error message if the user does not exist or data is unavailable.
+
+        Args:
+            username (str): The username of the user.
+
+        Returns:
+            Rendered 'img_grid.html' template with relevant image data
+            if user exists and data is available, otherwise a string error message.
+        """
+        if username not in app.user_cache:
+            return "No such user exists. Please check it again."
+
+        user_data = app.user_cache[username]
+        if any(value is None for value in user_data.values()):
+            return "Error loading data."
+
+        # Cached data is being used here
+        app.num_predictions_per_user[username] = user_data['num_predictions']
+
+        # get class names and mappings
+        label_indices_to_label_names, label_indices_to_human_readable = get_label_indices_to_label_names_dicts(app)
+        # assert both are not None
+        assert label_indices_to_label_names is not None and label_indices_to_human_readable is not None
+
+        # Set current image index
+        images_per_page = app.config['GRID_IMAGES_PER_PAGE']
+        current_image_index = app.current_image_index_dct.get(username, 0)
+        current_image_index = current_image_index - (current_image_index % images_per_page)
 
-        print("bbox_data: ", bbox_data)
-        t=time.time()
-        # Load class_corrected_images from checkbox selection file
-        class_dict = ClassDictionary()
         current_class = current_image_index // 50
-        
+
         # Time tracking: Start class session only if class changed
         time_tracker = get_time_tracker()
         class_name = label_indices_to_human_readable.get(str(current_class), f"Class_{current_class}")
         time_tracker.start_class_session_if_changed(str(current_class), class_name)
-        
+
         # End any active image session when returning to grid view
         if time_tracker.current_image_id:
             time_tracker.end_image_session()
-        
-        class_corrected_images = 0
-        for img_name_key in man_annotated_bboxes_dict.keys():
-            if class_corrected_images == 50:
-                break
-            if class_dict.get_val_img_class(img_name_key) == current_class:
-                class_corrected_images += 1
 
+        return cached_page_response(username, 'grid_image', current_image_index,
+                                    lambda: render_grid_page(username, current_image_index))
 
-        # Get cluster name for current class
-        cluster_name_final = app.get_cluster_name(current_class)
+    def render_grid_page(username, current_image_index):
+        """
+        Renders the grid view page starting at current_image_index.
 
-        print(f"Cluster name for class {current_class}: {cluster_name_final}")
+        Args:
+            username (str): The username of the user.
+            current_image_index (int): Index of the first image of the page.
 
-        # Prepare clusters for dropdown menu
-        clusters = {}
-        for cluster_name in sorted(app.parent_to_children.keys()):
-            classes_in_cluster = app.parent_to_children[cluster_name]
-            clusters[cluster_name] = []
-            for i,class_id in enumerate(classes_in_cluster):
-                if str(class_id) in label_indices_to_human_readable:
-                    class_name = label_indices_to_human_readable[str(class_id)]
-                    clusters[cluster_name].append({
-                        'id': class_id,
-                        'name': class_name,
-                        'rel_class_id': i
-                    })
-        print("time to load the rest", time.time()-t)
+        Returns:
+            str: The rendered 'img_grid.html'.
+        """
+        _, label_indices_to_human_readable = get_label_indices_to_label_names_dicts(app)
+        images_per_page = app.config['GRID_IMAGES_PER_PAGE']
+        current_class = current_image_index // 50
 
-        return render_template('img_grid.html',
-                               image_paths=image_paths,
-                               label_indices=label_indices,
-                               checked_labels=checked_labels,
-                               bbox_data=bbox_data,  # Pass bbox data to template
-                               username=username,
-                               human_readable_classes_map=label_indices_to_human_readable,
-                               current_image_index=current_image_index,
-                               num_corrected_images=num_corrected_images,
-                               borders=borders,
-                               class_corrected_images=class_corrected_images,
-                               class_total_images=50,
-                               cluster_name=cluster_name_final,  # Add cluster name to template
-                               clusters=clusters)  # Add clusters data for dropdown
+        # Load checkbox selections with bounding box data
+        with app.metrics.stage('load_annotations'):
+            man_annotated_bboxes_dict = load_user_data(app, username)
 
-    @app.route('/<username>/label_image')
-    def label_image(username):
+        # Used to track the progress of the user
+        num_corrected_images = len(man_annotated_bboxes_dict)
+
+        with app.metrics.stage('grid_data'):
+            page_data = build_grid_page_data(username, current_image_index, images_per_page, man_annotated_bboxes_dict)
+
+        with app.metrics.stage('grid_context'):
+            # Load class_corrected_images from checkbox selection file
+            class_corrected_images = count_class_corrected_images(username, current_class,
+                                                                  man_annotated_bboxes_dict)
+
+            # Get cluster name for current class
+            cluster_name_final = app.get_cluster_name(current_class)
+
+            # Prepare clusters for dropdown menu
+            clusters = get_cluster_dropdown_data(label_indices_to_human_readable)
+
+        with app.metrics.stage('render'):
+            return render_template('img_grid.html',
+                                   image_paths=page_data['image_paths'],
+                                   label_indices=page_data['label_indices'],
+                                   checked_labels=page_data['checked_labels'],
+                                   bbox_data=page_data['bbox_data'],  # Pass bbox data to template
+                                   username=username,
+                                   human_readable_classes_map=label_indices_to_human_readable,
+                                   current_image_index=current_image_index,
+                                   images_per_page=images_per_page,
+                                   num_corrected_images=num_corrected_images,
+                                   borders=page_data['borders'],
+                                   class_corrected_images=class_corrected_images,
+                                   class_total_images=50,
+                                   cluster_name=cluster_name_final,  # Add cluster name to template
+                                   clusters=clusters)  # Add clusters data for dropdown
+
+    @app.route('/api/<username>/grid')
+    def grid_page_data(username):
         """
-        Renders the image labeling page for a given user.
+        Returns the data of grid pages as compact JSON, so the grid view can switch pages without a full render.
 
-        Validates the user from the cached data and processes image data for labeling.
-        Returns an error message if the user does not exist or data is unavailable.
+        Query parameters:
+            start: Index of an image of the page, defaults to the user's current image. Pages are aligned
+                to count within each class, the last page of a class ends at the class end.
+            count: Images per page, defaults to GRID_IMAGES_PER_PAGE (at most GRID_API_MAX_IMAGES).
+            lookahead: Number of following pages to return as well (at most GRID_API_MAX_LOOKAHEAD_PAGES).
 
         Args:
             username (str): The username of the user.
 
         Returns:
-            Rendered 'user_label.html' template with relevant image data
-            if user exists and data is available, otherwise a string error message.
+            JSON with 'success', 'page' and 'lookahead' (list of the following pages). Each page holds its
+            images (path, checkbox value, class, checked state, border and bboxes), the progress counters and
+            the start indices of the next and previous pages (None past the end of the dataset).
         """
-        start_time = timeit.default_timer()
-        t=time.time()
-        print(f"Started loading page at: {time.strftime('%H:%M:%S')}")
-
         if username not in app.user_cache:
-            return "No such user exists. Please check it again."
+            return jsonify({'success': False, 'error': 'No such user exists'}), 404
 
         user_data = app.user_cache[username]
         if any(value is None for value in user_data.values()):
-            return "Error loading data."
+            return jsonify({'success': False, 'error': 'Error loading data'}), 500
+
+        num_images = len(user_data['proposals_info'])
+        count = request.args.get('count', default=app.config['GRID_IMAGES_PER_PAGE'], type=int)
+        count = max(1, min(count, app.config['GRID_API_MAX_IMAGES']))
+        lookahead = request.args.get('lookahead', default=0, type=int)
+        lookahead = max(0, min(lookahead, app.config['GRID_API_MAX_LOOKAHEAD_PAGES']))
+        start = request.args.get('start', type=int)
+        if start is None:
+            start = app.current_image_index_dct.get(username, 0)
+        if not 0 <= start < num_images:
+            return jsonify({'success': False, 'error': f'start must be between 0 and {num_images - 1}'}), 400
+
+        _, label_indices_to_human_readable = get_label_indices_to_label_names_dicts(app)
+        man_annotated_bboxes_dict = load_user_data(app, username)
+
+        def page_start_of(index):
+            # Pages do not cross classes: a count that does not divide 50 leaves a shorter last page
+            class_start = (index // 50) * 50
+            return class_start + ((index - class_start) // count) * count
+
+        def adjacent_page_start(page_start, direction):
+            index = get_adjacent_grid_index(page_start, direction, count)
+            return page_start_of(index) if 0 <= index < num_images else None
+
+        pages = []
+        page_start = page_start_of(start)
+        while page_start is not None and len(pages) <= lookahead:
+            page_count = min(count, (page_start // 50 + 1) * 50 - page_start)
+            page_data = build_grid_page_data(username, page_start, page_count, man_annotated_bboxes_dict)
+            class_index = page_data['label_indices'][page_start]
+            pages.append({
+                'start': page_start,
+                'images': [{
+                    'index': index,
+                    'path': image_path,
+                    # Value of the grid checkbox, computed like the template does
+                    'checkbox_value': f"{image_path.lstrip('static/images')}|{page_data['label_indices'][index]}",
+                    'label_index': page_data['label_indices'][index],
+                    'checked': os.path.basename(image_path) in page_data['checked_labels'],
+                    'border': page_data['borders'].get(index),
+                    'bboxes': page_data['bbox_data'][index]
+                } for index, image_path in page_data['image_paths'].items()],
+                'class_index': class_index,
+                'class_name': label_indices_to_human_readable.get(str(class_index), str(class_index)),
+                'cluster_name': app.get_cluster_name(page_start // 50),
+                'progress': {
+                    'num_corrected_images': len(man_annotated_bboxes_dict),
+                    'class_corrected_images': count_class_corrected_images(username, page_start // 50,
+                                                                           man_annotated_bboxes_dict),
+                    'class_total_images': 50
+                },
+                'next_start': adjacent_page_start(page_start, "next"),
+                'prev_start': adjacent_page_start(page_start, "prev")
+            })
+            page_start = pages[-1]['next_start']
 
-        # Get data from user cache
+        return jsonify({'success': True, 'page': pages[0], 'lookahead': pages[1:]})
+
+    def compute_image_context(username, image_index):
+        """
+        Computes the annotation-independent part of the labeling page of one image.
+
+        Cached and computed ahead of navigation by app.page_warmer, so it must not depend on the
+        user's annotations.
+
+        Args:
+            username (str): The username of the user.
+            image_index (int): Index of the image within the user's proposals.
+
+        Returns:
+            dict: 'image_name', 'ground_truth', 'image_path' (relative to the dataset root) and
+            'similar_images', the example image paths of the top-20 classes.
+        """
+        user_data = app.user_cache[username]
         proposals_info = user_data['proposals_info']
-        all_sample_images = user_data['all_sample_images']
-        app.num_predictions_per_user[username] = user_data['num_predictions']
+        if not 0 <= image_index < len(proposals_info):
+            raise IndexError(f"Image index {image_index} out of range for user {username}")
 
-        # Get class names and mappings
-        label_indices_to_label_names, label_indices_to_human_readable = get_label_indices_to_label_names_dicts(app)
-        # Assert both are not None
-        assert label_indices_to_label_names is not None and label_indices_to_human_readable is not None
+        label_indices_to_label_names, _ = get_label_indices_to_label_names_dicts(app)
 
-        # image_softmax_dict = get_image_softmax_dict(proposals_info)
+        image_data = proposals_info[image_index]
+        class_name = label_indices_to_label_names[str(image_data['ground_truth'])]
 
-        # Set current image index
-        current_image_index = request.args.get('image_index')
-        if current_image_index is None:
-            current_image_index = app.current_image_index_dct.get(username, 0)
-        else:
-            try:
-                current_image_index = int(current_image_index)
-                update_current_image_index_simple(app, username, app.current_image_index_dct, current_image_index)
-            except ValueError:
-                current_image_index = 0
+        # load softmax values only for the current image, not for all at once (dense or top-k encoded)
+        top_categories = get_top_classes(image_data, 20)
+        similar_images = get_sample_images_for_categories(top_categories, user_data['all_sample_images'],
+                                                          label_indices_to_label_names,
+                                                          num_selection=app.config['NUM_EXAMPLES_PER_CLASS'])
 
-        current_image_data = proposals_info[current_image_index]
-        current_image = current_image_data['image_name']
-        current_gt_class = current_image_data['ground_truth']
-        current_class_name = label_indices_to_label_names[str(current_gt_class)]
-        current_imagepath = [os.path.join(current_class_name, current_image)]
+        return {'image_name': image_data['image_name'],
+                'ground_truth': image_data['ground_truth'],
+                'image_path': os.path.join(class_name, image_data['image_name']),
+                'similar_images': similar_images}
+
+    def get_image_context_files(image_context):
+        """Files read when the labeling page of an image is opened: the image and its examples."""
+        static_images_dir = os.path.join(app.config['APP_ROOT_FOLDER'], app.config['STATIC_FOLDER'], 'images')
+        files = [os.path.join(app.config['ANNOTATIONS_ROOT_FOLDER'], image_context['image_path'])]
+        for example_paths in image_context['similar_images'].values():
+            files.extend(os.path.join(static_images_dir, path) for path in example_paths)
+        return files
+
+    # Background warming of the next images of the labeling page
+    app.page_warmer = PageWarmer(
+        compute_image_context,
+        files_func=get_image_context_files,
+        lookahead=app.config.get('PAGE_WARMER_LOOKAHEAD', 3),
+        max_entries=app.config.get('PAGE_WARMER_MAX_ENTRIES', 64),
+        max_workers=app.config.get('PAGE_WARMER_WORKERS', 2),
+        logger=app.logger
+    )
+    atexit.register(app.page_warmer.shutdown)
+
+    def warm_next_images(username, current_image_index):
+        """Start warming the images following the one just shown, unless warming is disabled."""
+        if app.config.get('PAGE_WARMER_ENABLED', True):
+            app.page_warmer.schedule(username, current_image_index)
+
+    def start_label_image_time_tracking(username, current_image_index):
+        """
+        Starts the time tracking session of an image shown on the labeling page, and of its class if it changed.
+
+        Args:
+            username (str): The username of the user.
+            current_image_index (int): Index of the image within the user's proposals.
+        """
+        image_data = app.user_cache[username]['proposals_info'][current_image_index]
+        current_gt_class = image_data['ground_truth']
+        _, label_indices_to_human_readable = get_label_indices_to_label_names_dicts(app)
 
         # Time tracking: Start class session only if class changed, and start image session
         time_tracker = get_time_tracker()
         class_name = label_indices_to_human_readable.get(str(current_gt_class), f"Class_{current_gt_class}")
         time_tracker.start_class_session_if_changed(str(current_gt_class), class_name)
-        
+
         # Start tracking time spent on this specific image (simplified)
-        time_tracker.start_image_session(current_image, current_image_index)
+        time_tracker.start_image_session(image_data['image_name'], current_image_index)
 
-        # top_categories = image_softmax_dict[current_image][:20]
+    def build_label_image_context(username, current_image_index):
+        """
+        Computes the page context of the image labeling page for one image.
 
-        # load softmax values only for the current image, not for all at once
-        top_categories = np.argsort(proposals_info[current_image_index]["softmax_val"])[::-1][:20]
-        similar_images = get_sample_images_for_categories(top_categories, all_sample_images,
-                                                          label_indices_to_label_names,
-                                                          num_selection=app.config['NUM_EXAMPLES_PER_CLASS'])
+        Shared by label_image, which renders it, and save_and_advance, which returns it as JSON.
+
+        Args:
+            username (str): The username of the user.
+            current_image_index (int): Index of the image within the user's proposals.
+
+        Returns:
+            dict: Template variables for 'user_label.html' (without the cluster dropdown data).
+        """
+        # Get class names and mappings
+        label_indices_to_label_names, label_indices_to_human_readable = get_label_indices_to_label_names_dicts(app)
+        # Assert both are not None
+        assert label_indices_to_label_names is not None and label_indices_to_human_readable is not None
+
+        # Image, top-k classes and example picks, usually precomputed in the background after the previous page
+        if app.config.get('PAGE_WARMER_ENABLED', True):
+            image_context = app.page_warmer.get(username, current_image_index)
+        else:
+            image_context = compute_image_context(username, current_image_index)
+        current_image = image_context['image_name']
+        current_gt_class = image_context['ground_truth']
+        current_imagepath = [image_context['image_path']]
+
+        similar_images = image_context['similar_images']
 
         copy_to_static_dir(current_imagepath, app.config['ANNOTATIONS_ROOT_FOLDER'],
                            os.path.join(app.config['APP_ROOT_FOLDER'], app.config['STATIC_FOLDER'], 'images'))
@@ -1026,8 +1234,6 @@ def register_routes(app):
         similar_images = {key: [os.path.join(app.config['STATIC_FOLDER'], 'images', image)
                                 for image in value] for key, value in similar_images.items()}
 
-        print(f"Looking up data for image: {current_image}")
-
         # Load user data directly from file every time (no caching)
         try:
             checkbox_selections = load_user_data(app, username)
@@ -1045,7 +1251,6 @@ def register_routes(app):
         # First try checkbox_selections (user annotated images)
         if current_image in checkbox_selections:
             data = checkbox_selections[current_image]
-            print(f"Found data in checkbox_selections for {current_image}")
 
             # Handle new data structure with label_type
             if isinstance(data, dict) and 'label_type' in data:
@@ -1099,7 +1304,6 @@ def register_routes(app):
                               'group': group
                               }
                     bboxes_source = 'checkbox_selections_new_format'
-                    print(f"Found {len(boxes)} bboxes in checkbox_selections")
 
             # Handle legacy format with bboxes as list of dicts
             elif (isinstance(data, list) and len(data) > 0 and
@@ -1150,7 +1354,6 @@ def register_routes(app):
                           'group': group
                           }
                 bboxes_source = 'checkbox_selections_legacy'
-                print(f"Found {len(boxes)} bboxes in annotator format")
 
         # If no bboxes found in checkbox_selections, try loading from machine-generated bboxes file
         else:
@@ -1159,8 +1362,6 @@ def register_routes(app):
 
             # Check if we got valid bbox data
             if bbox_data and 'boxes' in bbox_data and bbox_data['boxes']:
-                print(f"Found {len(bbox_data['boxes'])} bboxes in machine-generated bboxes file")
-
                 # Ensure at least one bbox is displayed
                 bbox_data = ensure_at_least_one_bbox(bbox_data, threshold)
 
@@ -1177,7 +1378,9 @@ def register_routes(app):
         if bboxes is None:
             bboxes = {'boxes': [], 'scores': [], 'labels': [], 'crowd_flags': [], 'reflected_flags': [], 'rendition_flags': [], 'ocr_needed_flags': [], 'uncertain_flags': [], 'possible_labels': [], 'group': []}
             bboxes_source = 'empty'
-            print(f"No bboxes found for {current_image}")
+
+        debug_event('label_image_bboxes', username=username, image=current_image, source=bboxes_source,
+                    boxes=len(bboxes['boxes']), label_type=label_type)
 
         # Ensure bboxes is properly serializable
         bboxes = convert_bboxes_to_serializable(bboxes, threshold)
@@ -1189,41 +1392,134 @@ def register_routes(app):
         current_class = class_dict.get_val_img_class(current_image)
         cluster_name_final = app.get_cluster_name(current_class)
 
-        # Prepare clusters for dropdown menu
+        return dict(predicted_image=current_imagepath[0],
+                    similar_images=similar_images,
+                    username=username,
+                    ground_truth_label=class_dict.get_class_name(
+                        class_dict.get_val_img_class(current_image)),
+                    ground_truth_class_index=class_dict.get_val_img_class(current_image),
+                    checked_categories=checked_categories,
+                    comments={},
+                    human_readable_classes_map=label_indices_to_human_readable,
+                    current_image_index=current_image_index,
+                    num_similar_images=app.config['NUM_EXAMPLES_PER_CLASS'],
+                    bboxes=bboxes,
+                    image_name=current_imagepath,
+                    bboxes_source=bboxes_source,
+                    label_type=label_type,
+                    cluster_name=cluster_name_final)  # Add cluster name to template
+
+    def get_cluster_dropdown_data(label_indices_to_human_readable):
+        """Groups the classes by cluster for the cluster dropdown menu."""
         clusters = {}
         for cluster_name in sorted(app.parent_to_children.keys()):
             classes_in_cluster = app.parent_to_children[cluster_name]
             clusters[cluster_name] = []
-            for class_id in classes_in_cluster:
+            for i, class_id in enumerate(classes_in_cluster):
                 if str(class_id) in label_indices_to_human_readable:
                     class_name = label_indices_to_human_readable[str(class_id)]
                     clusters[cluster_name].append({
                         'id': class_id,
-                        'name': class_name
+                        'name': class_name,
+                        'rel_class_id': i
                     })
+        return clusters
 
-        end_time = timeit.default_timer()
-        # print(time.time() - t, "for load")
-        print(f"Total page load time: {end_time - start_time:.4f} seconds")
+    def get_class_names_payload():
+        """
+        The class-name map and cluster menu served by class_names, built once per process.
 
-        return render_template('user_label.html',
-                               predicted_image=current_imagepath[0],
-                               similar_images=similar_images,
-                               username=username,
-                               ground_truth_label=class_dict.get_class_name(
-                                   class_dict.get_val_img_class(current_image)),
-                               ground_truth_class_index=class_dict.get_val_img_class(current_image),
-                               checked_categories=checked_categories,
-                               comments={},
-                               human_readable_classes_map=label_indices_to_human_readable,
-                               current_image_index=current_image_index,
-                               num_similar_images=app.config['NUM_EXAMPLES_PER_CLASS'],
-                               bboxes=bboxes,
-                               image_name=current_imagepath,
-                               bboxes_source=bboxes_source,
-                               label_type=label_type,
-                               cluster_name=cluster_name_final,  # Add cluster name to template
-                               clusters=clusters)  # Add clusters data for dropdown
+        Returns:
+            tuple: (version, body), the version being a hash of the JSON body.
+        """
+        if app.class_names_payload is None:
+            _, label_indices_to_human_readable = get_label_indices_to_label_names_dicts(app)
+            body = json.dumps({'classes': label_indices_to_human_readable,
+                               'clusters': get_cluster_dropdown_data(label_indices_to_human_readable)},
+                              separators=(',', ':'), sort_keys=True).encode('utf-8')
+            app.class_names_payload = (hashlib.sha256(body).hexdigest()[:16], body)
+        return app.class_names_payload
+
+    app.class_names_payload = None
+
+    @app.context_processor
+    def inject_class_names_url():
+        """Makes the versioned class names URL available to all templates."""
+        return {'class_names_url': url_for('class_names', version=get_class_names_payload()[0])}
+
+    @app.route('/class_names/<version>.json')
+    def class_names(version):
+        """
+        Serves the class-name map and cluster menu as JSON, so pages do not have to inline them.
+
+        The URL contains the content hash, so responses can be cached by browsers for a year; requests for
+        an outdated version are redirected to the current one.
+
+        Args:
+            version (str): Content hash of the payload.
+
+        Returns:
+            JSON with 'classes' (class index -> human-readable name) and 'clusters' (cluster name -> classes).
+        """
+        current_version, body = get_class_names_payload()
+        if version != current_version:
+            return redirect(url_for('class_names', version=current_version))
+
+        response = make_response(body)
+        response.mimetype = 'application/json'
+        response.set_etag(current_version)
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+        return response.make_conditional(request)
+
+    @app.route('/<username>/label_image')
+    def label_image(username):
+        """
+        Renders the image labeling page for a given user.
+
+        Validates the user from the cached data and processes image data for labeling.
+        Returns an error message if the user does not exist or data is unavailable.
+
+        Args:
+            username (str): The username of the user.
+
+        Returns:
+            Rendered 'user_label.html' template with relevant image data
+            if user exists and data is available, otherwise a string error message.
+        """
+        if username not in app.user_cache:
+            return "No such user exists. Please check it again."
+
+        user_data = app.user_cache[username]
+        if any(value is None for value in user_data.values()):
+            return "Error loading data."
+
+        # Get data from user cache
+        app.num_predictions_per_user[username] = user_data['num_predictions']
+
+        # Set current image index
+        current_image_index = request.args.get('image_index')
+        if current_image_index is None:
+            current_image_index = app.current_image_index_dct.get(username, 0)
+        else:
+            try:
+                current_image_index = int(current_image_index)
+                update_current_image_index_simple(app, username, app.current_image_index_dct, current_image_index)
+            except ValueError:
+                current_image_index = 0
+
+        with app.metrics.stage('time_tracking'):
+            start_label_image_time_tracking(username, current_image_index)
+        warm_next_images(username, current_image_index)
+
+        def render_page():
+            with app.metrics.stage('page_context'):
+                context = build_label_image_context(username, current_image_index)
+            with app.metrics.stage('render'):
+                return render_template('user_label.html', **context)
+
+        # The cached page keeps the example images picked when it was rendered: coming back to the image shows the
+        # same examples (until the annotations or ground truth change), the Refresh button picks new ones
+        return cached_page_response(username, 'label_image', current_image_index, render_page)
 
     @app.route('/<username>/save_grid', methods=['POST'])
     def save_grid(username):
@@ -1231,12 +1527,10 @@ def register_routes(app):
         Save checkboxes from the grid view, using the new bbox-based format.
         Always use base_image_name as the key for simplicity.
         """
-        import timeit
-        start = timeit.default_timer()
 
         image_paths, checkbox_values, direction = get_form_data()
 
-        print(f"Saving grid data for user {username} with direction {direction}")
+        app.logger.debug(f"Saving grid data for user {username} with direction {direction}")
 
         # Get base image names only
         all_image_base_names = [os.path.basename(path) for path in image_paths.split('|')]
@@ -1247,9 +1541,7 @@ def register_routes(app):
         # Load user data
         checkbox_selections = load_user_data(app, username)
         bboxes_dict = app.load_bbox_openclip_data(username)
-        man_annotated_bboxes_dict = read_json_file(
-            os.path.join(app.config['ANNOTATORS_ROOT_DIRECTORY'], username, f'checkbox_selections_{username}.json'),
-            app)
+        man_annotated_bboxes_dict = dict(checkbox_selections)  # As loaded, before this page's changes
 
         checked_images_count = 0
         # Process each image in the grid
@@ -1282,7 +1574,7 @@ def register_routes(app):
             if not any(above_threshold) and scores:
                 highest_score_idx = scores.index(max(scores))
                 above_threshold[highest_score_idx] = True
-                print(f"No boxes above threshold for {base_name}. Including highest score box {highest_score_idx}")
+                app.logger.debug(f"No boxes above threshold for {base_name}. Including highest score box {highest_score_idx}")
 
             checkbox_selections[base_name]['bboxes'] = [
                 {"coordinates": box, "label": bboxes_dict[base_name]['gt'][i] if 'gt' in bboxes_dict[base_name] else
@@ -1297,27 +1589,13 @@ def register_routes(app):
             current_image_index = app.current_image_index_dct.get(username, 0)
             current_class = current_image_index // 50
 
-            print(f"Current class: {current_class}")
-            print(f"Current image index: {current_image_index}")
-
-            # Get the next class based on hierarchy
-            if direction == "next":
-                next_class = app.get_next_class_in_hierarchy(current_class, "next")
-            elif direction == "prev":
-                next_class = app.get_next_class_in_hierarchy(current_class, "prev")
-            else:
-                # For 'stay' direction, don't change the index
-                next_class = current_class
-
-            print(f"Next class: {next_class}")
+            debug_event('navigate', username=username, class_index=current_class, image_index=current_image_index,
+                        direction=direction)
 
             # Only update index if not staying
             if direction != "stay":
-                if (direction == "next" and current_image_index + 5 < (current_class+1)*50) or (direction == "prev" and current_image_index - 5 >= current_class*50):
-                    new_index = current_image_index + 5 if direction == "next" else current_image_index - 5
-                else:
-                    # Calculate new index based on class * 50
-                    new_index = next_class * 50 if direction == "next" else (next_class + 1) * 50 - 1
+                # Next/previous page, or the neighbouring class in the hierarchy at class boundaries
+                new_index = get_adjacent_grid_index(current_image_index, direction)
 
                 # Update the current image index
                 app.current_image_index_dct[username] = new_index
@@ -1331,8 +1609,8 @@ def register_routes(app):
                     class_name = label_indices_to_human_readable.get(str(new_class), f"Class_{new_class}")
                     time_tracker.start_class_session(str(new_class), class_name)
 
-            # Save only the checkbox_selections, leave comments unchanged
-            save_user_data(app, username, checkbox_selections=checkbox_selections)
+            # Save only the checkbox_selections of this page, leave comments unchanged
+            save_user_data(app, username, checkbox_selections=checkbox_selections, image_names=all_image_base_names)
 
             # Trigger background upload to Google Drive if navigating (next/prev)
             if direction in ["next", "prev"]:
@@ -1340,16 +1618,18 @@ def register_routes(app):
 
         except Exception as e:
             app.logger.error(f"Error in save_grid function for user {username}: {e}")
-            # Return JSON error for AJAX requests (when direction is 'stay')
-            if direction == "stay":
+            # Return JSON error for AJAX requests
+            if direction == "stay" or request.headers.get('X-Requested-With') == 'XMLHttpRequest':
                 return jsonify({'success': False, 'error': 'An error occurred while saving'}), 500
             return "An error occurred"
 
-        print(f"Time taken in save_grid: {timeit.default_timer() - start}")
         
-        # Return JSON response for AJAX requests (when direction is 'stay')
+        # Return JSON response for AJAX requests (when direction is 'stay', or background saves of the grid
+        # view, which has already switched to the new page)
         if direction == "stay":
             return jsonify({'success': True, 'message': 'Grid data saved successfully'})
+        if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+            return jsonify({'success': True, 'current_image_index': app.current_image_index_dct.get(username, 0)})
         
         return redirect(url_for('grid_image', username=username))
 
@@ -1361,7 +1641,7 @@ def register_routes(app):
         # Get the base image name directly
         image_path = request.form.get('image')
         image_index = request.form.get("image_index")
-        print(f"User is reviewing image: {image_path}")
+        app.logger.debug(f"User is reviewing image: {image_path}")
         return redirect(url_for('label_image', username=username, image_path=image_path, image_index=image_index))
 
     @app.route('/back2grid/<username>', methods=['POST', 'GET'])
@@ -1380,9 +1660,7 @@ def register_routes(app):
         Handle jumping to a specific class while saving checkbox selections
         This functions similar to save_grid but with a different navigation target
         """
-        import timeit
         import os
-        start = timeit.default_timer()
 
         # Get form data - same as in save_grid
         image_paths, checkbox_values, direction = get_form_data()
@@ -1392,7 +1670,7 @@ def register_routes(app):
         cluster_name = request.form.get('cluster_name')
         class_id = request.form.get('class_id')
 
-        print(f"Jumping to class for user {username} with image index {image_index}, class {class_id}, ")
+        app.logger.debug(f"Jumping to class for user {username} with image index {image_index}, class {class_id}")
 
         # If image_index is provided directly, use it
         if image_index:
@@ -1437,9 +1715,7 @@ def register_routes(app):
         # Load user data
         checkbox_selections = load_user_data(app, username)
         bboxes_dict = app.load_bbox_openclip_data(username)
-        man_annotated_bboxes_dict = read_json_file(
-            os.path.join(app.config['ANNOTATORS_ROOT_DIRECTORY'], username, f'checkbox_selections_{username}.json'),
-            app) or {}
+        man_annotated_bboxes_dict = dict(checkbox_selections)  # As loaded, before this page's changes
 
         checked_images_count = 0
         # Process each image in the grid
@@ -1507,15 +1783,19 @@ def register_routes(app):
             app.logger.error(f"Error in jump_to_class function for user {username}: {e}")
             return "An error occurred"
 
-        print(f"Time taken in jump_to_class: {timeit.default_timer() - start}")
         return redirect(url_for('grid_image', username=username))
 
-    @app.route('/<username>/save', methods=['POST'])
-    def save(username):
-        """Save annotations for an image."""
-        import timeit
-        start = timeit.default_timer()
+    def save_annotation_and_navigate(username):
+        """
+        Saves the annotation posted from the image labeling page and moves the user to the
+        next/previous image if the form's direction asks for it.
 
+        Args:
+            username (str): The username of the user.
+
+        Raises:
+            Exception: If the navigation or saving the user data fails.
+        """
         # Get form data
         image_name, checkbox_values, direction = get_form_data()
 
@@ -1539,9 +1819,6 @@ def register_routes(app):
                 app.logger.error(f"Invalid JSON for bboxes_data: {bboxes_data}")
                 bboxes = []
 
-        # Load and update user data
-        checkbox_selections = load_user_data(app, username)
-
         # Create or update the image data structure
         # If there are bboxes, use those
         if bboxes:
@@ -1551,9 +1828,6 @@ def register_routes(app):
                 "label_type": label_type
             }
 
-            # Update the checkbox_selections using base_image_name as key
-            checkbox_selections[base_image_name] = image_data
-
         # If no bboxes or selected classes, but we have checkbox values
         elif checkbox_values:
             # Convert checkbox values to bboxes
@@ -1572,9 +1846,6 @@ def register_routes(app):
                 "bboxes": new_bboxes,
                 "label_type": label_type
             }
-
-            # Update the checkbox_selections
-            checkbox_selections[base_image_name] = image_data
         else:
             # No bboxes, no selected classes, no checkboxes - create empty structure
             image_data = {
@@ -1582,65 +1853,118 @@ def register_routes(app):
                 "label_type": label_type
             }
 
-            # Update the checkbox_selections
-            checkbox_selections[base_image_name] = image_data
-
-        try:
-            # Only navigate if direction is explicitly set to next/prev AND it's not just a save
-            should_navigate = direction in ["next", "prev"] and direction != "save"
-            
-            if should_navigate:
-                # Modified to use the hierarchy-based navigation
-                current_image_index = app.current_image_index_dct.get(username, 0)
-                current_class = current_image_index // 50
+        # Only navigate if direction is explicitly set to next/prev AND it's not just a save
+        should_navigate = direction in ["next", "prev"] and direction != "save"
+        
+        if should_navigate:
+            # Modified to use the hierarchy-based navigation
+            current_image_index = app.current_image_index_dct.get(username, 0)
+            current_class = current_image_index // 50
 
-                print(f"Current class: {current_class}")
-                print(f"Current image index: {current_image_index}")
+            debug_event('navigate', username=username, class_index=current_class, image_index=current_image_index,
+                        direction=direction)
 
-                # Get the next class based on hierarchy
-                if direction == "next":
-                    next_class = app.get_next_class_in_hierarchy(current_class, "next")
-                else:
-                    next_class = app.get_next_class_in_hierarchy(current_class, "prev")
+            # Get the next class based on hierarchy
+            if direction == "next":
+                next_class = app.get_next_class_in_hierarchy(current_class, "next")
+            else:
+                next_class = app.get_next_class_in_hierarchy(current_class, "prev")
 
-                print(f"Next class: {next_class}")
+            # Fixed skipping 5 images at once when pressing the next/prev button
+            if (direction == "next" and current_image_index + 1 < (current_class + 1) * 50) or (
+                    direction == "prev" and current_image_index - 1 >= current_class * 50):
+                new_index = current_image_index + 1 if direction == "next" else current_image_index - 1
+            else:
+                # Calculate new index based on class * 50
+                new_index = next_class * 50 if direction == "next" else (next_class + 1) * 50 - 1
 
-                # Fixed skipping 5 images at once when pressing the next/prev button
-                if (direction == "next" and current_image_index + 1 < (current_class + 1) * 50) or (
-                        direction == "prev" and current_image_index - 1 >= current_class * 50):
-                    new_index = current_image_index + 1 if direction == "next" else current_image_index - 1
-                else:
-                    # Calculate new index based on class * 50
-                    new_index = next_class * 50 if direction == "next" else (next_class + 1) * 50 - 1
+            # Update the current image index
+            app.current_image_index_dct[username] = new_index
 
-                # Update the current image index
-                app.current_image_index_dct[username] = new_index
+            update_current_image_index_simple(app, username, app.current_image_index_dct, new_index)
+            
+            # Time tracking: Check if class changed and start new session if needed
+            new_class = new_index // 50
+            if new_class != current_class:
+                time_tracker = get_time_tracker()
+                label_indices_to_label_names, label_indices_to_human_readable = get_label_indices_to_label_names_dicts(app)
+                class_name = label_indices_to_human_readable.get(str(new_class), f"Class_{new_class}")
+                time_tracker.start_class_session(str(new_class), class_name)
 
-                update_current_image_index_simple(app, username, app.current_image_index_dct, new_index)
-                
-                # Time tracking: Check if class changed and start new session if needed
-                new_class = new_index // 50
-                if new_class != current_class:
-                    time_tracker = get_time_tracker()
-                    label_indices_to_label_names, label_indices_to_human_readable = get_label_indices_to_label_names_dicts(app)
-                    class_name = label_indices_to_human_readable.get(str(new_class), f"Class_{new_class}")
-                    time_tracker.start_class_session(str(new_class), class_name)
+        # Save only this image's checkbox selections, leave comments unchanged
+        save_user_image(app, username, base_image_name, image_data)
 
-            # Save only the checkbox_selections, leave comments unchanged
-            save_user_data(app, username, checkbox_selections=checkbox_selections)
+    @app.route('/<username>/save', methods=['POST'])
+    def save(username):
+        """Save annotations for an image."""
 
+        try:
+            save_annotation_and_navigate(username)
         except Exception as e:
             app.logger.error(f"Error in save_grid function for user {username}: {e}")
             return "An error occurred"
 
-        print(f"Time taken in save: {timeit.default_timer() - start}")
         return redirect(url_for('label_image', username=username))
 
+    @app.route('/<username>/save_and_advance', methods=['POST'])
+    def save_and_advance(username):
+        """
+        Saves annotations for an image and returns the page context of the image to show next.
+
+        Same form fields as save, but instead of redirecting to label_image (a second request that
+        re-renders the whole page) the next image's data is returned as JSON, so the labeling page
+        can swap its content in place.
+
+        Args:
+            username (str): The username of the user.
+
+        Returns:
+            JSON with 'success' and 'page': image URL, bboxes, top-k classes with their example
+            image URLs, cluster name and the label_image URL of the new image.
+        """
+        if username not in app.user_cache:
+            return jsonify({'success': False, 'error': 'No such user exists'}), 404
+
+        try:
+            save_annotation_and_navigate(username)
+        except Exception as e:
+            app.logger.error(f"Error in save_and_advance function for user {username}: {e}")
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+        current_image_index = app.current_image_index_dct.get(username, 0)
+        start_label_image_time_tracking(username, current_image_index)
+        context = build_label_image_context(username, current_image_index)
+        warm_next_images(username, current_image_index)
+        human_readable_classes_map = context['human_readable_classes_map']
+
+        return jsonify({
+            'success': True,
+            'page': {
+                'current_image_index': current_image_index,
+                'label_image_url': url_for('label_image', username=username, image_index=current_image_index),
+                'predicted_image': context['predicted_image'],
+                # Value of the hidden image_name form field, computed like the template does
+                'image_name': context['predicted_image'].lstrip('static/images'),
+                'ground_truth_label': context['ground_truth_label'],
+                'ground_truth_class_index': context['ground_truth_class_index'],
+                'checked_categories': context['checked_categories'],
+                'bboxes': context['bboxes'],
+                'bboxes_source': context['bboxes_source'],
+                'label_type': context['label_type'],
+                'cluster_name': context['cluster_name'],
+                # A list keeps the top-k order, JSON object keys would be sorted
+                'similar_images': [
+                    {'class_id': int(class_id),
+                     'class_name': human_readable_classes_map.get(str(class_id), str(class_id)),
+                     'images': images}
+                    for class_id, images in context['similar_images'].items()
+                ]
+            }
+        })
+
     @app.route('/<username>/sanity_check/<mode>/save', methods=['POST'])
     def save_sanity_check(username, mode):
         """Save annotations for sanity check mode and navigate to next/previous image."""
-        import timeit
-        start = timeit.default_timer()
 
         # Get form data
         image_name, checkbox_values, direction = get_form_data()
@@ -1668,25 +1992,20 @@ def register_routes(app):
         # Determine mode suffix for file naming: Mode 1 = 'S', Mode 2 = 'M'
         mode_suffix = 'S' if mode == '1' else 'M'
 
-        # Load and update user data from mode-specific file
-        checkbox_selections = load_user_data(app, username, mode=mode_suffix)
-
         # Create or update the image data structure
         if bboxes:
             image_data = {
                 "bboxes": bboxes['bboxes'],
                 "label_type": label_type
             }
-            checkbox_selections[base_image_name] = image_data
         else:
             image_data = {
                 "bboxes": [],
                 "label_type": label_type
             }
-            checkbox_selections[base_image_name] = image_data
 
-        # Save the updated checkbox selections to mode-specific file
-        save_user_data(app, username, checkbox_selections=checkbox_selections, mode=mode_suffix)
+        # Save the image's checkbox selections to the mode-specific file
+        save_user_image(app, username, base_image_name, image_data, mode=mode_suffix)
 
         # Get current image index and navigate
         current_image_index = int(request.form.get('current_image_index', 0))
@@ -1723,7 +2042,6 @@ def register_routes(app):
         else:
             new_index = current_image_index
 
-        print(f"Time taken in save_sanity_check: {timeit.default_timer() - start}")
         return redirect(url_for('sanity_check_detail', username=username, mode=mode, image_index=new_index))
 
     @app.route('/<username>/save_bboxes', methods=['POST'])
@@ -1752,21 +2070,14 @@ def register_routes(app):
             # Extract base image name regardless of path
             base_image_name = os.path.basename(image_name)
 
-            # Load existing checkbox selections
-            checkbox_selections = load_user_data(app, username)
-
             # Check if we already have label_type info for this image
             label_type = "basic" if not is_uncertain else "uncertain"
 
-            checkbox_selections[base_image_name] = {
+            # Save the image's checkbox selections
+            save_user_image(app, username, base_image_name, {
                 "bboxes": bboxes,
                 "label_type": label_type
-            }
-
-            # Save the updated checkbox selections
-            checkbox_path = os.path.join(app.config['ANNOTATORS_ROOT_DIRECTORY'], username,
-                                         f"checkbox_selections_{username}.json")
-            save_json_data(checkbox_path, checkbox_selections)
+            })
 
             return jsonify({'success': True, 'message': 'Bboxes saved successfully'})
 
@@ -1805,19 +2116,14 @@ def register_routes(app):
             # Determine mode suffix for file naming: Mode 1 = 'S', Mode 2 = 'M'
             mode_suffix = 'S' if mode == '1' else 'M'
 
-            # Load existing checkbox selections from mode-specific file
-            checkbox_selections = load_user_data(app, username, mode=mode_suffix)
-
             # Check if we already have label_type info for this image
             label_type = "basic" if not is_uncertain else "uncertain"
 
-            checkbox_selections[base_image_name] = {
+            # Save the image's checkbox selections to the mode-specific file
+            save_user_image(app, username, base_image_name, {
                 "bboxes": bboxes,
                 "label_type": label_type
-            }
-
-            # Save the updated checkbox selections to mode-specific file
-            save_user_data(app, username, checkbox_selections=checkbox_selections, mode=mode_suffix)
+            }, mode=mode_suffix)
 
             return jsonify({'success': True, 'message': 'Bboxes saved successfully'})
 
@@ -1832,8 +2138,6 @@ def register_routes(app):
         Handle jumping to a specific cluster while saving checkbox selections
         This functions similar to save_grid but with a different navigation target
         """
-        import timeit
-        start = timeit.default_timer()
 
         # Get form data - same as in save_grid
         image_paths, checkbox_values, direction = get_form_data()
@@ -1865,9 +2169,7 @@ def register_routes(app):
             # Load user data
             checkbox_selections = load_user_data(app, username)
             bboxes_dict = app.load_bbox_openclip_data(username)
-            man_annotated_bboxes_dict = read_json_file(
-                os.path.join(app.config['ANNOTATORS_ROOT_DIRECTORY'], username, f'checkbox_selections_{username}.json'),
-                app) or {}
+            man_annotated_bboxes_dict = dict(checkbox_selections)  # As loaded, before this page's changes
 
             checked_images_count = 0
             # Process each image in the grid
@@ -1917,15 +2219,14 @@ def register_routes(app):
             # Update the in-memory index
             update_current_image_index_simple(app, username, app.current_image_index_dct, target_index)
 
-            # Save the checkbox selections
-            save_user_data(app, username, checkbox_selections=checkbox_selections)
+            # Save the checkbox selections of this page
+            save_user_data(app, username, checkbox_selections=checkbox_selections, image_names=all_image_base_names)
 
             # Trigger background upload to Google Drive when jumping to a cluster
             trigger_background_upload(app.config.get('UPLOAD_USERNAME'))
 
             app.logger.info(f"User {username} jumped to cluster {cluster_name}, class {target_class}")
 
-            print(f"Time taken in jump_to_cluster: {timeit.default_timer() - start}")
             return redirect(url_for('grid_image', username=username))
         except (IndexError, ValueError) as e:
             app.logger.error(f"Error jumping to cluster {cluster_name}: {e}")
@@ -1980,13 +2281,9 @@ def register_routes(app):
 
             # Find the current image data in proposals_info
             current_image_data = None
-            current_image_index = -1
-
-            for i, data in enumerate(proposals_info):
-                if data['image_name'] == base_image_name:
-                    current_image_data = data
-                    current_image_index = i
-                    break
+            current_image_index = find_image_index(proposals_info, base_image_name)
+            if current_image_index >= 0:
+                current_image_data = proposals_info[current_image_index]
 
             if current_image_data is None:
                 # If image not found by name, fallback to the current index
@@ -1997,8 +2294,8 @@ def register_routes(app):
             # image_softmax_dict = get_image_softmax_dict(proposals_info)
             # top_categories = image_softmax_dict[current_image_data['image_name']][:20]
 
-            # load softmax values only for the current image, not for all at once
-            top_categories = np.argsort(proposals_info[current_image_index]["softmax_val"])[::-1][:20]
+            # load softmax values only for the current image, not for all at once (dense or top-k encoded)
+            top_categories = get_top_classes(proposals_info[current_image_index], 20)
 
             # If we have specific class IDs, filter top categories to only include those
             if specific_class_ids:
@@ -2060,8 +2357,8 @@ def register_routes(app):
     def upload_to_drive():
         """Upload user annotation data to Google Drive."""
         try:
-            # Check if Google Drive is enabled
-            if not app.config.get('GOOGLE_DRIVE_ENABLED', False):
+            # Check if syncing is enabled
+            if app.sync_backend is None:
                 return jsonify({'error': 'Google Drive integration is disabled'}), 400
 
             # Get username from config
@@ -2069,55 +2366,76 @@ def register_routes(app):
             if not username:
                 return jsonify({'error': 'Username not configured'}), 400
 
-            # Initialize Google Drive service
-            drive_service = GoogleDriveService(
-                app.config.get('GOOGLE_DRIVE_CREDENTIALS_FILE'),
-                app.config.get('GOOGLE_DRIVE_TOKEN_FILE')
-            )
+            drive_service = app.sync_backend
 
             # Get user data directory
             user_data_dir = os.path.join(app.config['ANNOTATORS_ROOT_DIRECTORY'], username)
 
             # Get folder ID from config if specified
-            folder_id = app.config.get('GOOGLE_DRIVE_FOLDER_ID')
+            folder_id = get_sync_folder_id('GOOGLE_DRIVE_FOLDER_ID')
+
+            # The JSON files are what gets uploaded, whatever the annotation backend
+            export_user_files(app, username)
+
+            # Dry run: report which files would be transferred without uploading anything
+            if request.args.get('dry_run', 'false').lower() in ('1', 'true'):
+                dry_run_results = drive_service.upload_user_data(username, user_data_dir, folder_id, dry_run=True)
+                return jsonify(dry_run_results)
 
             app.logger.info(f"Google Drive upload for user {username} started. Data directory: {user_data_dir}, Folder ID: {folder_id}")
-            
-            # Upload data to Google Drive
-            upload_results = drive_service.upload_user_data(username, user_data_dir, folder_id)
+
+            # Connect once up front, the transfers below run concurrently
+            drive_service.connect()
 
             # Get time tracking data and upload both JSON and Google Sheet
             time_tracker = get_time_tracker()
             time_tracking_results = {'success': True, 'errors': []}
             json_upload_results = {'success': True, 'errors': []}
-            
+            json_upload_future = None
+
             # Always try to upload time tracking data if it exists
             if time_tracker and time_tracker.session_data:
                 # Finalize the current session to ensure complete data
                 time_tracker.finalize_session()
-                
+
                 # Get time tracking folder ID (same folder for both JSON and Google Sheets)
-                time_tracking_folder_id = app.config.get('GOOGLE_DRIVE_TIME_TRACKING_FOLDER_ID')
-                
-                # Upload time tracking JSON file
-                json_upload_results = drive_service.upload_time_tracking_json(
+                time_tracking_folder_id = get_sync_folder_id('GOOGLE_DRIVE_TIME_TRACKING_FOLDER_ID')
+
+                # Upload time tracking JSON file alongside the annotation files
+                json_upload_future = app.transfer_engine.submit(
+                    drive_service.upload_time_tracking_json,
                     username,
                     time_tracker.session_data,
                     user_data_dir,
                     time_tracking_folder_id
                 )
-                
+
+            # Upload data to Google Drive
+            with app.metrics.stage('drive_upload'), get_sync_lock(username):
+                upload_results = drive_service.upload_user_data(username, user_data_dir, folder_id)
+
+            if time_tracker and time_tracker.session_data and hasattr(drive_service, 'create_time_tracking_sheet'):
                 # Upload time tracking data as Google Sheet (only if there are class sessions)
                 if time_tracker.session_data.get('class_sessions'):
-                    time_tracking_results = drive_service.create_time_tracking_sheet(
-                        username, 
-                        time_tracker.session_data, 
-                        time_tracking_folder_id
-                    )
+                    with app.metrics.stage('drive_sheet'):
+                        time_tracking_results = drive_service.create_time_tracking_sheet(
+                            username,
+                            time_tracker.session_data,
+                            time_tracking_folder_id,
+                            local_data_dir=user_data_dir
+                        )
                 else:
                     app.logger.info(f"No class sessions found for user {username}, skipping Google Sheet creation")
                     time_tracking_results = {'success': True, 'message': 'No class sessions to export'}
 
+            if json_upload_future is not None:
+                outcome = json_upload_future.result()
+                if outcome['error'] is not None:
+                    json_upload_results = {'success': False,
+                                           'errors': [f"Error uploading time tracking JSON: {outcome['error']}"]}
+                else:
+                    json_upload_results = outcome['result']
+
             # Determine overall success
             overall_success = (upload_results['success'] and 
                              time_tracking_results['success'] and 
@@ -2128,7 +2446,8 @@ def register_routes(app):
                 response_data = {
                     'success': True,
                     'message': f"Successfully uploaded all data to Google Drive",
-                    'uploaded_files': upload_results['uploaded_files']
+                    'uploaded_files': upload_results['uploaded_files'],
+                    'skipped_files': upload_results['skipped_files']
                 }
                 
                 # Add time tracking JSON info if uploaded
@@ -2162,8 +2481,8 @@ def register_routes(app):
     def download_from_drive():
         """Download user annotation data from Google Drive."""
         try:
-            # Check if Google Drive is enabled
-            if not app.config.get('GOOGLE_DRIVE_ENABLED', False):
+            # Check if syncing is enabled
+            if app.sync_backend is None:
                 return jsonify({'error': 'Google Drive integration is disabled'}), 400
 
             # Get username from config
@@ -2171,20 +2490,20 @@ def register_routes(app):
             if not username:
                 return jsonify({'error': 'Username not configured'}), 400
 
-            # Initialize Google Drive service
-            drive_service = GoogleDriveService(
-                app.config.get('GOOGLE_DRIVE_CREDENTIALS_FILE'),
-                app.config.get('GOOGLE_DRIVE_TOKEN_FILE')
-            )
+            drive_service = app.sync_backend
 
             # Get user data directory
             user_data_dir = os.path.join(app.config['ANNOTATORS_ROOT_DIRECTORY'], username)
 
             # Get folder ID from config if specified
-            folder_id = app.config.get('GOOGLE_DRIVE_FOLDER_ID')
+            folder_id = get_sync_folder_id('GOOGLE_DRIVE_FOLDER_ID')
+
+            # Pending background uploads would push the data that is about to be replaced
+            app.upload_scheduler.cancel(username)
 
             # Download data from Google Drive
-            download_results = drive_service.download_user_data(username, user_data_dir, folder_id)
+            with app.metrics.stage('drive_download'), get_sync_lock(username):
+                download_results = drive_service.download_user_data(username, user_data_dir, folder_id)
 
             if download_results['success']:
                 app.logger.info(f"Successfully downloaded data for user {username} from Google Drive")
@@ -2192,18 +2511,14 @@ def register_routes(app):
                 # Clear user cache to force reload with new data
                 if username in app.user_cache:
                     del app.user_cache[username]
+                app.page_warmer.invalidate(username)
+                app.page_cache.invalidate(username)
                 
-                # Reload current image index from file if it exists
-                index_file_path = os.path.join(app.config['ANNOTATORS_ROOT_DIRECTORY'], username,
-                                               f'current_image_index_{username}.txt')
-                if os.path.exists(index_file_path):
-                    try:
-                        with open(index_file_path, 'r') as f:
-                            app.current_image_index_dct[username] = int(f.read())
-                    except (ValueError, FileNotFoundError):
-                        app.current_image_index_dct[username] = 0
-                else:
-                    app.current_image_index_dct[username] = 0
+                # Load the downloaded files into the annotation store and reload the current image index
+                app.navigation_state.forget(username)
+                import_user_files(app, username)
+                current_image_index = load_current_image_index(app, username)
+                app.current_image_index_dct[username] = current_image_index if current_image_index is not None else 0
                 
                 # Repopulate the cache with the newly downloaded data
                 from app.app_utils import load_user_specific_data
@@ -2232,9 +2547,19 @@ def register_routes(app):
     def check_drive_status():
         """Check if Google Drive service is available and user has data."""
         try:
-            if not app.config.get('GOOGLE_DRIVE_ENABLED', False):
+            if app.sync_backend is None:
                 return jsonify({'available': False, 'reason': 'Google Drive integration is disabled'})
 
+            if app.config.get('GOOGLE_DRIVE_USE_FAKE', False):
+                return jsonify({'available': True, 'message': 'Using local fake Google Drive'})
+
+            if app.config.get('SYNC_BACKEND', 'google_drive') != 'google_drive':
+                app.sync_backend.connect()
+                return jsonify({
+                    'available': True,
+                    'message': f'{app.sync_backend.backend_name} sync backend is available'
+                })
+
             # Check if credentials file exists
             credentials_file = app.config.get('GOOGLE_DRIVE_CREDENTIALS_FILE')
             if not os.path.exists(credentials_file):
@@ -2243,14 +2568,8 @@ def register_routes(app):
                     'reason': 'Google Drive credentials file not found'
                 })
 
-            # Try to initialize service (this will check authentication)
-            drive_service = GoogleDriveService(
-                app.config.get('GOOGLE_DRIVE_CREDENTIALS_FILE'),
-                app.config.get('GOOGLE_DRIVE_TOKEN_FILE')
-            )
-            
             # Try to authenticate to check if service is working
-            drive_service.authenticate()
+            app.sync_backend.connect()
 
             return jsonify({
                 'available': True,
@@ -2264,6 +2583,83 @@ def register_routes(app):
                 'reason': f'Google Drive service error: {str(e)}'
             })
 
+    @app.route('/sync_status', methods=['GET'])
+    def sync_status():
+        """Report the background upload queue, last successful sync per user and transfer statistics."""
+        status = app.upload_scheduler.get_status()
+        status['transfers'] = app.transfer_engine.get_stats()
+        return jsonify(status)
+
+    @app.route('/navigation_status', methods=['GET'])
+    def navigation_status():
+        """Report the navigation state writes: changes, batches written and changes not written yet."""
+        return jsonify(app.navigation_state.get_stats())
+
+    @app.route('/page_cache_status', methods=['GET'])
+    def page_cache_status():
+        """Report hits, evictions and the size of the rendered page cache."""
+        return jsonify(app.page_cache.get_stats())
+
+    @app.route('/page_warmer_status', methods=['GET'])
+    def page_warmer_status():
+        """Report how often labeling pages were served from warmed contexts."""
+        return jsonify(app.page_warmer.get_stats())
+
+    @app.route('/asset_pipeline_status', methods=['GET'])
+    def asset_pipeline_status():
+        """Report the size savings of the static asset pipeline and the encodings served."""
+        pipeline = getattr(app, 'asset_pipeline', None)
+        if pipeline is None:
+            return jsonify({'enabled': False})
+        return jsonify(dict(pipeline.get_stats(), enabled=True))
+
+    @app.route('/compression_status', methods=['GET'])
+    def compression_status():
+        """Report the bytes before and after response compression, per route."""
+        compression = getattr(app, 'compression', None)
+        if compression is None:
+            return jsonify({'enabled': False})
+        return jsonify(dict(compression.get_stats(), enabled=True))
+
+    @app.route('/logging_status', methods=['GET'])
+    def logging_status():
+        """Report queued, dropped and rate-limited log records."""
+        return jsonify(app.logging_pipeline.get_stats())
+
+    @app.route('/profiling_status', methods=['GET'])
+    def profiling_status():
+        """List the written profiles, newest first."""
+        if app.profiler is None:
+            return jsonify({'enabled': False})
+        return jsonify(dict(app.profiler.get_stats(), enabled=True))
+
+    @app.route('/trace_status', methods=['GET'])
+    def trace_status():
+        """Report recorded and dropped trace lines and the current trace file."""
+        if app.trace_recorder is None:
+            return jsonify({'enabled': False})
+        return jsonify(dict(app.trace_recorder.get_stats(), enabled=True))
+
+    # Opt-in: walking all caches holds the GIL for seconds on large datasets, so the route stalls its worker
+    if app.config.get('MEMORY_DEBUG_ENDPOINT_ENABLED', False):
+        @app.route('/debug/memory', methods=['GET'])
+        def debug_memory():
+            """Deep sizes of the caches and of every user's data, and the memory of each startup stage."""
+            report = get_memory_report(app, per_user=request.args.get('per_user', '1') != '0')
+            report['startup'] = app.startup_memory.get_stats()
+            report['budget_mb'] = app.config.get('MEMORY_BUDGET_MB')
+            return jsonify(report)
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        """Per-route stage latencies in the Prometheus text format (JSON summaries with ?format=json)."""
+        if request.args.get('format') == 'json':
+            return jsonify(app.metrics.get_stats())
+        response = make_response(app.metrics.render_prometheus())
+        response.mimetype = 'text/plain'
+        response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+        return response
+
     @app.route('/time_tracking_status', methods=['GET'])
     def time_tracking_status():
         """Get current time tracking status for debugging."""
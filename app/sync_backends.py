@@ -0,0 +1,589 @@
+"""
+Storage backends for syncing annotator data (checkbox selections and time tracking files).
+
+SyncBackend implements the sync logic shared by every backend: the content-hash manifest,
+optional gzip compression, concurrent transfers and atomic downloads. Backends only provide a
+few storage primitives. Available backends: Google Drive (GoogleDriveService), a local or
+NFS-mounted directory, and S3-compatible object storage.
+"""
+
+import os
+import gzip
+import shutil
+import logging
+import tempfile
+import threading
+
+from app.sync_manifest import SyncManifest, compute_file_hash, get_manifest_path
+from app.transfer_engine import TransferEngine, normalize_chunk_size
+
+try:
+    import boto3
+    from botocore.config import Config as BotoConfig
+except ImportError:
+    boto3 = None
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+def get_checkbox_filenames(username):
+    """All checkbox_selections files of a user (default + mode-specific)."""
+    return [
+        f"checkbox_selections_{username}.json",       # Default mode
+        f"checkbox_selections_{username}_S.json",     # Sanity Check Mode 1
+        f"checkbox_selections_{username}_M.json"      # Sanity Check Mode 2
+    ]
+
+
+def gzip_to_temp_file(local_file_path):
+    """Write a gzipped copy of the file to a temporary path and return that path."""
+    fd, tmp_path = tempfile.mkstemp(suffix='.gz')
+    with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb', mtime=0) as gz, \
+            open(local_file_path, 'rb') as src:
+        shutil.copyfileobj(src, gz)
+    return tmp_path
+
+
+def finalize_download(tmp_path, local_file_path):
+    """
+    Move a fully downloaded temporary file into place, decompressing it first if it was stored
+    gzipped. The temporary file must live in the destination directory so the rename is atomic.
+    """
+    with open(tmp_path, 'rb') as f:
+        is_gzipped = f.read(len(GZIP_MAGIC)) == GZIP_MAGIC
+    if is_gzipped:
+        fd, plain_path = tempfile.mkstemp(dir=os.path.dirname(tmp_path), prefix='.download_', suffix='.part')
+        with os.fdopen(fd, 'wb') as dst, gzip.open(tmp_path, 'rb') as src:
+            shutil.copyfileobj(src, dst)
+        os.remove(tmp_path)
+        tmp_path = plain_path
+    os.replace(tmp_path, local_file_path)
+
+
+def make_download_temp_file(local_file_path):
+    """Create a temporary file next to local_file_path; returns (fd, path)."""
+    target_dir = os.path.dirname(os.path.abspath(local_file_path))
+    os.makedirs(target_dir, exist_ok=True)
+    return tempfile.mkstemp(dir=target_dir, prefix='.download_', suffix='.part')
+
+
+class SyncBackend:
+    """
+    Base class for sync backends.
+
+    Subclasses implement the storage primitives (connect, resolve_location,
+    resolve_time_tracking_location, put_file, find_files, get_file); the upload and download
+    workflows below are shared so every backend benefits from the same optimizations.
+    """
+
+    backend_name = 'base'
+
+    def __init__(self, transfer_engine=None, compress_threshold=None, chunk_size=None):
+        """
+        Args:
+            transfer_engine: Shared TransferEngine used to run file transfers concurrently
+            compress_threshold: Files of at least this many bytes are gzipped before upload (None disables)
+            chunk_size: Transfer chunk size in bytes (rounded up to a multiple of 256 KiB)
+        """
+        self.transfer_engine = transfer_engine or TransferEngine()
+        self.compress_threshold = compress_threshold
+        self.chunk_size = normalize_chunk_size(chunk_size)
+        self.logger = logging.getLogger(__name__)
+
+    # Storage primitives ------------------------------------------------------------------------
+
+    def connect(self):
+        """Establish the connection/credentials once; called before any transfer."""
+
+    def manifest_target(self, target_folder_id=None):
+        """
+        Identify the sync destination in the manifest, so switching backends or folders does not
+        skip files that were only uploaded to the previous destination.
+        """
+        return target_folder_id
+
+    def resolve_location(self, username, target_folder_id=None, create=True):
+        """Return the backend-specific location of a user's files (None if missing and create is False)."""
+        raise NotImplementedError
+
+    def resolve_time_tracking_location(self, folder_id=None):
+        """Return the location time tracking files are uploaded to."""
+        raise NotImplementedError
+
+    def put_file(self, local_file_path, remote_name, location, remote_id=None, compress=False):
+        """Upload a file. Returns a dictionary with the remote 'id' and 'revision'."""
+        raise NotImplementedError
+
+    def find_files(self, remote_names, location):
+        """Look up several files at once. Returns {remote_name: remote_id} for those that exist."""
+        raise NotImplementedError
+
+    def get_file(self, remote_id, local_file_path):
+        """Download a file atomically to local_file_path. Returns True if successful."""
+        raise NotImplementedError
+
+    # Shared workflows --------------------------------------------------------------------------
+
+    def upload_user_data(self, username, local_data_dir, target_folder_id=None, dry_run=False, cancel_event=None):
+        """
+        Upload checkbox selections files.
+
+        Only files whose content changed since the last successful upload are transferred; the
+        state of previous uploads is kept in a sync manifest inside the local data directory.
+
+        Args:
+            username: Username of the annotator
+            local_data_dir: Local directory containing user data
+            target_folder_id: Backend folder/location to save to (if None, uses default structure)
+            dry_run: Only report what would be transferred, without contacting the backend
+            cancel_event: threading.Event checked between file uploads; remaining files are skipped once set.
+                          Files are then uploaded one after another instead of concurrently
+
+        Returns:
+            Dictionary with upload results ('permanent' is True for failures retrying cannot fix)
+        """
+        results = {
+            'success': True,
+            'permanent': False,
+            'dry_run': dry_run,
+            'uploaded_files': [],
+            'skipped_files': [],
+            'pending_files': [],
+            'cancelled': False,
+            'errors': []
+        }
+
+        try:
+            manifest = SyncManifest(get_manifest_path(local_data_dir, username))
+            manifest_target = self.manifest_target(target_folder_id)
+
+            # Compare local content against the manifest before touching the network
+            files_found = False
+            pending = []
+            for checkbox_filename in get_checkbox_filenames(username):
+                local_file_path = os.path.join(local_data_dir, checkbox_filename)
+                if not os.path.exists(local_file_path):
+                    continue
+                files_found = True
+
+                content_hash, size = compute_file_hash(local_file_path)
+                if manifest.is_unchanged(checkbox_filename, content_hash, size, manifest_target):
+                    results['skipped_files'].append(checkbox_filename)
+                    continue
+
+                compress = self.compress_threshold is not None and size >= self.compress_threshold
+                pending.append((checkbox_filename, local_file_path, content_hash, size, compress))
+                results['pending_files'].append({
+                    'filename': checkbox_filename,
+                    'size': size,
+                    'compress': compress
+                })
+
+            if not files_found:
+                results['errors'].append(f"No checkbox selections files found for user {username}")
+                results['success'] = False
+                results['permanent'] = True
+                return results
+
+            if dry_run or not pending:
+                if not pending:
+                    self.logger.debug(f"All checkbox selections files of {username} are unchanged, nothing to upload")
+                return results
+
+            try:
+                self.connect()
+            except (FileNotFoundError, ImportError):
+                # Missing credentials or client library: retrying cannot help until the setup is fixed
+                results['permanent'] = True
+                raise
+            location = self.resolve_location(username, target_folder_id, create=True)
+
+            def upload_pending_file(pending_file):
+                checkbox_filename, local_file_path, content_hash, size, compress = pending_file
+                if cancel_event is not None and cancel_event.is_set():
+                    return {'cancelled': True}
+                entry = manifest.get(checkbox_filename) or {}
+                known_id = entry.get('file_id') if entry.get('folder_id') == manifest_target else None
+                remote = self.put_file(local_file_path, checkbox_filename, location,
+                                       remote_id=known_id, compress=compress)
+                manifest.record(checkbox_filename, content_hash, size,
+                                file_id=remote.get('id'),
+                                revision_id=remote.get('revision'),
+                                folder_id=manifest_target,
+                                compressed=compress)
+                return {'remote': remote, 'bytes': size}
+
+            # Files are independent, so they are transferred concurrently. A cancellable upload sends them
+            # one at a time instead: with all of them started at once, there is no "between files" to stop at
+            outcomes = self.transfer_engine.map(upload_pending_file, pending, concurrent=cancel_event is None)
+            for outcome in outcomes:
+                checkbox_filename, _, _, size, compress = outcome['item']
+                if outcome['error'] is not None:
+                    results['errors'].append(f"Error uploading {checkbox_filename}: {str(outcome['error'])}")
+                    self.logger.warning(f"Failed to upload {checkbox_filename}: {str(outcome['error'])}")
+                elif outcome['result'].get('cancelled'):
+                    results['cancelled'] = True
+                    self.logger.info(f"Upload of {checkbox_filename} for user {username} cancelled")
+                else:
+                    results['uploaded_files'].append({
+                        'filename': checkbox_filename,
+                        'file_id': outcome['result']['remote'].get('id'),
+                        'size': size,
+                        'compressed': compress,
+                        'seconds': outcome['seconds']
+                    })
+                    self.logger.info(f"Successfully uploaded {checkbox_filename} for user {username}")
+
+            if results['uploaded_files']:
+                manifest.save()
+
+            # Only set success to False if NO pending file could be uploaded at all
+            if not results['uploaded_files'] and not results['cancelled']:
+                results['success'] = False
+
+        except Exception as e:
+            results['success'] = False
+            results['errors'].append(f"General error: {str(e)}")
+
+        return results
+
+    def download_user_data(self, username, local_data_dir, target_folder_id=None):
+        """
+        Download checkbox selections files.
+
+        Args:
+            username: Username of the annotator
+            local_data_dir: Local directory to save downloaded data
+            target_folder_id: Backend folder/location to download from (if None, uses default structure)
+
+        Returns:
+            Dictionary with download results
+        """
+        results = {
+            'success': True,
+            'downloaded_files': [],
+            'errors': []
+        }
+
+        try:
+            self.connect()
+            location = self.resolve_location(username, target_folder_id, create=False)
+            if location is None:
+                results['errors'].append(f"No data found for user {username} on {self.backend_name}")
+                results['success'] = False
+                return results
+
+            # Create local directory if it doesn't exist
+            os.makedirs(local_data_dir, exist_ok=True)
+
+            manifest = SyncManifest(get_manifest_path(local_data_dir, username))
+
+            # One batched lookup for all files
+            remote_ids = self.find_files(get_checkbox_filenames(username), location)
+
+            def download_checkbox_file(checkbox_filename):
+                local_file_path = os.path.join(local_data_dir, checkbox_filename)
+                if not self.get_file(remote_ids[checkbox_filename], local_file_path):
+                    return {'downloaded': False}
+                # The local copy now matches the remote one, so the next upload can skip it
+                content_hash, size = compute_file_hash(local_file_path)
+                manifest.record(checkbox_filename, content_hash, size, file_id=remote_ids[checkbox_filename],
+                                folder_id=self.manifest_target(target_folder_id))
+                return {'downloaded': True, 'bytes': size}
+
+            files_downloaded = False
+            for outcome in self.transfer_engine.map(download_checkbox_file, list(remote_ids)):
+                checkbox_filename = outcome['item']
+                if outcome['error'] is not None:
+                    results['errors'].append(f"Error downloading {checkbox_filename}: {str(outcome['error'])}")
+                    self.logger.warning(f"Error downloading {checkbox_filename}: {str(outcome['error'])}")
+                elif outcome['result']['downloaded']:
+                    results['downloaded_files'].append(checkbox_filename)
+                    self.logger.info(f"Successfully downloaded {checkbox_filename} for user {username}")
+                    files_downloaded = True
+                else:
+                    results['errors'].append(f"Failed to download {checkbox_filename}")
+                    self.logger.warning(f"Failed to download {checkbox_filename}")
+
+            if files_downloaded:
+                manifest.save()
+
+            # Only set success to False if NO files were downloaded at all
+            if not files_downloaded:
+                results['errors'].append(
+                    f"No checkbox selections files found for user {username} on {self.backend_name}")
+                results['success'] = False
+
+        except Exception as e:
+            results['success'] = False
+            results['errors'].append(f"General error: {str(e)}")
+
+        return results
+
+    def upload_time_tracking_json(self, username, session_data, local_data_dir, folder_id=None):
+        """
+        Upload time tracking JSON file.
+
+        Args:
+            username: Username of the annotator
+            session_data: Time tracking session data
+            local_data_dir: Local directory containing time tracking files
+            folder_id: Backend folder/location to save to
+
+        Returns:
+            Dictionary with upload results
+        """
+        results = {
+            'success': True,
+            'uploaded_file': None,
+            'errors': []
+        }
+
+        try:
+            self.connect()
+            location = self.resolve_time_tracking_location(folder_id)
+
+            # Find the time tracking JSON file for this session
+            session_id = session_data.get('session_id')
+            json_filename = f"time_tracking_{session_id}.json"
+            local_file_path = os.path.join(local_data_dir, json_filename)
+
+            if os.path.exists(local_file_path):
+                try:
+                    # Use session-specific filename to ensure uniqueness
+                    remote_filename = f"Time_Tracking_{username}_{session_id}.json"
+
+                    remote = self.put_file(local_file_path, remote_filename, location)
+                    results['uploaded_file'] = {
+                        'filename': remote_filename,
+                        'file_id': remote.get('id'),
+                        'local_path': local_file_path
+                    }
+                    self.logger.info(f"Successfully uploaded {remote_filename} for user {username}")
+                except Exception as e:
+                    results['errors'].append(f"Error uploading {json_filename}: {str(e)}")
+                    results['success'] = False
+            else:
+                results['errors'].append(f"Time tracking JSON file not found: {local_file_path}")
+                results['success'] = False
+
+        except Exception as e:
+            results['success'] = False
+            results['errors'].append(f"General error uploading time tracking JSON: {str(e)}")
+
+        return results
+
+
+class LocalDirectoryBackend(SyncBackend):
+    """
+    Syncs into a local or NFS-mounted directory: <root>/<username>/ and <root>/Time_Tracking/.
+
+    Files are written to a temporary name in the destination directory and renamed into place,
+    so readers on other machines never see partial files.
+    """
+
+    backend_name = 'local directory'
+
+    def __init__(self, root_dir, **kwargs):
+        super().__init__(**kwargs)
+        self.root_dir = root_dir
+
+    def manifest_target(self, target_folder_id=None):
+        return f"local:{os.path.abspath(self.root_dir)}/{target_folder_id or ''}"
+
+    def resolve_location(self, username, target_folder_id=None, create=True):
+        location = os.path.join(self.root_dir, target_folder_id or username)
+        if create:
+            os.makedirs(location, exist_ok=True)
+        return location if os.path.isdir(location) else None
+
+    def resolve_time_tracking_location(self, folder_id=None):
+        location = os.path.join(self.root_dir, folder_id or 'Time_Tracking')
+        os.makedirs(location, exist_ok=True)
+        return location
+
+    def put_file(self, local_file_path, remote_name, location, remote_id=None, compress=False):
+        remote_path = os.path.join(location, remote_name)
+        fd, tmp_path = tempfile.mkstemp(dir=location, prefix='.upload_', suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as dst:
+                if compress:
+                    with gzip.GzipFile(fileobj=dst, mode='wb', mtime=0) as gz, open(local_file_path, 'rb') as src:
+                        shutil.copyfileobj(src, gz, self.chunk_size)
+                else:
+                    with open(local_file_path, 'rb') as src:
+                        shutil.copyfileobj(src, dst, self.chunk_size)
+            os.replace(tmp_path, remote_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return {'id': remote_path, 'revision': str(os.stat(remote_path).st_mtime_ns)}
+
+    def find_files(self, remote_names, location):
+        existing = set(os.listdir(location))
+        return {name: os.path.join(location, name) for name in remote_names if name in existing}
+
+    def get_file(self, remote_id, local_file_path):
+        fd, tmp_path = make_download_temp_file(local_file_path)
+        try:
+            with os.fdopen(fd, 'wb') as dst, open(remote_id, 'rb') as src:
+                shutil.copyfileobj(src, dst, self.chunk_size)
+            finalize_download(tmp_path, local_file_path)
+            return True
+        except OSError as error:
+            self.logger.error(f"Error downloading file: {error}")
+            return False
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+class S3Backend(SyncBackend):
+    """
+    Syncs into an S3-compatible bucket (AWS S3, MinIO, Ceph, ...) under <prefix>/<username>/.
+
+    A single client, and therefore a single connection pool sized to the transfer pool, is
+    shared by all users.
+    """
+
+    backend_name = 'S3'
+
+    def __init__(self, bucket, prefix='multilabelfy', client=None, endpoint_url=None, region_name=None, **kwargs):
+        """
+        Args:
+            bucket: Bucket name
+            prefix: Key prefix for all synced files
+            client: Pre-built S3 client (e.g. FakeS3Client); built with boto3 if None
+            endpoint_url: Endpoint of an S3-compatible server (None for AWS)
+            region_name: Region of the bucket
+        """
+        super().__init__(**kwargs)
+        self.bucket = bucket
+        self.prefix = prefix.strip('/')
+        self.client = client
+        self.endpoint_url = endpoint_url
+        self.region_name = region_name
+        self._connect_lock = threading.Lock()
+
+    def manifest_target(self, target_folder_id=None):
+        return f"s3:{self.endpoint_url or ''}/{self.bucket}/{self.prefix}/{target_folder_id or ''}"
+
+    def connect(self):
+        with self._connect_lock:
+            if self.client is not None:
+                return
+            if boto3 is None:
+                raise ImportError("boto3 is required for the S3 sync backend. Install it with `pip install boto3`.")
+            self.client = boto3.client(
+                's3',
+                endpoint_url=self.endpoint_url,
+                region_name=self.region_name,
+                config=BotoConfig(max_pool_connections=max(10, self.transfer_engine.max_workers * 2),
+                                  retries={'max_attempts': 5, 'mode': 'standard'})
+            )
+
+    def resolve_location(self, username, target_folder_id=None, create=True):
+        # Prefixes need no creation; a missing user simply has no keys
+        return f"{self.prefix}/{target_folder_id or username}"
+
+    def resolve_time_tracking_location(self, folder_id=None):
+        return f"{self.prefix}/{folder_id or 'Time_Tracking'}"
+
+    def put_file(self, local_file_path, remote_name, location, remote_id=None, compress=False):
+        key = f"{location}/{remote_name}"
+        compressed_path = gzip_to_temp_file(local_file_path) if compress else None
+        try:
+            with open(compressed_path or local_file_path, 'rb') as body:
+                response = self.client.put_object(Bucket=self.bucket, Key=key, Body=body)
+        finally:
+            if compressed_path:
+                os.remove(compressed_path)
+        return {'id': key, 'revision': response.get('VersionId') or response.get('ETag')}
+
+    def find_files(self, remote_names, location):
+        # One listing for all files instead of a HEAD request per file
+        wanted = {f"{location}/{name}": name for name in remote_names}
+        found = {}
+        kwargs = {'Bucket': self.bucket, 'Prefix': f"{location}/"}
+        while True:
+            response = self.client.list_objects_v2(**kwargs)
+            for obj in response.get('Contents', []):
+                if obj['Key'] in wanted:
+                    found[wanted[obj['Key']]] = obj['Key']
+            if not response.get('IsTruncated'):
+                return found
+            kwargs['ContinuationToken'] = response['NextContinuationToken']
+
+    def get_file(self, remote_id, local_file_path):
+        fd, tmp_path = make_download_temp_file(local_file_path)
+        try:
+            body = self.client.get_object(Bucket=self.bucket, Key=remote_id)['Body']
+            with os.fdopen(fd, 'wb') as dst:
+                for chunk in iter(lambda: body.read(self.chunk_size), b''):
+                    dst.write(chunk)
+            finalize_download(tmp_path, local_file_path)
+            return True
+        except Exception as error:
+            self.logger.error(f"Error downloading {remote_id}: {error}")
+            return False
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+def create_sync_backend(config, transfer_engine=None, drive_service=None, sheets_service=None, s3_client=None):
+    """
+    Build the sync backend selected by SYNC_BACKEND in the app config.
+
+    Args:
+        config: Flask app config
+        transfer_engine: Shared TransferEngine
+        drive_service/sheets_service: Pre-built Google API service objects (fakes for local runs)
+        s3_client: Pre-built S3 client (e.g. FakeS3Client)
+        With GOOGLE_DRIVE_USE_FAKE set, in-process fakes are built for the services that are not given.
+
+    Returns:
+        SyncBackend instance, or None if syncing is disabled
+    """
+    backend = config.get('SYNC_BACKEND', 'google_drive')
+    if config.get('GOOGLE_DRIVE_USE_FAKE', False):
+        # Imported only here, so the test stand-ins are not loaded in production
+        from app.fake_drive_service import FakeDriveService, FakeSheetsService
+        from app.fake_s3_client import FakeS3Client
+        if drive_service is None:
+            drive_service = FakeDriveService()
+        if sheets_service is None:
+            sheets_service = FakeSheetsService(drive=drive_service)
+        if s3_client is None:
+            s3_client = FakeS3Client()
+    common = {
+        'transfer_engine': transfer_engine,
+        'compress_threshold': config.get('GOOGLE_DRIVE_COMPRESS_THRESHOLD_BYTES'),
+        'chunk_size': config.get('GOOGLE_DRIVE_CHUNK_SIZE_BYTES')
+    }
+    if backend == 'google_drive':
+        if not config.get('GOOGLE_DRIVE_ENABLED', False):
+            return None
+        from app.google_drive_service import GoogleDriveService
+        return GoogleDriveService(
+            config.get('GOOGLE_DRIVE_CREDENTIALS_FILE'),
+            config.get('GOOGLE_DRIVE_TOKEN_FILE'),
+            service=drive_service,
+            sheets_service=sheets_service,
+            **common
+        )
+    if backend == 'local':
+        return LocalDirectoryBackend(config['SYNC_LOCAL_DIRECTORY'], **common)
+    if backend == 's3':
+        return S3Backend(
+            config['SYNC_S3_BUCKET'],
+            prefix=config.get('SYNC_S3_PREFIX', 'multilabelfy'),
+            endpoint_url=config.get('SYNC_S3_ENDPOINT_URL'),
+            region_name=config.get('SYNC_S3_REGION'),
+            client=s3_client,
+            **common
+        )
+    if backend is None:
+        return None
+    raise ValueError(f"Unknown SYNC_BACKEND: {backend}. Use 'google_drive', 'local', 's3' or None.")
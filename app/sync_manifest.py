@@ -0,0 +1,84 @@
+"""
+Keeps track of what has already been pushed to remote storage so unchanged files are not re-uploaded.
+"""
+
+import os
+import json
+import hashlib
+import threading
+from datetime import datetime
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def compute_file_hash(file_path):
+    """Return the SHA-256 hex digest and size in bytes of a file."""
+    digest = hashlib.sha256()
+    size = 0
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+
+class SyncManifest:
+    """
+    JSON-backed record of the last synced state of each file.
+
+    Entries are keyed by remote file name and store the content hash, size, remote file id,
+    last uploaded revision id, target folder and whether the remote copy is compressed.
+    """
+
+    def __init__(self, manifest_path):
+        self.manifest_path = manifest_path
+        self._lock = threading.Lock()
+        self.entries = self._load()
+
+    def _load(self):
+        try:
+            with open(self.manifest_path, 'r') as f:
+                return json.load(f).get('files', {})
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def save(self):
+        """Write the manifest atomically next to the data it describes."""
+        with self._lock:
+            os.makedirs(os.path.dirname(self.manifest_path) or '.', exist_ok=True)
+            tmp_path = f"{self.manifest_path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump({'files': self.entries}, f, indent=2)
+            os.replace(tmp_path, self.manifest_path)
+
+    def get(self, remote_name):
+        return self.entries.get(remote_name)
+
+    def is_unchanged(self, remote_name, content_hash, size, folder_id=None):
+        """True if the file was already uploaded with this exact content to the same folder."""
+        entry = self.entries.get(remote_name)
+        return (entry is not None and
+                entry.get('sha256') == content_hash and
+                entry.get('size') == size and
+                entry.get('folder_id') == folder_id)
+
+    def record(self, remote_name, content_hash, size, file_id=None, revision_id=None, folder_id=None,
+               compressed=False):
+        with self._lock:
+            self.entries[remote_name] = {
+                'sha256': content_hash,
+                'size': size,
+                'file_id': file_id,
+                'revision_id': revision_id,
+                'folder_id': folder_id,
+                'compressed': compressed,
+                'synced_at': datetime.now().isoformat()
+            }
+
+    def forget(self, remote_name):
+        with self._lock:
+            self.entries.pop(remote_name, None)
+
+
+def get_manifest_path(local_data_dir, username):
+    return os.path.join(local_data_dir, f"sync_manifest_{username}.json")
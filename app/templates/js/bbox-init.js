@@ -4,16 +4,12 @@
 document.addEventListener('DOMContentLoaded', function() {
     // Get bounding box data from the backend
     const bboxes = JSON.parse(document.getElementById('bbox-data').textContent);
-    const humanReadableClasses = JSON.parse(document.getElementById('human-readable-classes').textContent);
 
     const img = document.querySelector('#image-with-bboxes img');
     const canvas = document.createElement('canvas');
 
-    // Create a map of class labels
-    const classLabels = {};
-    for (const [classId, className] of Object.entries(humanReadableClasses)) {
-        classLabels[classId] = className;
-    }
+    // Map of class labels, filled in place by class-names.js once loaded
+    const classLabels = window.classNames.classes;
 
     // Check for gt field first and use it as labels if it exists
     if (bboxes.gt && !bboxes.labels) {
@@ -2,21 +2,23 @@
  * Class Jump functionality - Searchable dropdown for jumping to specific classes
  */
 
-// Initialize the searchable dropdown when DOM is ready
+// Initialize the searchable dropdown when DOM is ready and the class and cluster options are filled in
 document.addEventListener('DOMContentLoaded', function() {
-    // Create and initialize the searchable dropdown
-    initSearchableDropdown();
+    window.classNamesReady.then(function() {
+        // Create and initialize the searchable dropdown
+        initSearchableDropdown();
 
-    // Initialize the image index search functionality
-    initImageIndexSearch();
+        // Initialize the image index search functionality
+        initImageIndexSearch();
 
-    // Initialize the cluster dropdown functionality
-    initClusterDropdown();
+        // Initialize the cluster dropdown functionality
+        initClusterDropdown();
 
-    // Set up class dropdown navigation
-    initClassDropdownNavigation();
+        // Set up class dropdown navigation
+        initClassDropdownNavigation();
 
-    initCompareSearchableDropdown();
+        initCompareSearchableDropdown();
+    });
 });
 
 // Initialize searchable compare dropdown component
@@ -0,0 +1,113 @@
+/**
+ * Loads the class-name map and the cluster menu from the class names endpoint.
+ *
+ * The endpoint URL (data-src of this script tag) contains a hash of the content and is cached by the
+ * browser for a year, so the map is downloaded once instead of being inlined into every page.
+ *
+ * window.classNames.classes / .clusters are filled in place once loaded, so code that kept a reference
+ * sees the data. window.classNamesReady resolves after that and after the page elements below were filled:
+ * - #human-readable-classes: the map as JSON text, for code reading it from there
+ * - select[data-class-options]: one "<id> - <name>" option per class
+ * - select[data-cluster-options]: one "<cluster> (<n> classes)" option per cluster
+ * - [data-uncertainty-class-options]: the class checkboxes of the uncertainty modal
+ */
+window.classNames = {classes: {}, clusters: {}};
+
+window.classNamesReady = (function() {
+    const src = document.currentScript ? document.currentScript.dataset.src : null;
+    if (!src || !window.fetch) {
+        return Promise.resolve(window.classNames);
+    }
+
+    const domReady = new Promise(resolve => {
+        if (document.readyState === 'loading') {
+            document.addEventListener('DOMContentLoaded', resolve);
+        } else {
+            resolve();
+        }
+    });
+
+    return fetch(src)
+        .then(response => {
+            if (!response.ok) {
+                throw new Error('Loading class names failed with status ' + response.status);
+            }
+            return response.json();
+        })
+        .then(data => {
+            Object.assign(window.classNames.classes, data.classes);
+            Object.assign(window.classNames.clusters, data.clusters);
+            return domReady;
+        })
+        .then(() => {
+            fillClassNameElements(window.classNames);
+            return window.classNames;
+        })
+        .catch(error => {
+            console.error('Error loading class names:', error);
+            return window.classNames;
+        });
+})();
+
+function getSortedClassIds(classes) {
+    return Object.keys(classes).sort((a, b) => parseInt(a) - parseInt(b));
+}
+
+function fillClassNameElements(classNames) {
+    const classes = classNames.classes;
+    const sortedClassIds = getSortedClassIds(classes);
+
+    const classesElement = document.getElementById('human-readable-classes');
+    if (classesElement) {
+        classesElement.textContent = JSON.stringify(classes);
+    }
+
+    document.querySelectorAll('select[data-class-options]').forEach(select => {
+        const fragment = document.createDocumentFragment();
+        sortedClassIds.forEach(classId => {
+            const option = document.createElement('option');
+            option.value = classId;
+            option.textContent = `${classId} - ${classes[classId]}`;
+            fragment.appendChild(option);
+        });
+        select.appendChild(fragment);
+    });
+
+    document.querySelectorAll('select[data-cluster-options]').forEach(select => {
+        const fragment = document.createDocumentFragment();
+        Object.keys(classNames.clusters).sort().forEach(clusterName => {
+            const option = document.createElement('option');
+            option.value = clusterName;
+            option.textContent = `${clusterName} (${classNames.clusters[clusterName].length} classes)`;
+            fragment.appendChild(option);
+        });
+        select.appendChild(fragment);
+    });
+
+    document.querySelectorAll('[data-uncertainty-class-options]').forEach(list => {
+        const fragment = document.createDocumentFragment();
+        sortedClassIds.forEach(classId => {
+            const item = document.createElement('div');
+            item.className = 'uncertainty-class-item';
+
+            const label = document.createElement('label');
+            label.className = 'uncertainty-class-label';
+
+            const checkbox = document.createElement('input');
+            checkbox.type = 'checkbox';
+            checkbox.className = 'uncertainty-class-checkbox';
+            checkbox.value = classId;
+            checkbox.dataset.className = classes[classId];
+
+            const text = document.createElement('span');
+            text.className = 'uncertainty-class-text';
+            text.textContent = `${classId} - ${classes[classId]}`;
+
+            label.appendChild(checkbox);
+            label.appendChild(text);
+            item.appendChild(label);
+            fragment.appendChild(item);
+        });
+        list.appendChild(fragment);
+    });
+}
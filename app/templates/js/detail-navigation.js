@@ -0,0 +1,144 @@
+/**
+ * Next/previous navigation of the image labeling page without reloading the page.
+ *
+ * The annotation is posted to the save_and_advance endpoint, which saves it and returns the next
+ * image's data as JSON in the same response; the page content is then swapped in place. Falls back
+ * to the regular form submission (save + redirect) whenever the in-place path is not available.
+ */
+let detailNavigationInProgress = false;
+
+function saveAndAdvance(direction) {
+    const form = document.getElementById('save');
+    const advanceUrl = form ? form.dataset.advanceUrl : null;
+
+    document.getElementById('direction').value = direction;
+
+    // Sanity check mode and pages without a ready editor keep the full page navigation
+    if (!advanceUrl || !window.fetch || !window.inlineEditor || !window.inlineEditor.editor ||
+        typeof window.loadInlineEditorBboxes !== 'function') {
+        form.submit();
+        return;
+    }
+    if (detailNavigationInProgress) {
+        return;
+    }
+    detailNavigationInProgress = true;
+
+    // Make sure the hidden fields hold the latest edits before posting them
+    if (typeof window.updateHiddenBboxesField === 'function') {
+        window.updateHiddenBboxesField();
+    }
+
+    fetch(advanceUrl, {
+        method: 'POST',
+        body: new FormData(form),
+        headers: {
+            'X-Requested-With': 'XMLHttpRequest'
+        }
+    })
+    .then(response => {
+        if (!response.ok) {
+            throw new Error('Save failed with status ' + response.status);
+        }
+        return response.json();
+    })
+    .then(data => {
+        // The annotation is saved at this point, so any problem below only needs a reload
+        try {
+            swapDetailPage(data.page);
+        } catch (error) {
+            console.error('Error updating the page in place, reloading:', error);
+            window.location.href = data.page.label_image_url;
+        }
+    })
+    .catch(error => {
+        console.error('Error in save and advance, falling back to form submission:', error);
+        form.submit();
+    })
+    .finally(() => {
+        detailNavigationInProgress = false;
+    });
+}
+
+/**
+ * Replaces the image, ground truth, example images and bounding boxes with those of the new page.
+ */
+function swapDetailPage(page) {
+    const form = document.getElementById('save');
+
+    // Form state for the next save
+    document.querySelector('input[name="image_name"]').value = page.image_name;
+    document.getElementById('direction').value = 'save';
+    document.getElementById('label_type').value = page.label_type;
+    document.getElementById('selected_classes').value = '{}';
+    document.querySelectorAll('input[name="class_selection"]').forEach(radio => { radio.checked = false; });
+    if (typeof window.resetRadioSelection === 'function') {
+        window.resetRadioSelection();
+    }
+    if (typeof window.removeOODBorder === 'function') {
+        window.removeOODBorder();
+    }
+
+    // Ground truth
+    const gtLabel = document.querySelector('.gt-label');
+    if (gtLabel) {
+        gtLabel.textContent = 'Ground Truth: ' + (page.ground_truth_label || 'Unknown');
+    }
+    document.getElementById('ground-truth-data').textContent = page.ground_truth_class_index;
+    window.groundTruthClassId = String(page.ground_truth_class_index);
+    document.getElementById('bbox-data').textContent = JSON.stringify(page.bboxes);
+
+    updateTopCategories(page.similar_images);
+    pageSelect(1);
+
+    // Swap the image; the boxes are loaded once the canvas has the new image's size
+    const editor = window.inlineEditor.editor;
+    const img = editor.img;
+    img.onload = function() {
+        img.onload = null;
+        editor.canvas.width = img.naturalWidth;
+        editor.canvas.height = img.naturalHeight;
+        window.loadInlineEditorBboxes(page.bboxes);
+    };
+    img.src = '/' + page.predicted_image;
+
+    window.history.replaceState({}, '', page.label_image_url);
+    window.scrollTo(0, 0);
+}
+
+/**
+ * Rewrites the 20 category columns (label, radio value and example images) in the new top-k order.
+ */
+function updateTopCategories(similarImages) {
+    const columns = document.querySelectorAll('.column[class*="_element"]');
+
+    columns.forEach((column, index) => {
+        const category = similarImages[index];
+        column.style.visibility = category ? '' : 'hidden';
+        if (!category) {
+            return;
+        }
+
+        column.querySelector('.category_label').textContent = category.class_name;
+        column.querySelector('input[type="radio"]').value = category.class_id;
+
+        // Rebuild the image rows like the template does: one image per row, then an empty row
+        column.querySelectorAll('.right').forEach(div => div.remove());
+        category.images.forEach(imgUrl => {
+            const rightDiv = document.createElement('div');
+            rightDiv.className = 'right';
+
+            const img = document.createElement('img');
+            img.className = 'thumbnail';
+            img.src = '/' + imgUrl;
+            img.alt = 'Class Image';
+            img.onclick = function() { show_image(this); };
+
+            rightDiv.appendChild(img);
+            column.appendChild(rightDiv);
+        });
+        const emptyRightDiv = document.createElement('div');
+        emptyRightDiv.className = 'right';
+        column.appendChild(emptyRightDiv);
+    });
+}
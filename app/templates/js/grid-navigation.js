@@ -0,0 +1,261 @@
+/**
+ * Next/previous navigation of the grid view without reloading the page.
+ *
+ * The pages around the current one are prefetched from the grid page-data API. Navigating to a
+ * prefetched page of the same class swaps the images in place right away, while the checkboxes of the
+ * page that was left are saved through save_grid in the background. Saves are sent one after another so
+ * the server-side image index advances in the same order as the pages shown. Falls back to the regular
+ * form submission (save + redirect) whenever the in-place path is not available.
+ */
+const gridPageCache = {}; // page start index -> page data from the API
+let gridCurrentPage = null;
+let gridSaveQueue = Promise.resolve();
+let gridPendingSaves = 0;
+
+function getGridApiUrl(params) {
+    const form = document.getElementById('save');
+    return form.dataset.gridApiUrl + '?' + new URLSearchParams(params).toString();
+}
+
+function fetchGridPages(start, lookahead) {
+    const form = document.getElementById('save');
+    return fetch(getGridApiUrl({start: start, count: form.dataset.pageSize, lookahead: lookahead}))
+        .then(response => {
+            if (!response.ok) {
+                throw new Error('Loading grid page failed with status ' + response.status);
+            }
+            return response.json();
+        });
+}
+
+function navigateGrid(direction) {
+    const form = document.getElementById('save');
+    change(direction);
+
+    const targetStart = gridCurrentPage ? gridCurrentPage[direction + '_start'] : null;
+    const targetPage = targetStart !== null && targetStart !== undefined ? gridPageCache[targetStart] : null;
+
+    // Pages of another class change the title, cluster and dropdowns, so they keep the full page navigation
+    if (!window.fetch || !targetPage || targetPage.class_index !== gridCurrentPage.class_index) {
+        gridSaveQueue.then(() => form.submit());
+        return;
+    }
+
+    // Capture the checkboxes of the page being left before its content is replaced
+    const formData = new FormData(form);
+    rememberGridCheckboxes();
+
+    gridPendingSaves++;
+    gridSaveQueue = gridSaveQueue
+        .then(() => fetch(form.action, {
+            method: 'POST',
+            body: formData,
+            headers: {
+                'X-Requested-With': 'XMLHttpRequest'
+            }
+        }))
+        .then(response => {
+            if (!response.ok) {
+                throw new Error('Save failed with status ' + response.status);
+            }
+            return response.json();
+        })
+        .then(data => {
+            if (!data.success) {
+                throw new Error(data.error || 'Save failed');
+            }
+            gridPendingSaves--;
+            // Only refresh once the last queued save is done, earlier data would be outdated
+            if (gridPendingSaves === 0) {
+                prefetchGridPages();
+            }
+        })
+        .catch(error => {
+            console.error('Error saving the grid in the background:', error);
+            alert('Saving the grid failed, the page will be reloaded.');
+            gridPendingSaves = 0;
+            window.location.reload();
+        });
+
+    swapGridPage(targetPage);
+}
+
+/**
+ * Copies the checkbox state of the displayed page into its cached data, for navigating back to it.
+ */
+function rememberGridCheckboxes() {
+    const cachedPage = gridPageCache[gridCurrentPage.start];
+    if (!cachedPage) {
+        return;
+    }
+    cachedPage.images.forEach(image => {
+        const checkbox = document.getElementById('checkbox_' + image.index);
+        if (checkbox) {
+            image.checked = checkbox.checked;
+        }
+    });
+}
+
+/**
+ * Loads the current page (for up to date progress), the following page and the previous page.
+ */
+function prefetchGridPages() {
+    const page = gridCurrentPage;
+
+    const requests = [fetchGridPages(page.start, 1).then(data => {
+        if (gridCurrentPage.start === data.page.start) {
+            const progress = data.page.progress;
+            document.getElementById('class-corrected-images').textContent = progress.class_corrected_images;
+            document.getElementById('num-corrected-images').textContent = progress.num_corrected_images;
+            updateGridProgressBar();
+        }
+        data.lookahead.forEach(nextPage => { gridPageCache[nextPage.start] = nextPage; });
+    })];
+    if (page.prev_start !== null) {
+        requests.push(fetchGridPages(page.prev_start, 0).then(data => {
+            gridPageCache[data.page.start] = data.page;
+        }));
+    }
+
+    return Promise.all(requests)
+        .then(() => {
+            // Keep only the pages reachable with one navigation
+            const keep = [gridCurrentPage.start, gridCurrentPage.next_start, gridCurrentPage.prev_start];
+            Object.keys(gridPageCache).forEach(start => {
+                if (!keep.includes(parseInt(start, 10))) {
+                    delete gridPageCache[start];
+                }
+            });
+        })
+        .catch(error => {
+            console.warn('Could not prefetch grid pages:', error);
+        });
+}
+
+/**
+ * Replaces the images, checkboxes and bounding boxes of the grid with those of the new page.
+ */
+function swapGridPage(page) {
+    const wrapper = document.querySelector('.image-wrapper');
+    const reviewAction = wrapper.querySelector('form[id^="review_form_"]').action;
+
+    wrapper.innerHTML = '';
+    page.images.forEach(image => {
+        const container = document.createElement('div');
+        container.className = 'image-container ' + (image.border || 'no-border');
+        container.dataset.index = image.index;
+
+        const bboxContainer = document.createElement('div');
+        bboxContainer.className = 'bbox-container';
+
+        const img = document.createElement('img');
+        img.className = 'image-thumbnail';
+        img.src = '/' + image.path;
+        img.alt = 'Input Image';
+
+        const overlay = document.createElement('div');
+        overlay.className = 'bbox-overlay';
+
+        const bboxScript = document.createElement('script');
+        bboxScript.className = 'bbox-data';
+        bboxScript.type = 'application/json';
+        bboxScript.textContent = JSON.stringify(image.bboxes);
+
+        const imageIndex = document.createElement('div');
+        imageIndex.className = 'image-index';
+        imageIndex.textContent = 'Relative Id: ' + (image.index % 50) + ' | Absolute Id: ' + image.index;
+
+        // Checkbox and details button, like the template renders them
+        const actionRow = document.createElement('div');
+        actionRow.className = 'action-row';
+
+        const label = document.createElement('label');
+        label.className = 'container';
+        const checkbox = document.createElement('input');
+        checkbox.setAttribute('form', 'save');
+        checkbox.type = 'checkbox';
+        checkbox.id = 'checkbox_' + image.index;
+        checkbox.name = 'checkboxes';
+        checkbox.value = image.checkbox_value;
+        checkbox.checked = image.checked;
+        const checkmark = document.createElement('div');
+        checkmark.className = 'checkmark';
+        label.appendChild(checkbox);
+        label.appendChild(checkmark);
+
+        const reviewForm = document.createElement('form');
+        reviewForm.id = 'review_form_' + image.index;
+        reviewForm.action = reviewAction;
+        reviewForm.method = 'post';
+        const indexInput = document.createElement('input');
+        indexInput.type = 'hidden';
+        indexInput.name = 'image_index';
+        indexInput.value = image.index;
+        const detailsButton = document.createElement('button');
+        detailsButton.type = 'submit';
+        detailsButton.textContent = 'Details';
+        reviewForm.appendChild(indexInput);
+        reviewForm.appendChild(detailsButton);
+
+        actionRow.appendChild(label);
+        actionRow.appendChild(reviewForm);
+
+        bboxContainer.appendChild(img);
+        bboxContainer.appendChild(overlay);
+        bboxContainer.appendChild(bboxScript);
+        bboxContainer.appendChild(imageIndex);
+        bboxContainer.appendChild(actionRow);
+        container.appendChild(bboxContainer);
+        wrapper.appendChild(container);
+    });
+
+    // Form state for the next save
+    document.querySelector('input[name="image_name"]').value = page.images.map(image => image.path).join('|');
+    document.getElementById('direction').value = 'next';
+    document.getElementById('save').dataset.pageStart = page.start;
+
+    gridCurrentPage = page;
+    allChecked = false;
+    checkInitialCheckboxState();
+    renderAllBoundingBoxes();
+}
+
+function updateGridProgressBar() {
+    let className = document.getElementById('current-class-name')?.textContent;
+    if (className && className.length > 20) {
+        className = className.substring(0, 19) + '...';
+    }
+    const classCorrectedImages = parseInt(document.getElementById('class-corrected-images')?.textContent || '0', 10);
+    const classTotalImages = parseInt(document.getElementById('class-total-images')?.textContent || '0', 10);
+    updateProgressBar(classCorrectedImages, classTotalImages, className);
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+    const form = document.getElementById('save');
+    if (!window.fetch || !form || !form.dataset.gridApiUrl) {
+        return;
+    }
+
+    fetchGridPages(form.dataset.pageStart, 1)
+        .then(data => {
+            gridCurrentPage = data.page;
+            gridPageCache[data.page.start] = data.page;
+            data.lookahead.forEach(nextPage => { gridPageCache[nextPage.start] = nextPage; });
+            if (data.page.prev_start !== null) {
+                return fetchGridPages(data.page.prev_start, 0).then(prevData => {
+                    gridPageCache[prevData.page.start] = prevData.page;
+                });
+            }
+        })
+        .catch(error => {
+            console.warn('Could not prefetch grid pages:', error);
+        });
+
+    // Leaving the page while background saves are queued would lose them
+    window.addEventListener('beforeunload', function(event) {
+        if (gridPendingSaves > 0) {
+            event.preventDefault();
+            event.returnValue = '';
+        }
+    });
+});
@@ -59,17 +59,11 @@ window.onload = function() {
     // Add CSS styles for uncertain boxes
     addUncertainBoxStyles();
 
-    // Load class label mappings if available
-    const classesElement = document.getElementById('human-readable-classes');
-    if (classesElement && classesElement.textContent) {
-        try {
-            classLabelMap = JSON.parse(classesElement.textContent);
-            console.log(`Loaded ${Object.keys(classLabelMap).length} class labels`);
-        } catch (e) {
-            console.error("Error parsing class labels:", e);
-            classLabelMap = {};
-        }
-    }
+    // Load class label mappings (filled in place by class-names.js once loaded)
+    classLabelMap = window.classNames.classes;
+    window.classNamesReady.then(() => {
+        console.log(`Loaded ${Object.keys(classLabelMap).length} class labels`);
+    });
 
     // Draw bounding boxes after a short delay to ensure images are loaded
     setTimeout(() => renderAllBoundingBoxes(), 200);
@@ -224,16 +224,11 @@ document.addEventListener('DOMContentLoaded', function() {
 		debug('Reset all uncertainty checkboxes');
 	}
 
-	// Load class labels
-	const classesElement = document.getElementById('human-readable-classes');
-	if (classesElement && classesElement.textContent) {
-		try {
-			inlineEditor.classLabels = JSON.parse(classesElement.textContent);
-			debug(`Loaded ${Object.keys(inlineEditor.classLabels).length} class labels`);
-		} catch (e) {
-			console.error('Error parsing class labels:', e);
-		}
-	}
+	// Load class labels (filled in place by class-names.js once loaded)
+	inlineEditor.classLabels = window.classNames.classes;
+	window.classNamesReady.then(() => {
+		debug(`Loaded ${Object.keys(inlineEditor.classLabels).length} class labels`);
+	});
 
 	// Load initial bounding boxes
 	const bboxDataElement = document.getElementById('bbox-data');
@@ -3507,6 +3502,59 @@ function updateDropdownVisibility(forceMultiLabel = null) {
 		debug('Cancelled all changes');
 	}
 
+	// Replace all boxes with those of another image (used when the page navigates in place)
+	function loadBboxes(newBboxes) {
+		const bboxes = JSON.parse(JSON.stringify(newBboxes));
+		const count = bboxes.boxes ? bboxes.boxes.length : 0;
+
+		// Same defaults as when the page loads
+		if (bboxes.gt && !bboxes.labels) {
+			bboxes.labels = bboxes.gt;
+		}
+		bboxes.labels = (bboxes.labels || new Array(count).fill(0))
+			.map(label => typeof label === 'string' ? parseInt(label) : label);
+		['crowd_flags', 'reflected_flags', 'rendition_flags', 'ocr_needed_flags', 'uncertain_flags'].forEach(key => {
+			if (!bboxes[key]) {
+				bboxes[key] = new Array(count).fill(false);
+			}
+		});
+		if (!bboxes.possible_labels) {
+			bboxes.possible_labels = new Array(count).fill([]);
+		}
+		if (!bboxes.group) {
+			bboxes.group = new Array(count).fill(null);
+		}
+
+		inlineEditor.bboxes = bboxes;
+		inlineEditor.originalBboxes = JSON.parse(JSON.stringify(bboxes));
+		inlineEditor.currentBoxIndex = -1;
+
+		// Reset uncertainty mode
+		inlineEditor.uncertaintyMode = false;
+		inlineEditor.selectedUncertainClasses = [];
+		window.uncertaintyMode = false;
+		window.selectedUncertainClasses = [];
+		removeUncertaintyModeIndicator();
+
+		// Update the editor
+		if (inlineEditor.editor) {
+			inlineEditor.editor.selectedBboxIndex = -1;
+			inlineEditor.editor.bboxes = inlineEditor.bboxes;
+			inlineEditor.editor.originalBboxes = JSON.parse(JSON.stringify(bboxes));
+			inlineEditor.editor.redrawCanvas();
+		}
+
+		// Update UI
+		updateBboxSelector();
+
+		// Update hidden form field
+		updateHiddenBboxesField();
+
+		debug(`Loaded ${count} boxes for the new image`);
+	}
+
+	window.loadInlineEditorBboxes = loadBboxes;
+
 	// Update class of selected box
 	function updateSelectedBoxClass(classId) {
 		if (inlineEditor.currentBoxIndex < 0 || !inlineEditor.bboxes ||
@@ -6,12 +6,55 @@ Tracks time spent on each class and activity type.
 import time
 import json
 import os
+import functools
+import threading
 from datetime import datetime
 from typing import Dict, List, Optional, Any
 
+try:
+    from .file_lock import FileLock, write_file_atomically
+except ImportError:
+    # Fallback for when not running as a module
+    from file_lock import FileLock, write_file_atomically
+
+# Attributes of a TimeTracker shared by all worker processes
+SHARED_STATE_FIELDS = ('session_id', 'session_data', 'current_class_id', 'current_session_start', 'current_image_id',
+                       'current_image_start', 'is_first_class_session', 'current_class_session')
+SHARED_STATE_FILENAME = 'time_tracking_state.json'
+
+
+def synchronized(method):
+    """
+    With a shared TimeTracker, run the method on the state of all worker processes: under a file lock, load the
+    state, apply the method and store the state again. Calls nested in a synchronized method run directly.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if not self.shared or getattr(self._local, 'synchronized', False):
+            return method(self, *args, **kwargs)
+        with FileLock(self._get_shared_state_file() + '.lock'):
+            self._local.synchronized = True
+            try:
+                self._load_shared_state()
+                result = method(self, *args, **kwargs)
+                self._save_shared_state()
+                return result
+            finally:
+                self._local.synchronized = False
+    return wrapper
+
+
 class TimeTracker:
-    def __init__(self, username: str):
+    def __init__(self, username: str, shared: bool = False):
+        """
+        Args:
+            username: Annotator whose time is tracked
+            shared: Keep the session in a state file shared by the worker processes (see synchronized()) instead
+                    of in this process only. The processes join the session of the first one to start.
+        """
         self.username = username
+        self.shared = shared
+        self._local = threading.local()
         self.session_id = datetime.now().strftime("%Y%m%d_%H%M%S")
         self.current_class_id = None
         self.current_session_start = None
@@ -26,18 +69,47 @@ class TimeTracker:
         }
         self.current_class_session = None
         self.persistent_visits = self._load_persistent_visits()
+        if shared:
+            os.makedirs(os.path.dirname(self._get_shared_state_file()), exist_ok=True)
+            self.refresh()
+
+    def _get_shared_state_file(self):
+        return os.path.join(os.path.dirname(self._get_persistent_visits_file()), SHARED_STATE_FILENAME)
+
+    def _load_shared_state(self):
+        """Take over the session state of the worker processes, or share this one if there is none yet."""
+        state_file = self._get_shared_state_file()
+        try:
+            with open(state_file, 'r') as f:
+                state = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self._save_shared_state()
+            return
+        for field in SHARED_STATE_FIELDS:
+            setattr(self, field, state[field])
+
+    def _save_shared_state(self):
+        state = {field: getattr(self, field) for field in SHARED_STATE_FIELDS}
+        write_file_atomically(self._get_shared_state_file(), json.dumps(state))
+
+    def refresh(self):
+        """Load the session state of the worker processes (nothing to do unless shared)."""
+        if self.shared:
+            with FileLock(self._get_shared_state_file() + '.lock'):
+                self._load_shared_state()
         
+    def _get_persistent_visits_file(self):
+        try:
+            from .config import ANNOTATORS_ROOT_DIRECTORY
+        except ImportError:
+            # Fallback for when not running as a module
+            from config import ANNOTATORS_ROOT_DIRECTORY
+        return os.path.join(ANNOTATORS_ROOT_DIRECTORY, self.username, "persistent_visits.json")
+
     def _load_persistent_visits(self):
         """Load persistent visit counts from file"""
         try:
-            try:
-                from .config import ANNOTATORS_ROOT_DIRECTORY
-            except ImportError:
-                # Fallback for when not running as a module
-                from config import ANNOTATORS_ROOT_DIRECTORY
-            
-            user_dir = os.path.join(ANNOTATORS_ROOT_DIRECTORY, self.username)
-            visits_file = os.path.join(user_dir, "persistent_visits.json")
+            visits_file = self._get_persistent_visits_file()
             
             if os.path.exists(visits_file):
                 with open(visits_file, 'r') as f:
@@ -51,24 +123,28 @@ class TimeTracker:
             print(f"Error loading persistent visits: {e}")
             return {'class_visits': {}, 'image_visits': {}}
     
-    def _save_persistent_visits(self):
-        """Save persistent visit counts to file"""
+    def _count_visit(self, kind: str, key: str, only_if_new: bool = False) -> int:
+        """
+        Increment the persistent visit count of a class or image (kind 'class_visits' or 'image_visits') and
+        return it; with only_if_new, only counts that are still 0. The file is read again under a lock, so visits
+        counted by other worker processes are kept.
+        """
         try:
-            try:
-                from .config import ANNOTATORS_ROOT_DIRECTORY
-            except ImportError:
-                # Fallback for when not running as a module
-                from config import ANNOTATORS_ROOT_DIRECTORY
-                
-            user_dir = os.path.join(ANNOTATORS_ROOT_DIRECTORY, self.username)
-            os.makedirs(user_dir, exist_ok=True)
-            visits_file = os.path.join(user_dir, "persistent_visits.json")
-            
-            with open(visits_file, 'w') as f:
-                json.dump(self.persistent_visits, f, indent=2)
+            visits_file = self._get_persistent_visits_file()
+            os.makedirs(os.path.dirname(visits_file), exist_ok=True)
+
+            with FileLock(visits_file + '.lock'):
+                self.persistent_visits = self._load_persistent_visits()
+                current_visits = self.persistent_visits[kind].get(key, 0)
+                if only_if_new and current_visits > 0:
+                    return current_visits
+                self.persistent_visits[kind][key] = current_visits + 1
+                write_file_atomically(visits_file, json.dumps(self.persistent_visits, indent=2))
         except Exception as e:
             print(f"Error saving persistent visits: {e}")
+        return self.persistent_visits[kind].get(key, 0)
         
+    @synchronized
     def start_class_session(self, class_id: str, class_name: str):
         """Start tracking a new class session"""
         # End current session if exists
@@ -78,25 +154,13 @@ class TimeTracker:
         self.current_class_id = class_id
         self.current_session_start = time.time()
         
-        # Get current persistent visit count before potentially incrementing
-        current_visits = self.persistent_visits['class_visits'].get(class_id, 0)
-        
         # Only increment persistent visit count if this is NOT the first class session
         # The first class session when the app starts doesn't count as a new visit
         if not self.is_first_class_session:
-            self.persistent_visits['class_visits'][class_id] = current_visits + 1
-            self._save_persistent_visits()
-            persistent_visit_number = current_visits + 1
+            persistent_visit_number = self._count_visit('class_visits', class_id)
         else:
             # For the first class session, use the existing count or 1 if it's the first time ever
-            if current_visits == 0:
-                # This is the very first time visiting this class
-                self.persistent_visits['class_visits'][class_id] = 1
-                self._save_persistent_visits()
-                persistent_visit_number = 1
-            else:
-                # This class has been visited before, don't increment for first session
-                persistent_visit_number = current_visits
+            persistent_visit_number = self._count_visit('class_visits', class_id, only_if_new=True)
             self.is_first_class_session = False  # Mark that we've passed the first session
         
         # Find session-specific visit count
@@ -117,6 +181,7 @@ class TimeTracker:
             'image_sessions': []  # Track individual image sessions in detail mode
         }
         
+    @synchronized
     def end_class_session(self):
         """End current class session and save duration"""
         if self.current_class_session and self.current_session_start:
@@ -137,6 +202,7 @@ class TimeTracker:
             self.current_class_session = None
             self.current_session_start = None
             
+    @synchronized
     def log_activity(self, activity_type: str, details: Dict[str, Any] = None):
         """Log an activity in the current class session"""
         if not self.current_class_session:
@@ -189,6 +255,7 @@ class TimeTracker:
         user_dir = os.path.join(ANNOTATORS_ROOT_DIRECTORY, self.username)
         return os.path.join(user_dir, f"time_tracking_{self.session_id}.json")
         
+    @synchronized
     def finalize_session(self):
         """Finalize the current session"""
         # End any active image session first
@@ -201,6 +268,7 @@ class TimeTracker:
         self.session_data['end_time'] = datetime.now().isoformat()
         self._save_session_data()
         
+    @synchronized
     def start_image_session(self, image_name: str, image_index: int = None):
         """Start tracking time spent on a specific image in detail mode"""
         # Only start if we're not already tracking this exact image
@@ -217,9 +285,7 @@ class TimeTracker:
         self.current_image_start = time.time()
         
         # Update persistent visit count for this image
-        current_visits = self.persistent_visits['image_visits'].get(image_name, 0)
-        self.persistent_visits['image_visits'][image_name] = current_visits + 1
-        self._save_persistent_visits()
+        self._count_visit('image_visits', image_name)
         
         # Log the start in activities - simplified to just detail_view_open
         self.log_activity('detail_view_open', {
@@ -228,6 +294,7 @@ class TimeTracker:
             'persistent_visit_number': self.persistent_visits['image_visits'][image_name]
         })
         
+    @synchronized
     def end_image_session(self):
         """End current image session and save duration"""
         if not self.current_class_session or not self.current_image_id or not self.current_image_start:
@@ -267,6 +334,7 @@ class TimeTracker:
         """Check if we should start a new class session (only for actual class changes)"""
         return self.current_class_id != class_id
         
+    @synchronized
     def start_class_session_if_changed(self, class_id: str, class_name: str):
         """Start a new class session only if the class has actually changed"""
         if self.should_start_new_class_session(class_id):
@@ -277,7 +345,7 @@ class TimeTracker:
 _time_tracker = None
 
 def get_time_tracker() -> TimeTracker:
-    """Get the global time tracker instance"""
+    """Get the global time tracker instance (with the current state of all worker processes if shared)"""
     global _time_tracker
     if _time_tracker is None:
         try:
@@ -286,9 +354,11 @@ def get_time_tracker() -> TimeTracker:
             # Fallback for when not running as a module
             from config import UPLOAD_USERNAME
         _time_tracker = TimeTracker(UPLOAD_USERNAME)
+    else:
+        _time_tracker.refresh()
     return _time_tracker
 
-def initialize_time_tracker(username: str = None):
+def initialize_time_tracker(username: str = None, shared: bool = False):
     """Initialize or reinitialize the time tracker"""
     global _time_tracker
     if username is None:
@@ -298,5 +368,20 @@ def initialize_time_tracker(username: str = None):
             # Fallback for when not running as a module
             from config import UPLOAD_USERNAME
         username = UPLOAD_USERNAME
-    _time_tracker = TimeTracker(username)
+    _time_tracker = TimeTracker(username, shared)
     return _time_tracker
+
+
+def reset_shared_time_tracking_state(username: str):
+    """Remove the shared session state, so the worker processes started next begin a new session."""
+    try:
+        from .config import ANNOTATORS_ROOT_DIRECTORY
+    except ImportError:
+        # Fallback for when not running as a module
+        from config import ANNOTATORS_ROOT_DIRECTORY
+    state_file = os.path.join(ANNOTATORS_ROOT_DIRECTORY, username, SHARED_STATE_FILENAME)
+    if not os.path.isdir(os.path.dirname(state_file)):
+        return
+    with FileLock(state_file + '.lock'):
+        if os.path.exists(state_file):
+            os.remove(state_file)
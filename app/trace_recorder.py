@@ -0,0 +1,209 @@
+"""
+Anonymized request traces, replayed by benchmarks/replay.py to compare builds on real annotator behaviour.
+
+Every request is written as one JSON line: time, method, URL rule, endpoint, anonymized user, integer query
+parameters, the shape of the form or JSON payload, whether it was an XMLHttpRequest (background saves), status,
+response size and duration. Usernames are replaced
+by salted hashes, and payload values are never recorded, except for the navigation fields in
+RECORDED_FORM_FIELDS that replay needs to follow the same path through the dataset. Lines are queued and
+written by a background thread (a LoggingPipeline) to one file per day, trace-YYYY-MM-DD.jsonl.
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import atexit
+import secrets
+import threading
+
+from flask import request, g
+
+from .file_lock import FileLock, write_file_atomically
+from .logging_pipeline import LoggingPipeline
+
+TRACE_LOGGER_NAME = 'app.trace'
+SALT_FILENAME = '.salt'
+
+# Form and JSON fields recorded with their values: enums and indices, no annotation content
+RECORDED_FORM_FIELDS = {'direction', 'label_type', 'class_id', 'image_index', 'cluster_name'}
+
+
+class DailyTraceFileHandler(logging.Handler):
+    """Writes the messages of the records to trace-<date>.jsonl in trace_dir, one file per local day."""
+
+    def __init__(self, trace_dir):
+        super().__init__()
+        self.trace_dir = trace_dir
+        self.date = None
+        self.file = None
+
+    def emit(self, record):
+        try:
+            date = time.strftime('%Y-%m-%d', time.localtime(record.created))
+            if date != self.date:
+                self._open(date)
+            self.file.write(record.getMessage() + '\n')
+            self.file.flush()
+        except Exception:
+            self.handleError(record)
+
+    def _open(self, date):
+        if self.file is not None:
+            self.file.close()
+        os.makedirs(self.trace_dir, exist_ok=True)
+        self.file = open(os.path.join(self.trace_dir, f"trace-{date}.jsonl"), 'a')
+        self.date = date
+
+    @property
+    def current_file(self):
+        return self.file.name if self.file is not None else None
+
+    def close(self):
+        self.acquire()
+        try:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+        finally:
+            self.release()
+        super().close()
+
+
+class TraceRecorder:
+    def __init__(self, trace_dir, queue_size=10000, exclude_endpoints=('static',), salt=None):
+        """
+        Args:
+            trace_dir: Directory of the daily trace files (created on first write)
+            queue_size: Maximum number of trace lines waiting to be written, further ones are dropped
+            exclude_endpoints: Endpoints not recorded
+            salt: Salt of the username hashes; by default one is generated once and kept in trace_dir, so
+                users keep their pseudonyms across restarts
+        """
+        self.trace_dir = trace_dir
+        self.exclude_endpoints = set(exclude_endpoints)
+        self.salt = salt if salt is not None else load_or_create_salt(trace_dir)
+
+        self.file_handler = DailyTraceFileHandler(trace_dir)
+        self.pipeline = LoggingPipeline([self.file_handler], queue_size=queue_size)
+        self.logger = logging.getLogger(TRACE_LOGGER_NAME)
+        self.logger.propagate = False  # Traces do not belong in the app log
+        self.logger.setLevel(logging.INFO)
+
+        self._lock = threading.Lock()
+        self.stats = {
+            'recorded': 0,
+            'excluded': 0
+        }
+
+    def init_app(self, app):
+        for handler in list(self.logger.handlers):
+            self.logger.removeHandler(handler)
+        self.logger.addHandler(self.pipeline.handler)
+        self.pipeline.start()
+        atexit.register(self.pipeline.stop)
+        app.trace_recorder = self
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+
+    def stop(self):
+        self.pipeline.stop()
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        pipeline_stats = self.pipeline.get_stats()
+        stats['dropped'] = pipeline_stats['dropped']
+        stats['queued'] = pipeline_stats['queued']
+        stats['current_file'] = self.file_handler.current_file
+        return stats
+
+    def anonymize(self, username):
+        return 'u_' + hashlib.sha256((self.salt + username).encode('utf-8')).hexdigest()[:12]
+
+    def _start_request(self):
+        g.trace_start = time.perf_counter()
+
+    def _finish_request(self, response):
+        start = g.pop('trace_start', None)
+        if start is None:
+            return response
+        if request.endpoint in self.exclude_endpoints:
+            with self._lock:
+                self.stats['excluded'] += 1
+            return response
+
+        view_args = dict(request.view_args or {})
+        user = self.anonymize(view_args.pop('username')) if 'username' in view_args else None
+        event = {
+            'ts': round(time.time(), 3),
+            'method': request.method,
+            'route': request.url_rule.rule if request.url_rule is not None else None,
+            'endpoint': request.endpoint,
+            'user': user,
+            'view_args': view_args,
+            'query': describe_query(request.args),
+            'payload': describe_payload(),
+            'xhr': request.headers.get('X-Requested-With') == 'XMLHttpRequest',
+            'request_bytes': request.content_length or 0,
+            'status': response.status_code,
+            'response_bytes': response.calculate_content_length(),
+            'duration_ms': round((time.perf_counter() - start) * 1000, 3)
+        }
+        self.logger.info('%s', json.dumps(event, default=str, separators=(',', ':')))
+        with self._lock:
+            self.stats['recorded'] += 1
+        return response
+
+
+def describe_query(args):
+    """Integer query parameters with their values, others only with their length."""
+    query = {}
+    for name, value in args.items():
+        try:
+            query[name] = int(value)
+        except ValueError:
+            query[name] = {'bytes': len(value)}
+    return query
+
+
+def describe_payload():
+    """
+    Shape of the request body: per form field the number of values and their total size, for JSON bodies
+    the length of every top-level list, dict or string. Values of RECORDED_FORM_FIELDS are kept.
+    """
+    if request.form:
+        fields = {}
+        for name in request.form:
+            values = request.form.getlist(name)
+            field = {'values': len(values), 'bytes': sum(len(value) for value in values)}
+            if name in RECORDED_FORM_FIELDS:
+                field['value'] = values[0]
+            fields[name] = field
+        return {'form': fields}
+
+    if request.is_json:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return {'json': None}
+        fields = {}
+        for name, value in data.items():
+            field = {'length': len(value) if isinstance(value, (list, dict, str)) else None}
+            if name in RECORDED_FORM_FIELDS and isinstance(value, (str, int)):
+                field['value'] = value
+            fields[name] = field
+        return {'json': fields}
+    return None
+
+
+def load_or_create_salt(trace_dir):
+    """The salt kept in trace_dir, created on first use. Worker processes starting together get the same one."""
+    path = os.path.join(trace_dir, SALT_FILENAME)
+    if not os.path.isfile(path):
+        os.makedirs(trace_dir, exist_ok=True)
+        with FileLock(f"{path}.lock"):
+            if not os.path.isfile(path):
+                write_file_atomically(path, secrets.token_hex(16))
+    with open(path, 'r') as f:
+        return f.read().strip()
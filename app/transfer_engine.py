@@ -0,0 +1,110 @@
+"""
+Runs independent file transfers concurrently on a bounded thread pool and records their timings.
+"""
+
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Resumable upload chunks must be a multiple of 256 KiB
+CHUNK_SIZE_GRANULARITY = 256 * 1024
+DEFAULT_CHUNK_SIZE = 5 * 1024 * 1024
+
+
+def normalize_chunk_size(chunk_size):
+    """Round a chunk size up to the next multiple of 256 KiB (-1 means a single chunk)."""
+    if chunk_size is None:
+        return DEFAULT_CHUNK_SIZE
+    if chunk_size == -1:
+        return chunk_size
+    chunks = max(1, -(-int(chunk_size) // CHUNK_SIZE_GRANULARITY))
+    return chunks * CHUNK_SIZE_GRANULARITY
+
+
+class TransferEngine:
+    def __init__(self, max_workers=4):
+        """
+        Args:
+            max_workers: Maximum number of transfers running at the same time
+        """
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='transfer')
+        self._lock = threading.Lock()
+        self.stats = {
+            'transfers': 0,
+            'failures': 0,
+            'bytes': 0,
+            'busy_seconds': 0.0,
+            'latencies': []
+        }
+
+    def submit(self, func, *args, **kwargs):
+        """Run a single transfer on the pool and return its Future."""
+        return self._executor.submit(self._timed, func, *args, **kwargs)
+
+    def map(self, func, items, concurrent=True):
+        """
+        Run func(item) for every item concurrently.
+
+        Args:
+            concurrent: If False, each item is submitted only after the previous one finished, so func can
+                        still decide not to start (e.g. after a cancellation) when its turn comes
+
+        Returns:
+            List of dictionaries (in input order) with 'item', 'result', 'error' and 'seconds'.
+            func may return a dictionary with a 'bytes' key to be counted towards throughput.
+        """
+        if not concurrent:
+            outcomes = []
+            for item in items:
+                outcome = self.submit(func, item).result()
+                outcome['item'] = item
+                outcomes.append(outcome)
+            return outcomes
+
+        futures = [(item, self.submit(func, item)) for item in items]
+        outcomes = []
+        for item, future in futures:
+            outcome = future.result()
+            outcome['item'] = item
+            outcomes.append(outcome)
+        return outcomes
+
+    def _timed(self, func, *args, **kwargs):
+        start = time.perf_counter()
+        outcome = {'result': None, 'error': None, 'seconds': 0.0}
+        try:
+            outcome['result'] = func(*args, **kwargs)
+        except Exception as e:
+            outcome['error'] = e
+        outcome['seconds'] = time.perf_counter() - start
+
+        transferred = outcome['result'].get('bytes', 0) if isinstance(outcome['result'], dict) else 0
+        with self._lock:
+            self.stats['transfers'] += 1
+            self.stats['failures'] += outcome['error'] is not None
+            self.stats['bytes'] += transferred
+            self.stats['busy_seconds'] += outcome['seconds']
+            self.stats['latencies'].append(outcome['seconds'])
+            # Keep the latency sample bounded for long running servers
+            if len(self.stats['latencies']) > 10000:
+                del self.stats['latencies'][:5000]
+        return outcome
+
+    def get_stats(self):
+        with self._lock:
+            latencies = sorted(self.stats['latencies'])
+            stats = {key: value for key, value in self.stats.items() if key != 'latencies'}
+
+        def percentile(p):
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(p / 100.0 * len(latencies)))]
+
+        stats['latency_p50_seconds'] = percentile(50)
+        stats['latency_p95_seconds'] = percentile(95)
+        stats['latency_max_seconds'] = latencies[-1] if latencies else 0.0
+        return stats
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,186 @@
+"""
+Single background worker that syncs annotator data without blocking navigation requests.
+
+Upload requests are queued per user and coalesced: a user's data is uploaded once the user has
+been idle for the debounce window, or at the latest after the maximum delay since the first
+pending request, so continuous paging still syncs regularly. Failed uploads are retried with
+exponential backoff, up to a maximum number of attempts; failures the backend reports as permanent
+(no files to upload, missing credentials) are not retried. The next request of the user tries again.
+"""
+
+import time
+import logging
+import threading
+from datetime import datetime
+
+
+class UploadScheduler:
+    def __init__(self, upload_func, debounce_seconds=2.0, max_delay_seconds=30.0,
+                 retry_base_seconds=5.0, retry_max_seconds=300.0, max_attempts=10, logger=None):
+        """
+        Args:
+            upload_func: Callable (username, cancel_event) -> results dict with a 'success' key, and
+                         'permanent': True for failures that retrying cannot fix.
+                         It should check cancel_event between file transfers.
+            debounce_seconds: Quiet period after the last request before uploading
+            max_delay_seconds: Upper bound on how long a request can be postponed by newer ones
+            retry_base_seconds: Delay before the first retry after a failed upload
+            retry_max_seconds: Upper bound for the exponential retry delay
+            max_attempts: Consecutive failed uploads of a user after which retrying stops
+        """
+        self.upload_func = upload_func
+        self.debounce_seconds = debounce_seconds
+        self.max_delay_seconds = max_delay_seconds
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.max_attempts = max_attempts
+        self.logger = logger or logging.getLogger(__name__)
+
+        self._cond = threading.Condition()
+        self._pending = {}  # username -> {'first': t, 'last': t, 'not_before': t}
+        self._failures = {}  # username -> consecutive failures
+        self._active_user = None
+        self._active_cancel = None
+        self._stopped = False
+        self._thread = None
+
+        self.metrics = {
+            'requests': 0,
+            'coalesced': 0,
+            'uploads_started': 0,
+            'uploads_succeeded': 0,
+            'uploads_failed': 0,
+            'uploads_cancelled': 0,
+            'uploads_abandoned': 0,
+            'last_success': {},  # username -> ISO timestamp
+            'last_error': {}     # username -> error list
+        }
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, name='upload-scheduler', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=5.0):
+        """Stop the worker, cancelling the upload in progress between files."""
+        with self._cond:
+            self._stopped = True
+            if self._active_cancel is not None:
+                self._active_cancel.set()
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+
+    def schedule(self, username):
+        """Request an upload for the user. Never blocks on network I/O."""
+        now = time.monotonic()
+        with self._cond:
+            self.metrics['requests'] += 1
+            entry = self._pending.get(username)
+            if entry is None:
+                self._pending[username] = {'first': now, 'last': now, 'not_before': 0.0}
+            else:
+                entry['last'] = now
+                self.metrics['coalesced'] += 1
+            self._cond.notify_all()
+
+    def cancel(self, username):
+        """Drop pending uploads for the user and stop an upload in progress after the current file."""
+        with self._cond:
+            self._pending.pop(username, None)
+            if self._active_user == username and self._active_cancel is not None:
+                self._active_cancel.set()
+
+    def get_status(self):
+        with self._cond:
+            return {
+                'queue_depth': len(self._pending),
+                'queued_users': sorted(self._pending),
+                'active_user': self._active_user,
+                'consecutive_failures': dict(self._failures),
+                'requests': self.metrics['requests'],
+                'coalesced': self.metrics['coalesced'],
+                'uploads_started': self.metrics['uploads_started'],
+                'uploads_succeeded': self.metrics['uploads_succeeded'],
+                'uploads_failed': self.metrics['uploads_failed'],
+                'uploads_cancelled': self.metrics['uploads_cancelled'],
+                'uploads_abandoned': self.metrics['uploads_abandoned'],
+                'last_success': dict(self.metrics['last_success']),
+                'last_error': dict(self.metrics['last_error'])
+            }
+
+    def _due_time(self, entry):
+        due = min(entry['last'] + self.debounce_seconds, entry['first'] + self.max_delay_seconds)
+        return max(due, entry['not_before'])
+
+    def _next_job(self):
+        """Wait until some user's upload is due and claim it. Returns None when stopped."""
+        with self._cond:
+            while not self._stopped:
+                now = time.monotonic()
+                username, due = None, None
+                for user, entry in self._pending.items():
+                    user_due = self._due_time(entry)
+                    if due is None or user_due < due:
+                        username, due = user, user_due
+                if username is not None and due <= now:
+                    del self._pending[username]
+                    self._active_user = username
+                    self._active_cancel = threading.Event()
+                    self.metrics['uploads_started'] += 1
+                    return username, self._active_cancel
+                self._cond.wait(timeout=None if due is None else due - now)
+            return None
+
+    def _run(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            username, cancel_event = job
+            try:
+                results = self.upload_func(username, cancel_event)
+                errors = results.get('errors', [])
+                success = results.get('success', False)
+                permanent = results.get('permanent', False)
+            except Exception as e:
+                errors = [str(e)]
+                success = False
+                permanent = False
+
+            with self._cond:
+                self._active_user = None
+                self._active_cancel = None
+                if cancel_event.is_set():
+                    self.metrics['uploads_cancelled'] += 1
+                    self.logger.debug(f"Background upload for {username} cancelled")
+                elif success:
+                    self._failures.pop(username, None)
+                    self.metrics['uploads_succeeded'] += 1
+                    self.metrics['last_success'][username] = datetime.now().isoformat()
+                    self.metrics['last_error'].pop(username, None)
+                    self.logger.debug(f"Background upload successful for {username}")
+                else:
+                    failures = self._failures.get(username, 0) + 1
+                    self._failures[username] = failures
+                    self.metrics['uploads_failed'] += 1
+                    self.metrics['last_error'][username] = errors
+                    if permanent or failures >= self.max_attempts:
+                        # Retrying cannot help, or has not helped: wait for the user's next request
+                        self.metrics['uploads_abandoned'] += 1
+                        reason = "permanent failure" if permanent else f"{failures} failed attempts"
+                        message = f"Background upload failed for {username}: {errors}. Not retrying ({reason})"
+                    else:
+                        delay = min(self.retry_base_seconds * 2 ** (failures - 1), self.retry_max_seconds)
+                        now = time.monotonic()
+                        entry = self._pending.setdefault(username, {'first': now, 'last': now, 'not_before': 0.0})
+                        entry['not_before'] = now + delay
+                        message = f"Background upload failed for {username}: {errors}. Retrying in {delay:.0f}s"
+                    # Warn once per failure streak (and when giving up), not on every retry
+                    if failures == 1 or failures == self.max_attempts:
+                        self.logger.warning(message)
+                    else:
+                        self.logger.debug(message)
@@ -0,0 +1,101 @@
+"""
+Runs the benchmark suite on a synthetic dataset and compares the results with a stored baseline.
+
+Usage:
+    python -m benchmarks                                  # all groups, results printed and saved
+    python -m benchmarks --groups micro routes --classes 10 --annotators 3 --boxes 5
+    python -m benchmarks --save-baseline                  # store the results as benchmarks/baseline.json
+    python -m benchmarks --fail-on-regression             # exit with status 1 on regressions vs. the baseline
+
+Groups: micro (helper functions), routes (Flask test client), drive (transfers against the fake Drive).
+Baselines are only comparable when recorded on the same machine with the same fixture parameters.
+"""
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+
+from benchmarks.harness import BenchmarkSuite, save_results, load_results, compare_results, format_seconds
+from benchmarks.fixtures import generate_fixture
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+GROUPS = ('micro', 'routes', 'drive')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--groups', nargs='+', choices=GROUPS, default=list(GROUPS), help='Benchmark groups to run')
+    parser.add_argument('--filter', default=None, help='Only run benchmarks whose name contains this text')
+    parser.add_argument('--classes', type=int, default=3, help='Classes in the fixture (50 images each)')
+    parser.add_argument('--annotators', type=int, default=1, help='Annotators in the fixture')
+    parser.add_argument('--boxes', type=int, default=2, help='Machine-generated boxes per image')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the fixture generator')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed rounds per benchmark')
+    parser.add_argument('--min-time', type=float, default=0.05, help='Minimum duration of one round in seconds')
+    parser.add_argument('--output', default='benchmark_results.json', help='Where to write the results')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Baseline results to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='Store the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='Allowed slowdown of the median (0.15 = 15%%)')
+    parser.add_argument('--fail-on-regression', action='store_true', help='Exit with status 1 on regressions')
+    args = parser.parse_args()
+
+    fixture_params = {'num_classes': args.classes, 'num_annotators': args.annotators,
+                      'boxes_per_image': args.boxes, 'seed': args.seed}
+    work_dir = tempfile.mkdtemp(prefix='multilabelfy-bench-')
+    try:
+        fixture_paths = generate_fixture(os.path.join(work_dir, 'data'), **fixture_params)
+        suite = BenchmarkSuite(repeat=args.repeat, min_time=args.min_time)
+
+        # Imported here: importing the app modules is part of no benchmark
+        if 'micro' in args.groups:
+            from benchmarks.micro import add_micro_benchmarks
+            add_micro_benchmarks(suite, fixture_paths, work_dir, fixture_params)
+        if 'routes' in args.groups:
+            from benchmarks.macro import add_macro_benchmarks
+            add_macro_benchmarks(suite, fixture_paths, work_dir, fixture_params)
+        if 'drive' in args.groups:
+            from benchmarks.drive_transfers import add_drive_benchmarks
+            add_drive_benchmarks(suite)
+
+        results = suite.run(groups=args.groups, name_filter=args.filter, progress=print_result)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    save_results(args.output, results, fixture_params)
+    print(f"\nResults written to {args.output}")
+
+    exit_code = 0
+    if os.path.isfile(args.baseline) and not args.save_baseline:
+        baseline = load_results(args.baseline)
+        if baseline.get('fixture') != fixture_params:
+            print(f"Warning: the baseline was recorded with fixture {json.dumps(baseline.get('fixture'))}")
+        comparison = compare_results(results, baseline, tolerance=args.tolerance)
+        print_comparison(comparison)
+        if args.fail_on_regression and any(entry['status'] == 'regression' for entry in comparison):
+            exit_code = 1
+
+    if args.save_baseline:
+        save_results(args.baseline, results, fixture_params)
+        print(f"Baseline written to {args.baseline}")
+    return exit_code
+
+
+def print_result(result):
+    print(f"{result['name']:<50} median {format_seconds(result['median_seconds']):>12}  "
+          f"min {format_seconds(result['min_seconds']):>12}  ({result['repeat']} x {result['number']})")
+
+
+def print_comparison(comparison):
+    print(f"\n{'benchmark':<50} {'baseline':>12} {'current':>12} {'ratio':>7}  status")
+    for entry in comparison:
+        baseline = format_seconds(entry['baseline_median_seconds']) if 'baseline_median_seconds' in entry else '-'
+        ratio = f"{entry['ratio']:.2f}" if 'ratio' in entry else '-'
+        print(f"{entry['name']:<50} {baseline:>12} {format_seconds(entry['median_seconds']):>12} {ratio:>7}  "
+              f"{entry['status']}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""
+Measures Drive upload/download throughput and latency against the in-process fake Drive.
+
+Usage:
+    python -m benchmarks.drive_transfers --workers 1 4 --latency 0.05 --size-kb 512
+
+Also part of the benchmark suite (`python -m benchmarks --groups drive`).
+"""
+
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+from app.fake_drive_service import FakeDriveService
+from app.google_drive_service import GoogleDriveService
+from app.transfer_engine import TransferEngine
+
+
+def write_checkbox_files(data_dir, username, size_kb):
+    """Write the three checkbox_selections files with roughly size_kb of JSON each."""
+    entry = {'bboxes': [{'coordinates': [10, 20, 30, 40], 'label': 1}], 'label_type': 'basic'}
+    num_entries = max(1, size_kb * 1024 // len(json.dumps(entry)))
+    for suffix in ('', '_S', '_M'):
+        data = {f"ILSVRC2012_val_{i:08d}.JPEG": entry for i in range(num_entries)}
+        with open(os.path.join(data_dir, f"checkbox_selections_{username}{suffix}.json"), 'w') as f:
+            json.dump(data, f)
+
+
+def run_once(workers, latency, size_kb, chunk_size):
+    username = 'bench'
+    upload_dir = tempfile.mkdtemp()
+    download_dir = tempfile.mkdtemp()
+    try:
+        write_checkbox_files(upload_dir, username, size_kb)
+        engine = TransferEngine(max_workers=workers)
+        drive = GoogleDriveService(service=FakeDriveService(latency_seconds=latency),
+                                   transfer_engine=engine, chunk_size=chunk_size)
+
+        start = time.perf_counter()
+        upload_results = drive.upload_user_data(username, upload_dir, 'bench-folder')
+        upload_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        download_results = drive.download_user_data(username, download_dir, 'bench-folder')
+        download_seconds = time.perf_counter() - start
+
+        stats = engine.get_stats()
+        engine.shutdown()
+        assert upload_results['success'] and download_results['success']
+        return {
+            'workers': workers,
+            'latency_seconds': latency,
+            'file_size_kb': size_kb,
+            'chunk_size': drive.chunk_size,
+            'upload_seconds': upload_seconds,
+            'download_seconds': download_seconds,
+            'throughput_mb_per_second': stats['bytes'] / (1024 * 1024) / max(upload_seconds + download_seconds, 1e-9),
+            'transfer_latency_p50_seconds': stats['latency_p50_seconds'],
+            'transfer_latency_max_seconds': stats['latency_max_seconds']
+        }
+    finally:
+        shutil.rmtree(upload_dir, ignore_errors=True)
+        shutil.rmtree(download_dir, ignore_errors=True)
+
+
+def add_drive_benchmarks(suite, workers=(1, 4), latency=0.01, size_kb=256, chunk_size=256 * 1024):
+    """Register one upload+download round trip per pool size with the benchmark suite."""
+    for num_workers in workers:
+        params = {'workers': num_workers, 'latency_seconds': latency, 'file_size_kb': size_kb}
+        suite.add(f'drive.upload_download.workers{num_workers}', 'drive',
+                  lambda num_workers=num_workers: run_once(num_workers, latency, size_kb, chunk_size),
+                  params, repeat=3, number=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4], help='Pool sizes to compare')
+    parser.add_argument('--latency', type=float, default=0.05, help='Simulated per-request latency in seconds')
+    parser.add_argument('--size-kb', type=int, default=512, help='Approximate size of each checkbox file')
+    parser.add_argument('--chunk-size', type=int, default=256 * 1024, help='Resumable chunk size in bytes')
+    args = parser.parse_args()
+
+    results = [run_once(workers, args.latency, args.size_kb, args.chunk_size) for workers in args.workers]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
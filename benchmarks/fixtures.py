@@ -0,0 +1,223 @@
+"""
+Deterministic synthetic datasets for the benchmarks and the load test.
+
+generate_fixture() writes everything the app needs for C classes of the ImageNet validation set: the image
+files (placeholder JPEGs, hard links of one file), predictions.json with softmax vectors,
+sample_images_info.json, bboxes.json with K boxes per image, and M annotator directories whose
+checkbox_selections files have a share of the images annotated. The same parameters and seed always produce
+the same files.
+
+Large datasets (num_images beyond the 50 000 validation images) get synthetic image names appended after
+the validation images. The app pages through classes of 50 images, so it only navigates the first 50 per
+class, but loads, caches and saves the full files. The JSON files are written incrementally; predictions
+take about 10 KB per image.
+"""
+
+import os
+import json
+import math
+import random
+
+import numpy as np
+
+from class_mapping.class_loader import ClassDictionary
+
+IMAGES_PER_CLASS = 50  # The app pages through classes of 50 images
+NUM_CLASSES = 1000
+SOFTMAX_VARIANTS = 8  # Distinct softmax vectors per class, serialized once and shared by the class's images
+PLACEHOLDER_JPEG = b'\xff\xd8\xff\xe0' + b'\x00' * 2044 + b'\xff\xd9'
+WORDNET_IDS_FILE = os.path.join(os.path.dirname(__file__), '..', 'required_files', 'imagenet_v2',
+                                'label_indices_to_wordnet_ids.json')
+
+
+def generate_fixture(root, num_classes=3, num_annotators=1, boxes_per_image=2, annotated_share=0.5, seed=0,
+                     num_images=None, progress=None):
+    """
+    Write a synthetic dataset below root and return the paths the app config needs.
+
+    Args:
+        root: Directory to write to (created if needed)
+        num_classes: Number of classes, each with IMAGES_PER_CLASS validation images
+        num_annotators: Number of annotator directories (bench_user_0, bench_user_1, ...)
+        boxes_per_image: Number of machine-generated boxes per image
+        annotated_share: Share of the images already annotated by every annotator
+        seed: Seed of the random softmax values, boxes and annotations
+        num_images: Total number of images instead of num_classes * IMAGES_PER_CLASS; sets the number of
+            classes to what the images fill (at most 1000) and adds synthetic images beyond the validation set
+        progress: Optional callable taking a message, called for every written file
+    """
+    if num_images is not None:
+        num_classes = min(NUM_CLASSES, math.ceil(num_images / IMAGES_PER_CLASS))
+    else:
+        num_images = num_classes * IMAGES_PER_CLASS
+
+    rnd = random.Random(seed)
+    np_rnd = np.random.default_rng(seed)
+    with open(WORDNET_IDS_FILE, 'r') as f:
+        wordnet_ids = json.load(f)
+
+    paths = {
+        'images': os.path.join(root, 'images'),
+        'gt': os.path.join(root, 'gt'),
+        'annotators': os.path.join(root, 'annotators')
+    }
+    os.makedirs(paths['gt'], exist_ok=True)
+
+    images = get_fixture_images(num_classes, num_images)
+    write_images(paths['images'], images, wordnet_ids, os.path.join(root, 'placeholder.jpg'))
+    report(progress, f"{len(images)} images in {num_classes} classes below {paths['images']}")
+
+    softmax_variants = {class_index: [serialize_softmax(np_rnd, class_index) for _ in range(SOFTMAX_VARIANTS)]
+                        for class_index in range(num_classes)}
+    with open(os.path.join(paths['gt'], 'predictions.json'), 'w') as f:
+        write_json_array(f, ('{"image_name": %s, "ground_truth": %d, "softmax_val": %s}'
+                             % (json.dumps(image_name), class_index, rnd.choice(softmax_variants[class_index]))
+                             for image_name, class_index in images))
+    report(progress, 'predictions.json')
+
+    # The examples are taken from the validation images only, as with the real examples dataset
+    with open(os.path.join(paths['gt'], 'sample_images_info.json'), 'w') as f:
+        write_json_array(f, (json.dumps({'image_name': image_name, 'ground_truth': class_index})
+                             for image_name, class_index in images[:num_classes * IMAGES_PER_CLASS]))
+    report(progress, 'sample_images_info.json')
+
+    # The boxes of an image are derived from its own seed, so they can be regenerated instead of kept in memory
+    def image_bboxes(image_number):
+        image_rnd = random.Random(seed * 1000003 + image_number)
+        return random_bboxes(image_rnd, images[image_number][1], boxes_per_image)
+
+    with open(os.path.join(paths['gt'], 'bboxes.json'), 'w') as f:
+        write_json_object(f, ((image_name, json.dumps(image_bboxes(i))) for i, (image_name, _) in enumerate(images)))
+    report(progress, 'bboxes.json')
+
+    usernames = [f"bench_user_{i}" for i in range(num_annotators)]
+    for username in usernames:
+        user_dir = os.path.join(paths['annotators'], username)
+        os.makedirs(user_dir, exist_ok=True)
+        annotated = [i for i in range(len(images)) if rnd.random() < annotated_share]
+        with open(os.path.join(user_dir, f"checkbox_selections_{username}.json"), 'w') as f:
+            write_json_object(f, ((images[i][0], json.dumps(make_annotation(image_bboxes(i)))) for i in annotated))
+        with open(os.path.join(user_dir, f"current_image_index_{username}.txt"), 'w') as f:
+            f.write('0')
+        report(progress, f"annotator {username} ({len(annotated)} annotated images)")
+
+    paths['usernames'] = usernames
+    paths['num_images'] = len(images)
+    paths['num_classes'] = num_classes
+    return paths
+
+
+def get_fixture_images(num_classes, num_images):
+    """
+    (image name, class index) of the fixture in the app's order: the validation images class by class, then
+    the synthetic images beyond them, assigned to the classes in turn.
+    """
+    images_by_class = get_validation_images(num_classes)
+    images = [(image_name, class_index) for class_index in range(num_classes)
+              for image_name in images_by_class[class_index]][:num_images]
+    for i in range(num_images - len(images)):
+        images.append((f"ILSVRC2012_synthetic_{i:08d}.JPEG", i % num_classes))
+    return images
+
+
+def get_validation_images(num_classes):
+    """The first IMAGES_PER_CLASS validation images (sorted by name) of each of the first num_classes classes."""
+    val_image_classes = np.load(ClassDictionary().filename_val_class, allow_pickle=True).item()
+    images_by_class = {class_index: [] for class_index in range(num_classes)}
+    for image_name, class_index in sorted(val_image_classes.items()):
+        if class_index < num_classes and len(images_by_class[class_index]) < IMAGES_PER_CLASS:
+            images_by_class[class_index].append(image_name)
+    return images_by_class
+
+
+def write_images(images_dir, images, wordnet_ids, placeholder_path):
+    """Hard-link every image to one placeholder JPEG (copies where hard links are not supported)."""
+    if not os.path.exists(placeholder_path):
+        with open(placeholder_path, 'wb') as f:
+            f.write(PLACEHOLDER_JPEG)
+    created_dirs = set()
+    for image_name, class_index in images:
+        class_dir = os.path.join(images_dir, wordnet_ids[str(class_index)])
+        if class_dir not in created_dirs:
+            os.makedirs(class_dir, exist_ok=True)
+            created_dirs.add(class_dir)
+        image_path = os.path.join(class_dir, image_name)
+        if os.path.exists(image_path):
+            continue
+        try:
+            os.link(placeholder_path, image_path)
+        except OSError:
+            with open(image_path, 'wb') as f:
+                f.write(PLACEHOLDER_JPEG)
+
+
+def serialize_softmax(np_rnd, class_index):
+    softmax = np_rnd.random(NUM_CLASSES)
+    softmax[class_index] += NUM_CLASSES / 10
+    softmax /= softmax.sum()
+    return json.dumps([round(float(value), 6) for value in softmax])
+
+
+def random_bboxes(rnd, class_index, num_boxes):
+    boxes, scores = [], []
+    for _ in range(num_boxes):
+        x, y = rnd.randint(0, 300), rnd.randint(0, 300)
+        boxes.append([x, y, x + rnd.randint(20, 200), y + rnd.randint(20, 200)])
+        scores.append(round(rnd.uniform(0.1, 1.0), 4))
+    return {'boxes': boxes, 'scores': scores, 'gt': [class_index] * num_boxes}
+
+
+def make_annotation(bbox_data):
+    """checkbox_selections entry as saved by the grid view."""
+    return {
+        'bboxes': [{'coordinates': box, 'label': label, 'crowd_flag': False, 'reflected_flag': False,
+                    'rendition_flag': False, 'ocr_needed_flag': False, 'uncertain_flag': False,
+                    'possible_label': [], 'group': None}
+                   for box, label in zip(bbox_data['boxes'], bbox_data['gt'])],
+        'label_type': 'basic'
+    }
+
+
+def write_json_array(f, serialized_items):
+    """Write a JSON array from already serialized items without holding the whole document in memory."""
+    f.write('[')
+    for i, item in enumerate(serialized_items):
+        if i:
+            f.write(', ')
+        f.write(item)
+    f.write(']')
+
+
+def write_json_object(f, serialized_items):
+    """Write a JSON object from (key, serialized value) pairs."""
+    f.write('{')
+    for i, (key, value) in enumerate(serialized_items):
+        if i:
+            f.write(', ')
+        f.write(json.dumps(key))
+        f.write(': ')
+        f.write(value)
+    f.write('}')
+
+
+def report(progress, message):
+    if progress is not None:
+        progress(message)
+
+
+def create_benchmark_app(fixture_paths, log_dir, **config_overrides):
+    """Create the app on a fixture. The overrides are applied to app.config before create_app() reads it."""
+    import app.config as config
+    config.ANNOTATIONS_ROOT_FOLDER = fixture_paths['images']
+    config.EXAMPLES_DATASET_ROOT_DIR = fixture_paths['images']
+    config.GT_DATA_ROOT_DIRECTORY = fixture_paths['gt']
+    config.ANNOTATORS_ROOT_DIRECTORY = fixture_paths['annotators']
+    config.UPLOAD_USERNAME = fixture_paths['usernames'][0]
+    config.GOOGLE_DRIVE_ENABLED = False
+    config.LOG_FILE = os.path.join(log_dir, 'benchmark.log')
+    config.LOG_TO_CONSOLE = False
+    for key, value in config_overrides.items():
+        setattr(config, key, value)
+
+    from app.factory import create_app
+    return create_app()
@@ -0,0 +1,160 @@
+"""
+Timing, result files and baseline comparison for the benchmark suite.
+
+Every benchmark is timed over `repeat` rounds of `number` calls (calibrated so one round takes at least
+`min_time` seconds) after a warm-up call. Results are stored as JSON; compare_results() matches them by
+name against a stored baseline and flags benchmarks whose median got slower than the tolerance.
+"""
+
+import gc
+import sys
+import json
+import time
+import platform
+import statistics
+
+
+class Benchmark:
+    def __init__(self, name, group, func, params=None, repeat=None, number=None):
+        """
+        Args:
+            name: Unique name, used to match results against the baseline
+            group: 'micro', 'routes' or 'drive'
+            func: Callable without arguments running one iteration
+            params: Parameters recorded with the result (fixture sizes, ...)
+            repeat/number: Fixed rounds and calls per round instead of the suite's defaults/calibration
+        """
+        self.name = name
+        self.group = group
+        self.func = func
+        self.params = params or {}
+        self.repeat = repeat
+        self.number = number
+
+
+class BenchmarkSuite:
+    def __init__(self, repeat=5, min_time=0.05, max_number=10000):
+        self.repeat = repeat
+        self.min_time = min_time
+        self.max_number = max_number
+        self.benchmarks = []
+
+    def add(self, name, group, func, params=None, repeat=None, number=None):
+        self.benchmarks.append(Benchmark(name, group, func, params=params, repeat=repeat, number=number))
+
+    def run(self, groups=None, name_filter=None, progress=None):
+        """Run the selected benchmarks and return their results."""
+        results = []
+        for benchmark in self.benchmarks:
+            if groups and benchmark.group not in groups:
+                continue
+            if name_filter and name_filter not in benchmark.name:
+                continue
+            result = self.run_benchmark(benchmark)
+            if progress is not None:
+                progress(result)
+            results.append(result)
+        return results
+
+    def run_benchmark(self, benchmark):
+        func = benchmark.func
+        func()  # Warm-up: imports, caches, lazily loaded data
+
+        number = benchmark.number or self._calibrate(func)
+        repeat = benchmark.repeat or self.repeat
+        timings = []
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for _ in range(repeat):
+                start = time.perf_counter()
+                for _ in range(number):
+                    func()
+                timings.append((time.perf_counter() - start) / number)
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+
+        timings.sort()
+        return {
+            'name': benchmark.name,
+            'group': benchmark.group,
+            'params': benchmark.params,
+            'repeat': repeat,
+            'number': number,
+            'min_seconds': timings[0],
+            'median_seconds': statistics.median(timings),
+            'mean_seconds': statistics.fmean(timings),
+            'max_seconds': timings[-1],
+            'stdev_seconds': statistics.stdev(timings) if len(timings) > 1 else 0.0
+        }
+
+    def _calibrate(self, func):
+        """Smallest power of ten of calls taking at least min_time seconds."""
+        number = 1
+        while number < self.max_number:
+            start = time.perf_counter()
+            for _ in range(number):
+                func()
+            if time.perf_counter() - start >= self.min_time:
+                break
+            number *= 10
+        return number
+
+
+def get_environment():
+    return {
+        'python': sys.version.split()[0],
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S')
+    }
+
+
+def save_results(path, results, fixture_params):
+    with open(path, 'w') as f:
+        json.dump({'environment': get_environment(), 'fixture': fixture_params, 'results': results}, f, indent=2)
+
+
+def load_results(path):
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def compare_results(results, baseline, tolerance=0.15):
+    """
+    Compare the medians of results with a baseline file's results.
+
+    Returns:
+        List of dicts (name, baseline/current median, ratio, status) where status is 'regression' for
+        benchmarks slower than 1 + tolerance times the baseline, 'improvement' for those faster than
+        1 - tolerance times it, 'ok' otherwise and 'new' without a baseline entry.
+    """
+    baseline_by_name = {result['name']: result for result in baseline.get('results', [])}
+    comparison = []
+    for result in results:
+        previous = baseline_by_name.get(result['name'])
+        entry = {'name': result['name'], 'median_seconds': result['median_seconds']}
+        if previous is None:
+            entry['status'] = 'new'
+        else:
+            ratio = result['median_seconds'] / max(previous['median_seconds'], 1e-12)
+            entry['baseline_median_seconds'] = previous['median_seconds']
+            entry['ratio'] = ratio
+            if ratio > 1 + tolerance:
+                entry['status'] = 'regression'
+            elif ratio < 1 - tolerance:
+                entry['status'] = 'improvement'
+            else:
+                entry['status'] = 'ok'
+        comparison.append(entry)
+    return comparison
+
+
+def format_seconds(seconds):
+    if seconds >= 1:
+        return f"{seconds:.3f} s"
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.3f} ms"
+    return f"{seconds * 1e6:.1f} us"
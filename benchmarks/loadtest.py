@@ -0,0 +1,370 @@
+"""
+Load test: simulated annotators working concurrently against one instance of the app.
+
+Every annotator is a thread that works like a person does in the browser: it pages through the grid (saving
+the page it leaves in the background and fetching the next ones from the grid API), sometimes opens an image
+in the labeling view and saves its boxes, sometimes jumps to another class, and waits a log-normally
+distributed think time between actions. Per route, the throughput, p50/p95/p99 latency and error rate are
+reported.
+
+Usage:
+    python -m benchmarks.loadtest --images 10000 --annotators 8 --duration 60 --think-scale 0.05
+    python -m benchmarks.loadtest --dataset /data/loadtest --images 1000000 --annotators 10 --duration 600
+    python -m benchmarks.loadtest --url http://annotation-host:9000 --usernames alice bob --duration 300
+
+Without --url, the dataset is generated (or reused, when --dataset already holds one with the same
+parameters) and the app is served on it by a threaded server in this process. With --url, an already
+running instance is tested with the given usernames; their annotations are changed by the test.
+
+The grid moves to the next class in the class hierarchy at the end of a class. Datasets of fewer than
+50 000 images lack some of those classes, so annotators occasionally land on a class without images
+(a failed grid_page_data request) and jump back to a random class, as they would in the browser.
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import random
+import shutil
+import logging
+import argparse
+import tempfile
+import threading
+import http.client
+from urllib.parse import urlsplit, urlencode
+
+from benchmarks.fixtures import generate_fixture, create_benchmark_app
+
+FIXTURE_INFO_FILE = 'fixture.json'
+
+# Median think times in seconds (before --think-scale) and the spread of their log-normal distributions
+THINK_TIME_MEDIANS = {'grid_page': 6.0, 'label_image': 15.0, 'after_save': 1.0}
+THINK_TIME_SIGMA = 0.6
+
+# Probabilities of the actions taken on a grid page
+GRID_ACTION_WEIGHTS = {'next_page': 0.75, 'label_image': 0.12, 'save_stay': 0.08, 'jump_to_class': 0.05}
+CHECKED_SHARE = 0.8  # Share of the grid images an annotator leaves checked
+
+
+class LoadStats:
+    """Latencies, status codes and errors per route, collected from all annotator threads."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.routes = {}
+        self.started = time.time()
+        self.stopped = None
+
+    def record(self, route, seconds, status):
+        with self.lock:
+            entry = self.routes.setdefault(route, {'latencies': [], 'statuses': {}, 'errors': 0})
+            entry['latencies'].append(seconds)
+            entry['statuses'][status] = entry['statuses'].get(status, 0) + 1
+            if status == 0 or status >= 400:
+                entry['errors'] += 1
+
+    def stop(self):
+        self.stopped = time.time()
+
+    def get_report(self):
+        with self.lock:
+            duration = (self.stopped or time.time()) - self.started
+            routes = {}
+            for route, entry in sorted(self.routes.items()):
+                latencies = sorted(entry['latencies'])
+                routes[route] = {
+                    'requests': len(latencies),
+                    'errors': entry['errors'],
+                    'error_rate': entry['errors'] / len(latencies),
+                    'throughput_per_second': len(latencies) / duration,
+                    'p50_seconds': percentile(latencies, 50),
+                    'p95_seconds': percentile(latencies, 95),
+                    'p99_seconds': percentile(latencies, 99),
+                    'max_seconds': latencies[-1],
+                    'statuses': {str(status): count for status, count in sorted(entry['statuses'].items())}
+                }
+        total_requests = sum(route['requests'] for route in routes.values())
+        total_errors = sum(route['errors'] for route in routes.values())
+        return {
+            'duration_seconds': duration,
+            'requests': total_requests,
+            'errors': total_errors,
+            'error_rate': total_errors / total_requests if total_requests else 0.0,
+            'throughput_per_second': total_requests / duration if duration else 0.0,
+            'routes': routes
+        }
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class HttpClient:
+    """Minimal HTTP client recording the latency of every request under the name of its route."""
+
+    def __init__(self, base_url, stats, timeout=60):
+        parts = urlsplit(base_url)
+        self.connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.netloc = parts.netloc
+        self.prefix = parts.path.rstrip('/')
+        self.stats = stats
+        self.timeout = timeout
+
+    def request(self, route, method, path, params=None, form=None, json_body=None, headers=None):
+        """Returns (status, body bytes); status is 0 when the request failed without a response."""
+        url = self.prefix + path + ('?' + urlencode(params) if params else '')
+        headers = dict(headers or {})
+        body = None
+        if form is not None:
+            body = urlencode(form, doseq=True)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        elif json_body is not None:
+            body = json.dumps(json_body)
+            headers['Content-Type'] = 'application/json'
+
+        start = time.perf_counter()
+        connection = self.connection_class(self.netloc, timeout=self.timeout)
+        try:
+            connection.request(method, url, body=body, headers=headers)
+            response = connection.getresponse()
+            status, data = response.status, response.read()
+        except (OSError, http.client.HTTPException):
+            status, data = 0, b''
+        finally:
+            connection.close()
+        self.stats.record(route, time.perf_counter() - start, status)
+        return status, data
+
+
+class SimulatedAnnotator(threading.Thread):
+    def __init__(self, client, username, stop_event, num_classes, think_scale=1.0, seed=0):
+        super().__init__(name=f"annotator-{username}", daemon=True)
+        self.client = client
+        self.username = username
+        self.num_classes = num_classes
+        self.stop_event = stop_event
+        self.think_scale = think_scale
+        self.rnd = random.Random(seed)
+        self.page = None
+        self.page_cache = {}  # page start -> grid API page data, like the grid view keeps it
+
+    def run(self):
+        self.open_grid()
+        while not self.stop_event.is_set():
+            self.think('grid_page')
+            if self.stop_event.is_set():
+                break
+            if self.page is None:
+                self.jump_to_class()
+                continue
+            action = self.rnd.choices(list(GRID_ACTION_WEIGHTS), weights=list(GRID_ACTION_WEIGHTS.values()))[0]
+            getattr(self, action)()
+
+    def think(self, kind):
+        if self.think_scale > 0:
+            seconds = self.rnd.lognormvariate(math.log(THINK_TIME_MEDIANS[kind] * self.think_scale),
+                                              THINK_TIME_SIGMA)
+            self.stop_event.wait(seconds)
+
+    def open_grid(self):
+        """Full load of the grid page, followed by the prefetch of the grid view's script."""
+        self.client.request('grid_image', 'GET', f'/{self.username}')
+        self.fetch_pages(None)
+
+    def fetch_pages(self, start):
+        params = {'lookahead': 1}
+        if start is not None:
+            params['start'] = start
+        status, body = self.client.request('grid_page_data', 'GET', f'/api/{self.username}/grid', params=params)
+        if status != 200:
+            self.page = None
+            return
+        data = json.loads(body)
+        self.page = data['page']
+        for page in [data['page']] + data['lookahead']:
+            self.page_cache[page['start']] = page
+
+    def grid_form(self, direction):
+        checked = [image for image in self.page['images'] if self.rnd.random() < CHECKED_SHARE]
+        return {
+            'image_name': '|'.join(image['path'] for image in self.page['images']),
+            'checkboxes': [image['checkbox_value'] for image in checked],
+            'direction': direction
+        }
+
+    def next_page(self):
+        """In-place navigation within a class with a background save; a full form submission otherwise."""
+        next_start = self.page['next_start']
+        next_page = self.page_cache.get(next_start)
+        if next_page is not None and next_page['class_index'] == self.page['class_index']:
+            self.client.request('save_grid', 'POST', f'/{self.username}/save_grid', form=self.grid_form('next'),
+                                headers={'X-Requested-With': 'XMLHttpRequest'})
+            self.fetch_pages(next_start)
+        else:
+            self.client.request('save_grid', 'POST', f'/{self.username}/save_grid', form=self.grid_form('next'))
+            self.page_cache.clear()
+            self.open_grid()
+
+    def save_stay(self):
+        self.client.request('save_grid', 'POST', f'/{self.username}/save_grid', form=self.grid_form('stay'))
+
+    def label_image(self):
+        """Open one image of the page in the labeling view, save its boxes and return to the grid."""
+        image = self.rnd.choice(self.page['images'])
+        self.client.request('label_image', 'GET', f'/{self.username}/label_image',
+                            params={'image_index': image['index']})
+        self.think('label_image')
+        bboxes = image['bboxes'] or {}
+        self.client.request('save_bboxes', 'POST', f'/{self.username}/save_bboxes', json_body={
+            'image_name': os.path.basename(image['path']),
+            'bboxes': [{'coordinates': box, 'label': label, 'crowd_flag': False, 'reflected_flag': False,
+                        'rendition_flag': False, 'ocr_needed_flag': False, 'uncertain_flag': False}
+                       for box, label in zip(bboxes.get('boxes', []), bboxes.get('labels') or bboxes.get('gt', []))],
+            'label_type': 'basic',
+            'timestamp': time.time() * 1000
+        })
+        self.think('after_save')
+        self.open_grid()
+
+    def jump_to_class(self):
+        form = self.grid_form('stay') if self.page is not None else {'image_name': '', 'direction': 'stay'}
+        form['class_id'] = self.rnd.randrange(self.num_classes)
+        self.client.request('jump_to_class', 'POST', f'/{self.username}/jump_to_class', form=form)
+        self.page_cache.clear()
+        self.open_grid()
+
+
+def run_load_test(base_url, usernames, num_annotators, duration, num_classes=1000, think_scale=1.0, ramp_up=0.0,
+                  seed=0, progress=None):
+    """
+    Run num_annotators simulated annotators (assigned to usernames in turn) for duration seconds.
+    Jumps go to one of the first num_classes classes.
+
+    Returns:
+        Report dict of LoadStats.get_report()
+    """
+    stats = LoadStats()
+    stop_event = threading.Event()
+    annotators = []
+    for i in range(num_annotators):
+        annotator = SimulatedAnnotator(HttpClient(base_url, stats), usernames[i % len(usernames)], stop_event,
+                                       num_classes, think_scale=think_scale, seed=seed * 1000 + i)
+        annotators.append(annotator)
+
+    deadline = time.time() + duration
+    for i, annotator in enumerate(annotators):
+        annotator.start()
+        if ramp_up and i < len(annotators) - 1:
+            stop_event.wait(ramp_up / len(annotators))
+    while time.time() < deadline:
+        stop_event.wait(min(10.0, max(0.0, deadline - time.time())))
+        if progress is not None:
+            report = stats.get_report()
+            progress(f"{report['requests']} requests, {report['errors']} errors, "
+                     f"{report['throughput_per_second']:.1f} requests/s")
+    stop_event.set()
+    for annotator in annotators:
+        annotator.join()
+    stats.stop()
+    return stats.get_report()
+
+
+def prepare_dataset(dataset_dir, fixture_params, progress=None):
+    """Generate the dataset, or reuse the one in dataset_dir when it was generated with the same parameters."""
+    info_path = os.path.join(dataset_dir, FIXTURE_INFO_FILE)
+    if os.path.isfile(info_path):
+        with open(info_path, 'r') as f:
+            info = json.load(f)
+        if info['params'] == fixture_params:
+            return info['paths']
+        shutil.rmtree(dataset_dir)
+
+    paths = generate_fixture(dataset_dir, progress=progress, **fixture_params)
+    with open(info_path, 'w') as f:
+        json.dump({'params': fixture_params, 'paths': paths}, f, indent=2)
+    return paths
+
+
+def serve_app(app):
+    """Serve the app with a threaded server on a free local port; returns the server and its URL."""
+    from werkzeug.serving import make_server
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)  # No access log line per request
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='loadtest-server', daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def print_report(report):
+    print(f"\n{report['requests']} requests in {report['duration_seconds']:.1f} s "
+          f"({report['throughput_per_second']:.1f} requests/s), error rate {report['error_rate']:.2%}\n")
+    print(f"{'route':<18} {'requests':>9} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+          f"{'max ms':>9} {'errors':>8}")
+    for route, entry in report['routes'].items():
+        print(f"{route:<18} {entry['requests']:>9} {entry['throughput_per_second']:>8.2f} "
+              f"{entry['p50_seconds'] * 1e3:>9.1f} {entry['p95_seconds'] * 1e3:>9.1f} "
+              f"{entry['p99_seconds'] * 1e3:>9.1f} {entry['max_seconds'] * 1e3:>9.1f} {entry['error_rate']:>8.2%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default=None, help='Test a running instance instead of an in-process one')
+    parser.add_argument('--usernames', nargs='+', default=None, help='Annotator usernames (required with --url)')
+    parser.add_argument('--num-classes', type=int, default=1000, help='Classes of the instance tested with --url')
+    parser.add_argument('--dataset', default=None, help='Directory of the generated dataset (kept for reuse)')
+    parser.add_argument('--images', type=int, default=10000, help='Images in the generated dataset')
+    parser.add_argument('--annotator-dirs', type=int, default=None,
+                        help='Annotator directories in the generated dataset, defaults to --annotators')
+    parser.add_argument('--boxes', type=int, default=2, help='Machine-generated boxes per image')
+    parser.add_argument('--annotated-share', type=float, default=0.5, help='Share of already annotated images')
+    parser.add_argument('--annotators', type=int, default=8, help='Simulated annotators')
+    parser.add_argument('--duration', type=float, default=60.0, help='Duration of the test in seconds')
+    parser.add_argument('--ramp-up', type=float, default=0.0, help='Seconds over which the annotators start')
+    parser.add_argument('--think-scale', type=float, default=1.0,
+                        help='Factor on the think times (0 for back-to-back requests)')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the dataset and the annotators')
+    parser.add_argument('--output', default=None, help='Write the report as JSON to this file')
+    args = parser.parse_args()
+
+    server, work_dir = None, None
+    if args.url:
+        if not args.usernames:
+            parser.error('--usernames is required with --url')
+        base_url, usernames, num_classes = args.url, args.usernames, args.num_classes
+    else:
+        fixture_params = {'num_images': args.images, 'num_annotators': args.annotator_dirs or args.annotators,
+                          'boxes_per_image': args.boxes, 'annotated_share': args.annotated_share, 'seed': args.seed}
+        dataset_dir = args.dataset or tempfile.mkdtemp(prefix='multilabelfy-loadtest-')
+        work_dir = None if args.dataset else dataset_dir
+        print(f"Preparing the dataset in {dataset_dir}")
+        paths = prepare_dataset(dataset_dir, fixture_params, progress=lambda message: print(f"  {message}"))
+        app = create_benchmark_app(paths, dataset_dir)
+        server, base_url = serve_app(app)
+        usernames, num_classes = paths['usernames'], paths['num_classes']
+
+    print(f"{args.annotators} annotators against {base_url} for {args.duration:.0f} s")
+    try:
+        report = run_load_test(base_url, usernames, args.annotators, args.duration, num_classes=num_classes,
+                               think_scale=args.think_scale,
+                               ramp_up=args.ramp_up, seed=args.seed, progress=lambda message: print(f"  {message}"))
+    finally:
+        if server is not None:
+            server.shutdown()
+        if work_dir is not None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.output}")
+    return 1 if report['requests'] == 0 else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
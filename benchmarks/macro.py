@@ -0,0 +1,63 @@
+"""
+Macro-benchmarks of the route handlers through the Flask test client.
+
+Pages are measured both rendered from scratch (rendered page cache and page warming disabled) and with the
+default configuration, where repeated requests are served from the page cache or revalidated with a 304.
+"""
+
+import itertools
+
+from benchmarks.fixtures import create_benchmark_app
+
+_save_grid_forms = {}  # username -> form data of the first grid page
+
+
+def add_macro_benchmarks(suite, fixture_paths, work_dir, params):
+    username = fixture_paths['usernames'][0]
+
+    uncached_app = create_benchmark_app(fixture_paths, work_dir, RENDERED_PAGE_CACHE_ENABLED=False,
+                                        PAGE_WARMER_ENABLED=False, RESPONSE_COMPRESSION_ENABLED=False)
+    uncached = uncached_app.test_client()
+    image_indices = itertools.cycle(range(fixture_paths['num_images']))
+
+    suite.add('routes.grid_image', 'routes',
+              lambda: check(uncached.get(f'/{username}')), params)
+    suite.add('routes.label_image', 'routes',
+              lambda: check(uncached.get(f'/{username}/label_image?image_index={next(image_indices)}')), params)
+    suite.add('routes.grid_page_data.lookahead1', 'routes',
+              lambda: check(uncached.get(f'/api/{username}/grid?start=0&lookahead=1')), params)
+    suite.add('routes.save_grid.stay', 'routes',
+              lambda: check(uncached.post(f'/{username}/save_grid', data=get_save_grid_form(uncached, username))),
+              params)
+
+    cached_app = create_benchmark_app(fixture_paths, work_dir, RENDERED_PAGE_CACHE_ENABLED=True,
+                                      PAGE_WARMER_ENABLED=True, RESPONSE_COMPRESSION_ENABLED=True)
+    cached = cached_app.test_client()
+    etag = cached.get(f'/{username}/label_image?image_index=0').headers['ETag']
+
+    suite.add('routes.label_image.cached', 'routes',
+              lambda: check(cached.get(f'/{username}/label_image?image_index=0')), params)
+    suite.add('routes.label_image.not_modified', 'routes',
+              lambda: check(cached.get(f'/{username}/label_image?image_index=0',
+                                       headers={'If-None-Match': etag}), 304), params)
+    suite.add('routes.label_image.cached_gzip', 'routes',
+              lambda: check(cached.get(f'/{username}/label_image?image_index=0',
+                                       headers={'Accept-Encoding': 'gzip'})), params)
+
+
+def get_save_grid_form(client, username):
+    """Form of the first grid page with every image checked, as the grid view submits it."""
+    if username not in _save_grid_forms:
+        page = check(client.get(f'/api/{username}/grid?start=0')).get_json()['page']
+        _save_grid_forms[username] = {
+            'image_name': '|'.join(image['path'] for image in page['images']),
+            'checkboxes': [image['checkbox_value'] for image in page['images']],
+            'direction': 'stay'
+        }
+    return _save_grid_forms[username]
+
+
+def check(response, status_code=200):
+    if response.status_code != status_code:
+        raise RuntimeError(f"{response.request.path} returned {response.status_code} instead of {status_code}")
+    return response
@@ -0,0 +1,92 @@
+"""
+Reports the memory of the app's caches per cache and per user, and the memory of each startup stage.
+
+Usage:
+    python -m benchmarks.memory_report                          # the configured dataset and annotators
+    python -m benchmarks.memory_report --images 50000 --annotators 5 --trace-startup
+    python -m benchmarks.memory_report --json memory.json
+    python -m benchmarks.memory_report --images 50000 --gt-backend arrays
+
+With --images, the app is created on a generated dataset (see benchmarks/fixtures.py) instead of the
+configured one. Users' bbox data is loaded lazily by the app, so it is loaded for every user before measuring. With
+--gt-backend arrays the ground truth data is memory-mapped (see app/gt_arrays.py): its pages are shared with other
+processes and not counted in the cache sizes.
+"""
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+
+from app.memory import get_memory_report, format_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', type=int, default=None, help='Use a generated dataset of this many images')
+    parser.add_argument('--annotators', type=int, default=3, help='Annotators of the generated dataset')
+    parser.add_argument('--trace-startup', action='store_true', help='Top allocators per startup stage')
+    parser.add_argument('--top', type=int, default=5, help='Allocators printed per startup stage')
+    parser.add_argument('--gt-backend', choices=('json', 'arrays'), default=None, help='GT_DATA_BACKEND to use')
+    parser.add_argument('--json', default=None, help='Write the full report as JSON to this file')
+    args = parser.parse_args()
+
+    import app.config as config
+    config.MEMORY_TRACE_STARTUP = args.trace_startup
+    config.MEMORY_TRACE_TOP_ALLOCATORS = args.top
+    if args.gt_backend is not None:
+        config.GT_DATA_BACKEND = args.gt_backend
+
+    work_dir = None
+    try:
+        if args.images is not None:
+            from benchmarks.fixtures import generate_fixture, create_benchmark_app
+            work_dir = tempfile.mkdtemp(prefix='multilabelfy-memory-')
+            paths = generate_fixture(work_dir, num_images=args.images, num_annotators=args.annotators)
+            app = create_benchmark_app(paths, work_dir, GT_ARRAYS_DIRECTORY=os.path.join(work_dir, 'gt_arrays'))
+        else:
+            from app.factory import create_app
+            app = create_app()
+
+        for username in list(app.user_cache):
+            app.load_bbox_openclip_data(username)
+        report = get_memory_report(app)
+        report['startup'] = app.startup_memory.get_stats()
+    finally:
+        if work_dir is not None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.json}")
+    return 0
+
+
+def print_report(report):
+    print(f"\nProcess RSS: {format_bytes(report['rss_bytes'])}, caches (unique): "
+          f"{format_bytes(report['caches_unique_bytes'])}, measured in {report['measure_seconds']:.1f} s\n")
+    print(f"{'cache':<28} {'bytes':>12} {'unique':>12}")
+    for name, sizes in sorted(report['caches'].items(), key=lambda item: -item[1]['bytes']):
+        print(f"{name:<28} {format_bytes(sizes['bytes']):>12} {format_bytes(sizes['unique_bytes']):>12}")
+
+    print(f"\n{'user':<28} {'total':>12}  details")
+    for username, sizes in report['users'].items():
+        details = ', '.join(f"{key} {format_bytes(value)}" for key, value in sizes.items() if key != 'total_bytes')
+        print(f"{username:<28} {format_bytes(sizes['total_bytes']):>12}  {details}")
+    print(f"Summed over users: {format_bytes(report['users_summed_bytes'])}, of which per-user copies of the "
+          f"same data: {format_bytes(report['duplicated_bytes'])}")
+
+    print(f"\n{'startup stage':<28} {'seconds':>8} {'RSS':>12} {'added':>12}")
+    for stage in report['startup']['stages']:
+        print(f"{stage['stage']:<28} {stage['seconds']:>8.2f} {format_bytes(stage['rss_bytes']):>12} "
+              f"{format_bytes(stage.get('rss_delta_bytes')):>12}")
+        for allocator in stage.get('top_allocators', []):
+            print(f"    {format_bytes(allocator['size_delta_bytes']):>12}  {allocator['location']}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
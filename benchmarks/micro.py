@@ -0,0 +1,90 @@
+"""
+Micro-benchmarks of the helper functions the grid and labeling pages are built from.
+"""
+
+import os
+import random
+from types import SimpleNamespace
+
+from app.helper_funcs import get_sample_image_for_category, get_sample_images_for_categories, \
+    get_image_conf_dict, get_image_softmax_dict, load_json, find_image_index
+from app.app_utils import load_user_data, save_json_data
+from app.annotation_store import JsonFileStore, SqliteAnnotationStore
+from app.gt_arrays import load_gt_arrays
+from app.lazy_proposals import load_lazy_records
+from app.proposals_encoding import convert_file, encode_record
+from app.routes import convert_bboxes_to_serializable
+from benchmarks.fixtures import IMAGES_PER_CLASS, WORDNET_IDS_FILE
+
+
+def add_micro_benchmarks(suite, fixture_paths, work_dir, params):
+    predictions_file = os.path.join(fixture_paths['gt'], 'predictions.json')
+    predictions = load_json(predictions_file)
+    all_sample_images = load_json(os.path.join(fixture_paths['gt'], 'sample_images_info.json'))
+    bboxes = load_json(os.path.join(fixture_paths['gt'], 'bboxes.json'))
+    wordnet_ids = load_json(WORDNET_IDS_FILE)
+
+    username = fixture_paths['usernames'][0]
+    fake_app = SimpleNamespace(config={'ANNOTATORS_ROOT_DIRECTORY': fixture_paths['annotators']})
+    checkbox_selections = load_user_data(fake_app, username)
+    save_path = os.path.join(work_dir, 'save_json_data.json')
+
+    # Same class sample as the labeling page: the top 5 predicted classes
+    top_categories = list(range(min(5, params['num_classes'])))
+    first_page_bboxes = [bboxes[prediction['image_name']] for prediction in predictions[:IMAGES_PER_CLASS]]
+
+    random.seed(0)
+    suite.add('helpers.get_sample_image_for_category', 'micro',
+              lambda: get_sample_image_for_category(0, all_sample_images, wordnet_ids, 10), params)
+    suite.add('helpers.get_sample_images_for_categories.top5', 'micro',
+              lambda: get_sample_images_for_categories(top_categories, all_sample_images, wordnet_ids, 10), params)
+    suite.add('helpers.convert_bboxes_to_serializable.class', 'micro',
+              lambda: [convert_bboxes_to_serializable(bbox_data, 0.5) for bbox_data in first_page_bboxes], params)
+    suite.add('helpers.get_image_conf_dict', 'micro', lambda: get_image_conf_dict(predictions), params)
+    suite.add('helpers.get_image_softmax_dict', 'micro', lambda: get_image_softmax_dict(predictions), params)
+    suite.add('helpers.load_json.predictions', 'micro', lambda: load_json(predictions_file), params)
+
+    # The same proposals top-k encoded (see app/proposals_encoding.py)
+    predictions_topk_file = os.path.join(work_dir, 'predictions_topk.json')
+    convert_file(predictions_file, predictions_topk_file, encode_record)
+    predictions_topk = load_json(predictions_topk_file)
+    suite.add('helpers.load_json.predictions_topk', 'micro', lambda: load_json(predictions_topk_file), params)
+    suite.add('helpers.get_image_conf_dict.topk', 'micro', lambda: get_image_conf_dict(predictions_topk), params)
+    suite.add('app_utils.load_user_data', 'micro', lambda: load_user_data(fake_app, username), params)
+    suite.add('app_utils.save_json_data', 'micro', lambda: save_json_data(save_path, checkbox_selections), params)
+
+    # Saving one image's annotation: the whole file is rewritten, or one row upserted
+    image_data = {'bboxes': [{'coordinates': [10, 10, 50, 50], 'label': 0}], 'label_type': 'basic'}
+    json_store = JsonFileStore(os.path.join(work_dir, 'json_store'), class_of=lambda image_name: 0)
+    os.makedirs(os.path.join(json_store.annotators_dir, username), exist_ok=True)
+    json_store.save_selections(username, checkbox_selections)
+    sqlite_store = SqliteAnnotationStore(os.path.join(work_dir, 'annotations.sqlite3'),
+                                         class_of=lambda image_name: 0)
+    sqlite_store.save_selections(username, checkbox_selections)
+    save_name = next(iter(checkbox_selections), 'ILSVRC2012_val_00000001.JPEG')
+    for name, store in (('json', json_store), ('sqlite', sqlite_store)):
+        suite.add(f'annotation_store.{name}.save_image', 'micro',
+                  lambda store=store: store.save_image(username, save_name, image_data), params)
+        suite.add(f'annotation_store.{name}.load_selections', 'micro',
+                  lambda store=store: store.load_selections(username), params)
+        suite.add(f'annotation_store.{name}.count_class', 'micro',
+                  lambda store=store: store.count_annotations(username, 0), params)
+
+    # Fetching proposals by index and by name: parsed JSON, memory-mapped arrays, and lazy rows read from disk
+    # (lazy: all rows in the LRU after the warm-up; lazy_uncached: every fetch reads, from the warm OS page cache)
+    arrays_directory = os.path.join(work_dir, 'gt_arrays')
+    proposal_backends = {
+        'json': predictions,
+        'arrays': load_gt_arrays(predictions_file, arrays_directory),
+        'lazy': load_lazy_records(predictions_file, arrays_directory, cache_rows=len(predictions)),
+        'lazy_uncached': load_lazy_records(predictions_file, arrays_directory, cache_rows=0)
+    }
+    row_indices = random.Random(0).choices(range(len(predictions)), k=100)
+    last_image_name = predictions[-1]['image_name']
+    for name, proposals in proposal_backends.items():
+        suite.add(f'proposals.{name}.fetch_100_rows', 'micro',
+                  lambda proposals=proposals: [proposals[i]['softmax_val'] for i in row_indices], params)
+        suite.add(f'proposals.{name}.fetch_grid_page', 'micro',
+                  lambda proposals=proposals: proposals[:IMAGES_PER_CLASS], params)
+        suite.add(f'proposals.{name}.find_image_index', 'micro',
+                  lambda proposals=proposals: find_image_index(proposals, last_image_name), params)
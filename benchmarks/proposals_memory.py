@@ -0,0 +1,134 @@
+"""
+Peak memory and row-fetch latency of the proposals backends (GT_DATA_BACKEND) as the dataset grows.
+
+Usage:
+    python -m benchmarks.proposals_memory                                 # 10000 and 50000 images
+    python -m benchmarks.proposals_memory --images 20000 100000 --backends json lazy
+    python -m benchmarks.proposals_memory --topk 20                      # top-k encoded predictions.json
+
+For every dataset size a dataset is generated (see benchmarks/fixtures.py), and every backend is measured in a
+fresh process: converting predictions.json (arrays, lazy), then looking up the top classes of every row once and of
+random rows. The peak resident set size of that process shows how the memory of a backend grows with the number of
+images; it should stay roughly constant with 'lazy'. With --topk, predictions.json is top-k encoded first (see
+app/proposals_encoding.py).
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+BACKENDS = ('json', 'arrays', 'lazy')
+
+
+def measure(predictions_file, backend, arrays_directory, random_fetches, cache_rows):
+    """Runs in the child process: load, top classes of all rows and of random rows; returns the measurements."""
+    from app.helper_funcs import load_json
+    from app.gt_arrays import load_gt_arrays
+    from app.lazy_proposals import load_lazy_records
+    from app.proposals_encoding import get_top_classes
+
+    start = time.perf_counter()
+    if backend == 'json':
+        proposals = load_json(predictions_file)
+    elif backend == 'arrays':
+        proposals = load_gt_arrays(predictions_file, arrays_directory)
+    else:
+        proposals = load_lazy_records(predictions_file, arrays_directory, cache_rows=cache_rows)
+    load_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(len(proposals)):
+        get_top_classes(proposals[i], 20)
+    scan_seconds = time.perf_counter() - start
+
+    rnd = random.Random(0)
+    indices = [rnd.randrange(len(proposals)) for _ in range(random_fetches)]
+    start = time.perf_counter()
+    for i in indices:
+        get_top_classes(proposals[i], 20)
+    fetch_seconds = time.perf_counter() - start
+
+    return {
+        'images': len(proposals),
+        'load_seconds': load_seconds,
+        'scan_row_us': scan_seconds / max(len(proposals), 1) * 1e6,
+        'random_row_us': fetch_seconds / max(random_fetches, 1) * 1e6,
+        'peak_rss_mb': get_peak_rss_bytes() / 1024 / 1024
+    }
+
+
+def get_peak_rss_bytes():
+    """
+    Peak resident set size of this process. On Linux from VmHWM: ru_maxrss also covers the parent process's memory
+    at the time it forked this one.
+    """
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', type=int, nargs='+', default=[10000, 50000], help='Dataset sizes')
+    parser.add_argument('--backends', nargs='+', choices=BACKENDS, default=list(BACKENDS), help='Backends')
+    parser.add_argument('--random-fetches', type=int, default=10000, help='Random rows fetched per backend')
+    parser.add_argument('--cache-rows', type=int, default=4096, help='LRU size of the lazy backend')
+    parser.add_argument('--topk', type=int, default=None, help='Top-k encode predictions.json with this k')
+    parser.add_argument('--json', default=None, help='Write the results as JSON to this file')
+    parser.add_argument('--child', nargs=3, metavar=('PREDICTIONS', 'BACKEND', 'ARRAYS_DIR'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(*args.child, args.random_fetches, args.cache_rows)))
+        return 0
+
+    from benchmarks.fixtures import generate_fixture
+
+    results = []
+    print(f"{'images':>8} {'backend':<8} {'load s':>8} {'scan us/row':>12} {'random us/row':>14} {'peak RSS':>10}")
+    for num_images in args.images:
+        work_dir = tempfile.mkdtemp(prefix='multilabelfy-proposals-')
+        try:
+            paths = generate_fixture(work_dir, num_images=num_images)
+            predictions_file = os.path.join(paths['gt'], 'predictions.json')
+            if args.topk:
+                from app.proposals_encoding import convert_file, encode_record
+                topk_file = os.path.join(work_dir, 'predictions_topk.json')
+                convert_file(predictions_file, topk_file, lambda record: encode_record(record, args.topk))
+                predictions_file = topk_file
+            for backend in args.backends:
+                output = subprocess.run(
+                    [sys.executable, '-m', 'benchmarks.proposals_memory', '--child', predictions_file, backend,
+                     os.path.join(work_dir, 'gt_arrays'), '--random-fetches', str(args.random_fetches),
+                     '--cache-rows', str(args.cache_rows)],
+                    check=True, capture_output=True, text=True).stdout
+                result = dict(json.loads(output.strip().splitlines()[-1]), backend=backend)
+                results.append(result)
+                print(f"{result['images']:>8} {backend:<8} {result['load_seconds']:>8.2f} "
+                      f"{result['scan_row_us']:>12.1f} {result['random_row_us']:>14.1f} "
+                      f"{result['peak_rss_mb']:>7.0f} MB")
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.json}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,306 @@
+"""
+Replays recorded request traces (TRACE_ENABLED, see app/trace_recorder.py) against a fresh app instance and
+compares the per-route latency distributions of two builds.
+
+Usage:
+    python -m benchmarks.replay run traces/trace-2026-10-19.jsonl --snapshot /backups/annotator_dirs \\
+        --speed 10 --output build_a.json
+    python -m benchmarks.replay diff build_a.json build_b.json --tolerance 0.1
+
+`run` copies the snapshot of the annotator directories (taken before the recorded day) to a temporary
+directory, creates the app on it with the configured dataset (or --gt-dir/--images-dir), serves it with a
+threaded server and re-issues the requests. Every recorded user is mapped to one of the snapshot's annotators;
+each user's requests are sent in order at their recorded offsets divided by --speed (0 sends them back to
+back). Payload values are not recorded, so forms are rebuilt from the replaying user's current grid page or
+image with the recorded number of checkboxes and boxes, keeping the recorded navigation fields.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+
+from benchmarks.fixtures import create_benchmark_app
+from benchmarks.loadtest import LoadStats, HttpClient, serve_app, print_report
+
+RULE_PARAMETER = re.compile(r'<(?:[^:<>]+:)?([^<>]+)>')
+
+
+def load_trace(paths):
+    """Trace events of the given files, ordered by time."""
+    events = []
+    for path in paths:
+        with open(path, 'r') as f:
+            events.extend(json.loads(line) for line in f if line.strip())
+    events.sort(key=lambda event: event['ts'])
+    return events
+
+
+def map_users(events, usernames):
+    """Assign the recorded (anonymized) users to the snapshot's usernames in order of first appearance."""
+    user_map = {}
+    for event in events:
+        user = event.get('user')
+        if user is not None and user not in user_map:
+            user_map[user] = usernames[len(user_map) % len(usernames)]
+    return user_map
+
+
+class RequestBuilder:
+    """Rebuilds replayable requests from trace events, using the replay app's state for payload values."""
+
+    def __init__(self, app):
+        self.app = app
+
+    def build(self, event, username):
+        """Returns the keyword arguments of HttpClient.request() (without the route name)."""
+        view_args = dict(event.get('view_args') or {})
+        if username is not None:
+            view_args['username'] = username
+        path = RULE_PARAMETER.sub(lambda match: str(view_args.get(match.group(1), '')), event['route'])
+        params = {name: value for name, value in (event.get('query') or {}).items() if isinstance(value, int)}
+        request = {'method': event['method'], 'path': path, 'params': params or None}
+        if event.get('xhr'):
+            request['headers'] = {'X-Requested-With': 'XMLHttpRequest'}
+
+        payload = event.get('payload') or {}
+        if 'form' in payload:
+            request['form'] = self.build_form(event['endpoint'], payload['form'], username)
+        elif 'json' in payload:
+            request['json_body'] = self.build_json(event['endpoint'], payload['json'] or {}, username)
+        return request
+
+    def build_form(self, endpoint, fields, username):
+        form = {name: field['value'] for name, field in fields.items() if 'value' in field}
+        if endpoint in ('save_grid', 'jump_to_class') and username is not None:
+            images = self.current_grid_images(username)
+            num_checked = fields.get('checkboxes', {}).get('values', 0)
+            form['image_name'] = '|'.join(path for path, _ in images)
+            form['checkboxes'] = [f"{path}|{label}" for path, label in images[:num_checked]]
+        elif endpoint in ('save', 'save_and_advance') and username is not None:
+            path, label = self.current_image(username)
+            form['image_name'] = path
+            form['checkboxes'] = [str(label)] * fields.get('checkboxes', {}).get('values', 0)
+        else:
+            # Fields of other forms are sent with placeholder values of the recorded sizes
+            for name, field in fields.items():
+                if name not in form:
+                    size = field['bytes'] // max(field['values'], 1)
+                    form[name] = ['x' * size] * field['values']
+        return form
+
+    def build_json(self, endpoint, fields, username):
+        body = {name: field['value'] for name, field in fields.items() if 'value' in field}
+        if endpoint in ('save_bboxes', 'save_bboxes_sanity') and username is not None:
+            path, label = self.current_image(username)
+            body['image_name'] = os.path.basename(path)
+            body['bboxes'] = [{'coordinates': [10 + i, 10 + i, 60 + i, 60 + i], 'label': label,
+                               'crowd_flag': False, 'reflected_flag': False, 'rendition_flag': False,
+                               'ocr_needed_flag': False, 'uncertain_flag': False}
+                              for i in range(fields.get('bboxes', {}).get('length') or 0)]
+            body['timestamp'] = time.time() * 1000
+        return body
+
+    def current_image(self, username):
+        """(class_name/image_name, class index) of the user's current image."""
+        proposals_info = self.app.user_cache[username]['proposals_info']
+        index = min(self.app.current_image_index_dct.get(username, 0), len(proposals_info) - 1)
+        return self.image_path(proposals_info[index])
+
+    def current_grid_images(self, username):
+        proposals_info = self.app.user_cache[username]['proposals_info']
+        page_size = self.app.config['GRID_IMAGES_PER_PAGE']
+        index = self.app.current_image_index_dct.get(username, 0)
+        start = index - index % page_size
+        return [self.image_path(image_data) for image_data in proposals_info[start:start + page_size]]
+
+    def image_path(self, image_data):
+        from app.app_utils import get_label_indices_to_label_names_dicts
+        label_indices_to_label_names, _ = get_label_indices_to_label_names_dicts(self.app)
+        class_name = label_indices_to_label_names[str(image_data['ground_truth'])]
+        return os.path.join(class_name, image_data['image_name']), image_data['ground_truth']
+
+
+def replay(app, base_url, events, user_map, speed=1.0, progress=None):
+    """
+    Re-issue the trace events against base_url, one thread per recorded user (plus one for requests without
+    a user), each sending its requests in order at their recorded offsets divided by speed.
+
+    Returns:
+        Report dict of LoadStats.get_report() with 'status_mismatches' per route (replayed status differs
+        from the recorded one)
+    """
+    stats = LoadStats()
+    builder = RequestBuilder(app)
+    mismatches = {}
+    mismatches_lock = threading.Lock()
+    events_by_user = {}
+    for event in events:
+        events_by_user.setdefault(event.get('user'), []).append(event)
+
+    first_ts = events[0]['ts'] if events else 0
+    start = time.time()
+
+    def run_user(user, user_events):
+        client = HttpClient(base_url, stats)
+        username = user_map.get(user)
+        for event in user_events:
+            if speed > 0:
+                delay = start + (event['ts'] - first_ts) / speed - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+            status, _ = client.request(event['endpoint'], **builder.build(event, username))
+            if status != event.get('status'):
+                with mismatches_lock:
+                    mismatches[event['endpoint']] = mismatches.get(event['endpoint'], 0) + 1
+
+    threads = [threading.Thread(target=run_user, args=(user, user_events), daemon=True)
+               for user, user_events in events_by_user.items()]
+    for thread in threads:
+        thread.start()
+    while True:
+        alive = [thread for thread in threads if thread.is_alive()]
+        if not alive:
+            break
+        alive[0].join(timeout=10.0)
+        if progress is not None:
+            report = stats.get_report()
+            progress(f"{report['requests']}/{len(events)} requests replayed")
+    stats.stop()
+
+    report = stats.get_report()
+    report['status_mismatches'] = mismatches
+    report['speed'] = speed
+    report['recorded_duration_seconds'] = events[-1]['ts'] - first_ts if events else 0
+    return report
+
+
+def diff_reports(report_a, report_b, tolerance=0.1):
+    """
+    Per-route comparison of the p50/p95/p99 latencies of two replay reports.
+
+    Returns:
+        List of dicts (route, the percentiles of both, their ratios b/a and status 'regression' when p50 or p95
+        got slower than 1 + tolerance times build a, 'improvement' when both got faster than 1 - tolerance
+        times it, 'ok' otherwise, or 'only_a'/'only_b' for routes replayed in one build only)
+    """
+    routes_a, routes_b = report_a['routes'], report_b['routes']
+    comparison = []
+    for route in sorted(set(routes_a) | set(routes_b)):
+        if route not in routes_b or route not in routes_a:
+            comparison.append({'route': route, 'status': 'only_a' if route in routes_a else 'only_b'})
+            continue
+        entry = {'route': route}
+        for key in ('p50_seconds', 'p95_seconds', 'p99_seconds'):
+            entry[key] = (routes_a[route][key], routes_b[route][key])
+            entry[key.replace('_seconds', '_ratio')] = routes_b[route][key] / max(routes_a[route][key], 1e-9)
+        if entry['p50_ratio'] > 1 + tolerance or entry['p95_ratio'] > 1 + tolerance:
+            entry['status'] = 'regression'
+        elif entry['p50_ratio'] < 1 - tolerance and entry['p95_ratio'] < 1 - tolerance:
+            entry['status'] = 'improvement'
+        else:
+            entry['status'] = 'ok'
+        comparison.append(entry)
+    return comparison
+
+
+def print_diff(comparison):
+    print(f"{'route':<24} {'p50 a':>9} {'p50 b':>9} {'ratio':>6} {'p95 a':>9} {'p95 b':>9} {'ratio':>6} "
+          f"{'p99 a':>9} {'p99 b':>9} {'ratio':>6}  status")
+    for entry in comparison:
+        if 'p50_seconds' not in entry:
+            print(f"{entry['route']:<24} {'':>75}  {entry['status']}")
+            continue
+        columns = []
+        for key in ('p50', 'p95', 'p99'):
+            a, b = entry[f'{key}_seconds']
+            columns.append(f"{a * 1e3:>9.1f} {b * 1e3:>9.1f} {entry[f'{key}_ratio']:>6.2f}")
+        print(f"{entry['route']:<24} {' '.join(columns)}  {entry['status']}")
+
+
+def run_command(args):
+    import app.config as config
+    events = load_trace(args.trace)
+    if not events:
+        print('The trace is empty')
+        return 1
+
+    usernames = sorted(name for name in os.listdir(args.snapshot) if os.path.isdir(os.path.join(args.snapshot, name)))
+    if not usernames:
+        print(f"No annotator directories in {args.snapshot}")
+        return 1
+    user_map = map_users(events, usernames)
+    if len(user_map) > len(usernames):
+        print(f"Warning: {len(user_map)} recorded users share the {len(usernames)} annotators of the snapshot")
+
+    work_dir = tempfile.mkdtemp(prefix='multilabelfy-replay-')
+    server = None
+    try:
+        annotators_dir = os.path.join(work_dir, 'annotators')
+        shutil.copytree(args.snapshot, annotators_dir)
+        paths = {
+            'images': args.images_dir or config.ANNOTATIONS_ROOT_FOLDER,
+            'gt': args.gt_dir or config.GT_DATA_ROOT_DIRECTORY,
+            'annotators': annotators_dir,
+            'usernames': usernames
+        }
+        app = create_benchmark_app(paths, work_dir, TRACE_ENABLED=False)
+        server, base_url = serve_app(app)
+        print(f"Replaying {len(events)} requests of {len(user_map)} users against {base_url} at speed {args.speed}")
+        report = replay(app, base_url, events, user_map, speed=args.speed, progress=lambda message: print(f"  {message}"))
+    finally:
+        if server is not None:
+            server.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print_report(report)
+    if report['status_mismatches']:
+        print(f"\nStatus differing from the trace: {json.dumps(report['status_mismatches'], sort_keys=True)}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.output}")
+    return 0
+
+
+def diff_command(args):
+    with open(args.report_a, 'r') as f:
+        report_a = json.load(f)
+    with open(args.report_b, 'r') as f:
+        report_b = json.load(f)
+    comparison = diff_reports(report_a, report_b, tolerance=args.tolerance)
+    print_diff(comparison)
+    if args.fail_on_regression and any(entry['status'] == 'regression' for entry in comparison):
+        return 1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='Replay traces against a fresh app instance')
+    run_parser.add_argument('trace', nargs='+', help='Trace files (JSONL)')
+    run_parser.add_argument('--snapshot', required=True, help='Snapshot of the annotator directories')
+    run_parser.add_argument('--gt-dir', default=None, help='Ground truth directory, defaults to the config')
+    run_parser.add_argument('--images-dir', default=None, help='Dataset root, defaults to the config')
+    run_parser.add_argument('--speed', type=float, default=1.0, help='Replay speed factor, 0 for back to back')
+    run_parser.add_argument('--output', default=None, help='Write the report as JSON to this file')
+
+    diff_parser = subparsers.add_parser('diff', help='Compare the latencies of two replay reports')
+    diff_parser.add_argument('report_a', help='Report of the baseline build')
+    diff_parser.add_argument('report_b', help='Report of the build to compare')
+    diff_parser.add_argument('--tolerance', type=float, default=0.1, help='Allowed slowdown (0.1 = 10%%)')
+    diff_parser.add_argument('--fail-on-regression', action='store_true', help='Exit with status 1 on regressions')
+
+    args = parser.parse_args()
+    return run_command(args) if args.command == 'run' else diff_command(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
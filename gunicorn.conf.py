@@ -0,0 +1,37 @@
+"""
+Gunicorn settings of the production server:
+
+    gunicorn -c gunicorn.conf.py wsgi:app [-w <workers>]
+
+The ground truth files are read here, in the master process, and the workers forked from it share them (with
+GT_DATA_BACKEND = 'arrays' or 'lazy' they are also converted here, once). Every worker creates its own app, since
+create_app() starts background threads, which do not survive fork(). All workers append to LOG_FILE, which the app
+does not rotate with several workers: rotate it with logrotate (the workers reopen it after it is moved).
+"""
+
+import gc
+
+import app.config as config
+from app.app_utils import preload_gt_data
+from app.time_tracker_utils import reset_shared_time_tracking_state
+
+bind = f"{config.SERVER_HOST}:{config.PORT_NUMBER}"
+workers = config.WORKER_PROCESSES
+worker_class = 'gthread'
+threads = config.WORKER_THREADS
+timeout = 120  # Drive uploads and downloads run in request handlers
+preload_app = False
+
+preload_gt_data(config.GT_DATA_ROOT_DIRECTORY, config.GT_DATA_BACKEND, config.GT_ARRAYS_DIRECTORY)
+# The collector never scans the objects loaded so far, which would write to their pages in every worker
+gc.freeze()
+
+
+def on_starting(server):
+    # The workers started next record a new time tracking session together
+    reset_shared_time_tracking_state(config.UPLOAD_USERNAME)
+
+
+def post_fork(server, worker):
+    # Shared state across processes also when the worker count is given with -w
+    config.WORKER_PROCESSES = server.cfg.workers
@@ -0,0 +1,79 @@
+import os
+import json
+import random
+
+import numpy as np
+import pytest
+
+import app.config as config
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+NUM_CLASSES = 3
+IMAGES_PER_CLASS = 50
+USERNAME = 'demo'
+
+
+@pytest.fixture(scope='session')
+def dataset_dir(tmp_path_factory):
+    """Images, predictions, sample images and bboxes of the first classes of the validation set."""
+    root = tmp_path_factory.mktemp('dataset')
+    pairs = np.load(os.path.join(REPO_ROOT, 'class_mapping', 'val_img_classes_pairs.npy'), allow_pickle=True).item()
+    with open(os.path.join(REPO_ROOT, 'required_files', 'imagenet_v2', 'label_indices_to_wordnet_ids.json')) as f:
+        wordnet_ids = json.load(f)
+
+    images_by_class = {}
+    for image_name, class_index in pairs.items():
+        if class_index < NUM_CLASSES:
+            images_by_class.setdefault(class_index, []).append(image_name)
+
+    rng = random.Random(0)
+    predictions, bboxes, samples = [], {}, []
+    for class_index in range(NUM_CLASSES):
+        image_dir = root / 'images' / wordnet_ids[str(class_index)]
+        image_dir.mkdir(parents=True)
+        for image_name in sorted(images_by_class[class_index])[:IMAGES_PER_CLASS]:
+            (image_dir / image_name).write_bytes(b'\xff\xd8fakejpeg' * 100)
+            softmax = [rng.random() for _ in range(1000)]
+            softmax[class_index] += sum(softmax)
+            total = sum(softmax)
+            predictions.append({'image_name': image_name, 'ground_truth': class_index,
+                                'softmax_val': [value / total for value in softmax]})
+            bboxes[image_name] = {'boxes': [[1, 2, 30, 40]], 'scores': [80], 'gt': [class_index]}
+            samples.append({'image_name': image_name, 'ground_truth': class_index})
+
+    gt_dir = root / 'gt'
+    gt_dir.mkdir()
+    for filename, data in (('predictions.json', predictions), ('sample_images_info.json', samples),
+                           ('bboxes.json', bboxes)):
+        (gt_dir / filename).write_text(json.dumps(data))
+    return root
+
+
+@pytest.fixture
+def make_app(dataset_dir, tmp_path, monkeypatch):
+    """Factory of apps on the synthetic dataset with one annotator, USERNAME, and config overrides."""
+    monkeypatch.chdir(REPO_ROOT)
+    annotators_dir = tmp_path / 'annotators'
+    (annotators_dir / USERNAME).mkdir(parents=True)
+    (annotators_dir / USERNAME / f'checkbox_selections_{USERNAME}.json').write_text('{}')
+
+    def make(**overrides):
+        settings = {
+            'ANNOTATIONS_ROOT_FOLDER': str(dataset_dir / 'images'),
+            'EXAMPLES_DATASET_ROOT_DIR': str(dataset_dir / 'images'),
+            'GT_DATA_ROOT_DIRECTORY': str(dataset_dir / 'gt'),
+            'GT_ARRAYS_DIRECTORY': str(tmp_path / 'gt_arrays'),
+            'ANNOTATORS_ROOT_DIRECTORY': str(annotators_dir),
+            'ANNOTATION_SQLITE_PATH': str(tmp_path / 'annotations.sqlite3'),
+            'LOG_FILE': str(tmp_path / 'app.log'),
+            'LOG_TO_CONSOLE': False,
+            'GOOGLE_DRIVE_USE_FAKE': True,
+        }
+        settings.update(overrides)
+        for name, value in settings.items():
+            monkeypatch.setattr(config, name, value, raising=False)
+
+        from app.factory import create_app
+        return create_app()
+
+    return make
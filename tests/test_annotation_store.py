@@ -0,0 +1,104 @@
+import json
+
+import pytest
+
+from app.annotation_store import (NAVIGATION_FILENAME, JsonFileStore, SqliteAnnotationStore,
+                                  get_index_filename, get_selections_filename)
+
+USERNAME = 'annotator'
+
+# Keys deliberately not in sorted order, at both levels
+SELECTIONS = {
+    None: {
+        'ILSVRC2012_val_00000293.JPEG': {'selected': [3, 1], 'label_type': 'multi', 'comment': 'é'},
+        'ILSVRC2012_val_00000002.JPEG': {'selected': [], 'label_type': 'none'},
+        'ILSVRC2012_val_00000236.JPEG': {'z': None, 'a': {'y': 1.5, 'b': True}},
+    },
+    'S': {
+        'ILSVRC2012_val_00010001.JPEG': {'answer': 'yes'},
+        'ILSVRC2012_val_00000007.JPEG': {'answer': 'no'},
+    },
+    'M': {
+        'ILSVRC2012_val_00000003.JPEG': {'selected': [7], 'label_type': 'single'},
+    },
+}
+INDICES = {None: 12, 'sanity_1': 3, 'sanity_2': 0}
+
+
+def write_user_dir(user_dir, selections=SELECTIONS, indices=INDICES):
+    user_dir.mkdir(parents=True)
+    for mode, mode_selections in selections.items():
+        (user_dir / get_selections_filename(USERNAME, mode)).write_text(json.dumps(mode_selections))
+    for mode, index in indices.items():
+        (user_dir / get_index_filename(USERNAME, mode)).write_text(str(index))
+
+
+def read_files(user_dir):
+    return {path.name: path.read_text() for path in user_dir.iterdir() if not path.name.startswith('.')}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SqliteAnnotationStore(str(tmp_path / 'annotations.sqlite3'), class_of=lambda image_name: 0)
+    yield store
+    store.close()
+
+
+def test_json_files_round_trip_through_sqlite(tmp_path, store):
+    source_dir = tmp_path / 'source' / USERNAME
+    write_user_dir(source_dir)
+    store.import_user(USERNAME, str(source_dir))
+
+    for mode, mode_selections in SELECTIONS.items():
+        loaded = store.load_selections(USERNAME, mode)
+        assert loaded == mode_selections
+        assert json.dumps(loaded) == json.dumps(mode_selections)  # Same key order, nested ones included
+    for mode, index in INDICES.items():
+        assert store.get_current_index(USERNAME, mode) == index
+
+    exported_dir = tmp_path / 'exported' / USERNAME
+    store.export_user(USERNAME, str(exported_dir))
+    assert read_files(exported_dir) == read_files(source_dir)
+
+    json_store = JsonFileStore(str(exported_dir.parent))
+    for mode, mode_selections in SELECTIONS.items():
+        assert json.dumps(json_store.load_selections(USERNAME, mode)) == json.dumps(mode_selections)
+    for mode, index in INDICES.items():
+        assert json_store.get_current_index(USERNAME, mode) == index
+
+
+def test_export_does_not_add_missing_mode_files(tmp_path, store):
+    source_dir = tmp_path / 'source' / USERNAME
+    write_user_dir(source_dir, selections={None: SELECTIONS[None]}, indices={None: 5})
+    store.import_user(USERNAME, str(source_dir))
+
+    exported_dir = tmp_path / 'exported' / USERNAME
+    store.export_user(USERNAME, str(exported_dir))
+    assert read_files(exported_dir) == read_files(source_dir)
+
+
+def test_reimport_replaces_previous_annotations(tmp_path, store):
+    first_dir = tmp_path / 'first' / USERNAME
+    write_user_dir(first_dir)
+    store.import_user(USERNAME, str(first_dir))
+
+    changed = {None: dict(reversed(list(SELECTIONS[None].items()))), 'S': {}, 'M': SELECTIONS['M']}
+    second_dir = tmp_path / 'second' / USERNAME
+    write_user_dir(second_dir, selections=changed, indices={None: 40})
+    store.import_user(USERNAME, str(second_dir))
+
+    for mode, mode_selections in changed.items():
+        assert json.dumps(store.load_selections(USERNAME, mode)) == json.dumps(mode_selections)
+    assert store.get_current_index(USERNAME) == 40
+
+
+def test_navigation_state_takes_precedence_over_index_files(tmp_path, store):
+    source_dir = tmp_path / 'source' / USERNAME
+    write_user_dir(source_dir)
+    navigation = {USERNAME: {'grid': 30, 'sanity_1': 9}}
+    (source_dir.parent / NAVIGATION_FILENAME).write_text(json.dumps(navigation))
+    store.import_user(USERNAME, str(source_dir))
+
+    assert store.get_current_index(USERNAME) == 30
+    assert store.get_current_index(USERNAME, 'sanity_1') == 9
+    assert store.get_current_index(USERNAME, 'sanity_2') == INDICES['sanity_2']
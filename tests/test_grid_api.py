@@ -0,0 +1,54 @@
+import pytest
+
+from tests.conftest import IMAGES_PER_CLASS, USERNAME
+
+
+@pytest.fixture
+def client(make_app):
+    return make_app().test_client()
+
+
+def get_page(client, start, count):
+    response = client.get(f'/api/{USERNAME}/grid?start={start}&count={count}')
+    assert response.status_code == 200
+    return response.get_json()['page']
+
+
+@pytest.mark.parametrize('count', [5, 7, 12])
+def test_pages_stay_within_their_class(client, count):
+    # Walk forward from the first image into the next class and back again
+    pages = [get_page(client, 0, count)]
+    while pages[-1]['start'] < IMAGES_PER_CLASS:
+        assert len(pages) <= IMAGES_PER_CLASS, 'paging does not move forward'
+        pages.append(get_page(client, pages[-1]['next_start'], count))
+
+    for page in pages:
+        indices = [image['index'] for image in page['images']]
+        assert indices == list(range(page['start'], page['start'] + len(indices)))
+        assert len({index // IMAGES_PER_CLASS for index in indices}) == 1
+        assert 0 < len(indices) <= count
+
+    starts = [page['start'] for page in pages]
+    assert starts == sorted(set(starts))
+    covered = [image['index'] for page in pages[:-1] for image in page['images']]
+    assert covered == list(range(IMAGES_PER_CLASS))
+    assert pages[-1]['start'] == IMAGES_PER_CLASS
+
+    for previous, page in zip(pages, pages[1:]):
+        assert page['prev_start'] == previous['start']
+
+
+def test_start_inside_a_page_is_aligned_to_it(client):
+    page = get_page(client, 49, 7)
+    assert page['start'] == 49
+    assert [image['index'] for image in page['images']] == [49]
+    assert page['next_start'] == 50
+    assert page['prev_start'] == 42
+
+    assert get_page(client, 45, 7)['start'] == 42
+
+
+def test_lookahead_pages_move_forward(client):
+    response = client.get(f'/api/{USERNAME}/grid?start=49&count=7&lookahead=2').get_json()
+    starts = [page['start'] for page in [response['page']] + response['lookahead']]
+    assert starts == [49, 50, 57]
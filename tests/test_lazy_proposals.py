@@ -0,0 +1,71 @@
+import json
+import functools
+
+import numpy as np
+import pytest
+
+import app.lazy_proposals as lazy_proposals
+from app.helper_funcs import load_json
+from app.lazy_proposals import iter_json_array, load_lazy_records
+
+NUM_CLASSES = 10
+
+
+@pytest.fixture
+def predictions_file(tmp_path):
+    rng = np.random.default_rng(0)
+    records = []
+    for i in range(23):
+        softmax = rng.random(NUM_CLASSES)
+        records.append({'image_name': f'ILSVRC2012_val_{i:08d}_é.JPEG', 'ground_truth': i % NUM_CLASSES,
+                        'softmax_val': (softmax / softmax.sum()).tolist()})
+    # A second proposal of an image: index_of() finds the first
+    records.append(dict(records[3], ground_truth=-1))
+    path = tmp_path / 'predictions.json'
+    # Indented, so whitespace and numbers are split across chunks too
+    path.write_text(json.dumps(records, indent=1, ensure_ascii=False), encoding='utf-8')
+    return path
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 1 << 20])
+def test_iter_json_array_matches_load_json(predictions_file, chunk_size):
+    assert list(iter_json_array(predictions_file, chunk_size=chunk_size)) == load_json(predictions_file)
+
+
+@pytest.mark.parametrize('text', ['[]', ' [ ] ', '[1, 2.5, "a,]", {"b": [3]}]', '[\n-1e-3\n]'])
+def test_iter_json_array_small_arrays(tmp_path, text):
+    path = tmp_path / 'array.json'
+    path.write_text(text)
+    assert list(iter_json_array(path, chunk_size=7)) == json.loads(text)
+
+
+@pytest.mark.parametrize('text', ['{"a": 1}', '[1, 2', '[1 2]'])
+def test_iter_json_array_rejects_invalid_arrays(tmp_path, text):
+    path = tmp_path / 'array.json'
+    path.write_text(text)
+    with pytest.raises(ValueError):
+        list(iter_json_array(path, chunk_size=7))
+
+
+def test_lazy_records_match_load_json(predictions_file, tmp_path, monkeypatch):
+    monkeypatch.setattr(lazy_proposals, 'iter_json_array', functools.partial(iter_json_array, chunk_size=7))
+    monkeypatch.setattr(lazy_proposals, 'CONVERT_BATCH_RECORDS', 5)
+    expected = load_json(predictions_file)
+    records = load_lazy_records(str(predictions_file), str(tmp_path / 'gt_arrays'), cache_rows=4)
+    try:
+        assert len(records) == len(expected)
+        for record, expected_record in zip(records[:], expected):
+            assert list(record) == list(expected_record)
+            assert record['image_name'] == expected_record['image_name']
+            assert record['ground_truth'] == expected_record['ground_truth']
+            np.testing.assert_allclose(record['softmax_val'], expected_record['softmax_val'], rtol=1e-6)
+        for index in (0, 4, 5, 22, -1):
+            assert records[index]['image_name'] == expected[index]['image_name']
+
+        for index, expected_record in enumerate(expected[:-1]):
+            assert records.index_of(expected_record['image_name']) == index
+        assert records.index_of(expected[-1]['image_name']) == 3
+        with pytest.raises(ValueError):
+            records.index_of('missing.JPEG')
+    finally:
+        records.close()
@@ -0,0 +1,35 @@
+import itertools
+
+from app.page_warmer import PageWarmer
+
+
+def make_warmer():
+    picks = itertools.count()
+
+    def compute(username, image_index):
+        # Stands in for the random example picks of a labeling page
+        return {'image_index': image_index, 'pick': next(picks)}
+
+    return PageWarmer(compute, lookahead=2)
+
+
+def test_warmed_context_is_used_for_one_visit():
+    warmer = make_warmer()
+    warmer.schedule('annotator', 0)
+    warmer.shutdown(wait=True)
+
+    first = warmer.get('annotator', 1)
+    second = warmer.get('annotator', 1)
+    assert first['image_index'] == second['image_index'] == 1
+    assert first['pick'] != second['pick']
+    stats = warmer.get_stats()
+    assert (stats['hits'], stats['misses']) == (1, 1)
+    assert stats['entries'] == 1  # Image 2 is still warmed
+
+
+def test_contexts_computed_on_demand_are_not_kept():
+    warmer = make_warmer()
+    picks = {warmer.get('annotator', 5)['pick'] for _ in range(3)}
+    assert len(picks) == 3
+    assert warmer.get_stats()['entries'] == 0
+    warmer.shutdown()
@@ -0,0 +1,89 @@
+import pytest
+
+from app.fake_drive_service import FakeDriveService, FakeSheetsService
+from app.google_drive_service import CLASS_SESSIONS_TAB, IMAGE_SESSIONS_TAB, GoogleDriveService
+
+USERNAME = 'annotator'
+FOLDER_ID = 'folder'
+
+
+def class_session(i):
+    return {
+        'class_id': str(i),
+        'class_name': f'class_{i}',
+        'duration_seconds': 10,
+        'grid_annotations': 1,
+        'image_sessions': [{'image_name': f'image_{i}.JPEG', 'duration_seconds': 3}]
+    }
+
+
+@pytest.fixture
+def drive():
+    return FakeDriveService()
+
+
+@pytest.fixture
+def sheets(drive):
+    return FakeSheetsService(drive=drive)
+
+
+@pytest.fixture
+def service(drive, sheets):
+    return GoogleDriveService(service=drive, sheets_service=sheets)
+
+
+def export(service, session_data, data_dir):
+    results = service.create_time_tracking_sheet(USERNAME, session_data, FOLDER_ID, local_data_dir=str(data_dir))
+    assert results['success'], results['errors']
+    return results
+
+
+def test_second_export_appends_only_new_rows(service, sheets, tmp_path):
+    session_data = {'session_id': 'session', 'class_sessions': [class_session(0), class_session(1)]}
+    first = export(service, session_data, tmp_path)
+    assert first['rows_appended'] == {CLASS_SESSIONS_TAB: 2, IMAGE_SESSIONS_TAB: 2}
+    batch_updates = sheets.calls['batchUpdate']
+
+    session_data['class_sessions'].append(class_session(2))
+    second = export(service, session_data, tmp_path)
+    assert second['sheet_id'] == first['sheet_id']
+    assert second['rows_appended'] == {CLASS_SESSIONS_TAB: 1, IMAGE_SESSIONS_TAB: 1}
+    assert sheets.calls['batchUpdate'] == batch_updates + 1
+    assert sheets.calls['create'] == 1
+
+    # Header, summary and one row per class session, none of them written twice
+    class_rows = sheets.tab_rows(second['sheet_id'], CLASS_SESSIONS_TAB)
+    assert [row[0] for row in class_rows[2:]] == ['0', '1', '2']
+    image_rows = sheets.tab_rows(second['sheet_id'], IMAGE_SESSIONS_TAB)
+    assert [row[2] for row in image_rows[2:]] == ['image_0.JPEG', 'image_1.JPEG', 'image_2.JPEG']
+
+
+def test_tabs_are_formatted_only_when_created(service, sheets, tmp_path):
+    session_data = {'session_id': 'session', 'class_sessions': [class_session(0)]}
+    export(service, session_data, tmp_path)
+    format_requests = sheets.format_requests
+    assert format_requests > 0
+
+    session_data['class_sessions'].append(class_session(1))
+    export(service, session_data, tmp_path)
+    export(service, session_data, tmp_path)
+    assert sheets.format_requests == format_requests
+
+
+def test_deleted_spreadsheet_is_recreated(service, drive, sheets, tmp_path):
+    session_data = {'session_id': 'session', 'class_sessions': [class_session(0), class_session(1)]}
+    first = export(service, session_data, tmp_path)
+    drive.delete(first['sheet_id'])
+
+    second = export(service, session_data, tmp_path)
+    assert second['sheet_id'] != first['sheet_id']
+    assert sheets.calls['create'] == 2
+    # The new spreadsheet gets all rows, not only those added since the last export
+    assert second['rows_appended'] == {CLASS_SESSIONS_TAB: 2, IMAGE_SESSIONS_TAB: 2}
+    assert len(sheets.tab_rows(second['sheet_id'], CLASS_SESSIONS_TAB)) == 4
+
+    # The new id is stored, later exports append to it
+    session_data['class_sessions'].append(class_session(2))
+    third = export(service, session_data, tmp_path)
+    assert third['sheet_id'] == second['sheet_id']
+    assert third['rows_appended'] == {CLASS_SESSIONS_TAB: 1, IMAGE_SESSIONS_TAB: 1}
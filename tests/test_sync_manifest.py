@@ -0,0 +1,93 @@
+import os
+import json
+
+import pytest
+
+from app.fake_drive_service import FakeDriveService
+from app.google_drive_service import GoogleDriveService
+from app.sync_backends import GZIP_MAGIC
+from app.sync_manifest import SyncManifest, get_manifest_path
+
+USERNAME = 'annotator'
+FOLDER_ID = 'folder'
+
+
+def write_selections(data_dir, suffix, size):
+    path = os.path.join(data_dir, f"checkbox_selections_{USERNAME}{suffix}.json")
+    with open(path, 'w') as f:
+        json.dump({'selections': list(range(size))}, f)
+    return os.path.basename(path)
+
+
+@pytest.fixture
+def drive():
+    return FakeDriveService()
+
+
+@pytest.fixture
+def service(drive):
+    return GoogleDriveService(service=drive, compress_threshold=1000)
+
+
+def test_unchanged_file_is_skipped(service, drive, tmp_path):
+    filename = write_selections(tmp_path, '', 10)
+
+    first = service.upload_user_data(USERNAME, str(tmp_path), FOLDER_ID)
+    assert [f['filename'] for f in first['uploaded_files']] == [filename]
+    bytes_uploaded = drive.bytes_uploaded
+
+    second = service.upload_user_data(USERNAME, str(tmp_path), FOLDER_ID)
+    assert second['success']
+    assert second['uploaded_files'] == []
+    assert second['skipped_files'] == [filename]
+    assert drive.bytes_uploaded == bytes_uploaded
+
+
+def test_large_file_is_uploaded_gzipped(service, drive, tmp_path):
+    small = write_selections(tmp_path, '', 10)
+    large = write_selections(tmp_path, '_S', 1000)
+
+    results = service.upload_user_data(USERNAME, str(tmp_path), FOLDER_ID)
+    uploaded = {f['filename']: f for f in results['uploaded_files']}
+    assert not uploaded[small]['compressed']
+    assert uploaded[large]['compressed']
+    assert drive.get_content(uploaded[large]['file_id']).startswith(GZIP_MAGIC)
+    assert not drive.get_content(uploaded[small]['file_id']).startswith(GZIP_MAGIC)
+
+    # Downloads are decompressed again
+    download_dir = tmp_path / 'download'
+    download_dir.mkdir()
+    assert service.download_user_data(USERNAME, str(download_dir), FOLDER_ID)['success']
+    assert (download_dir / large).read_bytes() == (tmp_path / large).read_bytes()
+
+
+def test_dry_run_reports_planned_uploads_without_transferring(service, drive, tmp_path):
+    small = write_selections(tmp_path, '', 10)
+    large = write_selections(tmp_path, '_S', 1000)
+
+    results = service.upload_user_data(USERNAME, str(tmp_path), FOLDER_ID, dry_run=True)
+    assert results['success'] and results['dry_run']
+    planned = {f['filename']: f['compress'] for f in results['pending_files']}
+    assert planned == {small: False, large: True}
+    assert results['uploaded_files'] == []
+    assert drive.calls == {}
+    assert drive.bytes_uploaded == 0
+    assert not os.path.exists(get_manifest_path(str(tmp_path), USERNAME))
+
+
+def test_manifest_revision_is_updated_after_upload(service, drive, tmp_path):
+    filename = write_selections(tmp_path, '', 10)
+    manifest_path = get_manifest_path(str(tmp_path), USERNAME)
+
+    service.upload_user_data(USERNAME, str(tmp_path), FOLDER_ID)
+    entry = SyncManifest(manifest_path).get(filename)
+    assert entry['revision_id'] == drive.metadata(entry['file_id'])['headRevisionId']
+
+    write_selections(tmp_path, '', 20)
+    results = service.upload_user_data(USERNAME, str(tmp_path), FOLDER_ID)
+    assert [f['filename'] for f in results['uploaded_files']] == [filename]
+    updated = SyncManifest(manifest_path).get(filename)
+    assert updated['file_id'] == entry['file_id']  # Updated in place, not uploaded as a new file
+    assert updated['revision_id'] != entry['revision_id']
+    assert updated['revision_id'] == drive.metadata(entry['file_id'])['headRevisionId']
+    assert updated['size'] == os.path.getsize(tmp_path / filename)
@@ -0,0 +1,63 @@
+import json
+
+import pytest
+
+import app.config as config
+from app.time_tracker_utils import SHARED_STATE_FILENAME, TimeTracker, reset_shared_time_tracking_state
+
+USERNAME = 'annotator'
+
+
+@pytest.fixture(autouse=True)
+def annotators_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'ANNOTATORS_ROOT_DIRECTORY', str(tmp_path))
+    return tmp_path
+
+
+def test_shared_trackers_record_one_session():
+    # Two worker processes serving the requests of the same annotator
+    first = TimeTracker(USERNAME, shared=True)
+    second = TimeTracker(USERNAME, shared=True)
+    assert second.session_id == first.session_id
+
+    first.start_class_session_if_changed('1', 'tench')
+    second.start_class_session_if_changed('1', 'tench')  # Same class, no new session
+    second.start_image_session('image_1.JPEG', 3)
+    first.log_activity('grid_annotation')
+    first.end_image_session()
+    second.start_class_session_if_changed('2', 'goldfish')
+
+    for tracker in (first, second):
+        tracker.refresh()
+        class_sessions = tracker.session_data['class_sessions']
+        assert [session['class_id'] for session in class_sessions] == ['1']
+        assert class_sessions[0]['grid_annotations'] == 1
+        assert class_sessions[0]['detail_views'] == 1
+        assert [image['image_name'] for image in class_sessions[0]['image_sessions']] == ['image_1.JPEG']
+        assert tracker.current_class_id == '2'
+        assert tracker.current_image_id is None
+
+    first.finalize_session()
+    with open(first.get_session_file_path()) as f:
+        saved = json.load(f)
+    assert [session['class_id'] for session in saved['class_sessions']] == ['1', '2']
+
+
+def test_reset_starts_a_new_shared_session(annotators_dir):
+    first = TimeTracker(USERNAME, shared=True)
+    first.start_class_session('1', 'tench')
+    first.session_data['session_id'] = first.session_id = 'previous'
+    first._save_shared_state()
+
+    reset_shared_time_tracking_state(USERNAME)
+    assert not (annotators_dir / USERNAME / SHARED_STATE_FILENAME).exists()
+    second = TimeTracker(USERNAME, shared=True)
+    assert second.session_id != 'previous'
+    assert second.current_class_id is None
+
+
+def test_unshared_trackers_are_independent():
+    first = TimeTracker(USERNAME)
+    second = TimeTracker(USERNAME)
+    first.start_class_session('1', 'tench')
+    assert second.current_class_id is None
@@ -0,0 +1,57 @@
+import threading
+import time
+
+from app.upload_scheduler import UploadScheduler
+
+
+def run_scheduler(results, max_attempts=3, timeout=5.0):
+    """Schedule one upload and wait until the scheduler has nothing left to do."""
+    calls = []
+    done = threading.Event()
+
+    def upload(username, cancel_event):
+        calls.append(username)
+        if len(calls) >= len(results):
+            done.set()
+        return results[min(len(calls), len(results)) - 1]
+
+    scheduler = UploadScheduler(upload, debounce_seconds=0, retry_base_seconds=0.01,
+                                retry_max_seconds=0.01, max_attempts=max_attempts)
+    scheduler.start()
+    try:
+        scheduler.schedule('annotator')
+        assert done.wait(timeout)
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            status = scheduler.get_status()
+            if status['active_user'] is None and status['queue_depth'] == 0:
+                break
+            time.sleep(0.01)
+        time.sleep(0.05)  # A further retry would be due by now
+        return calls, scheduler.get_status()
+    finally:
+        scheduler.stop()
+
+
+def test_permanent_failure_is_not_retried():
+    failure = {'success': False, 'permanent': True, 'errors': ['No checkbox selections files found']}
+    calls, status = run_scheduler([failure])
+    assert calls == ['annotator']
+    assert status['uploads_abandoned'] == 1
+    assert status['queue_depth'] == 0
+
+
+def test_retries_stop_after_max_attempts():
+    failure = {'success': False, 'errors': ['Connection reset']}
+    calls, status = run_scheduler([failure] * 3, max_attempts=3)
+    assert len(calls) == 3
+    assert status['consecutive_failures'] == {'annotator': 3}
+    assert status['uploads_abandoned'] == 1
+
+
+def test_transient_failure_is_retried_until_success():
+    failure = {'success': False, 'errors': ['Connection reset']}
+    calls, status = run_scheduler([failure, {'success': True, 'errors': []}])
+    assert len(calls) == 2
+    assert status['consecutive_failures'] == {}
+    assert status['uploads_abandoned'] == 0
@@ -0,0 +1,12 @@
+"""
+WSGI entry point of the production server, without the debugger and reloader of run.py:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Any WSGI server can serve `app`. When several processes serve it, WORKER_PROCESSES in app/config.py must say so
+(gunicorn.conf.py sets it from the number of gunicorn workers), so they share the annotators' state safely.
+"""
+
+from app.factory import create_app
+
+app = create_app()